@@ -45,6 +45,7 @@ import { useAppContext } from '../context/AppContext';
 import CityDataDisplay from './CityDataDisplay';
 import EditAttendanceLogModal from './settings/EditAttendanceLogModal';
 import { AttendanceLog } from '../utils/types';
+import { useEventFeed } from '../utils/eventFeed';
 
 // ===== TYPES =====
 interface FaceDetection {
@@ -961,6 +962,15 @@ const CameraFeed: React.FC = () => {
     fetchDeviceSettings();
   }, []);
 
+  // Bumped by the change feed so settings are refetched only when they actually change
+  const [timeSettingsNonce, setTimeSettingsNonce] = useState(0);
+  const [attendanceSettingsNonce, setAttendanceSettingsNonce] = useState(0);
+  useEventFeed(['settings_changed'], (event) => {
+    const section = event.data?.section;
+    if (event.type === 'resync' || section === 'time') setTimeSettingsNonce((prev) => prev + 1);
+    if (event.type === 'resync' || section === 'attendance') setAttendanceSettingsNonce((prev) => prev + 1);
+  });
+
   useEffect(() => {
     const fetchIdleDisplaySettings = async () => {
       try {
@@ -982,9 +992,7 @@ const CameraFeed: React.FC = () => {
       }
     };
     fetchIdleDisplaySettings();
-    const interval = setInterval(fetchIdleDisplaySettings, 30000);
-    return () => clearInterval(interval);
-  }, []);
+  }, [timeSettingsNonce]);
 
   useEffect(() => {
     if (!showIdleHome || !idleDisplaySettings.showNewsTicker) return;
@@ -1104,10 +1112,15 @@ const CameraFeed: React.FC = () => {
       }
     };
     fetchSystemStats();
-    const interval = setInterval(fetchSystemStats, 15000);
-    return () => clearInterval(interval);
   }, []);
 
+  useEventFeed(['stats_sample'], (event) => {
+    if (event.type === 'stats_sample') setSystemStats(event.data);
+  });
+
+  const [employeeFeedNonce, setEmployeeFeedNonce] = useState(0);
+  useEventFeed(['employee_changed'], () => setEmployeeFeedNonce((prev) => prev + 1));
+
   useEffect(() => {
     let cancelled = false;
     const fetchEmployees = async () => {
@@ -1127,12 +1140,10 @@ const CameraFeed: React.FC = () => {
       }
     };
     fetchEmployees();
-    const interval = setInterval(fetchEmployees, 60000);
     return () => {
       cancelled = true;
-      clearInterval(interval);
     };
-  }, []);
+  }, [employeeFeedNonce]);
 
   useEffect(() => {
     const fetchAttendanceSettings = async () => {
@@ -1150,7 +1161,7 @@ const CameraFeed: React.FC = () => {
       }
     };
     fetchAttendanceSettings();
-  }, []);
+  }, [attendanceSettingsNonce]);
 
   useEffect(() => {
     if (!lastRecognizedPerson || lastRecognizedPerson.log_id) return;
@@ -1,4 +1,4 @@
-import React, { useMemo, useState, useEffect } from 'react';
+import React, { useMemo, useState, useEffect, useRef } from 'react';
 import {
   Box,
   Typography,
@@ -22,6 +22,7 @@ import {
 import { Edit, AlertCircle, Trash2 } from 'lucide-react';
 import { AttendanceLog, EventLog } from '../../utils/types';
 import EditAttendanceLogModal from './EditAttendanceLogModal';
+import { useEventFeed } from '../../utils/eventFeed';
 
 import { API_BASE } from '../../utils/api';
 const API_ROOT = API_BASE.replace(/\/api\/?$/, '') || window.location.origin;
@@ -111,10 +112,20 @@ const AttendanceLogs: React.FC = () => {
 
   useEffect(() => {
     fetchLogs();
-    const interval = setInterval(fetchLogs, 30000);
+    // Attendance arrives via the change feed; event logs have no feed topic, so poll them slowly
+    const interval = setInterval(fetchLogs, 60000);
     return () => clearInterval(interval);
   }, []);
 
+  const refetchTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  useEventFeed(['attendance_logged'], () => {
+    if (refetchTimerRef.current) clearTimeout(refetchTimerRef.current);
+    refetchTimerRef.current = setTimeout(fetchLogs, 500);
+  });
+  useEffect(() => () => {
+    if (refetchTimerRef.current) clearTimeout(refetchTimerRef.current);
+  }, []);
+
   const combinedLogs = useMemo<CombinedLog[]>(() => {
     const attendanceCombined: CombinedLog[] = attendanceLogs.map((log) => ({
       id: `att-${log.id}`,
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Typography,
@@ -24,6 +24,7 @@ import { AttendanceLog } from '../../utils/types';
 import EditAttendanceLogModal from './EditAttendanceLogModal';
 
 import { API_BASE } from '../../utils/api';
+import { useEventFeed } from '../../utils/eventFeed';
 const API_ROOT = API_BASE.replace(/\/api\/?$/, '') || window.location.origin;
 
 const parseTimestamp = (value?: string) => {
@@ -90,8 +91,16 @@ const AttendanceLogsOnly: React.FC = () => {
 
   useEffect(() => {
     fetchLogs();
-    const interval = setInterval(fetchLogs, 30000);
-    return () => clearInterval(interval);
+  }, []);
+
+  // Refetch when the backend change feed reports new or edited attendance
+  const refetchTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  useEventFeed(['attendance_logged'], () => {
+    if (refetchTimerRef.current) clearTimeout(refetchTimerRef.current);
+    refetchTimerRef.current = setTimeout(fetchLogs, 500);
+  });
+  useEffect(() => () => {
+    if (refetchTimerRef.current) clearTimeout(refetchTimerRef.current);
   }, []);
 
   const filteredLogs = attendanceLogs.filter((log) => {
@@ -3,6 +3,7 @@ import { Employee } from '../../utils/types';
 import { PlusIcon, SearchIcon, EditIcon, TrashIcon, CheckCircleIcon } from 'lucide-react';
 import AddEmployeeModal from './AddEmployeeModal';
 import EditEmployeeModal from './EditEmployeeModal';
+import { useEventFeed } from '../../utils/eventFeed';
 import {
   Box,
   Button,
@@ -114,10 +115,13 @@ const EmployeeList = () => {
 
   useEffect(() => {
     fetchEmployees();
-    const interval = setInterval(fetchRegisteredFaces, 10000);
-    return () => clearInterval(interval);
   }, []);
 
+  // Employee edits and face registrations from any device/tab arrive via the change feed
+  useEventFeed(['employee_changed'], () => {
+    fetchEmployees();
+  });
+
   const handleAddEmployee = async (employeeData: Employee) => {
     try {
       const response = await fetch(`${API_BASE}/employees`, {
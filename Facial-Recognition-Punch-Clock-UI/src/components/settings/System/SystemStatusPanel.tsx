@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Paper, Typography, Box, CircularProgress, Button, FormControl, Select, MenuItem, Tooltip } from '@mui/material';
 import { Cpu as CpuIcon, FileText as FileTextIcon } from 'lucide-react';
 import SystemStatsLogModal from './SystemStatsLogModal';
+import { useEventFeed } from '../../../utils/eventFeed';
 
 const API_BASE = import.meta.env.VITE_API_BASE || (window.location.protocol + '//' + window.location.hostname + ':5002/api');
 
@@ -17,10 +18,18 @@ const SystemStatusPanel: React.FC<Props> = ({ logIntervalSec, onLogIntervalChang
 
   useEffect(() => {
     fetchSystemStats();
-    const interval = setInterval(fetchSystemStats, 15000); // Refresh every 15 seconds
-    return () => clearInterval(interval);
   }, []);
 
+  // Stats samples are pushed by the backend change feed (every 15 seconds)
+  useEventFeed(['stats_sample'], (event) => {
+    if (event.type === 'stats_sample') {
+      setStats(event.data);
+      setLoading(false);
+    } else {
+      fetchSystemStats();
+    }
+  });
+
   const fetchSystemStats = async () => {
     try {
       const response = await fetch(`${API_BASE}/system/stats`);
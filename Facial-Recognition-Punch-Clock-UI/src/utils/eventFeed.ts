@@ -0,0 +1,91 @@
+import { useEffect, useRef } from 'react';
+import { API_BASE } from './api';
+
+// Topics published by the backend change feed (/api/events/stream).
+export type FeedTopic =
+  | 'attendance_logged'
+  | 'employee_changed'
+  | 'settings_changed'
+  | 'stats_sample'
+  | 'camera_state';
+
+export interface FeedEvent {
+  // 'resync' means events may have been missed: refetch the snapshot.
+  type: FeedTopic | 'resync';
+  id: number;
+  timestamp: number;
+  data: any;
+}
+
+type Listener = (event: FeedEvent) => void;
+
+// One EventSource per tab, shared by every component; reopened when the topic set changes.
+const listeners = new Map<Listener, FeedTopic[]>();
+let source: EventSource | null = null;
+let sourceTopicsKey = '';
+let lastEventId: string | null = null;
+
+const wantedTopics = (): FeedTopic[] => {
+  const all = new Set<FeedTopic>();
+  listeners.forEach((topics) => topics.forEach((t) => all.add(t)));
+  return Array.from(all).sort();
+};
+
+const dispatch = (event: FeedEvent) => {
+  listeners.forEach((topics, listener) => {
+    if (event.type !== 'resync' && !topics.includes(event.type)) return;
+    try {
+      listener(event);
+    } catch (error) {
+      console.error('Event feed listener error:', error);
+    }
+  });
+};
+
+const reconnect = () => {
+  const topics = wantedTopics();
+  const key = topics.join(',');
+  if (source && key === sourceTopicsKey) return;
+  if (source) {
+    source.close();
+    source = null;
+  }
+  sourceTopicsKey = key;
+  if (!topics.length) return;
+
+  const qs = new URLSearchParams({ topics: key });
+  // EventSource resends Last-Event-ID on its own retries; pass it explicitly when we reopen.
+  if (lastEventId) qs.set('lastEventId', lastEventId);
+  source = new EventSource(`${API_BASE}/events/stream?${qs.toString()}`);
+  source.onmessage = (msg) => {
+    if (msg.lastEventId) lastEventId = msg.lastEventId;
+    try {
+      const event = JSON.parse(msg.data);
+      if (event?.type === 'connection') return;
+      dispatch(event as FeedEvent);
+    } catch (error) {
+      console.error('Event feed parse error:', error);
+    }
+  };
+};
+
+export const subscribeEventFeed = (topics: FeedTopic[], listener: Listener) => {
+  listeners.set(listener, topics);
+  reconnect();
+  return () => {
+    listeners.delete(listener);
+    reconnect();
+  };
+};
+
+// Calls handler for each event on the given topics, and for 'resync' (initial connect or gap).
+export const useEventFeed = (topics: FeedTopic[], handler: Listener) => {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+  const topicsKey = [...topics].sort().join(',');
+
+  useEffect(() => {
+    const listener: Listener = (event) => handlerRef.current(event);
+    return subscribeEventFeed(topicsKey.split(',') as FeedTopic[], listener);
+  }, [topicsKey]);
+};
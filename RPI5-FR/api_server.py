@@ -9,17 +9,39 @@ from datetime import datetime
 import json
 import threading
 from collections import deque
-import tempfile
+from functools import lru_cache
 import subprocess
 import socket
 import struct
 import time
+import hmac
 from auth import AuthManager
 from config import Config
 # Import face detector for enhanced face detection
 from face_detection.face_detector import FaceDetector
 # Import enhanced camera manager
 from face_detection.camera_manager import CameraManager
+from face_detection.network_source import redact_url
+from face_detection.gallery import load_face_gallery, encode_face_image, delete_replica, load_replica
+from face_detection.gallery_index import GalleryIndex
+from face_detection.gallery_store import GalleryStore, SharedGallery
+from face_detection.detector_backends import backend_for_optimization
+from face_detection.embedding_backends import create_embedding_backend
+from event_bus import event_bus, EventBus, CoalescingQueue
+from frame_hub import FrameHub, FramePacer
+from metrics import metrics
+from recognition_scheduler import RecognitionScheduler, read_soc_temperature
+from attribute_worker import AttributeWorker
+from face_tracks import FaceTracker
+from enrichment import EnrichmentPool
+from liveness import LivenessEngine
+from identity_voting import IdentityVoter
+from camera_pipelines import CameraPipeline, CameraPipelines, parse_camera_specs
+from hub_client import HubClient
+from hub_matcher import HubMatcher
+import hub_protocol
+from gallery_replication import GalleryReplicator
+from erpnext_sync import ERPNextSyncWorker, ERPNextEmployeeSync
 import logging
 import numpy as np
 
@@ -110,6 +132,13 @@ def _save_attendance_snapshot(frame) -> str:
         print(f"⚠️  Attendance snapshot save error: {e}")
         return ''
 
+def _publish_event(topic: str, data: dict = None):
+    """Push a change-feed event; never lets a feed error break the caller."""
+    try:
+        event_bus.publish(topic, data or {})
+    except Exception as e:
+        logging.warning(f"Event publish error ({topic}): {e}")
+
 def log_event_entry(event_type: str, message: str = '', image_filename: str = '', metadata: dict = None):
     try:
         from db import db
@@ -124,10 +153,20 @@ CORS(app)  # Enable CORS for webapp integration
 # Initialize components
 auth_manager = AuthManager()
 face_detector = None  # Will be initialized after loading faces
+# Embedding model for the gallery and live probes (dlib by default, see EMBEDDING_BACKEND)
+embedding_backend = create_embedding_backend(
+    Config.EMBEDDING_BACKEND,
+    **({'model_path': Config.EMBEDDING_ONNX_MODEL or None,
+        'threads': Config.EMBEDDING_ONNX_THREADS,
+        'tolerance': Config.EMBEDDING_ONNX_TOLERANCE,
+        'margin': Config.EMBEDDING_ONNX_MARGIN}
+       if Config.EMBEDDING_BACKEND == 'onnx' else {'margin': Config.FACE_RECOGNITION_MARGIN})
+)
 
-# Global variables for face recognition
-known_face_encodings = []
+# Global variables for face recognition (encodings live only in face_detector.gallery)
 known_face_names = []
+# Read-only memory-mapped gallery shared with other recognition processes (see GALLERY_SHARED)
+shared_gallery = None
 last_attendance_time = {}
 attendance_cooldown = Config.ATTENDANCE_COOLDOWN  # seconds
 
@@ -192,6 +231,17 @@ recognition_lock = threading.Lock()
 # Enhanced EventSource variables
 event_source_clients = set()
 event_source_lock = threading.Lock()
+# Camera filter per SSE client (a camera id, or '*' for every camera); clients without an
+# entry follow the primary camera, as they did before there were several
+event_source_filters = {}
+# Bounded per-client backlog of non-coalescable events (person_recognized, duplicate_punch).
+# face_detected frames are latest-wins, so a stalled tab holds at most one of them.
+EVENT_SOURCE_MAX_PENDING = 64
+event_source_stats = {
+    'broadcasts': 0,
+    'frames_coalesced': 0,
+    'clients_evicted': 0,
+}
 
 #   Optimized Pipeline Variables
 frame_buffer = []
@@ -199,15 +249,31 @@ frame_buffer_lock = threading.Lock()
 # RAM tuning: keep more frames in memory to smooth stream + recognition handoff.
 # 24 frames at 1280x720 BGR ~66MB; use free RAM for smoother handoff and less frame drops.
 frame_buffer_max_size = 24
+# Single capture thread publishes every camera frame here; streams wait on it instead of polling.
+frame_hub = FrameHub()
+capture_thread = None
+capture_thread_lock = threading.Lock()
+# A stream waiting longer than this for a frame sends a blank part to keep the connection alive.
+STREAM_FRAME_WAIT_SEC = 2.0
+# Encoded JPEG parts shared between viewers: (camera, width, height, quality) -> (frame seq, part bytes).
+stream_part_cache = {}
+stream_part_cache_lock = threading.Lock()
+# Camera pipelines keyed by camera id, all served by the one recognition worker. The primary
+# camera is the capture path above (camera_manager -> frame_buffer/frame_hub); cameras listed
+# in EXTRA_CAMERAS own their camera and capture thread (registered below initialize_camera).
+camera_pipelines = CameraPipelines()
+primary_pipeline = camera_pipelines.add(CameraPipeline(
+    Config.PRIMARY_CAMERA_ID, Config.CAMERA_PORT, role=Config.CAMERA_ROLE,
+    hub=frame_hub, is_active=lambda: camera_active
+))
 recognition_thread = None
 recognition_active = False
 last_recognition_time = 0
 recognition_interval = 0.45  # Process recognition more often for smoother detection (~2.2 Hz)
+recognition_scheduler = RecognitionScheduler(base_interval=recognition_interval)
 last_face_detection_time = 0
 face_detection_cooldown = 2.0  # Retry recognition sooner when faces appear
-last_empty_broadcast_time = 0.0
 empty_broadcast_interval = 0.5
-last_attribute_time = 0
 system_stats_thread = None
 last_recognition_heartbeat = 0.0
 recognition_watchdog_thread = None
@@ -219,7 +285,48 @@ last_frame_source = None
 
 # System stats logging
 SYSTEM_STATS_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'system_stats.log')
+# Stats collection shells out to vcgencmd; share one sample across all polling tabs.
+SYSTEM_STATS_CACHE_TTL_SEC = 5.0
+system_stats_cache = {'data': None, 'ts': 0.0}
+system_stats_cache_lock = threading.Lock()
+STATS_SAMPLE_INTERVAL_SEC = 15.0
+stats_sample_thread = None
 DEEPFACE_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.venv-deepface', 'bin', 'python')
+# Long-lived DeepFace process (deepface_worker.py --serve) fed batched face crops; results land
+# on the face track asynchronously. Uses the dedicated venv when present.
+attribute_worker = AttributeWorker(
+    python=Config.DEEPFACE_PYTHON or (DEEPFACE_PY if os.path.exists(DEEPFACE_PY) else None),
+    batch_size=Config.ATTRIBUTE_BATCH_SIZE
+)
+# Faces followed across recognition cycles (attributes/spoof results are attached per track)
+face_tracker = FaceTracker()
+# Per-face checks (anti-spoofing) off the recognition critical path
+enrichment_pool = EnrichmentPool(face_tracker, workers=Config.ENRICHMENT_WORKERS)
+# Multi-frame liveness evidence per track (blink, micro-motion, moire, texture)
+liveness_engine = LivenessEngine(threshold=Config.LIVENESS_THRESHOLD, min_frames=Config.LIVENESS_MIN_FRAMES)
+# k-of-n identity votes per track before a punch is committed
+identity_voter = IdentityVoter(
+    window=Config.IDENTITY_VOTE_WINDOW,
+    votes_required=Config.IDENTITY_VOTES_REQUIRED,
+    early_frames=Config.IDENTITY_EARLY_FRAMES
+)
+# Edge/hub mode (HUB_MODE): an edge matches against the hub's master gallery, a hub batches
+# the matching requests of all edges. A hub answers any device that can reach it, so it only
+# starts with a HUB_TOKEN.
+if Config.HUB_MODE == 'hub' and not Config.HUB_TOKEN:
+    print("❌ HUB_MODE=hub needs HUB_TOKEN; /api/hub/match not started")
+hub_client = HubClient(
+    Config.HUB_URL,
+    Config.HUB_DEVICE_ID or socket.gethostname(),
+    payload=Config.HUB_PAYLOAD,
+    token=Config.HUB_TOKEN,
+    timeout=Config.HUB_TIMEOUT_SEC
+) if Config.HUB_MODE == 'edge' and Config.HUB_URL else None
+hub_matcher = HubMatcher(
+    lambda: face_detector,
+    max_batch=Config.HUB_MAX_BATCH,
+    max_wait=Config.HUB_BATCH_WAIT_SEC
+) if Config.HUB_MODE == 'hub' and Config.HUB_TOKEN else None
 
 # ERPNext settings (runtime)
 erpnext_settings = {
@@ -307,7 +414,67 @@ def _set_profile_photo_cache(cache_key: str, data: bytes, mime: str):
         # Evict oldest entry to cap RAM usage.
         oldest_key = min(profile_photo_cache.items(), key=lambda item: item[1].get('ts', 0))[0]
         profile_photo_cache.pop(oldest_key, None)
- 
+
+# Response versioning for polled endpoints: each resource carries a counter that is
+# bumped on mutation, so unchanged polls are answered with 304 and no JSON encoding.
+resource_versions = {
+    'attendance': 1,
+    'employees': 1,
+    'system_stats': 1,
+    'onvif': 1,
+    'time_settings': 1,
+}
+resource_versions_lock = threading.Lock()
+resource_observed_state = {}
+# Encoded bodies keyed by (resource, variant) so extra tabs reuse the same bytes.
+resource_body_cache = {}
+# Boot id in the ETag so a restarted server never matches a stale client validator.
+RESOURCE_BOOT_ID = format(int(time.time()), 'x')
+
+def _bump_resource_version(resource: str) -> int:
+    with resource_versions_lock:
+        version = resource_versions.get(resource, 0) + 1
+        resource_versions[resource] = version
+        return version
+
+def _observe_resource_state(resource: str, fingerprint) -> None:
+    """Bump a resource version when externally-owned state changes (process, file mtime)."""
+    with resource_versions_lock:
+        if resource_observed_state.get(resource, fingerprint) != fingerprint:
+            resource_versions[resource] = resource_versions.get(resource, 0) + 1
+        resource_observed_state[resource] = fingerprint
+
+def _resource_etag(resource: str, variant=None):
+    with resource_versions_lock:
+        version = resource_versions.get(resource, 0)
+    tag = f"{resource}-{RESOURCE_BOOT_ID}-{version}"
+    if variant is not None:
+        tag = f"{tag}-{variant}"
+    return tag, version
+
+def _conditional_json(resource: str, build_payload, variant=None):
+    """Return 304 if the client's If-None-Match is current, else the (cached) JSON body."""
+    tag, version = _resource_etag(resource, variant)
+    if request.if_none_match and request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+        response.set_etag(tag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    cache_key = (resource, variant)
+    cached = resource_body_cache.get(cache_key)
+    if cached and cached[0] == version:
+        body = cached[1]
+    else:
+        body = json.dumps(_json_safe(build_payload())).encode('utf-8')
+        resource_body_cache[cache_key] = (version, body)
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(tag, weak=True)
+    # no-cache: browsers store the body but revalidate every poll with If-None-Match.
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 def _get_resolution_dims(resolution: str):
     mapping = {
         '480p': (854, 480),
@@ -616,28 +783,13 @@ def _apply_camera_effects(frame):
         print(f"⚠️  Camera effects error: {e}")
         return frame
 
-def _detect_spoof(frame, face_location):
-    """Basic anti-spoofing check using sharpness/texture."""
+def _detect_spoof(track_id, frame, face_location, landmarks=None):
+    """Add this frame to the track's liveness evidence; returns the rolling verdict."""
     try:
         features = ai_settings.get('aiFeatures', {})
         if not features.get('antispoofing'):
             return None
-        top, right, bottom, left = face_location
-        h, w = frame.shape[:2]
-        top = max(0, top)
-        left = max(0, left)
-        bottom = min(h, bottom)
-        right = min(w, right)
-        if bottom <= top or right <= left:
-            return None
-        face_img = frame[top:bottom, left:right]
-        if face_img.size == 0:
-            return None
-        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-        # Low texture/blur often indicates a spoofed photo
-        is_spoof = bool(sharpness < 18.0)
-        return {'spoof': is_spoof, 'spoof_score': round(float(sharpness), 2)}
+        return liveness_engine.update(track_id, frame, face_location, landmarks)
     except Exception as e:
         print(f"⚠️  Anti-spoofing error: {e}")
         return None
@@ -659,19 +811,29 @@ def _apply_ai_settings():
         perf = ai_settings.get('aiPerformance', {}) or {}
         confidence = perf.get('confidenceThreshold', 0.85)
         model_optimization = str(perf.get('modelOptimization', 'balanced'))
+        if model_optimization == 'speed':
+            target_width = 800
+        elif model_optimization == 'accuracy':
+            target_width = 1120
+        else:
+            target_width = 960
+        # The scheduler may step the live width down from this under load/heat
+        recognition_scheduler.base_target_width = target_width
         if face_detector is not None:
             face_detector.min_confidence_threshold = float(confidence)
-            if model_optimization == 'speed':
-                face_detector.target_width = 800
-            elif model_optimization == 'accuracy':
-                face_detector.target_width = 1120
-            else:
-                face_detector.target_width = 960
+            face_detector.target_width = target_width
+            # speed -> DNN/Haar front detector, balanced/accuracy -> HOG; detectorBackend overrides
+            override = perf.get('detectorBackend') or Config.FACE_DETECTOR_BACKEND
+            face_detector.set_detector_backend(backend_for_optimization(model_optimization, override))
     except Exception as e:
         print(f"⚠️  Could not apply AI settings: {e}")
 
-def _analyze_face_attributes(frame, face_location):
-    """Optional age/emotion analysis using DeepFace if available."""
+def _analyze_face_attributes(frame, face_location, track, submit=True):
+    """Age/emotion for a face track from the DeepFace worker.
+
+    Returns the track's latest attributes (possibly from an earlier cycle) and, when they are
+    missing or older than ATTRIBUTE_REFRESH_SEC, queues the crop; the result is attached to the
+    track when it arrives. Never blocks on DeepFace."""
     try:
         features = ai_settings.get('aiFeatures', {})
         want_age = bool(features.get('ageEstimation'))
@@ -679,74 +841,31 @@ def _analyze_face_attributes(frame, face_location):
         if not want_age and not want_emotion:
             return {}
 
-        global last_attribute_time
-        now = time.time()
-        if now - last_attribute_time < 1.5:
-            return {}
-
-        top, right, bottom, left = face_location
-        h, w = frame.shape[:2]
-        top = max(0, top)
-        left = max(0, left)
-        bottom = min(h, bottom)
-        right = min(w, right)
-        if bottom <= top or right <= left:
-            return {}
-
-        face_img = frame[top:bottom, left:right]
-        if face_img.size == 0:
-            return {}
-
-        # Try in-process DeepFace first, else fallback to external worker
-        analysis = None
-        try:
-            from deepface import DeepFace  # type: ignore
-            actions = []
-            if want_age:
-                actions.append('age')
-            if want_emotion:
-                actions.append('emotion')
-
-            analysis = DeepFace.analyze(
-                img_path=face_img,
-                actions=actions,
-                enforce_detection=False
-            )
-            if isinstance(analysis, list):
-                analysis = analysis[0]
-        except Exception:
-            if os.path.exists(DEEPFACE_PY):
-                try:
-                    with tempfile.NamedTemporaryFile(suffix='.jpg', delete=True) as tmp:
-                        ok, buf = cv2.imencode('.jpg', face_img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
-                        if not ok:
-                            return {}
-                        tmp.write(buf.tobytes())
-                        tmp.flush()
-                        cmd = [
-                            DEEPFACE_PY,
-                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deepface_worker.py'),
-                            '--image', tmp.name,
-                        ]
-                        if want_age:
-                            cmd.append('--age')
-                        if want_emotion:
-                            cmd.append('--emotion')
-                        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=4)
-                        if proc.returncode == 0 and proc.stdout:
-                            analysis = json.loads(proc.stdout.strip())
-                except Exception as e:
-                    print(f"⚠️  DeepFace worker error: {e}")
-
-        if not analysis:
-            return {}
+        stale = track.age_of('attributes') >= Config.ATTRIBUTE_REFRESH_SEC
+        if submit and stale and 'attributes' not in track.pending:
+            top, right, bottom, left = face_location
+            h, w = frame.shape[:2]
+            top = max(0, top)
+            left = max(0, left)
+            bottom = min(h, bottom)
+            right = min(w, right)
+            if bottom > top and right > left:
+                face_img = frame[top:bottom, left:right]
+                actions = (['age'] if want_age else []) + (['emotion'] if want_emotion else [])
+                track_id = track.track_id
+                if face_tracker.mark_pending(track_id, 'attributes'):
+                    queued = attribute_worker.submit(
+                        face_img, actions, lambda attrs: face_tracker.set_result(track_id, 'attributes', attrs)
+                    )
+                    if not queued:
+                        face_tracker.set_result(track_id, 'attributes', None)
 
-        last_attribute_time = now
+        attributes = track.result('attributes') or {}
         result = {}
-        if want_age and 'age' in analysis:
-            result['age'] = int(analysis['age'])
-        if want_emotion and 'emotion' in analysis:
-            result['emotion'] = analysis.get('emotion')
+        if want_age and 'age' in attributes:
+            result['age'] = int(attributes['age'])
+        if want_emotion and attributes.get('emotion'):
+            result['emotion'] = attributes.get('emotion')
         return result
     except Exception as e:
         print(f"⚠️  Age/Emotion analysis error: {e}")
@@ -783,11 +902,24 @@ def initialize_camera():
             exposure_mode=Config.CAMERA_EXPOSURE_MODE,
             horizontal_flip=Config.CAMERA_HORIZONTAL_FLIP,
             vertical_flip=Config.CAMERA_VERTICAL_FLIP,
-            debug=Config.CAMERA_DEBUG  # Use camera debug setting
+            debug=Config.CAMERA_DEBUG,  # Use camera debug setting
+            replay_source=Config.CAMERA_REPLAY_SOURCE if Config.get_platform() == 'replay' else None,
+            replay_fps=Config.CAMERA_REPLAY_FPS,
+            replay_loop=Config.CAMERA_REPLAY_LOOP,
+            record_path=Config.CAMERA_RECORD_PATH or None,
+            network_timeout=Config.NETWORK_CAMERA_TIMEOUT_SEC,
+            network_reconnect_max=Config.NETWORK_CAMERA_RECONNECT_MAX_SEC,
+            rtsp_transport=Config.NETWORK_CAMERA_RTSP_TRANSPORT
         )
         
         # Initialize camera
         if camera_manager.initialize():
+            if _camera_reconnects_itself():
+                # The reader thread connects (and reconnects) on its own; the camera may not be
+                # reachable yet, and that is not an init failure
+                print("✅ Camera initialized using CameraManager (network reader connects in the background)")
+                camera_active = True
+                return True
             # Verify camera can deliver a frame
             frame = None
             for _ in range(3):
@@ -817,9 +949,56 @@ def initialize_camera():
         return False
 
 
+def _create_pipeline_camera(pipeline):
+    """CameraManager for an extra camera pipeline, with the primary camera's capture settings"""
+    width, height = _get_resolution_dims(camera_settings.get('cameraResolution', '1080p'))
+    return CameraManager(
+        width=width,
+        height=height,
+        framerate=Config.CAMERA_FPS,
+        camera_port=pipeline.source,
+        autofocus=Config.CAMERA_AUTOFOCUS,
+        awb_mode=Config.CAMERA_AWB_MODE,
+        exposure_mode=Config.CAMERA_EXPOSURE_MODE,
+        horizontal_flip=Config.CAMERA_HORIZONTAL_FLIP,
+        vertical_flip=Config.CAMERA_VERTICAL_FLIP,
+        debug=Config.CAMERA_DEBUG,
+        network_timeout=Config.NETWORK_CAMERA_TIMEOUT_SEC,
+        network_reconnect_max=Config.NETWORK_CAMERA_RECONNECT_MAX_SEC,
+        rtsp_transport=Config.NETWORK_CAMERA_RTSP_TRANSPORT
+    )
+
+
+def _register_extra_cameras():
+    """Add a pipeline per EXTRA_CAMERAS entry (id|source|role)"""
+    for camera_id, source, role in parse_camera_specs(Config.EXTRA_CAMERAS):
+        if camera_pipelines.get(camera_id) is not None:
+            print(f"⚠️  Duplicate camera id '{camera_id}' in EXTRA_CAMERAS, ignored")
+            continue
+        camera_pipelines.add(CameraPipeline(
+            camera_id, source, role=role,
+            create_manager=_create_pipeline_camera,
+            process_frame=_apply_camera_effects,
+            on_stop=face_tracker.drop_camera
+        ))
+        print(f"📷 Camera pipeline registered: {camera_id} ({redact_url(source)}, {role})")
+
+
+_register_extra_cameras()
+
+
+def _camera_reconnects_itself() -> bool:
+    """A network camera's reader thread reconnects with backoff by itself; reinitializing the
+    CameraManager would throw away the reader, its backoff and its health stats"""
+    return camera_manager is not None and camera_manager.platform == 'network'
+
+
 def ensure_camera_ready(force: bool = False) -> bool:
-    """Ensure camera is initialized and usable, optionally force reinit."""
+    """Ensure camera is initialized and usable, optionally force reinit (not for a running
+    network camera, which reconnects on its own)."""
     global camera_manager, camera_active, last_camera_init_attempt
+    if force and camera_active and _camera_reconnects_itself() and camera_manager.is_initialized:
+        return True
     now = time.time()
     if not force and (now - last_camera_init_attempt) < 3:
         return bool(camera_manager and camera_manager.is_initialized)
@@ -845,13 +1024,41 @@ def get_camera_frame():
     if not camera_active or not camera_manager:
         return None
     
-    frame = camera_manager.read_frame()
-    if frame is None:
+    with metrics.time_stage('capture'):
+        frame = camera_manager.read_frame()
+    if frame is None and not _camera_reconnects_itself():
         if ensure_camera_ready(force=True):
             frame = camera_manager.read_frame()
     if frame is None:
         return None
-    return _apply_camera_effects(frame)
+    with metrics.time_stage('camera_effects'):
+        return _apply_camera_effects(frame)
+
+def _match_probe(face_encoding, tolerance):
+    """(name, confidence) for /api/recognize and process_frame_for_recognition.
+
+    By default this is their original compare_faces rule: the first gallery entry within
+    tolerance (the embedding model's own tolerance when it has one). RECOGNIZE_STRICT_MATCH
+    applies the live pipeline's tolerance + margin rule (FaceDetector.match_encoding) instead.
+    """
+    if face_detector is None:
+        return "Unknown", 0.0
+    if Config.RECOGNIZE_STRICT_MATCH:
+        name, confidence, _, _, _ = face_detector.match_encoding(face_encoding)
+        return (name, confidence) if name != "Unknown" else ("Unknown", 0.0)
+    gallery = face_detector.gallery
+    if len(gallery) == 0:
+        return "Unknown", 0.0
+    backend = face_detector.embedding_backend
+    if backend.tolerance is not None:
+        tolerance = backend.tolerance
+    face_distances = gallery.distances(face_encoding)
+    matches = np.flatnonzero(face_distances <= tolerance)
+    if len(matches) == 0:
+        return "Unknown", 0.0
+    first_match_index = int(matches[0])
+    return gallery.name_at(first_match_index), backend.confidence(face_distances[first_match_index])
+
 
 def process_frame_for_recognition(frame):
     """Process a frame for face recognition"""
@@ -872,28 +1079,21 @@ def process_frame_for_recognition(frame):
     
     # Find faces in the image
     face_locations = face_recognition.face_locations(rgb_image)
-    face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+    # Encode with the detector's embedding model so probes match the gallery's model
+    face_encodings = face_detector.embedding_backend.encode(rgb_image, face_locations) if face_detector else []
     
     results = []
     for i, face_encoding in enumerate(face_encodings):
-        matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=Config.FACE_RECOGNITION_TOLERANCE)
-        name = "Unknown"
-        confidence = 0.0
+        name, confidence = _match_probe(face_encoding, Config.FACE_RECOGNITION_TOLERANCE)
         
-        if True in matches:
-            first_match_index = matches.index(True)
-            name = known_face_names[first_match_index]
-            
-            # Calculate confidence (distance-based)
-            face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-            confidence = 1.0 - face_distances[first_match_index]
-            
+        if name != "Unknown":
             # Check attendance cooldown
             current_time = datetime.now()
-            if name not in last_attendance_time or \
-               (current_time - last_attendance_time[name]).seconds > attendance_cooldown:
+            punch_key = (name, 'check-in')
+            if punch_key not in last_attendance_time or \
+               (current_time - last_attendance_time[punch_key]).seconds > attendance_cooldown:
                 record_attendance(name)
-                last_attendance_time[name] = current_time
+                last_attendance_time[punch_key] = current_time
         
         # Get face location for bounding box
         top, right, bottom, left = face_locations[i]
@@ -928,322 +1128,459 @@ def _parse_stream_arg(value, default, min_value, max_value):
         return default
 
 
-def generate_optimized_video_stream(width=STREAM_WIDTH, height=STREAM_HEIGHT, quality=STREAM_JPEG_QUALITY, fps=30):
-    """  optimized video stream - smooth, non-blocking. fps controls stream frame rate."""
-    global camera_active, frame_buffer
-    frame_interval = 1.0 / max(1, min(60, fps)) if fps else 0.02
+def _mjpeg_part(frame_bytes: bytes) -> bytes:
+    """One multipart/x-mixed-replace part; Content-Length lets proxies split parts without scanning"""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            b'Content-Length: ' + str(len(frame_bytes)).encode() + b'\r\n\r\n' + frame_bytes + b'\r\n')
+
+def capture_worker():
+    """Read camera frames at the sensor's pace and hand them to streams and recognition"""
+    global frame_buffer
+    failures = 0
+    logging.info("Capture worker started")
+    while camera_active:
+        frame = get_camera_frame()
+        if frame is None:
+            failures += 1
+            metrics.inc('frames_dropped', reason='capture_failed')
+            time.sleep(min(0.1 * failures, 1.0))
+            continue
+        failures = 0
+        metrics.inc('frames_captured')
+        with frame_buffer_lock:
+            frame_buffer.append(frame)
+            if len(frame_buffer) > frame_buffer_max_size:
+                frame_buffer.pop(0)  # Remove oldest frame
+        frame_hub.publish(frame)
+    with frame_buffer_lock:
+        # Don't let recognition pick up a stale frame after the camera restarts.
+        frame_buffer = []
+    logging.info("Capture worker stopped")
+
+
+def ensure_capture_thread():
+    """Start the capture thread if the camera is active and it isn't running"""
+    global capture_thread
+    if not camera_active:
+        return
+    with capture_thread_lock:
+        if capture_thread is not None and capture_thread.is_alive():
+            return
+        capture_thread = threading.Thread(target=capture_worker, daemon=True)
+        capture_thread.start()
+
+
+@lru_cache(maxsize=8)
+def _blank_stream_part(width, height, quality):
+    blank_frame = np.zeros((height, width, 3), dtype=np.uint8)
+    ret, buffer = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return _mjpeg_part(buffer.tobytes()) if ret else b''
+
+
+def _encoded_stream_part(seq, frame, width, height, quality, camera_id=None):
+    """Resize and JPEG-encode a frame once per (camera, size, quality), however many viewers want it"""
+    key = (camera_id or primary_pipeline.camera_id, width, height, quality)
+    with stream_part_cache_lock:
+        cached = stream_part_cache.get(key)
+        if cached and cached[0] == seq:
+            return cached[1]
+    stream_frame = frame
+    with metrics.time_stage('stream_encode'):
+        if frame.shape[1] != width or frame.shape[0] != height:
+            stream_frame = cv2.resize(frame, (width, height))
+        ret, buffer = cv2.imencode('.jpg', stream_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ret:
+        return None
+    part = _mjpeg_part(buffer.tobytes())
+    with stream_part_cache_lock:
+        cached = stream_part_cache.get(key)
+        if not cached or cached[0] < seq:
+            stream_part_cache[key] = (seq, part)
+    return part
+
+
+def generate_optimized_video_stream(width=STREAM_WIDTH, height=STREAM_HEIGHT, quality=STREAM_JPEG_QUALITY, fps=30,
+                                    pipeline=None):
+    """MJPEG stream of a camera pipeline (default primary): waits for its capture thread's next
+    frame; fps caps the rate by dropping frames (FramePacer)"""
+    pipeline = pipeline or primary_pipeline
+    pacer = FramePacer(fps)
+    last_seq = 0
     try:
         while True:
-            if not camera_active:
-                blank_frame = np.zeros((height, width, 3), dtype=np.uint8)
-                ret, buffer = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            if not pipeline.active:
+                yield _blank_stream_part(width, height, quality)
                 time.sleep(0.5)
                 continue
 
-            frame = get_camera_frame()
-            if frame is not None:
-                # Add frame to buffer for recognition thread
-                with frame_buffer_lock:
-                    frame_buffer.append(frame.copy())
-                    if len(frame_buffer) > frame_buffer_max_size:
-                        frame_buffer.pop(0)  # Remove oldest frame
-                # Resize for faster, smoother streaming
-                stream_frame = frame
-                if frame.shape[1] != width or frame.shape[0] != height:
-                    stream_frame = cv2.resize(frame, (width, height))
-                # Encode frame to JPEG for streaming (non-blocking)
-                ret, buffer = cv2.imencode(
-                    '.jpg',
-                    stream_frame,
-                    [cv2.IMWRITE_JPEG_QUALITY, quality]
-                )
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                    time.sleep(frame_interval)
-            else:
-                # Send a blank frame if camera is not available
-                blank_frame = np.zeros((height, width, 3), dtype=np.uint8)
-                ret, buffer = cv2.imencode('.jpg', blank_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                time.sleep(0.5)  # Delay if camera not available
+            if pipeline is primary_pipeline:
+                ensure_capture_thread()
+            seq, frame = pipeline.hub.wait_next(last_seq, STREAM_FRAME_WAIT_SEC)
+            if frame is None:
+                # Send a blank frame if camera is not delivering
+                yield _blank_stream_part(width, height, quality)
+                continue
+            last_seq = seq
+            if not pacer.admit():
+                metrics.inc('frames_dropped', reason='stream_rate_cap')
+                continue
+            part = _encoded_stream_part(seq, frame, width, height, quality, pipeline.camera_id)
+            if part:
+                yield part
     except GeneratorExit:
         logging.info("Client disconnected from MJPEG stream.")
     except Exception as e:
         logging.error(f"Error in MJPEG stream: {e}")
-    finally:
-        pass
+
+def _primary_recognition_frame():
+    """Latest primary-camera frame from the capture buffer, else a direct read (re-opening the camera after repeated misses)"""
+    global last_frame_none_count, last_frame_source
+    with frame_buffer_lock:
+        if frame_buffer:
+            last_frame_source = 'buffer'
+            last_frame_none_count = 0
+            return frame_buffer[-1].copy()  # Use latest frame
+    frame = get_camera_frame()
+    if frame is None:
+        last_frame_none_count += 1
+        last_frame_source = 'none'
+        if last_frame_none_count >= 5:
+            if not _camera_reconnects_itself():
+                ensure_camera_ready(force=True)
+            last_frame_none_count = 0
+        return None
+    last_frame_source = 'camera'
+    last_frame_none_count = 0
+    return frame
+
+
+def _pipeline_recognition_frame(pipeline):
+    """Latest frame of a camera pipeline for recognition, None if it has nothing fresh"""
+    if pipeline is primary_pipeline:
+        return _primary_recognition_frame()
+    frame = pipeline.latest_frame(max_age_sec=1.0)
+    return frame.copy() if frame is not None else None
+
+
+def _set_pipeline_results(pipeline, results, now_ts, faces_seen):
+    """Store a cycle's outcome on the camera pipeline; the primary camera's also feeds the legacy globals"""
+    global recognition_results, last_recognition_time, last_face_detection_time, last_detection_count
+    pipeline.results = results
+    pipeline.last_recognition_time = now_ts
+    if faces_seen:
+        pipeline.last_face_detection_time = now_ts
+    pipeline.stats['recognition_cycles'] += 1
+    pipeline.stats['faces'] += len(results)
+    if pipeline is primary_pipeline:
+        with recognition_lock:
+            recognition_results = results
+        last_recognition_time = pipeline.last_recognition_time
+        last_face_detection_time = pipeline.last_face_detection_time
+        last_detection_count = len(results)
+
 
 def recognition_worker():
-    """  optimized recognition worker - async, smart, efficient"""
-    global recognition_active, recognition_results, last_recognition_time, last_face_detection_time, last_empty_broadcast_time, last_recognition_heartbeat
-    global last_recognition_debug_log, last_frame_none_count, last_detection_count, last_frame_source
-    cpu_high = False
-    last_cpu_check = 0.0
-    frame_none_count = 0
+    """Shared recognition engine: serves every active camera pipeline, most overdue camera first"""
+    global recognition_active, last_recognition_heartbeat
     logging.info("Recognition worker started")
 
     while recognition_active:
         try:
             now_ts = time.time()
             last_recognition_heartbeat = now_ts
-            if now_ts - last_cpu_check >= 2.0:
-                try:
-                    import psutil
-                    cpu_high = psutil.cpu_percent(interval=0.0) >= 85.0
-                except Exception:
-                    cpu_high = False
-                last_cpu_check = now_ts
-
-            idle_gap = now_ts - last_face_detection_time if last_face_detection_time else 9999
-            if idle_gap > 10:
-                effective_interval = max(recognition_interval, 0.9)
-            elif idle_gap > 4:
-                effective_interval = max(recognition_interval, 0.65)
-            else:
-                effective_interval = recognition_interval
-
-            if cpu_high and (now_ts - last_recognition_time) < max(effective_interval, 1.0):
-                time.sleep(0.2)
-                continue
-            
-            # Smart frame skipping: only process if enough time has passed
-            if now_ts - last_recognition_time < effective_interval:
-                time.sleep(0.06)  # Short sleep to prevent CPU spinning
+            # Registrations made by another process switch the mapped gallery generation
+            _refresh_shared_gallery()
+
+            # Interval, detection width and optional stages per camera from load, temperature and
+            # that camera's presence; the camera furthest past its next cycle is served first
+            streams = max(1, len(camera_pipelines.active()))
+            pipeline, schedule, remaining = camera_pipelines.next_due(
+                lambda p: recognition_scheduler.plan(p.last_face_detection_time, now_ts, streams=streams),
+                now_ts
+            )
+            if pipeline is None or remaining > 0:
+                time.sleep(min(remaining, 0.1) if pipeline is not None else 0.1)  # Short sleep to prevent CPU spinning
                 continue
-            
-            # Get latest frame from buffer (fallback to camera if buffer is empty)
-            frame = None
-            with frame_buffer_lock:
-                if frame_buffer:
-                    frame = frame_buffer[-1].copy()  # Use latest frame
-                    last_frame_source = 'buffer'
+
+            frame = _pipeline_recognition_frame(pipeline)
             if frame is None:
-                frame = get_camera_frame()
-                if frame is None:
-                    frame_none_count += 1
-                    last_frame_none_count = frame_none_count
-                    last_frame_source = 'none'
-                    if frame_none_count >= 5:
-                        ensure_camera_ready(force=True)
-                        frame_none_count = 0
-                    time.sleep(0.1)
-                    continue
-                last_frame_source = 'camera'
-            frame_none_count = 0
-            last_frame_none_count = 0
-            
-            # Perform face detection and recognition in one step
-            try:
-                results = face_detector.detect_and_recognize_faces(frame)
-            except Exception as e:
-                print(f"❌ Face detection and recognition error: {e}")
-                time.sleep(0.12)
+                # Retry this camera shortly without holding up the others
+                pipeline.last_recognition_time = now_ts - schedule.interval + 0.1
                 continue
 
-            last_detection_count = len(results) if results is not None else 0
-            if now_ts - last_recognition_debug_log >= 5.0:
-                logging.info(
-                    "Recognition debug: frame_source=%s frame_none_count=%s results=%s cpu_high=%s",
-                    last_frame_source,
-                    last_frame_none_count,
-                    last_detection_count,
-                    cpu_high
-                )
-                last_recognition_debug_log = now_ts
-            
-            if not results:
-                # No faces detected - skip and extend cooldown
-                last_face_detection_time = now_ts
-                with recognition_lock:
-                    recognition_results = []
-                if now_ts - last_empty_broadcast_time >= empty_broadcast_interval:
-                    broadcast_recognition_results([])
-                    last_empty_broadcast_time = now_ts
-                time.sleep(0.12)  # Shorter sleep when no faces for snappier retry
-                continue
-            
-            # Update recognition results
-            with recognition_lock:
-                recognition_results = results
-            
-            # Multi-person toggle: limit to first face if disabled
-            if not ai_settings.get('aiFeatures', {}).get('multiPersonDetection', True):
-                results = results[:1]
-
-            # Build UI-friendly faces payload in stream coordinates so overlay matches video
-            frame_h, frame_w = frame.shape[:2]
-            scale_x = float(STREAM_WIDTH) / float(frame_w) if frame_w else 1.0
-            scale_y = float(STREAM_HEIGHT) / float(frame_h) if frame_h else 1.0
-            faces_payload = []
-            for r in results:
-                loc = r.get('location', {})
-                top = loc.get('top', 0)
-                right = loc.get('right', 0)
-                bottom = loc.get('bottom', 0)
-                left = loc.get('left', 0)
-                # Optional age/emotion analysis
-                attrs = _analyze_face_attributes(frame, (top, right, bottom, left))
-                if attrs:
-                    r.update(attrs)
-                spoof_attrs = _detect_spoof(frame, (top, right, bottom, left))
-                if spoof_attrs:
-                    r.update(spoof_attrs)
-                age = r.get('age')
-                emotion = r.get('emotion')
-                spoof = r.get('spoof')
-                raw_conf = r.get('confidence', 0.0)
-                faces_payload.append({
-                    'x': int(left * scale_x),
-                    'y': int(top * scale_y),
-                    'width': int((right - left) * scale_x),
-                    'height': int((bottom - top) * scale_y),
-                    'confidence': _normalize_confidence(raw_conf),
-                    'recognized': r.get('name') != 'Unknown',
-                    'name': r.get('name'),
-                    'age': age,
-                    'emotion': emotion,
-                    'spoof': spoof,
-                })
+            _run_recognition_cycle(pipeline, frame, schedule, now_ts)
 
-            # Prepare recognized payload (first recognized face)
-            recognized_payload = None
-            for r in results:
-                if r.get('name') and r.get('name') != 'Unknown':
-                    raw_conf = r.get('confidence')
-                    recognized_payload = {
-                        'type': 'person_recognized',
-                        'timestamp': r.get('timestamp'),
-                        'data': {
-                            'name': r.get('name'),
-                            'confidence': _normalize_confidence(raw_conf)
-                        }
-                    }
-                    break
+        except Exception as e:
+            logging.exception("Error in recognition worker")
+            time.sleep(1)
+    logging.warning("Recognition worker exited")
 
-            recognized_names = [r.get('name') for r in results if r.get('name') and r.get('name') != 'Unknown']
-            recognized_count = len(recognized_names)
-            detected_count = len(results)
 
-            if _should_log_event('event', cooldown_seconds=5):
-                log_event_entry(
-                    event_type='event',
-                    message=f"Recognition event processed ({detected_count} face(s))",
-                    metadata={'detected': detected_count, 'recognized': recognized_count}
-                )
+def _run_recognition_cycle(pipeline, frame, schedule, now_ts):
+    """Detect, recognize, broadcast and punch attendance for one frame of one camera"""
+    global last_recognition_debug_log
+    camera_id = pipeline.camera_id
 
-            if _should_log_event('detected', cooldown_seconds=5):
-                log_event_entry(
-                    event_type='detected',
-                    message=f"Detected {detected_count} face(s)",
-                    metadata={'detected': detected_count}
-                )
+    # Perform face detection and recognition in one step
+    cycle_start = time.perf_counter()
+    try:
+        face_detector.target_width = schedule.target_width
+        results = face_detector.detect_and_recognize_faces(frame, camera_id=camera_id)
+    except Exception as e:
+        print(f"❌ Face detection and recognition error ({camera_id}): {e}")
+        metrics.inc('recognition_errors')
+        pipeline.last_recognition_time = now_ts
+        time.sleep(0.12)
+        return
+    metrics.observe_stages(face_detector.last_stage_timings)
+    metrics.inc('recognition_cycles', camera=camera_id)
+
+    detection_count = len(results) if results is not None else 0
+    if now_ts - last_recognition_debug_log >= 5.0:
+        logging.info(
+            "Recognition debug: camera=%s frame_source=%s frame_none_count=%s results=%s level=%s interval=%.2f width=%s",
+            camera_id,
+            last_frame_source if pipeline is primary_pipeline else 'hub',
+            last_frame_none_count,
+            detection_count,
+            schedule.level,
+            schedule.interval,
+            schedule.target_width
+        )
+        last_recognition_debug_log = now_ts
+
+    if not results:
+        # No faces detected - presence decays, so the scheduler stretches the interval
+        _set_pipeline_results(pipeline, [], now_ts, faces_seen=False)
+        if now_ts - pipeline.last_empty_broadcast_time >= empty_broadcast_interval:
+            with metrics.time_stage('broadcast'):
+                broadcast_recognition_results([], camera_id=camera_id)
+            pipeline.last_empty_broadcast_time = now_ts
+        cycle_cost = time.perf_counter() - cycle_start
+        metrics.observe_stage('recognition_cycle', cycle_cost)
+        recognition_scheduler.record_cycle(cycle_cost, 0, schedule.target_width)
+        return
 
-            if recognized_names and _should_log_event('recognized', cooldown_seconds=5):
-                log_event_entry(
-                    event_type='recognized',
-                    message=f"Recognized: {', '.join(recognized_names)}",
-                    metadata={'recognized': recognized_count, 'names': recognized_names}
-                )
+    # Update recognition results
+    _set_pipeline_results(pipeline, results, now_ts, faces_seen=True)
+
+    # Multi-person toggle: limit to first face if disabled
+    if not ai_settings.get('aiFeatures', {}).get('multiPersonDetection', True):
+        results = results[:1]
+
+    # Build UI-friendly faces payload in stream coordinates so overlay matches video
+    frame_h, frame_w = frame.shape[:2]
+    scale_x = float(STREAM_WIDTH) / float(frame_w) if frame_w else 1.0
+    scale_y = float(STREAM_HEIGHT) / float(frame_h) if frame_h else 1.0
+    faces_payload = []
+    tracks = face_tracker.update([
+        (r.get('location', {}).get('top', 0), r.get('location', {}).get('right', 0),
+         r.get('location', {}).get('bottom', 0), r.get('location', {}).get('left', 0))
+        for r in results
+    ], now_ts, camera_id=camera_id)
+    antispoofing = bool(ai_settings.get('aiFeatures', {}).get('antispoofing'))
+    landmarks_by_face = face_detector.last_landmarks
+    for index, (r, track) in enumerate(zip(results, tracks)):
+        loc = r.get('location', {})
+        top = loc.get('top', 0)
+        right = loc.get('right', 0)
+        bottom = loc.get('bottom', 0)
+        left = loc.get('left', 0)
+        r['track_id'] = track.track_id
+        r['camera_id'] = camera_id
+        # Add this frame's match to the track's identity votes
+        r['identity'] = identity_voter.observe(
+            track.track_id, r.get('name'), r.get('distance'), r.get('margin'), r.get('confidence', 0.0),
+            face_detector.effective_tolerance, face_detector.embedding_backend.margin, now_ts
+        )
+        # Optional age/emotion: queued to the DeepFace worker, shown once it answers.
+        # New requests are shed first when the scheduler is degraded.
+        with metrics.time_stage('attributes'):
+            attrs = _analyze_face_attributes(frame, (top, right, bottom, left), track,
+                                             submit=schedule.run_attributes)
+        if attrs:
+            r.update(attrs)
+        # Liveness evidence is added on the enrichment pool; show the track's rolling verdict
+        if antispoofing:
+            landmarks = landmarks_by_face[index] if index < len(landmarks_by_face) else None
+            enrichment_pool.submit(track, 'spoof', _detect_spoof, track.track_id, frame,
+                                   (top, right, bottom, left), landmarks)
+            spoof_attrs = track.result('spoof', max_age=Config.SPOOF_RESULT_MAX_AGE_SEC)
+            if spoof_attrs:
+                r.update(spoof_attrs)
+        age = r.get('age')
+        emotion = r.get('emotion')
+        spoof = r.get('spoof')
+        liveness = r.get('liveness')
+        raw_conf = r.get('confidence', 0.0)
+        faces_payload.append({
+            'x': int(left * scale_x),
+            'y': int(top * scale_y),
+            'width': int((right - left) * scale_x),
+            'height': int((bottom - top) * scale_y),
+            'confidence': _normalize_confidence(raw_conf),
+            'recognized': r.get('name') != 'Unknown',
+            'name': r.get('name'),
+            'trackId': track.track_id,
+            'age': age,
+            'emotion': emotion,
+            'spoof': spoof,
+            'liveness': liveness,
+        })
 
-            if detected_count > 1 and _should_log_event('multi_face', cooldown_seconds=10):
-                log_event_entry(
-                    event_type='multi_face',
-                    message=f"Multiple faces detected ({detected_count})",
-                    metadata={'detected': detected_count}
-                )
+    # Prepare recognized payload (first recognized face)
+    recognized_payload = None
+    for r in results:
+        if r.get('name') and r.get('name') != 'Unknown':
+            raw_conf = r.get('confidence')
+            recognized_payload = {
+                'type': 'person_recognized',
+                'timestamp': r.get('timestamp'),
+                'cameraId': camera_id,
+                'data': {
+                    'name': r.get('name'),
+                    'confidence': _normalize_confidence(raw_conf)
+                }
+            }
+            break
 
-            if any(r.get('spoof') for r in results) and _should_log_event('anti_spoof', cooldown_seconds=30):
-                image_filename = _save_event_image(frame, 'anti_spoof')
-                log_event_entry(
-                    event_type='anti_spoof',
-                    message="Spoof suspected",
-                    image_filename=image_filename,
-                    metadata={'detected': detected_count, 'recognized': recognized_count}
-                )
+    recognized_names = [r.get('name') for r in results if r.get('name') and r.get('name') != 'Unknown']
+    recognized_count = len(recognized_names)
+    detected_count = len(results)
+    metrics.inc('faces_detected', detected_count)
+    metrics.inc('faces_recognized', recognized_count)
+
+    if _should_log_event('event', cooldown_seconds=5):
+        log_event_entry(
+            event_type='event',
+            message=f"Recognition event processed ({detected_count} face(s))",
+            metadata={'detected': detected_count, 'recognized': recognized_count, 'camera_id': camera_id}
+        )
 
-            # Broadcast results to EventSource clients
-            broadcast_recognition_results(faces_payload, recognized_payload)
+    if _should_log_event('detected', cooldown_seconds=5):
+        log_event_entry(
+            event_type='detected',
+            message=f"Detected {detected_count} face(s)",
+            metadata={'detected': detected_count, 'camera_id': camera_id}
+        )
 
-            # Record attendance only when confidence is high enough (0–100% scale)
-            from config import Config as Cfg
-            attendance_min_conf = getattr(Cfg, 'ATTENDANCE_MIN_CONFIDENCE', 0.75)
-            for r in results:
-                name = r.get('name')
-                if not name or name == 'Unknown':
-                    continue
-                raw_conf = r.get('confidence') or 0.0
-                norm_conf = _normalize_confidence(raw_conf)
-                if norm_conf < attendance_min_conf:
-                    continue  # skip low-confidence matches (threshold on 0–100% scale)
-                now_dt = datetime.now()
-                if name not in last_attendance_time or \
-                   (now_dt - last_attendance_time[name]).seconds > attendance_cooldown:
-                    attendance_info = record_attendance(name, confidence=raw_conf, frame=frame)
-                    last_attendance_time[name] = now_dt
-                    if recognized_payload and recognized_payload.get('data', {}).get('name') == name:
-                        recognized_payload['data'].update({
-                            'log_id': attendance_info.get('id'),
-                            'employee_id': attendance_info.get('employee_id'),
-                            'employee_name': attendance_info.get('employee_name'),
-                            'timestamp': attendance_info.get('timestamp'),
-                            'event_type': attendance_info.get('event_type'),
-                        })
-                else:
-                    # Within duplicate punch window: do not log attendance, but notify UI
-                    last_time = last_attendance_time.get(name)
-                    elapsed_sec = int((now_dt - last_time).total_seconds()) if last_time else 0
-                    try:
-                        now_ts = time.time()
-                        last_sent = duplicate_broadcast_last.get(name, 0)
-                        if now_ts - last_sent >= 1.0:
-                            duplicate_payload = {
-                                'type': 'duplicate_punch',
-                                'timestamp': now_dt.isoformat(),
-                                'data': {
-                                    'employee_id': name,
-                                    'employee_name': name,
-                                    'last_punch_time': last_time.isoformat() if last_time else None,
-                                    'elapsed_seconds': elapsed_sec,
-                                    'event_type': 'check-in',
-                                }
-                            }
-                            broadcast_recognition_results(None, duplicate_payload)
-                            duplicate_broadcast_last[name] = now_ts
-                    except Exception as e:
-                        logging.warning(f"Duplicate punch broadcast error: {e}")
-            
-            # Update timestamps
-            last_recognition_time = now_ts
-            last_face_detection_time = now_ts
-            
-            # Show recognition results
-            if results:
-                faces_detected = len(results)
-                recognized_names = [r['name'] for r in results if r['name'] != 'Unknown']
-                if recognized_names:
-                    print(f"👥 Detected {faces_detected} face(s): {', '.join(recognized_names)}")
-                else:
-                    print(f"👤 Detected {faces_detected} unknown face(s)")
-            
-            # Adaptive sleep based on results (tighter for smoother detection)
-            if results:
-                time.sleep(0.06)  # Shorter sleep when faces detected
-            else:
-                time.sleep(0.15)  # Shorter sleep when no recognition for quicker retry
-                
-        except Exception as e:
-            logging.exception("Error in recognition worker")
-            time.sleep(1)
-    logging.warning("Recognition worker exited")
+    if recognized_names and _should_log_event('recognized', cooldown_seconds=5):
+        log_event_entry(
+            event_type='recognized',
+            message=f"Recognized: {', '.join(recognized_names)}",
+            metadata={'recognized': recognized_count, 'names': recognized_names, 'camera_id': camera_id}
+        )
+
+    if detected_count > 1 and _should_log_event('multi_face', cooldown_seconds=10):
+        log_event_entry(
+            event_type='multi_face',
+            message=f"Multiple faces detected ({detected_count})",
+            metadata={'detected': detected_count, 'camera_id': camera_id}
+        )
+
+    if any(r.get('spoof') for r in results) and _should_log_event('anti_spoof', cooldown_seconds=30):
+        image_filename = _save_event_image(frame, 'anti_spoof')
+        log_event_entry(
+            event_type='anti_spoof',
+            message="Spoof suspected",
+            image_filename=image_filename,
+            metadata={'detected': detected_count, 'recognized': recognized_count, 'camera_id': camera_id}
+        )
+
+    # Broadcast results to EventSource clients
+    with metrics.time_stage('broadcast'):
+        broadcast_recognition_results(faces_payload, recognized_payload, camera_id=camera_id)
+
+    # Record attendance only when confidence is high enough (0–100% scale)
+    from config import Config as Cfg
+    attendance_min_conf = getattr(Cfg, 'ATTENDANCE_MIN_CONFIDENCE', 0.75)
+    # With antispoofing on, attendance waits for this cycle's liveness verdict - but only
+    # until a shared deadline - and commits once the rolling score crosses the threshold;
+    # undecided faces are retried on the next cycle with more evidence.
+    spoof_deadline = time.time() + Config.SPOOF_DEADLINE_SEC
+    # The camera's role decides the punch: an entry camera checks in, an exit camera checks
+    # out. The duplicate window is per person and direction, so leaving right after arriving
+    # is still recorded.
+    event_type = pipeline.role
+    # A punch needs the track's identity vote committed (k-of-n frames with a consistent
+    # margin, or an early commit on overwhelming evidence), not just this frame's match.
+    for r, track in zip(results, tracks):
+        decision = r.get('identity') or {}
+        name = decision.get('name')
+        if not name:
+            continue
+        if not decision.get('committed'):
+            metrics.inc('attendance_held', reason=f"identity_{decision.get('reason')}")
+            continue
+        raw_conf = decision.get('confidence') or 0.0
+        norm_conf = _normalize_confidence(raw_conf)
+        if norm_conf < attendance_min_conf:
+            continue  # skip low-confidence matches (threshold on 0–100% scale)
+        if antispoofing:
+            with metrics.time_stage('spoof_wait'):
+                spoof_attrs = enrichment_pool.wait(track, 'spoof', spoof_deadline - time.time(),
+                                                   max_age=Config.SPOOF_RESULT_MAX_AGE_SEC)
+            if spoof_attrs is None:
+                metrics.inc('attendance_held', reason='spoof_pending')
+                continue
+            if not spoof_attrs.get('live'):
+                metrics.inc('attendance_held', reason='spoof' if spoof_attrs.get('spoof') else 'liveness')
+                continue
+        now_dt = datetime.now()
+        punch_key = (name, event_type)
+        if punch_key not in last_attendance_time or \
+           (now_dt - last_attendance_time[punch_key]).seconds > attendance_cooldown:
+            attendance_info = record_attendance(name, confidence=raw_conf, event_type=event_type,
+                                                frame=frame, camera_id=camera_id)
+            last_attendance_time[punch_key] = now_dt
+            if recognized_payload and recognized_payload.get('data', {}).get('name') == name:
+                recognized_payload['data'].update({
+                    'log_id': attendance_info.get('id'),
+                    'employee_id': attendance_info.get('employee_id'),
+                    'employee_name': attendance_info.get('employee_name'),
+                    'timestamp': attendance_info.get('timestamp'),
+                    'event_type': attendance_info.get('event_type'),
+                    'camera_id': camera_id,
+                })
+        else:
+            # Within duplicate punch window: do not log attendance, but notify UI
+            last_time = last_attendance_time.get(punch_key)
+            elapsed_sec = int((now_dt - last_time).total_seconds()) if last_time else 0
+            try:
+                sent_ts = time.time()
+                last_sent = duplicate_broadcast_last.get(punch_key, 0)
+                if sent_ts - last_sent >= 1.0:
+                    duplicate_payload = {
+                        'type': 'duplicate_punch',
+                        'timestamp': now_dt.isoformat(),
+                        'cameraId': camera_id,
+                        'data': {
+                            'employee_id': name,
+                            'employee_name': name,
+                            'last_punch_time': last_time.isoformat() if last_time else None,
+                            'elapsed_seconds': elapsed_sec,
+                            'event_type': event_type,
+                            'camera_id': camera_id,
+                        }
+                    }
+                    broadcast_recognition_results(None, duplicate_payload, camera_id=camera_id)
+                    duplicate_broadcast_last[punch_key] = sent_ts
+            except Exception as e:
+                logging.warning(f"Duplicate punch broadcast error: {e}")
+
+    cycle_cost = time.perf_counter() - cycle_start
+    metrics.observe_stage('recognition_cycle', cycle_cost)
+    recognition_scheduler.record_cycle(cycle_cost, len(results), schedule.target_width)
+
+    # Show recognition results
+    faces_detected = len(results)
+    recognized_names = [r['name'] for r in results if r['name'] != 'Unknown']
+    prefix = f"[{camera_id}] " if pipeline is not primary_pipeline else ''
+    if recognized_names:
+        print(f"👥 {prefix}Detected {faces_detected} face(s): {', '.join(recognized_names)}")
+    else:
+        print(f"👤 {prefix}Detected {faces_detected} unknown face(s)")
 
 def start_recognition_pipeline(force=False):
     """Start the optimized recognition pipeline"""
@@ -1256,6 +1593,7 @@ def start_recognition_pipeline(force=False):
         recognition_active = False
         recognition_thread = None
 
+    ensure_capture_thread()
     if not recognition_active:
         recognition_active = True
         recognition_thread = threading.Thread(target=recognition_worker, daemon=True)
@@ -1277,7 +1615,7 @@ def start_recognition_watchdog():
         global recognition_active, recognition_thread, last_recognition_heartbeat
         while recognition_watchdog_active:
             time.sleep(2.0)
-            if not camera_active or not recognition_active:
+            if not camera_pipelines.active() or not recognition_active:
                 continue
             now = time.time()
             if last_recognition_heartbeat and (now - last_recognition_heartbeat) > 4.0:
@@ -1301,15 +1639,25 @@ def stop_recognition_pipeline():
         return True
     return False
 
+def _camera_state_snapshot():
+    return {
+        'camera_active': camera_active,
+        'recognition_active': recognition_active,
+        'idle': recognition_idle_mode,
+        'cameras': {p.camera_id: p.active for p in camera_pipelines.all()},
+    }
+
 def set_recognition_idle(idle: bool):
     """Toggle recognition idle mode without stopping camera feed."""
     global recognition_idle_mode
     recognition_idle_mode = bool(idle)
     if recognition_idle_mode:
         stop_recognition_pipeline()
+        _publish_event('camera_state', _camera_state_snapshot())
         return {'idle': True, 'recognition_active': recognition_active}
-    if camera_active:
+    if camera_pipelines.active():
         start_recognition_pipeline(force=True)
+    _publish_event('camera_state', _camera_state_snapshot())
     return {'idle': False, 'recognition_active': recognition_active}
 
 @app.route('/api/recognition/idle-mode', methods=['GET'])
@@ -1335,78 +1683,125 @@ def update_recognition_idle_mode():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def broadcast_recognition_results(faces_payload, recognized_payload=None):
-    """Broadcast recognition results to all connected EventSource clients"""
+def broadcast_recognition_results(faces_payload, recognized_payload=None, camera_id=None):
+    """Broadcast one camera's recognition results (default primary) to the EventSource clients following it"""
+    camera_id = camera_id or primary_pipeline.camera_id
     with event_source_lock:
-        if event_source_clients:
-            now_ts = datetime.now().isoformat()
-            # Send to all connected clients
-            for client in event_source_clients.copy():
-                try:
-                    if faces_payload is not None:
-                        face_event = {
-                            'type': 'face_detected',
-                            'timestamp': now_ts,
-                            'faces': faces_payload,
-                            'streamWidth': STREAM_WIDTH,
-                            'streamHeight': STREAM_HEIGHT,
-                            'data': {'faces_detected': len(faces_payload)}
-                        }
-                        client.put(f"data: {json.dumps(_json_safe(face_event))}\n\n")
-                    if recognized_payload:
-                        client.put(f"data: {json.dumps(_json_safe(recognized_payload))}\n\n")
-                except:
-                    # Remove disconnected clients
-                    event_source_clients.discard(client)
-
-def generate_recognition_stream():
-    """Enhanced EventSource stream with client management"""
-    from queue import Queue
-    
-    # Create a queue for this client
-    client_queue = Queue()
+        clients = [c for c in event_source_clients
+                   if event_source_filters.get(c, primary_pipeline.camera_id) in ('*', camera_id)]
+    if not clients:
+        return
+
+    # Serialize once, outside the lock, regardless of the number of viewers
+    face_message = None
+    recognized_message = None
+    if faces_payload is not None:
+        face_event = {
+            'type': 'face_detected',
+            'timestamp': datetime.now().isoformat(),
+            'faces': faces_payload,
+            'cameraId': camera_id,
+            'streamWidth': STREAM_WIDTH,
+            'streamHeight': STREAM_HEIGHT,
+            'data': {'faces_detected': len(faces_payload)}
+        }
+        face_message = f"data: {json.dumps(_json_safe(face_event))}\n\n"
+    if recognized_payload:
+        recognized_message = f"data: {json.dumps(_json_safe(recognized_payload))}\n\n"
+
+    evicted = []
+    coalesced_before = 0
+    coalesced_after = 0
+    for client in clients:
+        coalesced_before += client.coalesced
+        ok = True
+        if face_message is not None:
+            # Latest-wins per camera: a client following all cameras keeps one frame of each
+            ok = client.put(face_message, coalesce=camera_id)
+        if ok and recognized_message is not None:
+            ok = client.put(recognized_message)
+        coalesced_after += client.coalesced
+        if not ok:
+            evicted.append(client)
+
+    with event_source_lock:
+        event_source_stats['broadcasts'] += 1
+        event_source_stats['frames_coalesced'] += coalesced_after - coalesced_before
+        for client in evicted:
+            if client in event_source_clients:
+                # Slow consumer: drop it; EventSource reconnects and gets a fresh status
+                event_source_clients.discard(client)
+                event_source_filters.pop(client, None)
+                event_source_stats['clients_evicted'] += 1
+                client.close()
+    if evicted:
+        logging.warning(f"Evicted {len(evicted)} slow recognition stream client(s)")
+
+def _recognition_stream_preamble(camera_id=None):
+    """Connection message and current recognition status sent to each new SSE client"""
+    pipeline = camera_pipelines.get(camera_id) if camera_id else None
+    if pipeline is None or pipeline is primary_pipeline:
+        pipeline = primary_pipeline
+        with recognition_lock:
+            current_results = recognition_results.copy()
+    else:
+        current_results = list(pipeline.results)
+    recognized_count = len([r for r in current_results if r.get('name') and r.get('name') != 'Unknown'])
+
+    initial_data = {
+        'type': 'status',
+        'timestamp': datetime.now().isoformat(),
+        'faces_detected': len(current_results),
+        'recognitions': current_results,
+        'camera_active': pipeline.active,
+        'camera_id': camera_id or pipeline.camera_id,
+        'statistics': {
+            'totalFaces': len(current_results),
+            'recognizedFaces': recognized_count,
+            'eventsReceived': 0,
+            'uptime': 0
+        }
+    }
+    return [
+        f"data: {json.dumps({'type': 'connection', 'message': 'Connected to recognition stream'})}\n\n",
+        f"data: {json.dumps(_json_safe(initial_data))}\n\n",
+    ]
+
+
+def _recognition_heartbeat_message():
+    heartbeat = {
+        'type': 'heartbeat',
+        'timestamp': datetime.now().isoformat()
+    }
+    return f"data: {json.dumps(heartbeat)}\n\n"
+
+
+def generate_recognition_stream(camera_id=None):
+    """Enhanced EventSource stream with client management; camera_id '*' follows every camera"""
+    # Create a bounded, coalescing queue for this client
+    client_queue = CoalescingQueue(max_pending=EVENT_SOURCE_MAX_PENDING)
     
     # Add client to the set
     with event_source_lock:
         event_source_clients.add(client_queue)
+        if camera_id:
+            event_source_filters[client_queue] = camera_id
     
     try:
-        # Send initial connection message
-        yield f"data: {json.dumps({'type': 'connection', 'message': 'Connected to recognition stream'})}\n\n"
-        
-        # Send current recognition status
-        with recognition_lock:
-            current_results = recognition_results.copy()
-        recognized_count = len([r for r in current_results if r.get('name') and r.get('name') != 'Unknown'])
+        for message in _recognition_stream_preamble(camera_id):
+            yield message
 
-        initial_data = {
-            'type': 'status',
-            'timestamp': datetime.now().isoformat(),
-            'faces_detected': len(current_results),
-            'recognitions': current_results,
-            'camera_active': camera_active,
-            'statistics': {
-                'totalFaces': len(current_results),
-                'recognizedFaces': recognized_count,
-                'eventsReceived': 0,
-                'uptime': 0
-            }
-        }
-        yield f"data: {json.dumps(_json_safe(initial_data))}\n\n"
-        
         # Keep connection alive and send updates
-        while camera_active:
+        while camera_pipelines.active() and not client_queue.closed:
             try:
                 # Wait for new data or timeout
                 data = client_queue.get(timeout=30)  # 30 second timeout
                 yield data
             except Exception:
+                if client_queue.closed:
+                    break
                 # Send heartbeat to keep connection alive
-                heartbeat = {
-                    'type': 'heartbeat',
-                    'timestamp': datetime.now().isoformat()
-                }
-                yield f"data: {json.dumps(heartbeat)}\n\n"
+                yield _recognition_heartbeat_message()
                 
     except GeneratorExit:
         logging.info("Client disconnected from recognition SSE stream.")
@@ -1416,114 +1811,73 @@ def generate_recognition_stream():
         # Remove client from the set
         with event_source_lock:
             event_source_clients.discard(client_queue)
+            event_source_filters.pop(client_queue, None)
 
 def load_known_faces():
     """Load known faces from the faces directory (supports multi-angle registration)"""
-    global known_face_encodings, known_face_names
-    
-    known_face_encodings = []
-    known_face_names = []
+    global known_face_names
     
     faces_dir = Config.FACES_DIRECTORY
     if not os.path.exists(faces_dir):
         os.makedirs(faces_dir)
-        return
-    
-    # Track loaded employees to avoid duplicates
-    loaded_employees = set()
-    
-    # First, load faces from employee subdirectories (multi-angle format)
-    for item in os.listdir(faces_dir):
-        item_path = os.path.join(faces_dir, item)
-        
-        # Check if it's a directory (employee folder with multiple angles)
-        if os.path.isdir(item_path):
-            employee_name = item
-            angle_count = 0
-            
-            # Load all angles for this employee
-            for angle_file in os.listdir(item_path):
-                if angle_file.endswith((".jpg", ".jpeg", ".png")):
-                    image_path = os.path.join(item_path, angle_file)
-                    
-                    try:
-                        image = face_recognition.load_image_file(image_path)
-                        # Faster training load: use HOG with no upsample.
-                        face_locations = face_recognition.face_locations(
-                            image,
-                            number_of_times_to_upsample=0,
-                            model='hog'
-                        )
-                        
-                        if not face_locations:
-                            continue
-                        
-                        encoding = face_recognition.face_encodings(image, face_locations)
-                        if encoding:
-                            # Add encoding for each angle to improve recognition
-                            known_face_encodings.append(encoding[0])
-                            known_face_names.append(employee_name)
-                            angle_count += 1
-                    except Exception as e:
-                        print(f"❌ Error loading angle {angle_file} for {employee_name}: {e}")
-            
-            if angle_count > 0:
-                loaded_employees.add(employee_name)
-                print(f"✅ Loaded {angle_count} angles for {employee_name}")
+    known_face_encodings, known_face_names = load_face_gallery(faces_dir, embedding_backend)
     
-    # Then, load standalone face files (legacy format or main face files)
-    for filename in os.listdir(faces_dir):
-        file_path = os.path.join(faces_dir, filename)
-        
-        # Skip if it's a directory (already processed)
-        if os.path.isdir(file_path):
-            continue
-            
-        if filename.endswith((".jpg", ".jpeg", ".png")):
-            name = os.path.splitext(filename)[0]
-            
-            # Skip if already loaded from subdirectory
-            if name in loaded_employees:
-                continue
-            
-            try:
-                image = face_recognition.load_image_file(file_path)
-                # Faster training load: use HOG with no upsample.
-                face_locations = face_recognition.face_locations(
-                    image,
-                    number_of_times_to_upsample=0,
-                    model='hog'
-                )
-                
-                if not face_locations:
-                    print(f"⚠️  No face detected in {filename} - skipping")
-                    continue
-                
-                if len(face_locations) > 1:
-                    print(f"⚠️  Multiple faces detected in {filename} - using first face")
-                
-                encoding = face_recognition.face_encodings(image, face_locations)
-                if encoding:
-                    known_face_encodings.append(encoding[0])
-                    known_face_names.append(name)
-                    print(f"✅ Loaded face: {name}")
-                else:
-                    print(f"❌ Failed to encode face in {filename}")
-            except Exception as e:
-                print(f"❌ Error loading face {name}: {e}")
-    
-    print(f"📊 Loaded {len(known_face_names)} face encodings from {len(set(known_face_names))} employees")
+    print(f"📊 Loaded {len(known_face_names)} face encodings from {len(set(known_face_names))} employees ({embedding_backend.model_id})")
     # Initialize or update face detector with known faces
     global face_detector
     if face_detector is None:
         face_detector = FaceDetector(
-            known_face_encodings=known_face_encodings,
-            known_face_names=known_face_names,
-            recognition_tolerance=float(camera_settings.get('recognitionDistance', Config.FACE_RECOGNITION_TOLERANCE))
+            recognition_tolerance=float(camera_settings.get('recognitionDistance', Config.FACE_RECOGNITION_TOLERANCE)),
+            embedding_backend=embedding_backend,
+            gallery_model_id=embedding_backend.model_id,
+            gallery_dtype=Config.GALLERY_DTYPE
         )
+        _apply_ai_settings()
         print("🔍 Face detector initialized with recognition capabilities")
+        if hub_client is not None:
+            # The local gallery stays loaded as the offline fallback
+            face_detector.remote_matcher = hub_client
+            print(f"🛰️  Edge mode: matching via hub {redact_url(Config.HUB_URL)} ({hub_client.payload})")
     else:
-        face_detector.update_known_faces(known_face_encodings, known_face_names)
+        face_detector.set_embedding_backend(embedding_backend)
+    gallery = GalleryIndex(known_face_encodings, known_face_names, Config.GALLERY_DTYPE, embedding_backend.model_id)
+    del known_face_encodings
+    face_detector.set_gallery(_publish_gallery(gallery))
+
+
+def _publish_gallery(gallery):
+    """Publish a freshly built gallery as the next shared generation and return its read-only mapping.
+
+    Falls back to the in-memory index when sharing is off or the store cannot be written."""
+    global shared_gallery
+    if not Config.GALLERY_SHARED:
+        return gallery
+    try:
+        if shared_gallery is None or shared_gallery.store.model_id != gallery.model_id:
+            shared_gallery = SharedGallery(GalleryStore(Config.GALLERY_SHARED_DIR, gallery.model_id))
+        shared_gallery.store.publish(gallery)
+        mapped = shared_gallery.refresh(force=True)
+        return mapped if mapped is not None else gallery
+    except Exception as e:
+        print(f"⚠️  Shared gallery unavailable ({e}), keeping it in memory")
+        return gallery
+
+
+def _refresh_shared_gallery():
+    """Pick up a generation published by another process (one stat() when nothing changed)"""
+    global known_face_names
+    if shared_gallery is None or face_detector is None:
+        return False
+    try:
+        mapped = shared_gallery.refresh()
+    except Exception as e:
+        logging.warning(f"Shared gallery refresh failed: {e}")
+        return False
+    if mapped is None or mapped.model_id != face_detector.embedding_backend.model_id:
+        return False
+    face_detector.set_gallery(mapped)
+    known_face_names = mapped.names
+    return True
 
 
 def _score_profile_candidate(image_path: str, angle_hint: str = '') -> float:
@@ -1576,6 +1930,107 @@ def _score_profile_candidate(image_path: str, angle_hint: str = '') -> float:
 # Load faces on startup
 load_known_faces()
 
+
+def _replication_encodings(person_id):
+    """(model_id, encodings) of a person in the live gallery, for replication to peers"""
+    if face_detector is None:
+        return None, None
+    gallery = face_detector.gallery
+    return gallery.model_id, gallery.person_encodings(person_id)
+
+
+def _apply_replicated_person(person_id, encodings, removed):
+    """A peer's newer version of a person was stored: swap just their rows in the gallery"""
+    global known_face_names
+    if face_detector is not None and (encodings is not None or removed):
+        gallery = face_detector.gallery.replace_person(person_id, encodings)
+        face_detector.set_gallery(_publish_gallery(gallery))
+        known_face_names = gallery.names
+    profile_photo_cache.pop(os.path.join(gallery_replicator.profile_dir, f"{person_id}.jpg"), None)
+    _bump_resource_version('employees')
+    _publish_event('employee_changed', {'action': 'replicated', 'id': person_id})
+
+
+def _replication_people():
+    from db import db
+    people = [e['id'] for e in db.get_all_employees()]
+    if face_detector is not None:
+        people += face_detector.gallery.name_table
+    return list(dict.fromkeys(people))
+
+
+def _note_gallery_change(person_id, **kwargs):
+    """Stamp a local edit of a person for replication (no-op when replication is off)"""
+    if gallery_replicator is None:
+        return
+    try:
+        gallery_replicator.note_local_change(person_id, **kwargs)
+    except Exception as e:
+        print(f"⚠️  Replication change not recorded for {person_id}: {e}")
+
+
+def _create_gallery_replicator():
+    from db import db
+    return GalleryReplicator(
+        db,
+        Config.REPLICATION_DEVICE_ID or f"{socket.gethostname()}:{Config.API_PORT}",
+        Config.FACES_DIRECTORY,
+        peers=Config.REPLICATION_PEERS,
+        token=Config.REPLICATION_TOKEN,
+        interval=Config.REPLICATION_INTERVAL_SEC,
+        get_encodings=_replication_encodings,
+        local_model_id=lambda: embedding_backend.model_id,
+        encode_photo=lambda path: encode_face_image(path, embedding_backend),
+        on_applied=_apply_replicated_person
+    )
+
+
+def _token_matches(supplied, expected):
+    """Shared-secret check for device-to-device endpoints; an empty secret matches nothing"""
+    return bool(expected) and hmac.compare_digest((supplied or '').encode('utf-8'), expected.encode('utf-8'))
+
+
+# Gallery replication between devices (REPLICATION_ENABLED). Peers can add, change and delete
+# people, so it only starts with a REPLICATION_TOKEN.
+if Config.REPLICATION_ENABLED and not Config.REPLICATION_TOKEN:
+    print("❌ REPLICATION_ENABLED needs REPLICATION_TOKEN; gallery replication not started")
+gallery_replicator = _create_gallery_replicator() if Config.REPLICATION_ENABLED and Config.REPLICATION_TOKEN else None
+
+
+def _employees_pulled(result):
+    _bump_resource_version('employees')
+    _publish_event('employee_changed', {'action': 'erpnext_sync', 'created': result['created'],
+                                        'updated': result['updated']})
+
+
+def _create_erpnext_sync_worker():
+    from db import db
+    employee_sync = ERPNextEmployeeSync(
+        db,
+        lambda: erpnext_settings,
+        page_size=Config.ERPNEXT_EMPLOYEE_PAGE_SIZE,
+        workers=Config.ERPNEXT_EMPLOYEE_FETCH_WORKERS,
+        interval=Config.ERPNEXT_EMPLOYEE_SYNC_INTERVAL_SEC,
+        timeout=(Config.ERPNEXT_CONNECT_TIMEOUT_SEC, Config.ERPNEXT_READ_TIMEOUT_SEC),
+        on_synced=_employees_pulled
+    )
+    return ERPNextSyncWorker(
+        db,
+        lambda: erpnext_settings,
+        Config.ERPNEXT_DEVICE_ID or socket.gethostname(),
+        batch_size=Config.ERPNEXT_SYNC_BATCH_SIZE,
+        max_attempts=Config.ERPNEXT_SYNC_MAX_ATTEMPTS,
+        backoff_max=Config.ERPNEXT_SYNC_BACKOFF_MAX_SEC,
+        timeout=(Config.ERPNEXT_CONNECT_TIMEOUT_SEC, Config.ERPNEXT_READ_TIMEOUT_SEC),
+        log_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'erpnext_sync.log'),
+        on_synced=lambda result: _bump_resource_version('attendance'),
+        employee_sync=employee_sync
+    )
+
+
+# Attendance delivery to ERPNext; the attendance_logs table is its durable queue
+erpnext_sync_worker = _create_erpnext_sync_worker()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Enhanced health check with EventSource client count"""
@@ -1588,9 +2043,158 @@ def health_check():
         'loaded_faces': len(known_face_names),
         'platform': Config.get_platform(),
         'event_source_clients': client_count,
+        'event_feed_clients': event_bus.subscriber_count(),
         'camera_active': camera_active
     })
 
+def _max_recognition_queue_depth():
+    with event_source_lock:
+        clients = list(event_source_clients)
+    return max((q.qsize() for q in clients), default=0)
+
+
+def _frame_buffer_depth():
+    with frame_buffer_lock:
+        return len(frame_buffer)
+
+
+metrics.gauge('frame_buffer_depth', _frame_buffer_depth, 'Frames waiting in the recognition frame buffer')
+metrics.gauge('recognition_sse_clients', lambda: len(event_source_clients), 'Connected recognition SSE clients')
+metrics.gauge('recognition_sse_max_queue_depth', _max_recognition_queue_depth,
+              'Largest pending backlog among recognition SSE clients')
+metrics.gauge('event_feed_clients', event_bus.subscriber_count, 'Connected change-feed SSE clients')
+metrics.gauge('recognition_sse_frames_coalesced', lambda: event_source_stats['frames_coalesced'],
+              'face_detected frames replaced before delivery', metric_type='counter')
+metrics.gauge('recognition_sse_clients_evicted', lambda: event_source_stats['clients_evicted'],
+              'Recognition SSE clients dropped for falling behind', metric_type='counter')
+metrics.gauge('known_faces', lambda: len(known_face_names), 'Face encodings in the gallery')
+metrics.gauge('gallery_bytes', lambda: face_detector.gallery.nbytes if face_detector else 0,
+              'Memory held by the gallery matrix')
+metrics.gauge('attribute_worker_ready', lambda: 1 if attribute_worker.ready else 0,
+              'DeepFace attribute worker loaded and serving')
+metrics.gauge('attribute_worker_latency_seconds', lambda: attribute_worker.stats['last_latency_seconds'],
+              'Queue-to-result latency of the last attribute batch')
+metrics.gauge('attribute_worker_dropped', lambda: attribute_worker.stats['dropped'],
+              'Attribute requests dropped (queue full or worker unavailable)')
+metrics.gauge('enrichment_in_flight', lambda: enrichment_pool.snapshot()['in_flight'],
+              'Per-face enrichment jobs (anti-spoofing) running or queued')
+metrics.gauge('gallery_generation',
+              lambda: (face_detector.gallery.generation or 0) if face_detector else 0,
+              'Shared gallery generation in use (0 when held in memory)')
+metrics.gauge('camera_active', lambda: 1 if camera_active else 0, 'Camera running')
+metrics.gauge('cameras_active', lambda: len(camera_pipelines.active()), 'Camera pipelines running')
+metrics.gauge('recognition_active', lambda: 1 if recognition_active else 0, 'Recognition pipeline running')
+metrics.gauge('recognition_interval_seconds', lambda: recognition_interval, 'Base recognition interval')
+metrics.gauge('recognition_scheduled_interval_seconds',
+              lambda: recognition_scheduler.snapshot()['decision']['interval'],
+              'Interval chosen by the recognition scheduler')
+metrics.gauge('recognition_scheduler_level', lambda: recognition_scheduler.level,
+              'Scheduler degradation level (0 normal .. 3 critical)')
+metrics.gauge('recognition_cycle_cost_seconds', lambda: recognition_scheduler.cycle_cost_ewma,
+              'Smoothed recognition cycle cost at the base detection width')
+metrics.gauge('soc_temperature_celsius', lambda: recognition_scheduler.temperature, 'SoC temperature')
+metrics.gauge('detector_target_width', lambda: face_detector.target_width if face_detector else 0,
+              'Width frames are downscaled to before detection')
+metrics.describe('frames_captured', 'Frames read from the camera')
+metrics.describe('frames_dropped', 'Frames not delivered, by reason')
+metrics.describe('faces_detected', 'Faces found by the recognition pipeline')
+metrics.describe('faces_recognized', 'Faces matched to a known employee')
+metrics.describe('hub_faces_matched', 'Edge faces matched against the master gallery (hub mode)')
+metrics.gauge('erpnext_sync_pending', lambda: erpnext_sync_worker.db.get_attendance_sync_counts()['pending'],
+              'Attendance punches waiting for delivery to ERPNext')
+metrics.gauge('erpnext_sync_dead', lambda: erpnext_sync_worker.db.get_attendance_sync_counts()['dead'],
+              'Attendance punches ERPNext refused (dead letters)')
+if hub_client is not None:
+    metrics.gauge('hub_online', lambda: 1 if hub_client.online else 0, 'Recognition hub reachable (edge mode)')
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of pipeline stage latencies, counters and gauges"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/hub/match', methods=['POST'])
+def hub_match():
+    """Hub mode: match an edge device's embeddings or face crops (binary, see hub_protocol.py)"""
+    if hub_matcher is None:
+        return jsonify({'error': 'Not running as a recognition hub (HUB_MODE=hub with HUB_TOKEN)'}), 404
+    if not _token_matches(request.headers.get('X-Hub-Token'), Config.HUB_TOKEN):
+        return jsonify({'error': 'Invalid hub token'}), 401
+    try:
+        hub_request = hub_protocol.decode_request(request.get_data(cache=False))
+    except hub_protocol.ProtocolError as e:
+        logging.warning(f"Hub request rejected: {e}")
+        return Response(hub_protocol.encode_response(hub_protocol.STATUS_BAD_REQUEST),
+                        status=400, mimetype=hub_protocol.CONTENT_TYPE)
+    with metrics.time_stage('hub_match'):
+        status, matches = hub_matcher.match(hub_request)
+    metrics.inc('hub_faces_matched', len(matches))
+    ids = [item['id'] for item in hub_request.items] if matches else None
+    return Response(hub_protocol.encode_response(status, matches, ids), mimetype=hub_protocol.CONTENT_TYPE)
+
+
+@app.route('/api/hub/status', methods=['GET'])
+def hub_status():
+    """Edge/hub mode state: hub link health on an edge, batching and edge devices on a hub"""
+    return jsonify({
+        'mode': Config.HUB_MODE,
+        'edge': hub_client.snapshot() if hub_client is not None else None,
+        'hub': hub_matcher.snapshot() if hub_matcher is not None else None,
+    })
+
+
+def _replication_guard():
+    if gallery_replicator is None:
+        return jsonify({'error': 'Gallery replication is disabled (REPLICATION_ENABLED)'}), 404
+    if not Config.REPLICATION_TOKEN:
+        return jsonify({'error': 'REPLICATION_TOKEN is not set'}), 403
+    if not _token_matches(request.headers.get('X-Replication-Token'), Config.REPLICATION_TOKEN):
+        return jsonify({'error': 'Invalid replication token'}), 401
+    return None
+
+
+@app.route('/api/replication/changes', methods=['GET'])
+def replication_changes():
+    """People changed after ?since=<seq> (employee row, encodings, photo), for a peer's pull"""
+    error = _replication_guard()
+    if error:
+        return error
+    return jsonify(gallery_replicator.changes_since(
+        request.args.get('since', 0, type=int),
+        peer=request.args.get('peer'),
+        limit=request.args.get('limit', type=int)
+    ))
+
+
+@app.route('/api/replication/changes', methods=['POST'])
+def replication_apply():
+    """Changes pushed by a peer; only versions newer than ours are applied"""
+    error = _replication_guard()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    source = data.get('device_id') or request.headers.get('X-Replication-Device')
+    return jsonify(gallery_replicator.apply_changes(data.get('changes') or [], source))
+
+
+@app.route('/api/replication/status', methods=['GET'])
+def replication_status():
+    error = _replication_guard()
+    if error:
+        return error
+    return jsonify(gallery_replicator.snapshot())
+
+
+@app.route('/api/replication/sync', methods=['POST'])
+def replication_sync():
+    """Sync with every peer now instead of waiting for the next interval"""
+    error = _replication_guard()
+    if error:
+        return error
+    return jsonify({'peers': gallery_replicator.sync_all()})
+
+
 @app.route('/api/detect-face-quality', methods=['POST'])
 def detect_face_quality():
     """Detect face quality for registration (real-time validation)"""
@@ -1881,28 +2485,22 @@ def recognize_face():
         
         # Find faces in the image
         face_locations = face_recognition.face_locations(rgb_image)
-        face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+        # Encode with the detector's embedding model so probes match the gallery's model
+        face_encodings = face_detector.embedding_backend.encode(rgb_image, face_locations) if face_detector else []
         
         results = []
         for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(known_face_encodings, face_encoding)
-            name = "Unknown"
-            confidence = 0.0
+            # compare_faces' default tolerance, as before
+            name, confidence = _match_probe(face_encoding, 0.6)
             
-            if True in matches:
-                first_match_index = matches.index(True)
-                name = known_face_names[first_match_index]
-                
-                # Calculate confidence (distance-based)
-                face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-                confidence = 1.0 - face_distances[first_match_index]
-                
+            if name != "Unknown":
                 # Check attendance cooldown
                 current_time = datetime.now()
-                if name not in last_attendance_time or \
-                   (current_time - last_attendance_time[name]).seconds > attendance_cooldown:
+                punch_key = (name, 'check-in')
+                if punch_key not in last_attendance_time or \
+                   (current_time - last_attendance_time[punch_key]).seconds > attendance_cooldown:
                     record_attendance(name)
-                    last_attendance_time[name] = current_time
+                    last_attendance_time[punch_key] = current_time
             
             results.append({
                 'name': name,
@@ -2086,11 +2684,20 @@ def register_face():
                 )
             except Exception as e:
                 log_face_registration(f"register_log_error name={name} error={e}")
+            _bump_resource_version('employees')
+            _bump_resource_version('attendance')
+            _publish_event('employee_changed', {'action': 'face_registered', 'id': name})
+            _publish_event('attendance_logged', {'action': 'created', 'employee_id': name, 'event_type': 'register'})
+            
+            # The new local images replace any replicated encodings of this person
+            delete_replica(Config.FACES_DIRECTORY, name)
             
             # Reload known faces
             log_face_registration(f"training_start name={name}")
             load_known_faces()
             log_face_registration(f"training_done name={name} samples={validated_count}")
+            # Stamped once the gallery holds the new encodings, which are what peers receive
+            _note_gallery_change(name, faces_changed=True)
             
             return jsonify({
                 'success': True,
@@ -2169,9 +2776,15 @@ def register_face():
                 )
             except Exception as e:
                 print(f"⚠️  Could not log registration: {e}")
+            _bump_resource_version('employees')
+            _bump_resource_version('attendance')
+            _publish_event('employee_changed', {'action': 'face_registered', 'id': name})
+            _publish_event('attendance_logged', {'action': 'created', 'employee_id': name, 'event_type': 'register'})
+            delete_replica(Config.FACES_DIRECTORY, name)
             
             # Reload known faces
             load_known_faces()
+            _note_gallery_change(name, faces_changed=True)
             
             return jsonify({
                 'success': True,
@@ -2192,25 +2805,28 @@ def get_employees():
     """Get employee list from local database"""
     try:
         from db import db
-        employees = db.get_all_employees()
-        
-        # Convert to frontend format
-        formatted_employees = []
-        for emp in employees:
-            formatted_employees.append({
-                'id': emp['id'],
-                'name': emp['name'],
-                'department': emp['department'],
-                'photo': emp.get('photo', ''),
-                'active': bool(emp.get('active', True)),
-                'joinDate': emp.get('join_date', ''),
-                'faceRegistered': bool(emp.get('face_registered', False)),
-            })
-        
-        return jsonify({
-            'employees': formatted_employees,
-            'count': len(formatted_employees)
-        })
+
+        def _build():
+            employees = db.get_all_employees()
+
+            # Convert to frontend format
+            formatted_employees = []
+            for emp in employees:
+                formatted_employees.append({
+                    'id': emp['id'],
+                    'name': emp['name'],
+                    'department': emp['department'],
+                    'photo': emp.get('photo', ''),
+                    'active': bool(emp.get('active', True)),
+                    'joinDate': emp.get('join_date', ''),
+                    'faceRegistered': bool(emp.get('face_registered', False)),
+                })
+            return {
+                'employees': formatted_employees,
+                'count': len(formatted_employees)
+            }
+
+        return _conditional_json('employees', _build)
         
     except Exception as e:
         import traceback
@@ -2240,6 +2856,9 @@ def create_employee():
         success = db.create_employee(employee_data)
         
         if success:
+            _bump_resource_version('employees')
+            _publish_event('employee_changed', {'action': 'created', 'id': data['id']})
+            _note_gallery_change(data['id'])
             return jsonify({
                 'success': True,
                 'message': f'Employee {data["id"]} created successfully',
@@ -2273,6 +2892,9 @@ def update_employee(employee_id):
         success = db.update_employee(employee_id, employee_data)
         
         if success:
+            _bump_resource_version('employees')
+            _publish_event('employee_changed', {'action': 'updated', 'id': employee_id})
+            _note_gallery_change(employee_id)
             return jsonify({
                 'success': True,
                 'message': f'Employee {employee_id} updated successfully'
@@ -2327,6 +2949,9 @@ def delete_employee(employee_id):
                 except Exception as e:
                     print(f"⚠️  Error deleting face file: {e}")
             
+            # Encodings replicated from another device
+            delete_replica(faces_dir, employee_id)
+            
             # Reload known faces
             load_known_faces()
         
@@ -2334,6 +2959,9 @@ def delete_employee(employee_id):
         success = db.delete_employee(employee_id)
         
         if success:
+            _bump_resource_version('employees')
+            _publish_event('employee_changed', {'action': 'deleted', 'id': employee_id})
+            _note_gallery_change(employee_id, deleted=True, faces_deleted=delete_face_data)
             return jsonify({
                 'success': True,
                 'message': f'Employee {employee_id} deleted successfully',
@@ -2353,15 +2981,19 @@ def get_attendance_log():
     try:
         from db import db
         limit = min(int(request.args.get('limit', 200)), 1000)
-        logs = db.get_attendance_logs(limit=limit)
-        for log in logs:
-            snap = log.get('snapshot_path')
-            if snap:
-                log['snapshot_url'] = f"/api/attendance/snapshots/{snap}"
-        return jsonify({
-            'attendance': logs,
-            'count': len(logs)
-        })
+
+        def _build():
+            logs = db.get_attendance_logs(limit=limit)
+            for log in logs:
+                snap = log.get('snapshot_path')
+                if snap:
+                    log['snapshot_url'] = f"/api/attendance/snapshots/{snap}"
+            return {
+                'attendance': logs,
+                'count': len(logs)
+            }
+
+        return _conditional_json('attendance', _build, variant=limit)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2438,6 +3070,8 @@ def update_attendance_log(log_id):
         )
         if not ok:
             return jsonify({'error': 'Log not found'}), 404
+        _bump_resource_version('attendance')
+        _publish_event('attendance_logged', {'action': 'updated', 'id': log_id})
 
         return jsonify({'success': True})
     except Exception as e:
@@ -2451,6 +3085,8 @@ def delete_attendance_log(log_id):
         ok = db.delete_attendance_log(log_id)
         if not ok:
             return jsonify({'error': 'Log not found'}), 404
+        _bump_resource_version('attendance')
+        _publish_event('attendance_logged', {'action': 'deleted', 'id': log_id})
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -2490,6 +3126,12 @@ def delete_face(name):
         if os.path.exists(filepath):
             os.remove(filepath)
             load_known_faces()  # Reload faces
+            # Peers get the person's remaining encodings, or drop their copies if none are left
+            # (a replica outranks local images, so then nothing changed)
+            if not load_replica(faces_dir, name):
+                _, remaining = _replication_encodings(name)
+                has_faces = remaining is not None and len(remaining) > 0
+                _note_gallery_change(name, faces_changed=has_faces, faces_deleted=not has_faces)
             return jsonify({
                 'success': True,
                 'message': f'Face {name} deleted successfully'
@@ -2512,7 +3154,7 @@ def reload_faces():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def record_attendance(name, confidence=None, status='Present', event_type='check-in', frame=None):
+def record_attendance(name, confidence=None, status='Present', event_type='check-in', frame=None, camera_id=None):
     """Record attendance for the recognized person. Optionally saves snapshot if frame is provided."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"✅ Attendance recorded for {name} at {timestamp}")
@@ -2523,21 +3165,38 @@ def record_attendance(name, confidence=None, status='Present', event_type='check
 
     try:
         from db import db
-        employee = db.get_employee(name)
-        employee_id = employee.get('id') if employee else name
-        employee_name = employee.get('name') if employee else name
-        log_id = db.log_attendance(
-            employee_id=employee_id,
-            employee_name=employee_name,
-            confidence=confidence,
-            status=status,
-            event_type=event_type,
-            snapshot_path=snapshot_path or None
-        )
+        with metrics.time_stage('db_write'):
+            employee = db.get_employee(name)
+            employee_id = employee.get('id') if employee else name
+            employee_name = employee.get('name') if employee else name
+            log_id = db.log_attendance(
+                employee_id=employee_id,
+                employee_name=employee_name,
+                confidence=confidence,
+                status=status,
+                event_type=event_type,
+                snapshot_path=snapshot_path or None,
+                camera_id=camera_id
+            )
+        metrics.inc('attendance_recorded')
+        _bump_resource_version('attendance')
+        erpnext_sync_worker.notify()
     except Exception as e:
         print(f"⚠️  Could not write attendance to DB: {e}")
         log_id = None
 
+    if log_id is not None:
+        _publish_event('attendance_logged', {
+            'action': 'created',
+            'id': log_id,
+            'employee_id': employee_id,
+            'employee_name': employee_name,
+            'timestamp': timestamp,
+            'status': status,
+            'event_type': event_type,
+            'camera_id': camera_id,
+        })
+
     return {
         'id': log_id,
         'employee_id': employee_id if 'employee_id' in locals() else name,
@@ -2545,7 +3204,8 @@ def record_attendance(name, confidence=None, status='Present', event_type='check
         'name': name,
         'timestamp': timestamp,
         'status': status,
-        'event_type': event_type
+        'event_type': event_type,
+        'camera_id': camera_id
     }
 
 @app.route('/api/erpnext/authenticate', methods=['POST'])
@@ -2595,12 +3255,20 @@ def get_erpnext_employees():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/camera/stream', methods=['GET'])
-def camera_stream():
-    """Stream camera feed with integrated face recognition as MJPEG"""
-    # Use query params if provided, else camera_settings (Stream Resolution, Quality, FPS)
-    w_arg = request.args.get('w')
-    h_arg = request.args.get('h')
+@app.route('/api/erpnext/employees/sync', methods=['POST'])
+def sync_erpnext_employees():
+    """Pull employees changed in ERPNext since the last pull (?full=1 pulls everyone) into the local table"""
+    try:
+        full = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+        result = erpnext_sync_worker.employee_sync.run(full=full)
+        return jsonify({'success': result['error'] is None, **result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _resolve_stream_params(args):
+    """(width, height, quality, fps) from query params if provided, else camera_settings"""
+    w_arg = args.get('w')
+    h_arg = args.get('h')
     if w_arg and h_arg:
         stream_width = _parse_stream_arg(w_arg, STREAM_WIDTH, STREAM_MIN_WIDTH, STREAM_MAX_WIDTH)
         stream_height = _parse_stream_arg(h_arg, STREAM_HEIGHT, STREAM_MIN_HEIGHT, STREAM_MAX_HEIGHT)
@@ -2609,12 +3277,16 @@ def camera_stream():
         stream_width = min(max(sw, STREAM_MIN_WIDTH), STREAM_MAX_WIDTH)
         stream_height = min(max(sh, STREAM_MIN_HEIGHT), STREAM_MAX_HEIGHT)
     stream_quality = _parse_stream_arg(
-        request.args.get('q'),
+        args.get('q'),
         int(camera_settings.get('streamQuality', STREAM_JPEG_QUALITY)),
         STREAM_MIN_QUALITY,
         STREAM_MAX_QUALITY
     )
     stream_fps = max(1, min(60, int(camera_settings.get('streamFps', 30))))
+    return stream_width, stream_height, stream_quality, stream_fps
+
+
+def _autostart_camera_for_stream():
     try:
         if not camera_active:
             if ensure_camera_ready(force=True):
@@ -2623,6 +3295,13 @@ def camera_stream():
                     log_event_entry(event_type='camera_start', message='Camera started by stream request')
     except Exception as e:
         logging.warning(f"Camera auto-start on stream failed: {e}")
+
+
+@app.route('/api/camera/stream', methods=['GET'])
+def camera_stream():
+    """Stream camera feed with integrated face recognition as MJPEG"""
+    stream_width, stream_height, stream_quality, stream_fps = _resolve_stream_params(request.args)
+    _autostart_camera_for_stream()
     return Response(
         generate_optimized_video_stream(
             width=stream_width,
@@ -2643,7 +3322,10 @@ def camera_snapshot():
                 start_recognition_pipeline()
                 if _should_log_event('camera_start', 5):
                     log_event_entry(event_type='camera_start', message='Camera started by snapshot request')
-        frame = get_camera_frame()
+        # Reuse the capture thread's frame rather than contending with it for the camera.
+        _, frame = frame_hub.latest(max_age_sec=0.5)
+        if frame is None:
+            frame = get_camera_frame()
         if frame is None:
             if ensure_camera_ready(force=True):
                 frame = get_camera_frame()
@@ -2703,7 +3385,7 @@ def camera_status():
             'camera_type': 'None',
             'resolution': f"{Config.CAMERA_WIDTH}x{Config.CAMERA_HEIGHT}",
             'framerate': Config.CAMERA_FPS,
-            'camera_port': Config.CAMERA_PORT,
+            'camera_port': redact_url(Config.CAMERA_PORT),
             'error': 'Camera manager not available'
         })
 
@@ -2728,6 +3410,7 @@ def start_camera():
                 start_recognition_pipeline()
                 if _should_log_event('camera_start', 5):
                     log_event_entry(event_type='camera_start', message='Camera started')
+                _publish_event('camera_state', _camera_state_snapshot())
                 print("📹 Camera started with optimized face recognition pipeline")
                 return jsonify({
                     'success': True,
@@ -2758,13 +3441,16 @@ def stop_camera():
     try:
         if camera_active:
             camera_active = False
-            # Stop the recognition pipeline
-            stop_recognition_pipeline()
+            # Stop the recognition pipeline unless other cameras still need it
+            if not camera_pipelines.active():
+                stop_recognition_pipeline()
             if camera_manager:
                 camera_manager.close()
                 camera_manager = None
+            face_tracker.drop_camera(primary_pipeline.camera_id)
             if _should_log_event('camera_stop', 5):
                 log_event_entry(event_type='camera_stop', message='Camera stopped')
+            _publish_event('camera_state', _camera_state_snapshot())
             print("📹 Camera stopped")
             return jsonify({
                 'success': True,
@@ -2802,6 +3488,100 @@ def restart_camera():
         log_event_entry(event_type='camera_restart_error', message=str(e))
         return jsonify({'error': str(e)}), 500
 
+def _get_pipeline_or_404(camera_id):
+    pipeline = camera_pipelines.get(camera_id)
+    if pipeline is None:
+        return None, (jsonify({'error': f'Unknown camera: {camera_id}'}), 404)
+    return pipeline, None
+
+
+def _pipeline_status(pipeline):
+    status = pipeline.status()
+    if pipeline is primary_pipeline and camera_manager:
+        status['camera'] = camera_manager.get_status()
+    return status
+
+
+@app.route('/api/cameras', methods=['GET'])
+def list_cameras():
+    """Camera pipelines with their role (check-in/check-out) and state"""
+    return jsonify({
+        'primary': primary_pipeline.camera_id,
+        'recognition_active': recognition_active,
+        'cameras': [_pipeline_status(p) for p in camera_pipelines.all()]
+    })
+
+
+@app.route('/api/cameras/<camera_id>/status', methods=['GET'])
+def camera_pipeline_status(camera_id):
+    pipeline, error = _get_pipeline_or_404(camera_id)
+    if error:
+        return error
+    return jsonify(_pipeline_status(pipeline))
+
+
+@app.route('/api/cameras/<camera_id>/stream', methods=['GET'])
+def camera_pipeline_stream(camera_id):
+    """MJPEG stream of one camera (same query parameters as /api/camera/stream)"""
+    pipeline, error = _get_pipeline_or_404(camera_id)
+    if error:
+        return error
+    if pipeline is primary_pipeline:
+        return camera_stream()
+    stream_width, stream_height, stream_quality, stream_fps = _resolve_stream_params(request.args)
+    if not pipeline.active and pipeline.start():
+        start_recognition_pipeline()
+    return Response(
+        generate_optimized_video_stream(
+            width=stream_width,
+            height=stream_height,
+            quality=stream_quality,
+            fps=stream_fps,
+            pipeline=pipeline
+        ),
+        mimetype='multipart/x-mixed-replace; boundary=frame'
+    )
+
+
+@app.route('/api/cameras/<camera_id>/start', methods=['POST'])
+def start_camera_pipeline(camera_id):
+    pipeline, error = _get_pipeline_or_404(camera_id)
+    if error:
+        return error
+    if pipeline is primary_pipeline:
+        return start_camera()
+    if pipeline.active:
+        return jsonify({'success': False, 'message': f'Camera {camera_id} is already active'})
+    if not pipeline.start():
+        log_event_entry(event_type='camera_start_failed', message=pipeline.last_error,
+                        metadata={'camera_id': camera_id})
+        return jsonify({'error': pipeline.last_error or f'Failed to start camera {camera_id}'}), 500
+    start_recognition_pipeline()
+    if _should_log_event(f'camera_start_{camera_id}', 5):
+        log_event_entry(event_type='camera_start', message=f'Camera {camera_id} started',
+                        metadata={'camera_id': camera_id})
+    _publish_event('camera_state', _camera_state_snapshot())
+    return jsonify({'success': True, 'message': f'Camera {camera_id} started ({pipeline.role})'})
+
+
+@app.route('/api/cameras/<camera_id>/stop', methods=['POST'])
+def stop_camera_pipeline(camera_id):
+    pipeline, error = _get_pipeline_or_404(camera_id)
+    if error:
+        return error
+    if pipeline is primary_pipeline:
+        return stop_camera()
+    if not pipeline.active:
+        return jsonify({'success': False, 'message': f'Camera {camera_id} is not active'})
+    pipeline.stop()
+    if not camera_pipelines.active():
+        stop_recognition_pipeline()
+    if _should_log_event(f'camera_stop_{camera_id}', 5):
+        log_event_entry(event_type='camera_stop', message=f'Camera {camera_id} stopped',
+                        metadata={'camera_id': camera_id})
+    _publish_event('camera_state', _camera_state_snapshot())
+    return jsonify({'success': True, 'message': f'Camera {camera_id} stopped'})
+
 @app.route('/api/recognition/status', methods=['GET'])
 def recognition_status():
     """Get recognition status"""
@@ -2815,22 +3595,32 @@ def recognition_status():
         'loaded_faces': len(known_face_names),
         'last_results': recognition_results,
         'event_source_clients': client_count,
+        'event_source_stats': dict(event_source_stats),
         'recognition_active': recognition_active,
         'recognition_idle_mode': recognition_idle_mode,
         'last_heartbeat_age_sec': round(time.time() - last_recognition_heartbeat, 2) if last_recognition_heartbeat else None,
         'last_recognition_time_sec': round(time.time() - last_recognition_time, 2) if last_recognition_time else None,
         'last_detection_count': last_detection_count,
         'last_frame_none_count': last_frame_none_count,
-        'last_frame_source': last_frame_source
+        'last_frame_source': last_frame_source,
+        'scheduler': recognition_scheduler.snapshot(),
+        'attributes': attribute_worker.snapshot(),
+        'enrichment': enrichment_pool.snapshot(),
+        'cameras': [p.status() for p in camera_pipelines.all()]
     })
 
 @app.route('/api/recognition/stream', methods=['GET'])
 def recognition_stream():
-    """Enhanced EventSource stream with better error handling"""
-    if camera_active:
+    """Enhanced EventSource stream with better error handling (?camera=<id>|all, default primary)"""
+    camera_id = request.args.get('camera')
+    if camera_id == 'all':
+        camera_id = '*'
+    elif camera_id and camera_pipelines.get(camera_id) is None:
+        return jsonify({'error': f'Unknown camera: {camera_id}'}), 404
+    if camera_pipelines.active():
         start_recognition_pipeline()
     return Response(
-        generate_recognition_stream(),
+        generate_recognition_stream(camera_id),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
@@ -2841,13 +3631,33 @@ def recognition_stream():
         }
     )
 
+@app.route('/api/events/stream', methods=['GET'])
+def events_stream():
+    """Change feed (SSE): ?topics=attendance_logged,employee_changed,... with Last-Event-ID resume"""
+    topics = EventBus.parse_topics(request.args.get('topics'))
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    if 'stats_sample' in topics:
+        start_stats_sample_publisher()
+    return Response(
+        event_bus.stream(topics, last_event_id=last_event_id),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Headers': 'Cache-Control, Last-Event-ID',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/api/onvif/status', methods=['GET'])
 def get_onvif_status():
     """Get ONVIF server status"""
     try:
         from onvif_manager import onvif_manager
         status = onvif_manager.get_status()
-        return jsonify(status)
+        _observe_resource_state('onvif', tuple(sorted((k, str(v)) for k, v in status.items())))
+        return _conditional_json('onvif', lambda: status)
     except Exception as e:
         return jsonify({
             'running': False,
@@ -3051,7 +3861,8 @@ def get_profile_photo(filename):
 def get_system_stats():
     """Get system statistics (CPU, temperature, storage, database)"""
     try:
-        return jsonify(_collect_system_stats())
+        _get_system_stats_sample()
+        return _conditional_json('system_stats', lambda: system_stats_cache['data'])
         
     except Exception as e:
         import traceback
@@ -3071,12 +3882,8 @@ def _collect_system_stats():
     cpu_cores = psutil.cpu_count(logical=False) or cpu_threads
 
     # Temperature (Raspberry Pi specific)
-    temperature = None
-    try:
-        with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-            temp_raw = int(f.read().strip())
-            temperature = temp_raw / 1000.0  # Convert from millidegrees
-    except:
+    temperature = read_soc_temperature()
+    if temperature is None:
         # Fallback: try vcgencmd if available
         try:
             result = subprocess.run(['vcgencmd', 'measure_temp'], capture_output=True, text=True)
@@ -3177,17 +3984,44 @@ def _collect_system_stats():
         'ts': datetime.now().isoformat()
     }
 
+def _get_system_stats_sample():
+    """Return a recent stats sample, collecting at most once per SYSTEM_STATS_CACHE_TTL_SEC."""
+    with system_stats_cache_lock:
+        now = time.time()
+        if system_stats_cache['data'] is None or now - system_stats_cache['ts'] >= SYSTEM_STATS_CACHE_TTL_SEC:
+            system_stats_cache['data'] = _collect_system_stats()
+            system_stats_cache['ts'] = now
+            _bump_resource_version('system_stats')
+        return system_stats_cache['data']
+
 def _log_system_stats():
     os.makedirs(os.path.dirname(SYSTEM_STATS_LOG), exist_ok=True)
     while True:
         try:
-            data = _collect_system_stats()
+            data = _get_system_stats_sample()
             with open(SYSTEM_STATS_LOG, 'a') as f:
                 f.write(json.dumps(data) + "\n")
         except Exception as e:
             print(f"⚠️  System stats log error: {e}")
         time.sleep(30)
 
+def _publish_stats_samples():
+    """Push stats samples on the change feed while anyone is subscribed to them."""
+    while True:
+        try:
+            if event_bus.has_subscribers('stats_sample'):
+                _publish_event('stats_sample', _get_system_stats_sample())
+        except Exception as e:
+            print(f"⚠️  Stats sample publish error: {e}")
+        time.sleep(STATS_SAMPLE_INTERVAL_SEC)
+
+def start_stats_sample_publisher():
+    global stats_sample_thread
+    if stats_sample_thread and stats_sample_thread.is_alive():
+        return
+    stats_sample_thread = threading.Thread(target=_publish_stats_samples, daemon=True)
+    stats_sample_thread.start()
+
 def start_system_stats_logger():
     global system_stats_thread
     if system_stats_thread and system_stats_thread.is_alive():
@@ -3254,6 +4088,7 @@ def update_camera_settings():
             except Exception as e:
                 print(f"⚠️  Camera restart failed after settings update: {e}")
 
+        _publish_event('settings_changed', {'section': 'camera', 'settings': camera_settings})
         return jsonify({
             'success': True,
             'message': 'Camera settings updated successfully',
@@ -3295,6 +4130,7 @@ def update_ai_settings():
         ai_settings.update(data)
         _apply_ai_settings()
 
+        _publish_event('settings_changed', {'section': 'ai', 'settings': ai_settings})
         return jsonify({
             'success': True,
             'message': 'AI settings updated successfully',
@@ -3333,6 +4169,7 @@ def update_erpnext_settings():
 
         erpnext_settings.update(data)
 
+        _publish_event('settings_changed', {'section': 'erpnext'})
         return jsonify({
             'success': True,
             'message': 'ERPNext settings updated successfully',
@@ -3369,43 +4206,42 @@ def test_erpnext_connection():
 
 @app.route('/api/erpnext/sync', methods=['POST'])
 def sync_erpnext_logs():
-    """Sync attendance logs to ERPNext (placeholder)"""
+    """Deliver pending attendance punches to ERPNext now (the sync worker also runs on its own)"""
     try:
-        from db import db
-        settings = erpnext_settings.copy()
-        send_logs = settings.get('sendLogs', {})
-        logs = db.get_attendance_logs(limit=1000)
-        filtered = []
-        for log in logs:
-            event_type = log.get('event_type', 'check-in')
-            if event_type == 'register' and not send_logs.get('registration', True):
-                continue
-            if event_type != 'register' and not send_logs.get('recognition', True):
-                continue
-            filtered.append(log)
-
-        # Write payload to a local log for visibility
-        try:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            log_dir = os.path.join(base_dir, 'logs')
-            os.makedirs(log_dir, exist_ok=True)
-            sync_path = os.path.join(log_dir, 'erpnext_sync.log')
-            with open(sync_path, 'a') as f:
-                f.write(json.dumps({'ts': datetime.now().isoformat(), 'count': len(filtered)}) + "\n")
-        except Exception:
-            pass
-
-        try:
-            synced_ids = [int(log['id']) for log in filtered if log.get('id') is not None]
-            db.mark_attendance_synced(synced_ids)
-        except Exception:
-            pass
+        result = erpnext_sync_worker.run_once()
+        return jsonify({
+            'success': result['error'] is None,
+            **result,
+            'queue': erpnext_sync_worker.db.get_attendance_sync_counts()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/erpnext/sync/status', methods=['GET'])
+def erpnext_sync_status():
+    """Queue counts, last error and back-off of the ERPNext sync worker, plus recent dead letters"""
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 500))
         return jsonify({
-            'success': True,
-            'sent': len(filtered),
-            'message': 'Logs prepared for ERPNext sync'
+            **erpnext_sync_worker.snapshot(),
+            'dead_letters': erpnext_sync_worker.db.get_dead_attendance(limit),
+            'employees': erpnext_sync_worker.employee_sync.snapshot()
         })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/erpnext/sync/requeue', methods=['POST'])
+def requeue_erpnext_dead_letters():
+    """Send dead-lettered punches again (all of them, or the given ids) after fixing the cause"""
+    try:
+        from db import db
+        ids = (request.get_json(silent=True) or {}).get('ids')
+        if not ids:
+            ids = [log['id'] for log in db.get_dead_attendance(limit=100000)]
+        count = db.set_attendance_sync_state([int(i) for i in ids], 0)
+        erpnext_sync_worker.notify()
+        _bump_resource_version('attendance')
+        return jsonify({'success': True, 'requeued': count})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -3444,6 +4280,7 @@ def update_device_settings():
         device_settings.clear()
         device_settings.update(merged)
 
+        _publish_event('settings_changed', {'section': 'device', 'settings': device_settings})
         return jsonify({
             'success': True,
             'message': 'Device settings updated successfully',
@@ -3495,15 +4332,26 @@ def get_time_settings():
     """Get time settings"""
     try:
         settings_file = 'time_settings.json'
-        merged = dict(TIME_SETTINGS_DEFAULTS)
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r') as f:
-                data = json.load(f)
-                merged.update(_sanitize_time_settings(data))
-        _write_json_file(settings_file, merged)
-        time_settings.clear()
-        time_settings.update(merged)
-        return jsonify(merged)
+
+        def _build():
+            merged = dict(TIME_SETTINGS_DEFAULTS)
+            data = None
+            if os.path.exists(settings_file):
+                with open(settings_file, 'r') as f:
+                    data = json.load(f)
+                    merged.update(_sanitize_time_settings(data))
+            # Only rewrite when normalisation changed something, so the mtime stays stable.
+            if data != merged:
+                _write_json_file(settings_file, merged)
+            time_settings.clear()
+            time_settings.update(merged)
+            return merged
+
+        try:
+            _observe_resource_state('time_settings', os.stat(settings_file).st_mtime_ns)
+        except OSError:
+            _observe_resource_state('time_settings', None)
+        return _conditional_json('time_settings', _build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -3519,6 +4367,8 @@ def update_time_settings():
         _write_json_file(settings_file, merged)
         time_settings.clear()
         time_settings.update(merged)
+        _bump_resource_version('time_settings')
+        _publish_event('settings_changed', {'section': 'time', 'settings': time_settings})
         return jsonify({
             'success': True,
             'message': 'Time settings updated successfully',
@@ -3612,6 +4462,7 @@ def update_attendance_settings():
         attendance_settings.clear()
         attendance_settings.update(merged)
         attendance_cooldown = int(attendance_settings.get('duplicatePunchIntervalSec', attendance_cooldown))
+        _publish_event('settings_changed', {'section': 'attendance', 'settings': attendance_settings})
         return jsonify({
             'success': True,
             'message': 'Attendance settings updated successfully',
@@ -3680,10 +4531,48 @@ def cleanup_camera():
         camera_manager.close()
         print("✅ Camera cleanup completed")
 
+def start_owner_services():
+    """Background services the camera-owner process starts once, whatever server hosts the app"""
+    global camera_active, recognition_idle_mode
+    # Start system stats logger once
+    try:
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not Config.API_DEBUG:
+            start_system_stats_logger()
+    except Exception as e:
+        print(f"⚠️  Could not start system stats logger: {e}")
+
+    if gallery_replicator is not None:
+        gallery_replicator.start(seed_people=_replication_people)
+
+    _load_erpnext_settings()
+    erpnext_sync_worker.start()
+
+    # Auto-start camera stream/pipeline at server boot for kiosk mode.
+    if Config.AUTO_START_RECOGNITION:
+        try:
+            # Extra cameras first, so recognition serves them even if the primary fails to open
+            camera_pipelines.start_owned()
+            if ensure_camera_ready(force=True):
+                camera_active = True
+                recognition_idle_mode = False
+                start_recognition_pipeline(force=True)
+                print("✅ Auto-started camera and recognition pipeline on server startup")
+            else:
+                print(f"⚠️  Auto-start skipped: {last_camera_init_error or 'camera init failed'}")
+                if camera_pipelines.active():
+                    recognition_idle_mode = False
+                    start_recognition_pipeline(force=True)
+        except Exception as e:
+            print(f"⚠️  Auto-start error: {e}")
+
+
 if __name__ == '__main__':
     print("🚀 Starting Facial Recognition API Server...")
     print("Camera Configuration:")
-    print(f"  - Camera Port: {Config.CAMERA_PORT}")
+    print(f"  - Camera Port: {redact_url(Config.CAMERA_PORT)} ({Config.PRIMARY_CAMERA_ID}, {Config.CAMERA_ROLE})")
+    for extra in camera_pipelines.all():
+        if extra is not primary_pipeline:
+            print(f"  - Extra Camera: {extra.camera_id} -> {redact_url(extra.source)} ({extra.role})")
     print(f"  - Resolution: {Config.CAMERA_WIDTH}x{Config.CAMERA_HEIGHT} (16:9)")
     print(f"  - FPS: {Config.CAMERA_FPS}")
     print(f"  - Autofocus: {'Enabled' if Config.CAMERA_AUTOFOCUS else 'Disabled'}")
@@ -3693,14 +4582,9 @@ if __name__ == '__main__':
     print(f"  - Vertical Flip: {'Enabled' if Config.CAMERA_VERTICAL_FLIP else 'Disabled'}")
     print(f"  - Auto-Start Recognition: {'Enabled' if Config.AUTO_START_RECOGNITION else 'Disabled'}")
     print(f"  - Camera Debug: {'Enabled' if Config.CAMERA_DEBUG else 'Disabled'}")
+    if Config.get_platform() == 'replay':
+        print(f"  - Replay Source: {Config.CAMERA_REPLAY_SOURCE or '(not set)'}")
 
-    # Start system stats logger once
-    try:
-        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not Config.API_DEBUG:
-            start_system_stats_logger()
-    except Exception as e:
-        print(f"⚠️  Could not start system stats logger: {e}")
-    
     print("\nAvailable endpoints:")
     print("- GET  /api/health - Health check")
     print("- POST /api/recognize - Recognize faces from image")
@@ -3716,23 +4600,18 @@ if __name__ == '__main__':
     print("- POST /api/camera/start - Start camera with optimized recognition")
     print("- POST /api/camera/stop - Stop camera and recognition")
     print("- POST /api/camera/restart - Restart camera and recognition")
+    print("- GET  /api/cameras - List camera pipelines")
+    print("- POST /api/hub/match, GET /api/hub/status - Edge/hub recognition (HUB_MODE)")
+    print("- GET|POST /api/replication/changes, GET /api/replication/status, POST /api/replication/sync - Gallery replication")
+    print("- GET  /api/cameras/<id>/status|stream, POST /api/cameras/<id>/start|stop - Per-camera control")
     print("- GET  /api/recognition/status - Get recognition status")
     print("- GET  /api/recognition/stream - Stream recognition results (SSE)")
     print("- GET  /api/recognition/latest - Get latest recognition results")
+    print("- GET  /api/events/stream - Change feed (SSE, ?topics=...)")
+    print("- GET  /api/metrics - Pipeline metrics (Prometheus text format)")
+
+    start_owner_services()
 
-    # Auto-start camera stream/pipeline at server boot for kiosk mode.
-    if Config.AUTO_START_RECOGNITION:
-        try:
-            if ensure_camera_ready(force=True):
-                camera_active = True
-                recognition_idle_mode = False
-                start_recognition_pipeline(force=True)
-                print("✅ Auto-started camera and recognition pipeline on server startup")
-            else:
-                print(f"⚠️  Auto-start skipped: {last_camera_init_error or 'camera init failed'}")
-        except Exception as e:
-            print(f"⚠️  Auto-start error: {e}")
-    
     try:
         app.run(
             host=Config.API_HOST,
@@ -0,0 +1,188 @@
+"""
+ASGI entry point for the camera-owner process.
+
+/api/camera/stream and /api/recognition/stream are native coroutines that await the
+next frame (FrameHub) or recognition event (CoalescingQueue) instead of parking a
+thread in sleep/Queue.get, so idle viewers cost a coroutine each. Every other route
+is the Flask app behind a threaded WSGI bridge (wsgi_bridge.py), so long-lived Flask
+responses such as /api/events/stream do not hold up the rest of the API.
+
+Run with exactly one worker (the camera is a singleton):
+    uvicorn asgi:application --host 127.0.0.1 --port 5003 --workers 1
+"""
+import asyncio
+import json
+import logging
+from queue import Empty
+from urllib.parse import parse_qs
+
+import api_server
+from config import Config
+from event_bus import CoalescingQueue
+from frame_hub import FramePacer
+from wsgi_bridge import ThreadedWsgiToAsgi
+
+flask_application = ThreadedWsgiToAsgi(api_server.app, max_workers=Config.ASGI_WSGI_THREADS)
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'Cache-Control'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+async def video_stream(width, height, quality, fps):
+    """Async twin of api_server.generate_optimized_video_stream"""
+    loop = asyncio.get_running_loop()
+    pacer = FramePacer(fps)
+    last_seq = 0
+    while True:
+        if not api_server.camera_active:
+            yield api_server._blank_stream_part(width, height, quality)
+            await asyncio.sleep(0.5)
+            continue
+
+        api_server.ensure_capture_thread()
+        seq, frame = await api_server.frame_hub.wait_next_async(last_seq, api_server.STREAM_FRAME_WAIT_SEC)
+        if frame is None:
+            yield api_server._blank_stream_part(width, height, quality)
+            continue
+        last_seq = seq
+        if not pacer.admit():
+            api_server.metrics.inc('frames_dropped', reason='stream_rate_cap')
+            continue
+        # Encoding is shared across viewers and releases the GIL; keep it off the event loop.
+        part = await loop.run_in_executor(
+            None, api_server._encoded_stream_part, seq, frame, width, height, quality
+        )
+        if part:
+            yield part
+
+
+async def recognition_stream(camera_id=None):
+    """Async twin of api_server.generate_recognition_stream; camera_id '*' follows every camera"""
+    client_queue = CoalescingQueue(max_pending=api_server.EVENT_SOURCE_MAX_PENDING)
+    with api_server.event_source_lock:
+        api_server.event_source_clients.add(client_queue)
+        if camera_id:
+            api_server.event_source_filters[client_queue] = camera_id
+    try:
+        for message in api_server._recognition_stream_preamble(camera_id):
+            yield message.encode()
+        while api_server.camera_pipelines.active() and not client_queue.closed:
+            try:
+                message = await client_queue.get_async(timeout=30)
+            except Empty:
+                if client_queue.closed:
+                    break
+                message = api_server._recognition_heartbeat_message()
+            yield message.encode()
+    finally:
+        with api_server.event_source_lock:
+            api_server.event_source_clients.discard(client_queue)
+            api_server.event_source_filters.pop(client_queue, None)
+
+
+async def _send_stream(receive, send, headers, body):
+    """Stream an async generator until it ends or the client disconnects"""
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+    async def pump():
+        async for chunk in body:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    async def wait_disconnect():
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    pump_task = asyncio.ensure_future(pump())
+    disconnect_task = asyncio.ensure_future(wait_disconnect())
+    try:
+        done, _ = await asyncio.wait({pump_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump_task, disconnect_task):
+            task.cancel()
+        await asyncio.gather(pump_task, disconnect_task, return_exceptions=True)
+        await body.aclose()
+    if pump_task in done and not pump_task.cancelled() and pump_task.exception() is None:
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    elif pump_task in done and not pump_task.cancelled() and pump_task.exception() is not None:
+        logging.error(f"Error in async stream: {pump_task.exception()}")
+
+
+def _query_params(scope):
+    return {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        (b'access-control-allow-origin', b'*'),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def camera_stream(scope, receive, send):
+    params = _query_params(scope)
+    width, height, quality, fps = api_server._resolve_stream_params(params)
+    await asyncio.get_running_loop().run_in_executor(None, api_server._autostart_camera_for_stream)
+    headers = [
+        (b'content-type', b'multipart/x-mixed-replace; boundary=frame'),
+        (b'cache-control', b'no-cache'),
+        (b'access-control-allow-origin', b'*'),
+    ]
+    await _send_stream(receive, send, headers, video_stream(width, height, quality, fps))
+
+
+async def recognition_stream_endpoint(scope, receive, send):
+    """?camera=<id>|all, default primary (see api_server.recognition_stream)"""
+    camera_id = _query_params(scope).get('camera')
+    if camera_id == 'all':
+        camera_id = '*'
+    elif camera_id and api_server.camera_pipelines.get(camera_id) is None:
+        await _send_json(send, 404, {'error': f'Unknown camera: {camera_id}'})
+        return
+    if api_server.camera_pipelines.active():
+        await asyncio.get_running_loop().run_in_executor(None, api_server.start_recognition_pipeline)
+    await _send_stream(receive, send, SSE_HEADERS, recognition_stream(camera_id))
+
+
+STREAM_ROUTES = {
+    '/api/camera/stream': camera_stream,
+    '/api/recognition/stream': recognition_stream_endpoint,
+}
+
+
+async def _lifespan(receive, send):
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await loop.run_in_executor(None, api_server.start_owner_services)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await loop.run_in_executor(None, api_server.cleanup_camera)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope.get('method') == 'GET':
+        handler = STREAM_ROUTES.get(scope.get('path', ''))
+        if handler is not None:
+            await handler(scope, receive, send)
+            return
+    await flask_application(scope, receive, send)
@@ -0,0 +1,259 @@
+"""
+Attribute Worker - client for the long-lived DeepFace process (deepface_worker.py --serve).
+The models load once in that process; face crops are queued without blocking the
+recognition thread, sent in small batches over its stdin with the length-prefixed protocol
+and the results are handed back through callbacks. A crashed or missing worker is restarted
+with exponential backoff; requests that cannot be served are dropped, never waited on.
+"""
+import itertools
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from queue import Queue, Empty, Full
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from deepface_worker import read_message, write_message
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'deepface_worker.py')
+ResultCallback = Callable[[Optional[Dict]], None]
+
+
+class AttributeWorker:
+    """Thread-safe; submit() never blocks and callbacks run on the worker's reader thread"""
+
+    def __init__(self, python: Optional[str] = None, batch_size: int = 4, batch_wait: float = 0.03,
+                 max_queue: int = 16, request_timeout: float = 10.0, startup_timeout: float = 90.0,
+                 restart_backoff: Sequence[float] = (1.0, 60.0)):
+        self.python = python or sys.executable
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = batch_wait
+        self.request_timeout = request_timeout
+        # TensorFlow + two models can take a minute to load on a Pi
+        self.startup_timeout = startup_timeout
+        self.restart_backoff = restart_backoff
+        self._queue: Queue = Queue(maxsize=max_queue)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._ready = threading.Event()
+        self._pending: Dict[int, tuple] = {}
+        self._sender: Optional[threading.Thread] = None
+        self._next_start = 0.0
+        self._failures = 0
+        self._running = False
+        self.last_error: Optional[str] = None
+        self.stats = {
+            'submitted': 0, 'dropped': 0, 'batches': 0, 'faces': 0, 'errors': 0,
+            'restarts': 0, 'last_batch_seconds': 0.0, 'last_latency_seconds': 0.0,
+        }
+
+    # -- public -------------------------------------------------------------------------------
+
+    def submit(self, crop: np.ndarray, actions: List[str], callback: ResultCallback) -> bool:
+        """Queue one BGR face crop; False (and no callback) if the queue is full"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((np.ascontiguousarray(crop, dtype=np.uint8), list(actions), callback, time.time()))
+        except Full:
+            self.stats['dropped'] += 1
+            return False
+        self.stats['submitted'] += 1
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            pending = sum(len(entry[0]) for entry in self._pending.values())
+            pid = self._proc.pid if self._proc and self._proc.poll() is None else None
+        return dict(self.stats, ready=self.ready, pid=pid, queued=self._queue.qsize(),
+                    in_flight=pending, last_error=self.last_error)
+
+    def stop(self) -> None:
+        self._running = False
+        with self._lock:
+            proc = self._proc
+            self._proc = None
+        if proc is not None:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=3)
+            except Exception:
+                proc.kill()
+
+    # -- internals ----------------------------------------------------------------------------
+
+    def _ensure_started(self) -> None:
+        if self._running:
+            return
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._sender = threading.Thread(target=self._send_loop, name='attribute-worker-sender', daemon=True)
+            self._sender.start()
+
+    def _spawn(self) -> Optional[subprocess.Popen]:
+        """Start the worker process (with backoff after failures); None while backing off"""
+        with self._lock:
+            if self._proc is not None and self._proc.poll() is None:
+                return self._proc
+            if time.time() < self._next_start:
+                return None
+            self._ready.clear()
+            try:
+                proc = subprocess.Popen(
+                    [self.python, WORKER_SCRIPT, '--serve'],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                    close_fds=True,
+                )
+            except Exception as e:
+                self._record_failure(f'start failed: {e}')
+                return None
+            if self._proc is not None:
+                self.stats['restarts'] += 1
+            self._proc = proc
+        threading.Thread(target=self._read_loop, args=(proc,), name='attribute-worker-reader', daemon=True).start()
+        logger.info(f"DeepFace attribute worker started (pid {proc.pid})")
+        return proc
+
+    def _record_failure(self, error: str) -> None:
+        # Caller holds self._lock
+        self.last_error = error
+        self._failures += 1
+        low, high = self.restart_backoff
+        self._next_start = time.time() + min(high, low * (2 ** (self._failures - 1)))
+
+    def _collect_batch(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except Empty:
+            return []
+        batch = [first]
+        deadline = time.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _send_loop(self) -> None:
+        while self._running:
+            self._expire_pending()
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            proc = self._spawn()
+            if proc is None or not self._wait_ready(proc):
+                # Worker unavailable (missing DeepFace, backing off, still loading too long)
+                self.stats['dropped'] += len(batch)
+                for _, _, callback, _ in batch:
+                    self._callback(callback, None)
+                continue
+            # One request per action set so the worker runs each model once per batch
+            groups: Dict[tuple, list] = {}
+            for item in batch:
+                groups.setdefault(tuple(item[1]), []).append(item)
+            for actions, items in groups.items():
+                request_id = next(self._ids)
+                with self._lock:
+                    self._pending[request_id] = ([item[2] for item in items], [item[3] for item in items], time.time())
+                try:
+                    write_message(
+                        proc.stdin,
+                        {'id': request_id, 'actions': list(actions), 'shapes': [list(item[0].shape) for item in items]},
+                        b''.join(item[0].tobytes() for item in items),
+                    )
+                except Exception as e:
+                    logger.warning(f"Attribute worker write failed: {e}")
+                    self._fail_pending(request_id)
+
+    def _wait_ready(self, proc: subprocess.Popen) -> bool:
+        deadline = time.time() + self.startup_timeout
+        while not self._ready.wait(timeout=0.2):
+            if proc.poll() is not None or time.time() > deadline or not self._running:
+                return False
+        return proc.poll() is None
+
+    def _read_loop(self, proc: subprocess.Popen) -> None:
+        try:
+            while True:
+                header, _ = read_message(proc.stdout)
+                if header is None:
+                    break
+                if 'ready' in header or ('error' in header and 'id' not in header):
+                    if header.get('ready'):
+                        with self._lock:
+                            self._failures = 0
+                            self.last_error = None
+                        self._ready.set()
+                    else:
+                        with self._lock:
+                            self._record_failure(header.get('error', 'worker failed to start'))
+                        logger.warning(f"DeepFace attribute worker unavailable: {header.get('error')}")
+                    continue
+                with self._lock:
+                    entry = self._pending.pop(header.get('id'), None)
+                if entry is None:
+                    continue  # timed out already
+                callbacks, submitted, _ = entry
+                results = header.get('results') or []
+                now = time.time()
+                self.stats['batches'] += 1
+                self.stats['faces'] += len(callbacks)
+                self.stats['last_batch_seconds'] = float(header.get('seconds', 0.0))
+                self.stats['last_latency_seconds'] = now - min(submitted)
+                for i, callback in enumerate(callbacks):
+                    result = results[i] if i < len(results) else None
+                    if result is None or 'error' in result:
+                        self.stats['errors'] += 1
+                        result = None
+                    self._callback(callback, result)
+        except Exception as e:
+            logger.warning(f"Attribute worker reader stopped: {e}")
+        finally:
+            proc.poll()
+            with self._lock:
+                if self._proc is proc:
+                    self._proc = None
+                    if self._ready.is_set():
+                        self._record_failure(f'worker exited (code {proc.returncode})')
+                pending = list(self._pending)
+            self._ready.clear()
+            for request_id in pending:
+                self._fail_pending(request_id)
+
+    def _expire_pending(self) -> None:
+        cutoff = time.time() - self.request_timeout
+        with self._lock:
+            expired = [rid for rid, entry in self._pending.items() if entry[2] < cutoff]
+        for request_id in expired:
+            self._fail_pending(request_id)
+
+    def _fail_pending(self, request_id: int) -> None:
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is not None:
+            self.stats['errors'] += len(entry[0])
+            for callback in entry[0]:
+                self._callback(callback, None)
+
+    @staticmethod
+    def _callback(callback: ResultCallback, result: Optional[Dict]) -> None:
+        try:
+            callback(result)
+        except Exception as e:
+            logger.warning(f"Attribute callback failed: {e}")
@@ -1,9 +1,47 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import Config
 
+
+class TimeoutSession(requests.Session):
+    """requests.Session whose requests get a default (connect, read) timeout"""
+
+    def __init__(self, timeout=(5.0, 30.0)):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(timeout=(5.0, 30.0), retries=3, backoff=0.5, pool_size=4):
+    """Keep-alive session for ERPNext: pooled connections, default timeouts, and retries with
+    exponential backoff. Reads retry on 429/5xx; writes only when the connection could not be
+    made, since a POST that reached the server may already have been applied."""
+    session = TimeoutSession(timeout)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept': 'application/json'})
+    return session
+
+
 class AuthManager:
     def __init__(self):
-        self.session = requests.Session()
+        self.session = create_session(timeout=(Config.ERPNEXT_CONNECT_TIMEOUT_SEC, Config.ERPNEXT_READ_TIMEOUT_SEC))
         self.base_url = Config.ERPNEXT_BASE_URL
 
     def authenticate(self, username, password):
@@ -27,17 +65,14 @@ class AuthManager:
             print(f"Error during authentication: {e}")
             return False
 
-    def fetch_employee_data(self):
-        url = f"{self.base_url}/resource/Employee?limit_page_length=100"
+    def fetch_employee_data(self, modified_since=None):
+        """All Employee rows (or those modified after modified_since), every page"""
+        from erpnext_sync import erpnext_base_url, fetch_employees
         try:
-            response = self.session.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                print(data)
-                return data.get("data", [])
-            else:
-                print("Failed to fetch data from API:", response.status_code)
-                return []
-        except requests.RequestException as e:
+            rows = fetch_employees(self.session, erpnext_base_url(self.base_url), modified_since,
+                                   page_size=Config.ERPNEXT_EMPLOYEE_PAGE_SIZE,
+                                   workers=Config.ERPNEXT_EMPLOYEE_FETCH_WORKERS)
+            return rows
+        except Exception as e:
             print(f"Error fetching employee data: {e}")
-            return [] 
\ No newline at end of file
+            return []
@@ -0,0 +1,280 @@
+"""
+Offline recognition benchmark: replays recorded frames against a faces/ gallery through
+FaceDetector.detect_and_recognize_faces (the same call the live recognition worker makes)
+and writes throughput, per-stage latency percentiles, CPU/RSS and, given a labels file,
+identification precision/recall as JSON. No camera needed.
+
+Labels file: JSON {"<frame>": ["Name", ...]} or CSV lines "<frame>,Name1;Name2", where
+<frame> is the image file name, or the 0-based frame index for a video. An empty name
+list means nobody known is in the frame.
+
+    python benchmark.py --frames recordings/door_cam --faces faces --labels labels.csv \
+        --output bench.json
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_labels(path):
+    """Return {frame_name: set(names)}"""
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        return {str(k): set([v] if isinstance(v, str) else (v or [])) for k, v in raw.items()}
+    labels = {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            names = row[1] if len(row) > 1 else ''
+            labels[row[0].strip()] = {n.strip() for n in names.split(';') if n.strip()}
+    return labels
+
+
+def _round_ms(value):
+    return round(value * 1000.0, 3) if value is not None else None
+
+
+def run_benchmark(args):
+    # FaceDetector loads its cascades relative to the RPI5-FR directory.
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    from face_detection.detector_backends import create_detector_backend
+    from face_detection.embedding_backends import create_embedding_backend
+    from face_detection.face_detector import FaceDetector
+    from face_detection.frame_source import FileFrameSource
+    from face_detection.gallery import load_face_gallery
+    from face_detection.gallery_index import GalleryIndex
+    from metrics import MetricsRegistry
+
+    try:
+        import psutil
+        process = psutil.Process()
+    except Exception:
+        process = None
+
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+
+    options = {'model_path': args.embedding_model, 'threads': args.embedding_threads} if args.embedding == 'onnx' else {}
+    with quiet:
+        embedding = create_embedding_backend(args.embedding, **options)
+    if embedding.tolerance is not None and args.tolerance is not None:
+        embedding.tolerance = args.tolerance
+
+    gallery_start = time.perf_counter()
+    with quiet:
+        encodings, names = load_face_gallery(args.faces, embedding)
+    gallery_load_sec = time.perf_counter() - gallery_start
+
+    detector = FaceDetector(encodings, names, recognition_tolerance=args.tolerance or 0.5,
+                            embedding_backend=embedding, gallery_model_id=embedding.model_id,
+                            gallery_dtype=args.gallery_dtype)
+    # float64 reference gallery to measure what quantized storage changes
+    baseline = GalleryIndex(encodings, names, 'float64', embedding.model_id) \
+        if args.gallery_dtype != 'float64' and len(names) else None
+    quant = {'probes': 0, 'agree': 0, 'distance_errors': [], 'kernel_sec': 0.0, 'baseline_kernel_sec': 0.0,
+             'tp': 0, 'fp': 0, 'fn': 0, 'overhead_sec': 0.0}
+    detector.target_width = args.target_width
+    options = {'upsample': args.upsample} if args.detector == 'hog' else {}
+    with quiet:
+        detector.set_detector_backend(create_detector_backend(args.detector, **options))
+
+    labels = load_labels(args.labels) if args.labels else None
+    source = FileFrameSource(args.frames)
+    if not source.open():
+        raise SystemExit(f"Could not open frame source: {args.frames}")
+
+    registry = MetricsRegistry()
+    tp = fp = fn = 0
+    labelled_frames = 0
+    frames = 0
+    faces = 0
+    rss_peak = 0
+    cpu_start = process.cpu_times() if process else None
+    wall_start = None
+
+    try:
+        while args.max_frames <= 0 or frames < args.max_frames + args.warmup:
+            frame = source.read()
+            if frame is None:
+                break
+            if frames == args.warmup:
+                registry.reset()
+                wall_start = time.perf_counter()
+                cpu_start = process.cpu_times() if process else None
+            cycle_start = time.perf_counter()
+            with quiet:
+                results = detector.detect_and_recognize_faces(frame)
+            cycle = time.perf_counter() - cycle_start
+            registry.observe_stages(detector.last_stage_timings)
+            registry.observe_stage('recognition_cycle', cycle)
+            frames += 1
+            if frames <= args.warmup:
+                continue
+
+            faces += len(results)
+            if process:
+                rss_peak = max(rss_peak, process.memory_info().rss)
+            baseline_predicted = set()
+            if baseline is not None:
+                overhead_start = time.perf_counter()
+                for encoding in detector.last_encodings:
+                    t0 = time.perf_counter()
+                    quantized = detector.gallery.distances(encoding)
+                    t1 = time.perf_counter()
+                    exact = baseline.distances(encoding)
+                    quant['kernel_sec'] += t1 - t0
+                    quant['baseline_kernel_sec'] += time.perf_counter() - t1
+                    quant['distance_errors'].append(abs(float(quantized.min()) - float(exact.min())))
+                    name = detector.match_encoding(encoding)[0]
+                    baseline_name = detector.match_encoding(encoding, baseline)[0]
+                    quant['probes'] += 1
+                    quant['agree'] += int(name == baseline_name)
+                    if baseline_name != 'Unknown':
+                        baseline_predicted.add(baseline_name)
+                quant['overhead_sec'] += time.perf_counter() - overhead_start
+            if labels is not None and source.frame_name in labels:
+                truth = labels[source.frame_name]
+                predicted = {r['name'] for r in results if r.get('name') and r['name'] != 'Unknown'}
+                tp += len(predicted & truth)
+                fp += len(predicted - truth)
+                fn += len(truth - predicted)
+                quant['tp'] += len(baseline_predicted & truth)
+                quant['fp'] += len(baseline_predicted - truth)
+                quant['fn'] += len(truth - baseline_predicted)
+                labelled_frames += 1
+    finally:
+        source.close()
+
+    measured = max(0, frames - args.warmup)
+    # The float64 comparison is not part of the pipeline; keep it out of throughput
+    wall = (time.perf_counter() - wall_start - quant['overhead_sec']) if wall_start is not None else 0.0
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(),
+                 'cpus': os.cpu_count()},
+        'config': {
+            'frames': os.path.abspath(args.frames),
+            'faces': os.path.abspath(args.faces),
+            'labels': os.path.abspath(args.labels) if args.labels else None,
+            'target_width': args.target_width,
+            'detector': detector.detector_backend.describe(),
+            'tolerance': detector.effective_tolerance,
+            'embedding': embedding.describe(),
+            'warmup': args.warmup,
+        },
+        'gallery': {'encodings': len(encodings), 'identities': len(set(names)),
+                    'load_sec': round(gallery_load_sec, 3)},
+        'throughput': {
+            'frames': measured,
+            'wall_sec': round(wall, 3),
+            'fps': round(measured / wall, 3) if wall > 0 else None,
+            'faces_per_frame': round(faces / measured, 3) if measured else None,
+        },
+        'stages_ms': {
+            stage: {'count': s['count'], 'mean': _round_ms(s['mean']), 'p50': _round_ms(s['p50']),
+                    'p95': _round_ms(s['p95']), 'p99': _round_ms(s['p99'])}
+            for stage, s in sorted(registry.stage_summary().items())
+        },
+    }
+    if process and cpu_start is not None and wall > 0:
+        cpu_end = process.cpu_times()
+        cpu_used = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+        report['resources'] = {
+            'cpu_percent': round(100.0 * cpu_used / wall, 1),
+            'rss_peak_mb': round(rss_peak / (1024 * 1024), 1),
+        }
+    report['gallery']['storage'] = detector.gallery.describe()
+    if baseline is not None:
+        errors = sorted(quant['distance_errors'])
+        probes = quant['probes']
+        report['quantization'] = {
+            'dtype': args.gallery_dtype,
+            'bytes': detector.gallery.nbytes,
+            'float64_bytes': baseline.nbytes,
+            'probes': probes,
+            'decision_agreement': round(quant['agree'] / probes, 4) if probes else None,
+            'best_distance_abs_error': {
+                'p50': round(errors[len(errors) // 2], 5) if errors else None,
+                'p99': round(errors[min(len(errors) - 1, int(0.99 * len(errors)))], 5) if errors else None,
+                'max': round(errors[-1], 5) if errors else None,
+            },
+            'kernel_us_per_probe': round(1e6 * quant['kernel_sec'] / probes, 1) if probes else None,
+            'float64_kernel_us_per_probe': round(1e6 * quant['baseline_kernel_sec'] / probes, 1) if probes else None,
+        }
+        if labels is not None:
+            qtp, qfp, qfn = quant['tp'], quant['fp'], quant['fn']
+            report['quantization']['float64_accuracy'] = {
+                'precision': round(qtp / (qtp + qfp), 4) if (qtp + qfp) else None,
+                'recall': round(qtp / (qtp + qfn), 4) if (qtp + qfn) else None,
+            }
+    if labels is not None:
+        report['accuracy'] = {
+            'labelled_frames': labelled_frames,
+            'true_positives': tp,
+            'false_positives': fp,
+            'false_negatives': fn,
+            'precision': round(tp / (tp + fp), 4) if (tp + fp) else None,
+            'recall': round(tp / (tp + fn), 4) if (tp + fn) else None,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded frames through the recognition pipeline')
+    parser.add_argument('--frames', required=True, help='video file, image directory or single image')
+    parser.add_argument('--faces', default='faces', help='gallery directory (same layout as FACES_DIRECTORY)')
+    parser.add_argument('--labels', help='ground-truth labels (.json or .csv)')
+    parser.add_argument('--output', help='write the JSON report here (default: stdout)')
+    parser.add_argument('--target-width', type=int, default=960, help='FaceDetector.target_width')
+    parser.add_argument('--detector', default='hog', choices=['hog', 'haar', 'haar_multi', 'yunet', 'ssd'],
+                        help='face detector backend to benchmark')
+    parser.add_argument('--upsample', type=int, default=1, help='HOG upsample count')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='recognition distance tolerance (default: Config.FACE_RECOGNITION_TOLERANCE, '
+                             'or the ONNX model\'s own tolerance)')
+    parser.add_argument('--embedding', default='dlib', choices=['dlib', 'onnx'], help='embedding backend')
+    parser.add_argument('--embedding-model', help='ONNX embedding model (default face_detection/models/mobilefacenet.onnx)')
+    parser.add_argument('--embedding-threads', type=int, default=4, help='ONNX Runtime intra-op threads')
+    parser.add_argument('--gallery-dtype', default='float32', choices=['float64', 'float32', 'float16', 'int8'],
+                        help='gallery storage; non-float64 runs also report agreement with a float64 baseline')
+    parser.add_argument('--max-frames', type=int, default=0, help='stop after this many measured frames')
+    parser.add_argument('--warmup', type=int, default=3, help='frames run before measuring starts')
+    parser.add_argument('--verbose', action='store_true', help='keep the detector\'s per-face output')
+    args = parser.parse_args()
+
+    args.frames = os.path.abspath(args.frames)
+    args.faces = os.path.abspath(args.faces)
+    if args.labels:
+        args.labels = os.path.abspath(args.labels)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.embedding_model:
+        args.embedding_model = os.path.abspath(args.embedding_model)
+    if args.tolerance is None and args.embedding == 'dlib':
+        sys.path.insert(0, BASE_DIR)
+        from config import Config
+        args.tolerance = Config.FACE_RECOGNITION_TOLERANCE
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Wrote {args.output}: {report['throughput']['fps']} fps over {report['throughput']['frames']} frames")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+"""
+Camera Pipelines - one capture pipeline per camera, keyed by camera id, all served by the
+single recognition engine. Each pipeline has its own frame hub, per-camera recognition
+state and an attendance role (check-in at the entry door, check-out at the exit). The
+primary camera keeps its original capture thread and is wrapped here without a manager of
+its own; extra cameras (EXTRA_CAMERAS) own their CameraManager and capture thread.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from face_detection.network_source import redact_url
+from frame_hub import FrameHub
+
+logger = logging.getLogger(__name__)
+
+CAMERA_ROLES = ('check-in', 'check-out')
+
+
+def parse_camera_specs(spec: str) -> List[Tuple[str, str, str]]:
+    """'exit|CSI1|check-out; lobby|CSI0' -> [(camera_id, source, role), ...]
+
+    Fields are '|'-separated (sources may be URLs with ':' and '@'); role defaults to check-in."""
+    cameras = []
+    for entry in (spec or '').split(';'):
+        fields = [f.strip() for f in entry.split('|')]
+        if not fields or not fields[0]:
+            continue
+        if len(fields) < 2 or not fields[1]:
+            logger.warning(f"Ignoring camera spec without a source: {entry.strip()!r}")
+            continue
+        role = fields[2].lower() if len(fields) > 2 and fields[2] else 'check-in'
+        cameras.append((fields[0], fields[1], role))
+    return cameras
+
+
+class CameraPipeline:
+    """Frames and recognition state of one camera.
+
+    With create_manager, the pipeline owns a camera (create_manager(pipeline) -> CameraManager)
+    and runs its own capture thread; without it, frames are published into `hub` from outside
+    and is_active reports whether that outside source is running. on_stop(camera_id) runs after
+    an owned camera is stopped, to drop per-camera state kept elsewhere."""
+
+    def __init__(self, camera_id: str, source: str, role: str = 'check-in',
+                 create_manager: Optional[Callable] = None, hub: Optional[FrameHub] = None,
+                 is_active: Optional[Callable[[], bool]] = None,
+                 process_frame: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+                 on_stop: Optional[Callable[[str], None]] = None):
+        if role not in CAMERA_ROLES:
+            logger.warning(f"Camera {camera_id}: unknown role {role!r}, using check-in")
+            role = 'check-in'
+        self.camera_id = camera_id
+        self.source = source
+        self.role = role
+        self.hub = hub or FrameHub()
+        self._create_manager = create_manager
+        self._is_active = is_active
+        self._process_frame = process_frame
+        self._on_stop = on_stop
+        self.manager = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.last_error = ''
+        # Recognition state (owned by the recognition worker)
+        self.last_recognition_time = 0.0
+        self.last_face_detection_time = 0.0
+        self.last_empty_broadcast_time = 0.0
+        self.results: List[Dict] = []
+        self.stats = {'frames': 0, 'capture_failures': 0, 'recognition_cycles': 0, 'faces': 0}
+
+    @property
+    def owns_camera(self) -> bool:
+        return self._create_manager is not None
+
+    @property
+    def active(self) -> bool:
+        if self._is_active is not None:
+            return bool(self._is_active())
+        return self._running and self.manager is not None and self.manager.is_initialized
+
+    def start(self) -> bool:
+        """Open the camera and start capturing (no-op for externally fed pipelines)"""
+        if not self.owns_camera:
+            return self.active
+        with self._lock:
+            if self._running and self._thread is not None and self._thread.is_alive():
+                return True
+            try:
+                manager = self._create_manager(self)
+                if not manager.initialize():
+                    self.last_error = f'Camera {self.camera_id} ({redact_url(self.source)}) failed to open'
+                    print(f"❌ {self.last_error}")
+                    return False
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Camera {self.camera_id} initialization error: {e}")
+                return False
+            self.manager = manager
+            self.last_error = ''
+            self._running = True
+            self._thread = threading.Thread(target=self._capture_loop, name=f'capture-{self.camera_id}', daemon=True)
+            self._thread.start()
+        print(f"✅ Camera pipeline '{self.camera_id}' started ({redact_url(self.source)}, {self.role})")
+        return True
+
+    def stop(self) -> None:
+        if not self.owns_camera:
+            return
+        with self._lock:
+            self._running = False
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            thread.join(timeout=2)
+        if self.manager is not None:
+            try:
+                self.manager.close()
+            except Exception as e:
+                logger.warning(f"Camera {self.camera_id} close failed: {e}")
+            self.manager = None
+        self.results = []
+        if self._on_stop is not None:
+            self._on_stop(self.camera_id)
+
+    def _capture_loop(self) -> None:
+        failures = 0
+        logger.info(f"Capture worker started for camera {self.camera_id}")
+        while self._running:
+            frame = self.manager.read_frame() if self.manager is not None else None
+            if frame is None:
+                failures += 1
+                self.stats['capture_failures'] += 1
+                time.sleep(min(0.1 * failures, 1.0))
+                continue
+            failures = 0
+            if self._process_frame is not None:
+                frame = self._process_frame(frame)
+            self.stats['frames'] += 1
+            self.hub.publish(frame)
+        logger.info(f"Capture worker stopped for camera {self.camera_id}")
+
+    def latest_frame(self, max_age_sec: Optional[float] = 1.0) -> Optional[np.ndarray]:
+        _, frame = self.hub.latest(max_age_sec=max_age_sec)
+        return frame
+
+    def status(self) -> Dict:
+        info = {
+            'camera_id': self.camera_id,
+            'source': redact_url(self.source),
+            'role': self.role,
+            'active': self.active,
+            'owns_camera': self.owns_camera,
+            'last_error': self.last_error or None,
+            'last_recognition_age_sec': round(time.time() - self.last_recognition_time, 2)
+            if self.last_recognition_time else None,
+            'faces_in_view': len(self.results),
+            'stats': dict(self.stats),
+        }
+        if self.manager is not None:
+            try:
+                info['camera'] = self.manager.get_status()
+            except Exception as e:
+                info['camera'] = {'error': str(e)}
+        return info
+
+
+class CameraPipelines:
+    """Registry of pipelines plus the fair pick of which camera the engine serves next"""
+
+    def __init__(self):
+        self._pipelines: Dict[str, CameraPipeline] = {}
+        self._lock = threading.Lock()
+
+    def add(self, pipeline: CameraPipeline) -> CameraPipeline:
+        with self._lock:
+            self._pipelines[pipeline.camera_id] = pipeline
+        return pipeline
+
+    def get(self, camera_id: str) -> Optional[CameraPipeline]:
+        with self._lock:
+            return self._pipelines.get(camera_id)
+
+    def all(self) -> List[CameraPipeline]:
+        with self._lock:
+            return list(self._pipelines.values())
+
+    def active(self) -> List[CameraPipeline]:
+        return [p for p in self.all() if p.active]
+
+    def next_due(self, plan: Callable[[CameraPipeline], object], now: float):
+        """Earliest-deadline-first over active cameras: (pipeline, schedule, seconds until due).
+
+        plan(pipeline) returns that camera's schedule (with .interval). Each camera is due one
+        interval after its last cycle; serving the most overdue first keeps a busy camera from
+        starving the others. (None, None, 0.1) when no camera is active."""
+        best = None
+        for pipeline in self.active():
+            schedule = plan(pipeline)
+            due = pipeline.last_recognition_time + schedule.interval
+            if best is None or due < best[2]:
+                best = (pipeline, schedule, due)
+        if best is None:
+            return None, None, 0.1
+        return best[0], best[1], max(0.0, best[2] - now)
+
+    def start_owned(self) -> None:
+        for pipeline in self.all():
+            if pipeline.owns_camera and not pipeline.active:
+                pipeline.start()
+
+    def stop_owned(self) -> None:
+        for pipeline in self.all():
+            if pipeline.owns_camera:
+                pipeline.stop()
@@ -11,12 +11,34 @@ class Config:
     ERPNEXT_BASE_URL = os.getenv('ERPNEXT_BASE_URL', 'https://erp.namiex.com/api')
     ERPNEXT_USERNAME = os.getenv('ERPNEXT_USERNAME', '123456')
     ERPNEXT_PASSWORD = os.getenv('ERPNEXT_PASSWORD', '123456')
-    
+    ERPNEXT_CONNECT_TIMEOUT_SEC = float(os.getenv('ERPNEXT_CONNECT_TIMEOUT_SEC', 5.0))
+    ERPNEXT_READ_TIMEOUT_SEC = float(os.getenv('ERPNEXT_READ_TIMEOUT_SEC', 30.0))
+    # Attendance delivery (erpnext_sync.py): punches are sent in pages of ERPNEXT_SYNC_BATCH_SIZE;
+    # a punch ERPNext keeps failing on is dead-lettered after ERPNEXT_SYNC_MAX_ATTEMPTS tries.
+    # Time spent unreachable does not count as attempts.
+    ERPNEXT_SYNC_BATCH_SIZE = int(os.getenv('ERPNEXT_SYNC_BATCH_SIZE', 50))
+    ERPNEXT_SYNC_MAX_ATTEMPTS = int(os.getenv('ERPNEXT_SYNC_MAX_ATTEMPTS', 8))
+    ERPNEXT_SYNC_BACKOFF_MAX_SEC = float(os.getenv('ERPNEXT_SYNC_BACKOFF_MAX_SEC', 1800.0))
+    ERPNEXT_DEVICE_ID = os.getenv('ERPNEXT_DEVICE_ID', '')  # Employee Checkin device_id; default: hostname
+    # Employee pull: changes since the last pull, fetched as concurrent pages; interval 0 = on request only
+    ERPNEXT_EMPLOYEE_PAGE_SIZE = int(os.getenv('ERPNEXT_EMPLOYEE_PAGE_SIZE', 500))
+    ERPNEXT_EMPLOYEE_FETCH_WORKERS = int(os.getenv('ERPNEXT_EMPLOYEE_FETCH_WORKERS', 4))
+    ERPNEXT_EMPLOYEE_SYNC_INTERVAL_SEC = float(os.getenv('ERPNEXT_EMPLOYEE_SYNC_INTERVAL_SEC', 3600.0))
+
     # API Server Configuration
     API_HOST = os.getenv('API_HOST', '0.0.0.0')
     API_PORT = int(os.getenv('API_PORT', 5002))
     API_DEBUG = os.getenv('API_DEBUG', 'False').lower() == 'true'
-    
+
+    # Production serving (serve.py): api_server.py runs once as the camera owner on a
+    # loopback port; gevent front-end workers on API_PORT proxy to it.
+    API_INTERNAL_PORT = int(os.getenv('API_INTERNAL_PORT', 5003))
+    SERVE_WORKERS = int(os.getenv('SERVE_WORKERS', 1))
+    # How the owner runs: 'flask' (threaded dev server) or 'asgi' (uvicorn + asgi.py async streams)
+    OWNER_SERVER = os.getenv('OWNER_SERVER', 'flask')
+    # asgi owner: threads serving Flask routes; each open stream or long request holds one
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 64))
+
     # Face Recognition Configuration
     FACES_DIRECTORY = os.getenv('FACES_DIRECTORY', 'faces')
     ATTENDANCE_COOLDOWN = int(os.getenv('ATTENDANCE_COOLDOWN', 30))  # seconds
@@ -26,6 +48,75 @@ class Config:
     ATTENDANCE_MIN_CONFIDENCE = float(os.getenv('ATTENDANCE_MIN_CONFIDENCE', 0.75))
     # Raw confidence value that maps to 100% display (model typically tops out ~0.6; scale 0-100%).
     CONFIDENCE_100_PCT_RAW = float(os.getenv('CONFIDENCE_100_PCT_RAW', 0.6))
+    # Face detector: 'auto' follows the modelOptimization AI setting, or force hog/haar/yunet/ssd.
+    # DNN models (yunet/ssd) are read from face_detection/models/ and fall back to hog if absent.
+    FACE_DETECTOR_BACKEND = os.getenv('FACE_DETECTOR_BACKEND', 'auto')
+    # Required distance gap to the next-best different person (dlib embeddings).
+    FACE_RECOGNITION_MARGIN = float(os.getenv('FACE_RECOGNITION_MARGIN', 0.06))
+    # /api/recognize and the legacy frame path match the first gallery entry within tolerance;
+    # True applies the live pipeline's tolerance + margin rule to them as well.
+    RECOGNIZE_STRICT_MATCH = os.getenv('RECOGNIZE_STRICT_MATCH', 'False').lower() == 'true'
+    # Face embeddings: 'dlib' (ResNet-34, default) or 'onnx' (ONNX Runtime CPU model such as
+    # MobileFaceNet). Galleries are cached per model and never mixed; switching rebuilds them.
+    # ONNX embeddings are L2-normalized (distance 0-2) so they have their own tolerance/margin.
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'dlib').lower()
+    EMBEDDING_ONNX_MODEL = os.getenv('EMBEDDING_ONNX_MODEL', '')  # default face_detection/models/mobilefacenet.onnx
+    EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', 4))
+    EMBEDDING_ONNX_TOLERANCE = float(os.getenv('EMBEDDING_ONNX_TOLERANCE', 1.0))
+    EMBEDDING_ONNX_MARGIN = float(os.getenv('EMBEDDING_ONNX_MARGIN', 0.08))
+    # Gallery storage for matching: float64, float32 (default), float16 (1/2 the memory) or
+    # int8 (1/4, per-dimension scales). Quantized galleries are calibrated to float64 distances.
+    GALLERY_DTYPE = os.getenv('GALLERY_DTYPE', 'float32').lower()
+    # Shared gallery: published as versioned .npy generations that every recognition process
+    # memory-maps read-only (one copy in the page cache), switched atomically on registration.
+    GALLERY_SHARED = os.getenv('GALLERY_SHARED', 'true').lower() == 'true'
+    GALLERY_SHARED_DIR = os.getenv('GALLERY_SHARED_DIR', os.path.join(FACES_DIRECTORY, '.gallery', 'shared'))
+    
+    # Age/emotion: a persistent DeepFace process (deepface_worker.py --serve) analyzes face crops
+    # in batches; each face track is re-analyzed at most every ATTRIBUTE_REFRESH_SEC seconds.
+    DEEPFACE_PYTHON = os.getenv('DEEPFACE_PYTHON', '')  # default .venv-deepface/bin/python, else this interpreter
+    ATTRIBUTE_BATCH_SIZE = int(os.getenv('ATTRIBUTE_BATCH_SIZE', 4))
+    ATTRIBUTE_REFRESH_SEC = float(os.getenv('ATTRIBUTE_REFRESH_SEC', 5.0))
+    # Anti-spoofing runs on a small thread pool; attendance waits at most SPOOF_DEADLINE_SEC
+    # for a face's verdict and retries it next cycle otherwise. Verdicts older than
+    # SPOOF_RESULT_MAX_AGE_SEC are not shown.
+    ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', 2))
+    SPOOF_DEADLINE_SEC = float(os.getenv('SPOOF_DEADLINE_SEC', 0.25))
+    SPOOF_RESULT_MAX_AGE_SEC = float(os.getenv('SPOOF_RESULT_MAX_AGE_SEC', 2.0))
+    # Liveness: rolling 0-1 score per face track from blinks, micro-motion, screen moire and
+    # texture. Attendance needs score >= LIVENESS_THRESHOLD after at least LIVENESS_MIN_FRAMES.
+    LIVENESS_THRESHOLD = float(os.getenv('LIVENESS_THRESHOLD', 0.6))
+    LIVENESS_MIN_FRAMES = int(os.getenv('LIVENESS_MIN_FRAMES', 3))
+    # Identity voting: a punch is committed once one person wins IDENTITY_VOTES_REQUIRED of the
+    # track's last IDENTITY_VOTE_WINDOW frames with a consistent margin, or after
+    # IDENTITY_EARLY_FRAMES agreeing frames that are far inside tolerance and margin.
+    IDENTITY_VOTE_WINDOW = int(os.getenv('IDENTITY_VOTE_WINDOW', 5))
+    IDENTITY_VOTES_REQUIRED = int(os.getenv('IDENTITY_VOTES_REQUIRED', 3))
+    IDENTITY_EARLY_FRAMES = int(os.getenv('IDENTITY_EARLY_FRAMES', 2))
+    # Edge/hub recognition: 'off' (standalone), 'edge' (capture, detect and track here, match
+    # against the hub at HUB_URL and fall back to the local gallery while it is unreachable) or
+    # 'hub' (serve /api/hub/match from this device's master gallery). HUB_PAYLOAD 'embedding'
+    # sends 128/512-float vectors (same EMBEDDING_BACKEND on both sides); 'crop' sends JPEG
+    # face crops and lets the hub run the embedding model. HUB_TOKEN is required on a hub and
+    # must match on both sides.
+    HUB_MODE = os.getenv('HUB_MODE', 'off').lower()
+    HUB_URL = os.getenv('HUB_URL', '')
+    HUB_PAYLOAD = os.getenv('HUB_PAYLOAD', 'embedding').lower()
+    HUB_TOKEN = os.getenv('HUB_TOKEN', '')
+    HUB_TIMEOUT_SEC = float(os.getenv('HUB_TIMEOUT_SEC', 0.5))
+    HUB_DEVICE_ID = os.getenv('HUB_DEVICE_ID', '')  # default: hostname
+    # Hub side: edge requests arriving within HUB_BATCH_WAIT_SEC share one matching pass
+    HUB_MAX_BATCH = int(os.getenv('HUB_MAX_BATCH', 64))
+    HUB_BATCH_WAIT_SEC = float(os.getenv('HUB_BATCH_WAIT_SEC', 0.005))
+    # Gallery replication: registrations, employee rows and profile photos spread between
+    # devices. Peer-to-peer: list the other devices in REPLICATION_PEERS (comma-separated base
+    # URLs); via a hub: edges list only the hub, the hub lists none. Device ids must be unique
+    # (default hostname:API_PORT) and REPLICATION_TOKEN (required) must match on all devices.
+    REPLICATION_ENABLED = os.getenv('REPLICATION_ENABLED', 'False').lower() == 'true'
+    REPLICATION_PEERS = [p.strip() for p in os.getenv('REPLICATION_PEERS', '').split(',') if p.strip()]
+    REPLICATION_TOKEN = os.getenv('REPLICATION_TOKEN', '')
+    REPLICATION_DEVICE_ID = os.getenv('REPLICATION_DEVICE_ID', '')
+    REPLICATION_INTERVAL_SEC = float(os.getenv('REPLICATION_INTERVAL_SEC', 30.0))
     
     # Camera Configuration - 16:9 Aspect Ratio for Industrial RPi5 with Shield
     CAMERA_WIDTH = int(os.getenv('CAMERA_WIDTH', 960))  # 16:9 resolution
@@ -33,9 +124,22 @@ class Config:
     CAMERA_FPS = int(os.getenv('CAMERA_FPS', 15))  # Slightly higher FPS for smoother stream
     
     # Camera Port Configuration
-    CAMERA_PORT = os.getenv('CAMERA_PORT', 'CSI0')  # CSI0 for primary port
+    CAMERA_PORT = os.getenv('CAMERA_PORT', 'CSI0')  # CSI0 for primary port, or an rtsp:// / http:// MJPEG URL
     CAMERA_SENSOR_ID = int(os.getenv('CAMERA_SENSOR_ID', 0))  # Sensor 0 for CSI0
     
+    # Camera pipelines: the camera above is PRIMARY_CAMERA_ID with attendance role CAMERA_ROLE
+    # (check-in or check-out). EXTRA_CAMERAS adds more, all sharing one recognition engine:
+    # 'id|source|role' entries separated by ';', e.g. 'exit|CSI1|check-out'.
+    PRIMARY_CAMERA_ID = os.getenv('PRIMARY_CAMERA_ID', 'main')
+    CAMERA_ROLE = os.getenv('CAMERA_ROLE', 'check-in')
+    EXTRA_CAMERAS = os.getenv('EXTRA_CAMERAS', '')
+    
+    # Network cameras (rtsp://, http(s):// MJPEG): connect/read timeout, longest reconnect
+    # backoff, and RTSP transport for FFmpeg ('tcp' or 'udp')
+    NETWORK_CAMERA_TIMEOUT_SEC = float(os.getenv('NETWORK_CAMERA_TIMEOUT_SEC', 5.0))
+    NETWORK_CAMERA_RECONNECT_MAX_SEC = float(os.getenv('NETWORK_CAMERA_RECONNECT_MAX_SEC', 30.0))
+    NETWORK_CAMERA_RTSP_TRANSPORT = os.getenv('NETWORK_CAMERA_RTSP_TRANSPORT', 'tcp')
+    
     # Camera Transform Settings
     CAMERA_HORIZONTAL_FLIP = os.getenv('CAMERA_HORIZONTAL_FLIP', 'True').lower() == 'true'  # Enable horizontal flip
     CAMERA_VERTICAL_FLIP = os.getenv('CAMERA_VERTICAL_FLIP', 'False').lower() == 'true'  # Disable vertical flip
@@ -52,7 +156,14 @@ class Config:
     CAMERA_EXPOSURE_MODE = os.getenv('CAMERA_EXPOSURE_MODE', 'auto')  # auto, night, nightpreview, backlight, spotlight, sports, snow, beach, verylong, fixedfps, antishake, fireworks
     
     # Platform Configuration
-    PLATFORM = os.getenv('PLATFORM', 'auto')  # auto, raspberry_pi, macos, windows, linux
+    PLATFORM = os.getenv('PLATFORM', 'auto')  # auto, raspberry_pi, macos, windows, linux, replay
+    
+    # Replay camera (PLATFORM=replay): video file, image directory, image or .fdump frame dump
+    CAMERA_REPLAY_SOURCE = os.getenv('CAMERA_REPLAY_SOURCE', '')
+    CAMERA_REPLAY_FPS = float(os.getenv('CAMERA_REPLAY_FPS', 0))  # 0 = recorded timing, <0 = unpaced
+    CAMERA_REPLAY_LOOP = os.getenv('CAMERA_REPLAY_LOOP', 'True').lower() == 'true'
+    # Append captured frames to this .fdump so field issues can be replayed later
+    CAMERA_RECORD_PATH = os.getenv('CAMERA_RECORD_PATH', '')
     
     # Logging Configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
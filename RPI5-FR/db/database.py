@@ -13,7 +13,7 @@ logger = logging.getLogger(__name__)
 
 # Database file path
 DB_DIR = os.path.join(os.path.dirname(__file__))
-DB_FILE = os.path.join(DB_DIR, 'facial_recognition.db')
+DB_FILE = os.getenv('DATABASE_FILE', os.path.join(DB_DIR, 'facial_recognition.db'))
 
 
 class Database:
@@ -92,7 +92,34 @@ class Database:
                 )
             ''')
             
+            # Gallery replication: newest version of each person (Lamport counter + origin device)
+            # and the local change sequence peers read the feed by
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS gallery_versions (
+                    person_id TEXT PRIMARY KEY,
+                    counter INTEGER NOT NULL,
+                    origin TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    source TEXT,
+                    deleted INTEGER DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+
+            # Replication clock and per-peer cursors
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS replication_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            
             # Create indexes for better performance
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_gallery_versions_seq
+                ON gallery_versions(seq)
+            ''')
+
             cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_attendance_employee_id 
                 ON attendance_logs(employee_id)
@@ -131,6 +158,18 @@ class Database:
         self._ensure_column('attendance_logs', 'modified_at', 'TEXT')
         self._ensure_column('attendance_logs', 'original_timestamp', 'TEXT')
         self._ensure_column('attendance_logs', 'snapshot_path', 'TEXT')
+        self._ensure_column('attendance_logs', 'camera_id', 'TEXT')
+        # ERPNext delivery (synced: 0 pending, 1 sent, 2 not a check-in, -1 dead letter)
+        self._ensure_column('attendance_logs', 'sync_attempts', 'INTEGER DEFAULT 0')
+        self._ensure_column('attendance_logs', 'sync_next_at', 'REAL')
+        self._ensure_column('attendance_logs', 'sync_error', 'TEXT')
+        self._ensure_column('attendance_logs', 'sync_key', 'TEXT')
+        self._ensure_column('attendance_logs', 'sync_remote_id', 'TEXT')
+        try:
+            with self.get_connection() as conn:
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_attendance_sync ON attendance_logs(synced, id)')
+        except Exception as e:
+            logger.error(f"Error creating sync index: {e}")
         self._ensure_column('event_logs', 'event_type', 'TEXT')
         self._ensure_column('event_logs', 'message', 'TEXT')
         self._ensure_column('event_logs', 'image_path', 'TEXT')
@@ -252,6 +291,79 @@ class Database:
             logger.error(f"Error deleting employee: {e}")
             return False
     
+    def upsert_employee(self, employee_data: Dict) -> bool:
+        """Create an employee or overwrite all of its fields (keeps created_at)"""
+        try:
+            now = datetime.now().isoformat()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO employees
+                    (id, name, department, photo, join_date, active, face_registered, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name, department = excluded.department, photo = excluded.photo,
+                        join_date = excluded.join_date, active = excluded.active,
+                        face_registered = excluded.face_registered, updated_at = excluded.updated_at
+                ''', (
+                    employee_data['id'],
+                    employee_data.get('name') or employee_data['id'],
+                    employee_data.get('department') or '',
+                    employee_data.get('photo') or '',
+                    employee_data.get('join_date') or '',
+                    int(employee_data.get('active', True)),
+                    int(employee_data.get('face_registered', False)),
+                    now,
+                    now
+                ))
+                return True
+        except Exception as e:
+            logger.error(f"Error upserting employee: {e}")
+            return False
+
+    def merge_erpnext_employees(self, employees: List[Dict], state: Optional[tuple] = None) -> Dict:
+        """Insert new and update changed employees from ERPNext in one transaction, keeping the
+        local photo and face registration. state=(key, value) is stored in replication_state in
+        the same transaction. Returns created/updated/unchanged counts."""
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        now = datetime.now().isoformat()
+        fields = ('name', 'department', 'join_date', 'active')
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            existing = {}
+            ids = [employee['id'] for employee in employees]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cursor.execute(f'''
+                    SELECT id, name, department, join_date, active FROM employees
+                    WHERE id IN ({','.join(['?'] * len(chunk))})
+                ''', chunk)
+                existing.update({row['id']: tuple(row[f] for f in fields) for row in cursor.fetchall()})
+            created, updated = [], []
+            for employee in employees:
+                values = (employee['name'], employee['department'], employee['join_date'], int(employee['active']))
+                if employee['id'] not in existing:
+                    created.append((employee['id'],) + values + (now, now))
+                elif existing[employee['id']] != values:
+                    updated.append(values + (now, employee['id']))
+                else:
+                    counts['unchanged'] += 1
+            cursor.executemany('''
+                INSERT INTO employees
+                (id, name, department, photo, join_date, active, face_registered, created_at, updated_at)
+                VALUES (?, ?, ?, '', ?, ?, 0, ?, ?)
+                ON CONFLICT(id) DO NOTHING
+            ''', created)
+            cursor.executemany('''
+                UPDATE employees SET name = ?, department = ?, join_date = ?, active = ?, updated_at = ?
+                WHERE id = ?
+            ''', updated)
+            if state is not None:
+                cursor.execute('INSERT OR REPLACE INTO replication_state (key, value) VALUES (?, ?)',
+                               (state[0], str(state[1])))
+            counts['created'], counts['updated'] = len(created), len(updated)
+        return counts
+    
     def set_face_registered(self, employee_id: str, registered: bool = True) -> bool:
         """Mark employee as having face registered"""
         try:
@@ -273,7 +385,8 @@ class Database:
                       event_type: str = 'check-in',
                       synced: bool = False,
                       manual: bool = False,
-                      snapshot_path: str = None) -> Optional[int]:
+                      snapshot_path: str = None,
+                      camera_id: str = None) -> Optional[int]:
         """Log attendance for an employee"""
         try:
             now = datetime.now().isoformat()
@@ -282,9 +395,9 @@ class Database:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO attendance_logs 
-                    (employee_id, employee_name, timestamp, confidence, status, event_type, synced, manual, snapshot_path, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (employee_id, employee_name, timestamp, confidence, status, event_type, int(synced), int(manual), snapshot_path or '', now))
+                    (employee_id, employee_name, timestamp, confidence, status, event_type, synced, manual, snapshot_path, camera_id, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (employee_id, employee_name, timestamp, confidence, status, event_type, int(synced), int(manual), snapshot_path or '', camera_id, now))
                 logger.info(f"Attendance logged: {employee_name} ({employee_id}) at {timestamp}")
                 return cursor.lastrowid
         except Exception as e:
@@ -338,6 +451,96 @@ class Database:
             logger.error(f"Error marking attendance logs synced: {e}")
             return 0
     
+    def get_unsynced_attendance(self, after_id: int = 0, limit: int = 50,
+                                now: Optional[float] = None) -> List[Dict]:
+        """Pending logs due for delivery with id > after_id, oldest first (keyset page)"""
+        now = datetime.now().timestamp() if now is None else now
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM attendance_logs
+                    WHERE synced = 0 AND id > ? AND (sync_next_at IS NULL OR sync_next_at <= ?)
+                    ORDER BY id LIMIT ?
+                ''', (int(after_id), now, int(limit)))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error getting unsynced attendance: {e}")
+            return []
+
+    def set_attendance_sync_keys(self, keys: Dict[int, str]) -> None:
+        """Assign idempotency keys to logs that do not have one yet (a key never changes)"""
+        with self.get_connection() as conn:
+            conn.executemany('UPDATE attendance_logs SET sync_key = ? WHERE id = ? AND sync_key IS NULL',
+                             [(key, log_id) for log_id, key in keys.items()])
+
+    def mark_attendance_delivered(self, remote_ids: Dict[int, Optional[str]]) -> int:
+        """Mark logs as sent, recording the ERPNext document each one became"""
+        if not remote_ids:
+            return 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE attendance_logs
+                SET synced = 1, sync_error = NULL, sync_next_at = NULL, sync_remote_id = ?
+                WHERE id = ?
+            ''', [(remote_id, log_id) for log_id, remote_id in remote_ids.items()])
+            return cursor.rowcount
+
+    def set_attendance_sync_state(self, log_ids: List[int], state: int, error: Optional[str] = None) -> int:
+        """Skip (2) or dead-letter (-1) logs, or requeue them (0, attempts reset)"""
+        if not log_ids:
+            return 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['?'] * len(log_ids))
+            reset = ', sync_attempts = 0, sync_next_at = NULL' if state == 0 else ''
+            cursor.execute(f'''
+                UPDATE attendance_logs SET synced = ?, sync_error = ?{reset}
+                WHERE id IN ({placeholders})
+            ''', [state, error] + list(log_ids))
+            return cursor.rowcount
+
+    def schedule_attendance_retry(self, log_ids: List[int], error: str, next_at: float,
+                                  max_attempts: int) -> int:
+        """Count a failed attempt; logs that used up max_attempts become dead letters.
+        Returns how many were dead-lettered."""
+        if not log_ids:
+            return 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join(['?'] * len(log_ids))
+            cursor.execute(f'''
+                UPDATE attendance_logs
+                SET sync_attempts = COALESCE(sync_attempts, 0) + 1, sync_error = ?, sync_next_at = ?
+                WHERE id IN ({placeholders})
+            ''', [error, next_at] + list(log_ids))
+            cursor.execute(f'''
+                UPDATE attendance_logs SET synced = -1
+                WHERE id IN ({placeholders}) AND sync_attempts >= ?
+            ''', list(log_ids) + [int(max_attempts)])
+            return cursor.rowcount
+
+    def get_attendance_sync_counts(self) -> Dict:
+        """Logs per delivery state plus the next scheduled retry"""
+        names = {0: 'pending', 1: 'synced', 2: 'skipped', -1: 'dead'}
+        counts = {name: 0 for name in names.values()}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT synced, COUNT(*) AS n FROM attendance_logs GROUP BY synced')
+            for row in cursor.fetchall():
+                counts[names.get(row['synced'], str(row['synced']))] = row['n']
+            cursor.execute('SELECT MIN(sync_next_at) AS next_at FROM attendance_logs WHERE synced = 0')
+            row = cursor.fetchone()
+            counts['next_retry_at'] = row['next_at'] if row else None
+        return counts
+
+    def get_dead_attendance(self, limit: int = 100) -> List[Dict]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM attendance_logs WHERE synced = -1 ORDER BY id LIMIT ?', (int(limit),))
+            return [dict(row) for row in cursor.fetchall()]
+    
     def get_attendance_logs(self, limit: int = 100, 
                            employee_id: Optional[str] = None,
                            start_date: Optional[str] = None,
@@ -395,6 +598,68 @@ class Database:
             logger.error(f"Error deleting attendance log {log_id}: {e}")
             return False
 
+    # Gallery replication
+    def stamp_gallery_version(self, person_id: str, counter: Optional[int] = None, origin: Optional[str] = None,
+                              source: Optional[str] = None, deleted: bool = False) -> Dict:
+        """Record a person's new version and give it the next change sequence number.
+
+        counter=None stamps a local change: the Lamport clock ticks and origin is the caller's
+        device. A remote version keeps its counter and only moves the clock forward."""
+        now = datetime.now().isoformat()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute("SELECT value FROM replication_state WHERE key = 'clock'")
+            row = cursor.fetchone()
+            clock = int(row['value']) if row else 0
+            if counter is None:
+                clock += 1
+                counter = clock
+            else:
+                clock = max(clock, int(counter))
+            cursor.execute("INSERT OR REPLACE INTO replication_state (key, value) VALUES ('clock', ?)", (str(clock),))
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) + 1 AS seq FROM gallery_versions')
+            seq = cursor.fetchone()['seq']
+            cursor.execute('''
+                INSERT OR REPLACE INTO gallery_versions
+                (person_id, counter, origin, seq, source, deleted, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (person_id, int(counter), origin, seq, source, int(deleted), now))
+            return {'person_id': person_id, 'counter': int(counter), 'origin': origin, 'seq': seq,
+                    'source': source, 'deleted': int(deleted), 'updated_at': now}
+
+    def get_gallery_version(self, person_id: str) -> Optional[Dict]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM gallery_versions WHERE person_id = ?', (person_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def get_gallery_changes(self, since_seq: int = 0, limit: int = 50) -> List[Dict]:
+        """Versions changed after since_seq, in sequence order"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM gallery_versions WHERE seq > ? ORDER BY seq LIMIT ?',
+                           (int(since_seq), int(limit)))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_gallery_seq(self) -> int:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) AS seq FROM gallery_versions')
+            return int(cursor.fetchone()['seq'])
+
+    def get_replication_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT value FROM replication_state WHERE key = ?', (key,))
+            row = cursor.fetchone()
+            return row['value'] if row else default
+
+    def set_replication_state(self, key: str, value) -> None:
+        with self.get_connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO replication_state (key, value) VALUES (?, ?)', (key, str(value)))
+
     def log_event(self, event_type: str, message: str = '',
                   image_path: Optional[str] = None,
                   metadata: Optional[str] = None,
@@ -1,13 +1,129 @@
 import argparse
 import json
+import os
+import struct
+import sys
+import time
+
+# Length-prefixed messages used by --serve (see attribute_worker.py for the client):
+#   >II header_length payload_length, UTF-8 JSON header, raw payload bytes.
+# Request header:  {"id": n, "actions": ["age", "emotion"], "shapes": [[h, w, 3], ...]}
+#   payload: the BGR uint8 crops, concatenated in order.
+# Response header: {"id": n, "results": [{"age": 31, "emotion": "happy"} | {"error": "..."}, ...],
+#   "seconds": analysis time}; empty payload.
+# The worker sends {"ready": true} (or {"error": ...}) once the models are loaded.
+MESSAGE_HEADER = struct.Struct('>II')
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def write_message(stream, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    stream.write(MESSAGE_HEADER.pack(len(data), len(payload)) + data + payload)
+    stream.flush()
+
+
+def _read_exact(stream, size):
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_message(stream):
+    """Return (header dict, payload bytes), or (None, None) at end of stream"""
+    prefix = _read_exact(stream, MESSAGE_HEADER.size)
+    if prefix is None:
+        return None, None
+    header_length, payload_length = MESSAGE_HEADER.unpack(prefix)
+    if header_length + payload_length > MAX_MESSAGE_BYTES:
+        raise ValueError(f'message too large ({header_length + payload_length} bytes)')
+    header = _read_exact(stream, header_length)
+    payload = _read_exact(stream, payload_length) if payload_length else b''
+    if header is None or payload is None:
+        return None, None
+    return json.loads(header.decode('utf-8')), payload
+
+
+def _summarize(analysis, actions):
+    if isinstance(analysis, list):
+        analysis = analysis[0] if analysis else {}
+    result = {}
+    if 'age' in actions and 'age' in analysis:
+        result['age'] = int(analysis['age'])
+    if 'emotion' in actions:
+        result['emotion'] = analysis.get('dominant_emotion')
+    return result
+
+
+def _analyze(DeepFace, img, actions):
+    # Crops are already faces: skip DeepFace's own detector.
+    options = {'enforce_detection': False, 'detector_backend': 'skip', 'silent': True}
+    try:
+        return DeepFace.analyze(img_path=img, actions=actions, **options)
+    except TypeError:
+        # Older DeepFace releases have no 'silent' argument
+        options.pop('silent')
+        return DeepFace.analyze(img_path=img, actions=actions, **options)
+
+
+def serve():
+    """Long-lived mode: load the models once, then answer batched requests on stdin/stdout"""
+    # Anything DeepFace/TensorFlow prints must not corrupt the protocol stream.
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    protocol_in = sys.stdin.buffer
+
+    try:
+        import numpy as np
+        from deepface import DeepFace  # type: ignore
+        # Warm up both models so the first real request does not pay for loading them
+        _analyze(DeepFace, np.zeros((64, 64, 3), dtype=np.uint8), ['age', 'emotion'])
+    except Exception as e:
+        write_message(protocol_out, {'error': f'DeepFace import error: {e}'})
+        return 1
+    write_message(protocol_out, {'ready': True, 'pid': os.getpid()})
+
+    while True:
+        header, payload = read_message(protocol_in)
+        if header is None:
+            return 0
+        started = time.perf_counter()
+        actions = [a for a in header.get('actions', []) if a in ('age', 'emotion')]
+        results = []
+        offset = 0
+        for shape in header.get('shapes', []):
+            size = int(np.prod(shape))
+            try:
+                img = np.frombuffer(payload, dtype=np.uint8, count=size, offset=offset).reshape(shape)
+                results.append(_summarize(_analyze(DeepFace, img, actions), actions) if actions else {})
+            except Exception as e:
+                results.append({'error': str(e)})
+            offset += size
+        write_message(protocol_out, {
+            'id': header.get('id'),
+            'results': results,
+            'seconds': round(time.perf_counter() - started, 4),
+        })
+
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--image', required=True)
+    parser.add_argument('--image')
     parser.add_argument('--age', action='store_true')
     parser.add_argument('--emotion', action='store_true')
+    parser.add_argument('--serve', action='store_true',
+                        help='Stay running and answer length-prefixed requests on stdin/stdout')
     args = parser.parse_args()
 
+    if args.serve:
+        return serve()
+    if not args.image:
+        parser.error('--image is required unless --serve is given')
+
     try:
         from deepface import DeepFace  # type: ignore
     except Exception as e:
@@ -0,0 +1,75 @@
+"""
+Enrichment - per-face checks (anti-spoofing and similar) run on a small thread pool off the
+recognition critical path. Each job is keyed by (track, kind): at most one is in flight per
+track and kind, and its result is attached to the track when it completes. Callers that
+must act on a result (attendance vs. spoof) wait on it with a bounded deadline.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional, Tuple
+
+from face_tracks import FaceTrack, FaceTracker
+
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentPool:
+    """Thread-safe; jobs are plain callables returning a result dict or None"""
+
+    def __init__(self, tracker: FaceTracker, workers: int = 2):
+        self.tracker = tracker
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='enrichment')
+        self._futures: Dict[Tuple[int, str], Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'deadline_missed': 0}
+
+    def submit(self, track: FaceTrack, kind: str, fn: Callable, *args) -> Optional[Future]:
+        """Run fn(*args) for a track unless that kind is already in flight; returns the job's future"""
+        key = (track.track_id, kind)
+        if not self.tracker.mark_pending(track.track_id, kind):
+            with self._lock:
+                return self._futures.get(key)
+        future = self._executor.submit(fn, *args)
+        with self._lock:
+            self._futures[key] = future
+        self.stats['submitted'] += 1
+        future.add_done_callback(lambda f: self._complete(key, f))
+        return future
+
+    def _complete(self, key: Tuple[int, str], future: Future) -> None:
+        track_id, kind = key
+        try:
+            result = future.result()
+            self.stats['completed'] += 1
+        except Exception as e:
+            logger.warning(f"Enrichment '{kind}' failed for track {track_id}: {e}")
+            self.stats['failed'] += 1
+            result = None
+        self.tracker.set_result(track_id, kind, result)
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def wait(self, track: FaceTrack, kind: str, timeout: float, max_age: Optional[float] = None) -> Optional[Dict]:
+        """Result for (track, kind), waiting at most timeout seconds for a job in flight
+        (or the track's last result if none is, when younger than max_age).
+
+        None when nothing arrived in time (the job keeps running and lands on the track later)."""
+        with self._lock:
+            future = self._futures.get((track.track_id, kind))
+        if future is not None:
+            try:
+                # Read the future itself: its done-callback may not have reached the track yet
+                return future.result(timeout=max(0.0, timeout))
+            except FutureTimeout:
+                self.stats['deadline_missed'] += 1
+                return None
+            except Exception:
+                return None
+        return track.result(kind, max_age=max_age)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._futures)
+        return dict(self.stats, in_flight=in_flight)
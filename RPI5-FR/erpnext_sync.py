@@ -0,0 +1,628 @@
+"""
+ERPNext Sync - durable delivery of attendance punches to ERPNext as Employee Checkin
+documents. The attendance_logs table is the queue: `synced` is 0 until a punch is delivered
+(1), found not to be a check-in/out (2) or given up on (-1, dead letter, kept with its error
+for review and requeueing). A background worker reads pending rows in id order with keyset
+pages and sends each page in one frappe.client.insert_many call over a pooled keep-alive
+session, so punches taken while offline are delivered in order once ERPNext is reachable.
+
+Failures are handled by kind:
+  - ERPNext unreachable (connection error, timeout): nothing is counted against the rows, the
+    worker backs off exponentially (with jitter) and the queue simply waits.
+  - ERPNext reachable but failing (429/5xx): the page's rows count an attempt and are retried
+    with backoff; after max_attempts they become dead letters.
+  - Page rejected (4xx): rows are sent one by one to find the bad ones; a row ERPNext refuses
+    is dead-lettered at once, the rest go through.
+Every row has a fixed idempotency key (<device>-<log id>) sent as Idempotency-Key. ERPNext
+itself refuses a second checkin for the same employee and time; that refusal is treated as
+"already delivered", so a page resent after a lost response is not duplicated.
+
+The other direction, ERPNextEmployeeSync, pulls the Employee list incrementally: only rows
+with modified later than the last pull's high-water mark, fetched as overlapping concurrent
+keyset pages on (modified, name), and merged into the employees table in one transaction
+together with the new mark.
+
+Run a mock ERPNext to test against:  python erpnext_sync.py mock --port 8000 [--fail-rate 0.3]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+from auth import create_session
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_EVENTS = {'check-in': 'IN', 'check-out': 'OUT'}
+# Fragments of ERPNext's "already has a log with the same timestamp" validation error
+DUPLICATE_MARKERS = ('same timestamp', 'already has a log', 'DuplicateEntryError')
+TRANSIENT_STATUS = (408, 429, 500, 502, 503, 504)
+# Face registrations are logged in attendance_logs too, but Employee Checkin has no log type
+# for them: whatever sendLogs.registration says they are skipped, with the reason recorded.
+REGISTRATION_SKIP_REASONS = {
+    False: 'registration log: sendLogs.registration is off',
+    True: 'registration log: ERPNext Employee Checkin has no registration log type',
+}
+EMPLOYEE_FIELDS = ['name', 'employee_name', 'department', 'status', 'date_of_joining', 'modified']
+
+
+class _Unreachable(Exception):
+    """ERPNext could not be reached at all"""
+
+
+class _Transient(Exception):
+    """ERPNext answered but the request may succeed later"""
+
+
+def _is_registration(row: Dict) -> bool:
+    return row.get('event_type') == 'register' or row.get('status') == 'Registered'
+
+
+def erpnext_error(response) -> str:
+    """Readable error from a Frappe error response"""
+    try:
+        data = response.json()
+    except ValueError:
+        return f"HTTP {response.status_code}: {response.text[:200]}"
+    message = data.get('exception') or data.get('exc_type') or ''
+    if data.get('_server_messages'):
+        try:
+            messages = [json.loads(m).get('message', m) for m in json.loads(data['_server_messages'])]
+            message = '; '.join(str(m) for m in messages) or message
+        except (ValueError, AttributeError):
+            pass
+    return f"HTTP {response.status_code}: {message or data}"
+
+
+def erpnext_base_url(server_url: str) -> str:
+    """Site root from a configured URL ('https://erp.example.com' or '.../api')"""
+    url = (server_url or '').strip().rstrip('/')
+    return url[:-len('/api')] if url.endswith('/api') else url
+
+
+def _authorize(session, base: str, settings: Dict, login: Optional[tuple]) -> Optional[tuple]:
+    """Token auth when an API key is set, else a session login (skipped while still logged in
+    with the same credentials). Returns the login now held by the session."""
+    api_key, api_secret = settings.get('apiKey'), settings.get('apiSecret')
+    if api_key and api_secret:
+        session.headers['Authorization'] = f"token {api_key}:{api_secret}"
+        return None
+    session.headers.pop('Authorization', None)
+    wanted = (base, settings.get('username'), settings.get('password'))
+    if not wanted[1] or login == wanted:
+        return login
+    try:
+        response = session.post(f"{base}/api/method/login", json={'usr': wanted[1], 'pwd': wanted[2]})
+    except requests.RequestException as e:
+        raise _Unreachable(str(e))
+    if response.status_code != 200:
+        raise _Transient(f"login failed: {erpnext_error(response)}")
+    return wanted
+
+
+class ERPNextSyncWorker:
+    """get_settings() returns the ERPNext settings dict (serverUrl, apiKey/apiSecret or
+    username/password, syncInterval in minutes, sendLogs)"""
+
+    def __init__(self, database, get_settings: Callable[[], Dict], device_id: str, batch_size: int = 50,
+                 max_attempts: int = 8, backoff_base: float = 10.0, backoff_max: float = 1800.0,
+                 timeout=(5.0, 30.0), log_path: Optional[str] = None, on_synced: Optional[Callable] = None,
+                 employee_sync: Optional['ERPNextEmployeeSync'] = None):
+        self.db = database
+        self.get_settings = get_settings
+        self.device_id = device_id
+        self.batch_size = max(1, int(batch_size))
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.log_path = log_path
+        self.on_synced = on_synced
+        # Pulled from the same loop, every employee_sync.interval seconds
+        self.employee_sync = employee_sync
+        # Writes are never retried by the transport (see auth.create_session); this worker decides
+        self.session = create_session(timeout=timeout, retries=2)
+        self._login = None
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._failures = 0
+        self.backoff_until = 0.0
+        self.last_run = None
+        self.last_error = None
+        self.stats = {'sent': 0, 'duplicates': 0, 'skipped': 0, 'retried': 0, 'dead': 0, 'batches': 0}
+
+    # Delivery
+    def _authorize(self, base: str, settings: Dict) -> None:
+        self._login = _authorize(self.session, base, settings, self._login)
+
+    def _post(self, url: str, payload: Dict, key: str):
+        try:
+            response = self.session.post(url, json=payload, headers={'Idempotency-Key': key})
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise _Unreachable(str(e))
+        except requests.RequestException as e:
+            raise _Transient(str(e))
+        if response.status_code in (401, 403):
+            self._login = None
+            raise _Transient(f"not authorized: {erpnext_error(response)}")
+        if response.status_code in TRANSIENT_STATUS:
+            raise _Transient(erpnext_error(response))
+        return response
+
+    def _checkin(self, row: Dict) -> Dict:
+        device = f"{self.device_id}/{row['camera_id']}" if row.get('camera_id') else self.device_id
+        return {
+            'doctype': 'Employee Checkin',
+            'employee': row['employee_id'],
+            'log_type': CHECKIN_EVENTS[row.get('event_type') or 'check-in'],
+            'time': row['timestamp'],
+            'device_id': device,
+        }
+
+    def _send_page(self, base: str, rows: List[Dict]) -> Dict:
+        """Deliver one page; returns {log id: remote name, 'duplicate', ValueError (rejected) or
+        _Transient (failed, retry later)}. Rows after a transient failure are left out (not tried)."""
+        keys = [row['sync_key'] for row in rows]
+        batch_key = hashlib.sha1('|'.join(keys).encode('utf-8')).hexdigest()
+        response = self._post(f"{base}/api/method/frappe.client.insert_many",
+                              {'docs': [self._checkin(row) for row in rows]}, batch_key)
+        if response.status_code == 200:
+            names = (response.json() or {}).get('message') or []
+            return {row['id']: (names[i] if i < len(names) else None) for i, row in enumerate(rows)}
+        # The page was refused as a whole: find the rows ERPNext objects to
+        outcome = {}
+        for row in rows:
+            try:
+                response = self._post(f"{base}/api/resource/Employee Checkin", self._checkin(row), row['sync_key'])
+            except _Transient as e:
+                outcome[row['id']] = e
+                break
+            if response.status_code == 200:
+                outcome[row['id']] = ((response.json() or {}).get('data') or {}).get('name')
+            elif any(marker in response.text for marker in DUPLICATE_MARKERS):
+                outcome[row['id']] = 'duplicate'
+            else:
+                outcome[row['id']] = ValueError(erpnext_error(response))
+        return outcome
+
+    def _backoff(self) -> float:
+        self._failures += 1
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (self._failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def run_once(self) -> Dict:
+        """Deliver every due pending punch now; returns counts for this run"""
+        with self._run_lock:
+            return self._run_once()
+
+    def _run_once(self) -> Dict:
+        result = {'sent': 0, 'duplicates': 0, 'skipped': 0, 'retried': 0, 'dead': 0, 'error': None}
+        settings = self.get_settings() or {}
+        base = erpnext_base_url(settings.get('serverUrl'))
+        now = time.time()
+        if not base:
+            result['error'] = 'ERPNext server URL not configured'
+            return result
+        send_logs = settings.get('sendLogs') or {}
+        if not send_logs.get('recognition', True):
+            result['error'] = 'Sending recognition logs is disabled'
+            return result
+        if now < self.backoff_until:
+            result['error'] = f"Backing off after errors ({self.backoff_until - now:.0f}s left)"
+            return result
+        self.last_run = now
+        after_id = 0
+        try:
+            self._authorize(base, settings)
+            while True:
+                rows = self.db.get_unsynced_attendance(after_id, self.batch_size, now)
+                if not rows:
+                    break
+                after_id = rows[-1]['id']
+                registrations = {row['id'] for row in rows if _is_registration(row)}
+                if registrations:
+                    reason = REGISTRATION_SKIP_REASONS[bool(send_logs.get('registration', True))]
+                    self.db.set_attendance_sync_state(registrations, 2, reason)
+                    result['skipped'] += len(registrations)
+                    logger.info(f"ERPNext sync: skipped {len(registrations)} registration log(s): {reason}")
+                skipped = {row['id'] for row in rows if row['id'] not in registrations
+                           and row.get('event_type') not in CHECKIN_EVENTS}
+                if skipped:
+                    self.db.set_attendance_sync_state(skipped, 2, 'not a check-in/check-out punch')
+                    result['skipped'] += len(skipped)
+                rows = [row for row in rows if row['id'] not in skipped and row['id'] not in registrations]
+                if not rows:
+                    continue
+                missing = {row['id']: f"{self.device_id}-{row['id']}" for row in rows if not row.get('sync_key')}
+                if missing:
+                    self.db.set_attendance_sync_keys(missing)
+                    for row in rows:
+                        row['sync_key'] = row.get('sync_key') or missing[row['id']]
+                try:
+                    outcome = self._send_page(base, rows)
+                except _Transient as e:
+                    # Reachable but failing: these rows spend an attempt
+                    delay = self._backoff()
+                    dead = self.db.schedule_attendance_retry([row['id'] for row in rows], str(e), now + delay,
+                                                             self.max_attempts)
+                    result['retried'] += len(rows) - dead
+                    result['dead'] += dead
+                    self.backoff_until = now + delay
+                    raise
+                self.stats['batches'] += 1
+                delivered = {log_id: name for log_id, name in outcome.items() if not isinstance(name, Exception)}
+                self.db.mark_attendance_delivered(delivered)
+                result['sent'] += sum(1 for name in delivered.values() if name != 'duplicate')
+                result['duplicates'] += sum(1 for name in delivered.values() if name == 'duplicate')
+                failed = None
+                for log_id, error in outcome.items():
+                    if isinstance(error, _Transient):
+                        failed = error
+                        delay = self._backoff()
+                        dead = self.db.schedule_attendance_retry([log_id], str(error), now + delay, self.max_attempts)
+                        result['retried'] += 1 - dead
+                        result['dead'] += dead
+                        self.backoff_until = now + delay
+                    elif isinstance(error, Exception):
+                        self.db.set_attendance_sync_state([log_id], -1, str(error))
+                        result['dead'] += 1
+                if failed is not None:
+                    raise failed
+            self._failures = 0
+            self.last_error = None
+        except _Unreachable as e:
+            delay = self._backoff()
+            self.backoff_until = time.time() + delay
+            self.last_error = result['error'] = f"ERPNext unreachable: {e}"
+            logger.warning(f"{self.last_error}; retrying in {delay:.0f}s")
+        except _Transient as e:
+            if self.backoff_until <= time.time():
+                self.backoff_until = time.time() + self._backoff()
+            self.last_error = result['error'] = str(e)
+            logger.warning(f"ERPNext sync failed: {e}; retrying in {self.backoff_until - time.time():.0f}s")
+        for key in ('sent', 'duplicates', 'skipped', 'retried', 'dead'):
+            self.stats[key] += result[key]
+        if any(result[key] for key in ('sent', 'duplicates', 'dead')) or result['error']:
+            self._write_log(result)
+        if (result['sent'] or result['duplicates'] or result['skipped'] or result['dead']) and self.on_synced:
+            self.on_synced(result)
+        return result
+
+    def _write_log(self, result: Dict) -> None:
+        if not self.log_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps({'ts': datetime.now().isoformat(), **result}) + "\n")
+        except OSError:
+            pass
+
+    # Background worker
+    def notify(self) -> None:
+        """A punch was recorded: deliver it soon instead of at the next interval"""
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='erpnext-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._wake.set()
+
+    def _run(self) -> None:
+        logger.info("ERPNext sync worker started")
+        while self._running:
+            try:
+                self.run_once()
+                if self.employee_sync is not None:
+                    self.employee_sync.run_if_due()
+            except Exception as e:
+                logger.warning(f"ERPNext sync error: {e}")
+            interval = max(10.0, float((self.get_settings() or {}).get('syncInterval') or 5) * 60.0)
+            wait = max(1.0, min(interval, self.backoff_until - time.time())) if self.backoff_until > time.time() \
+                else interval
+            if self._wake.wait(wait) and self._running:
+                # Let punches arriving together share a page
+                time.sleep(2.0)
+            self._wake.clear()
+
+    def snapshot(self) -> Dict:
+        return {
+            'device_id': self.device_id,
+            'queue': self.db.get_attendance_sync_counts(),
+            'last_run': self.last_run,
+            'last_error': self.last_error,
+            'backoff_sec': round(max(0.0, self.backoff_until - time.time()), 1),
+            'consecutive_failures': self._failures,
+            **self.stats,
+        }
+
+
+def _get_json(session, url: str, params: Dict) -> Dict:
+    try:
+        response = session.get(url, params=params)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise _Unreachable(str(e))
+    except requests.RequestException as e:
+        raise _Transient(str(e))
+    if response.status_code != 200:
+        raise _Transient(erpnext_error(response))
+    return response.json() or {}
+
+
+def _employee_key(row: Dict) -> tuple:
+    return row['modified'], row['name']
+
+
+def fetch_employees(session, base: str, since: Optional[str] = None, page_size: int = 500, workers: int = 4):
+    """Employee rows modified after `since` (all when None), in (modified, name) order.
+
+    Paging is keyset on (modified, name): each round fetches `workers` pages after the last
+    accepted row concurrently, at offsets, each asking for one row more than page_size so it
+    overlaps the next. A page is only accepted while its extra row is the next page's first
+    row; an edit during the pull moves that employee to the end of the order and shifts the
+    later offsets, which shows up as a mismatch, and the next round restarts from the last
+    accepted row. Every row up to the last one returned was therefore seen."""
+    seen = {}
+    anchor = None
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            if anchor is None:
+                params = {'filters': json.dumps([['modified', '>', since]] if since else [])}
+            else:
+                params = {'filters': json.dumps([['modified', '>=', anchor[0]]]),
+                          'or_filters': json.dumps([['modified', '>', anchor[0]], ['name', '>', anchor[1]]])}
+
+            def page(start: int, params=params) -> List[Dict]:
+                return _get_json(session, f"{base}/api/resource/Employee", {
+                    'fields': json.dumps(EMPLOYEE_FIELDS),
+                    **params,
+                    'order_by': 'modified asc, name asc',
+                    'limit_start': start,
+                    'limit_page_length': page_size + 1,
+                }).get('data') or []
+
+            pages = list(pool.map(page, range(0, max(1, workers) * page_size, page_size)))
+            finished = False
+            for k, rows_page in enumerate(pages):
+                for row in rows_page[:page_size]:
+                    if row['name'] not in seen or row['modified'] >= seen[row['name']]['modified']:
+                        seen[row['name']] = row
+                anchor = _employee_key(rows_page[page_size - 1]) if len(rows_page) >= page_size else None
+                if len(rows_page) <= page_size:
+                    finished = True
+                    break
+                following = pages[k + 1] if k + 1 < len(pages) else None
+                if not following or _employee_key(following[0]) != _employee_key(rows_page[page_size]):
+                    break
+            if finished:
+                return sorted(seen.values(), key=_employee_key)
+
+
+class ERPNextEmployeeSync:
+    """Keeps the employees table in step with ERPNext's Employee list. The high-water mark is
+    ERPNext's own `modified` value, so device clock skew cannot lose changes."""
+
+    def __init__(self, database, get_settings: Callable[[], Dict], page_size: int = 500, workers: int = 4,
+                 interval: float = 3600.0, timeout=(5.0, 30.0), on_synced: Optional[Callable] = None):
+        self.db = database
+        self.get_settings = get_settings
+        self.page_size = max(1, int(page_size))
+        self.workers = max(1, int(workers))
+        self.interval = interval
+        self.on_synced = on_synced
+        self.session = create_session(timeout=timeout, pool_size=self.workers)
+        self._login = None
+        self._lock = threading.Lock()
+        self.last_attempt = 0.0
+        self.last_result: Optional[Dict] = None
+        self.last_error = None
+
+    @staticmethod
+    def _employee(row: Dict) -> Dict:
+        return {
+            'id': row['name'],
+            'name': row.get('employee_name') or row['name'],
+            'department': row.get('department') or '',
+            'join_date': row.get('date_of_joining') or '',
+            'active': (row.get('status') or 'Active') == 'Active',
+        }
+
+    def run(self, full: bool = False) -> Dict:
+        """Pull changed employees (all of them when full) and merge them locally"""
+        with self._lock:
+            started = time.time()
+            self.last_attempt = started
+            settings = self.get_settings() or {}
+            base = erpnext_base_url(settings.get('serverUrl'))
+            result = {'fetched': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'since': None, 'error': None}
+            if not base:
+                result['error'] = 'ERPNext server URL not configured'
+                return result
+            state_key = f"erpnext_employees_modified:{base}"
+            since = None if full else self.db.get_replication_state(state_key)
+            result['since'] = since
+            try:
+                self._login = _authorize(self.session, base, settings, self._login)
+                rows = fetch_employees(self.session, base, since, self.page_size, self.workers)
+            except (_Unreachable, _Transient) as e:
+                self._login = None
+                self.last_error = result['error'] = f"Employee pull failed: {e}"
+                logger.warning(self.last_error)
+                return result
+            # The latest change actually pulled: everything up to it is in rows
+            mark = rows[-1]['modified'] if rows else None
+            result.update(self.db.merge_erpnext_employees(
+                [self._employee(row) for row in rows], state=(state_key, mark) if mark else None))
+            result['fetched'] = len(rows)
+            result['seconds'] = round(time.time() - started, 2)
+            self.last_result, self.last_error = result, None
+        if (result['created'] or result['updated']) and self.on_synced:
+            self.on_synced(result)
+        return result
+
+    def run_if_due(self) -> Optional[Dict]:
+        if self.interval <= 0 or time.time() - self.last_attempt < self.interval:
+            return None
+        return self.run()
+
+    def snapshot(self) -> Dict:
+        base = erpnext_base_url((self.get_settings() or {}).get('serverUrl'))
+        return {
+            'interval_sec': self.interval,
+            'modified_since': self.db.get_replication_state(f"erpnext_employees_modified:{base}") if base else None,
+            'last_attempt': self.last_attempt or None,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
+
+
+def serve_mock(port: int, fail_rate: float = 0.0, latency: float = 0.0, employee_count: int = 250) -> None:
+    """Minimal ERPNext stand-in: login, Employee Checkin insert (single and insert_many) with
+    ERPNext's duplicate-timestamp validation, and Employee count/listing (POST /api/test/touch
+    marks some employees modified). fail_rate answers that share of requests with 503 to
+    exercise retries."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, unquote, urlparse
+
+    checkins: List[Dict] = []
+    employees: List[Dict] = [
+        {'name': f'HR-EMP-{i:05d}', 'employee_name': f'Employee {i}', 'department': 'Operations',
+         'status': 'Active', 'date_of_joining': '2024-01-01', 'modified': f'2025-01-{1 + i % 28:02d} 09:00:00'}
+        for i in range(1, employee_count + 1)
+    ]
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _flaky(self):
+            if latency:
+                time.sleep(latency)
+            if random.random() < fail_rate:
+                self._reply(503, {'exception': 'Service Unavailable'})
+                return True
+            return False
+
+        def _insert(self, doc):
+            """(inserted doc, None) or (None, ERPNext-style validation error body)"""
+            if not any(e['name'] == doc.get('employee') for e in employees):
+                message, exc_type = f"Could not find Employee: {doc.get('employee')}", 'LinkValidationError'
+            elif any(c['employee'] == doc.get('employee') and c['time'] == doc.get('time') for c in checkins):
+                message, exc_type = "This employee already has a log with the same timestamp.", 'ValidationError'
+            else:
+                doc = dict(doc, name=f"EMP-CKIN-{len(checkins) + 1:06d}")
+                checkins.append(doc)
+                return doc, None
+            return None, {'exc_type': exc_type, '_server_messages': json.dumps([json.dumps({'message': message})])}
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            path = unquote(urlparse(self.path).path)
+            if self._flaky():
+                return
+            if path == '/api/method/login':
+                return self._reply(200, {'message': 'Logged In'})
+            if path == '/api/test/touch':
+                stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+                with lock:
+                    touched = employees[:int(body.get('count') or 1)]
+                    for employee in touched:
+                        employee.update(modified=stamp, status=body.get('status') or employee['status'])
+                    employees.append({'name': f'HR-EMP-{len(employees) + 1:05d}', 'employee_name': 'New hire',
+                                      'department': 'Operations', 'status': 'Active',
+                                      'date_of_joining': stamp[:10], 'modified': stamp})
+                return self._reply(200, {'message': len(touched) + 1})
+            with lock:
+                if path == '/api/method/frappe.client.insert_many':
+                    docs = body.get('docs') or []
+                    snapshot = list(checkins)
+                    names = []
+                    for doc in docs:
+                        inserted, error = self._insert(doc)
+                        if error:
+                            # Frappe rolls the whole request back on a validation error
+                            checkins[:] = snapshot
+                            return self._reply(417, error)
+                        names.append(inserted['name'])
+                    print(f"mock: inserted {len(names)} checkins (total {len(checkins)})")
+                    return self._reply(200, {'message': names})
+                if path == '/api/resource/Employee Checkin':
+                    inserted, error = self._insert(body)
+                    return self._reply(417, error) if error else self._reply(200, {'data': inserted})
+            self._reply(404, {'exception': 'Not found'})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if self._flaky():
+                return
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            rows = sorted(employees, key=lambda e: (e['modified'], e['name']))
+            compare = {'>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+            for field, op, value in json.loads(query.get('filters') or '[]'):
+                rows = [e for e in rows if compare[op](e[field], value)]
+            or_filters = json.loads(query.get('or_filters') or '[]')
+            if or_filters:
+                rows = [e for e in rows if any(compare[op](e[field], value) for field, op, value in or_filters)]
+            if unquote(url.path) == '/api/method/frappe.client.get_count':
+                return self._reply(200, {'message': len(rows)})
+            if unquote(url.path) == '/api/resource/Employee':
+                start = int(query.get('limit_start') or 0)
+                length = int(query.get('limit_page_length') or 20)
+                return self._reply(200, {'data': rows[start:start + length]})
+            if unquote(url.path) == '/api/resource/Employee Checkin':
+                return self._reply(200, {'data': checkins})
+            self._reply(404, {'exception': 'Not found'})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    print(f"Mock ERPNext on http://127.0.0.1:{port} (fail rate {fail_rate:.0%})")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ERPNext attendance sync tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    mock = sub.add_parser('mock', help='Run a mock ERPNext HTTP server')
+    mock.add_argument('--port', type=int, default=8000)
+    mock.add_argument('--fail-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    mock.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    mock.add_argument('--employees', type=int, default=250, help='Employees the mock site holds')
+    once = sub.add_parser('once', help='Deliver pending punches from a database once')
+    once.add_argument('--url', required=True, help='ERPNext site URL')
+    once.add_argument('--db', default=None, help='SQLite file (default: the server database)')
+    once.add_argument('--api-key', default='')
+    once.add_argument('--api-secret', default='')
+    args = parser.parse_args()
+    if args.command == 'mock':
+        serve_mock(args.port, args.fail_rate, args.latency, args.employees)
+    else:
+        from db.database import Database
+        database = Database(args.db) if args.db else Database()
+        worker = ERPNextSyncWorker(database, lambda: {'serverUrl': args.url, 'apiKey': args.api_key,
+                                                      'apiSecret': args.api_secret}, device_id='cli')
+        print(json.dumps(worker.run_once()))
+        print(json.dumps(worker.snapshot(), default=str))
@@ -0,0 +1,270 @@
+"""
+Event Bus - topic-based change feed pushed to the UI over a single SSE connection,
+plus the bounded per-client queue used by the recognition SSE stream
+"""
+import asyncio
+import json
+import threading
+import time
+import logging
+import uuid
+from collections import deque
+from queue import Queue, Empty, Full
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TOPICS = (
+    'attendance_logged',
+    'employee_changed',
+    'settings_changed',
+    'stats_sample',
+    'camera_state',
+)
+
+# Events kept for Last-Event-ID resume after a brief disconnect.
+HISTORY_SIZE = 256
+# Per-subscriber backlog; a subscriber that falls this far behind is told to resync.
+SUBSCRIBER_QUEUE_SIZE = 128
+
+
+class _Subscriber:
+    """One connected SSE client and the topics it asked for"""
+
+    def __init__(self, topics: Set[str]):
+        self.topics = topics
+        self.queue: Queue = Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventBus:
+    """Publishes events to topic subscribers; each event is serialized once"""
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._subscribers: Set[_Subscriber] = set()
+        self._history: deque = deque(maxlen=history_size)
+        self._last_id = 0
+        # SSE ids are "<epoch>-<n>": n restarts at 1 with the process (and differs between serve
+        # workers), so a Last-Event-ID from another epoch resyncs instead of resuming.
+        self.epoch = uuid.uuid4().hex[:12]
+
+    @staticmethod
+    def parse_topics(raw: Optional[str]) -> Set[str]:
+        """Parse a comma-separated topic list; empty or unknown input means all topics"""
+        if not raw:
+            return set(TOPICS)
+        topics = {t.strip() for t in raw.split(',') if t.strip() in TOPICS}
+        return topics or set(TOPICS)
+
+    def _format(self, event_id: int, topic: str, data: Dict) -> str:
+        payload = {'type': topic, 'id': event_id, 'timestamp': time.time(), 'data': data}
+        return f"id: {self.epoch}-{event_id}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    def _resume_point(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Event number in a Last-Event-ID issued by this bus; None for another epoch's ids"""
+        epoch, _, event_id = str(last_event_id or '').rpartition('-')
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(event_id)
+        except ValueError:
+            return None
+
+    def publish(self, topic: str, data: Optional[Dict] = None) -> int:
+        """Publish an event to every subscriber of the topic; returns the event id"""
+        if topic not in TOPICS:
+            raise ValueError(f"Unknown event topic: {topic}")
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            message = self._format(event_id, topic, data or {})
+            self._history.append((event_id, topic, message))
+            for sub in self._subscribers:
+                if topic not in sub.topics or sub.overflowed:
+                    continue
+                try:
+                    sub.queue.put_nowait(message)
+                except Full:
+                    # Stalled client: stop queueing and let it resync on its next read.
+                    sub.overflowed = True
+        return event_id
+
+    def has_subscribers(self, topic: str) -> bool:
+        with self._lock:
+            return any(topic in sub.topics for sub in self._subscribers)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _format_resync(self, last_id: int) -> str:
+        payload = {'type': 'resync', 'id': last_id, 'timestamp': time.time(), 'data': {}}
+        return f"id: {self.epoch}-{last_id}\ndata: {json.dumps(payload)}\n\n"
+
+    def _resync_message(self) -> str:
+        with self._lock:
+            last_id = self._last_id
+        return self._format_resync(last_id)
+
+    def request_resync(self):
+        """Tell every subscriber to refetch its snapshots (e.g. the upstream feed restarted)"""
+        with self._lock:
+            message = self._format_resync(self._last_id)
+            for sub in self._subscribers:
+                if sub.overflowed:
+                    continue
+                try:
+                    sub.queue.put_nowait(message)
+                except Full:
+                    sub.overflowed = True
+
+    def stream(self, topics: Iterable[str], last_event_id: Optional[str] = None,
+               heartbeat_sec: float = 25.0):
+        """SSE generator: replays missed events after last_event_id, then streams live ones"""
+        sub = _Subscriber(set(topics))
+        replay = []
+        needs_resync = True
+        with self._lock:
+            self._subscribers.add(sub)
+            resume_from = self._resume_point(last_event_id)
+            if resume_from is not None and resume_from <= self._last_id:
+                oldest = self._history[0][0] if self._history else self._last_id + 1
+                # Resume is only exact if nothing between resume_from and oldest was evicted.
+                if resume_from >= oldest - 1:
+                    replay = [msg for eid, topic, msg in self._history
+                              if eid > resume_from and topic in sub.topics]
+                    needs_resync = False
+
+        try:
+            yield f"retry: 3000\ndata: {json.dumps({'type': 'connection', 'topics': sorted(sub.topics)})}\n\n"
+            if needs_resync:
+                # Fresh connection or gap too large: client should refetch its snapshots.
+                yield self._resync_message()
+            for message in replay:
+                yield message
+            while True:
+                if sub.overflowed:
+                    with self._lock:
+                        while not sub.queue.empty():
+                            sub.queue.get_nowait()
+                        sub.overflowed = False
+                    yield self._resync_message()
+                    continue
+                try:
+                    yield sub.queue.get(timeout=heartbeat_sec)
+                except Empty:
+                    yield ": heartbeat\n\n"
+        except GeneratorExit:
+            logger.info("Client disconnected from event stream.")
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+
+class AsyncWakeup:
+    """Lets producer threads wake coroutines awaiting on other threads' event loops"""
+
+    def __init__(self):
+        self._waiters = set()
+
+    def add(self, loop, future):
+        """Register a waiter; call while holding the producer's lock to avoid lost wakeups"""
+        self._waiters.add((loop, future))
+
+    def discard(self, loop, future):
+        self._waiters.discard((loop, future))
+
+    def wake_all(self):
+        """Call while holding the producer's lock"""
+        waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future)
+            except RuntimeError:
+                pass  # loop already closed
+
+
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CoalescingQueue:
+    """
+    Bounded per-client SSE queue. Coalescable messages (e.g. per-frame face boxes) keep
+    only the latest pending copy per coalesce key (e.g. one per camera); other messages are
+    kept in order until the backlog limit, after which the client is considered stalled and
+    put() returns False.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self.max_pending = max_pending
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._async_waiters = AsyncWakeup()
+        self.coalesced = 0
+        self.closed = False
+
+    def put(self, message: str, coalesce=False) -> bool:
+        """coalesce: False, or a key (True or e.g. a camera id) whose pending message this replaces"""
+        with self._cond:
+            if self.closed:
+                return False
+            if coalesce:
+                for item in self._items:
+                    if item[0] == coalesce:
+                        self._items.remove(item)
+                        self.coalesced += 1
+                        break
+            elif len(self._items) >= self.max_pending:
+                return False
+            self._items.append((coalesce, message))
+            self._cond.notify()
+            self._async_waiters.wake_all()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> str:
+        """Return the next message; raises Empty on timeout or once closed and drained."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                raise Empty
+            return self._items.popleft()[1]
+
+    async def get_async(self, timeout: Optional[float] = None) -> str:
+        """Coroutine form of get(): awaits the next message without holding a thread."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._items:
+                return self._items.popleft()[1]
+            if self.closed:
+                raise Empty
+            self._async_waiters.add(loop, future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(loop, future)
+        with self._cond:
+            if not self._items:
+                raise Empty
+            return self._items.popleft()[1]
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+            self._async_waiters.wake_all()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+
+# Global event bus instance
+event_bus = EventBus()
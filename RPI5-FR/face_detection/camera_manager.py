@@ -6,6 +6,13 @@ import time
 import numpy as np
 from typing import Optional, Tuple, Dict, Any
 
+from face_detection.frame_source import FileFrameSource, FrameDumpWriter
+from face_detection.network_source import NetworkFrameSource, is_network_source, redact_url
+
+# Longest pause replayed between two recorded frames, in frame intervals. A dump spanning
+# several recording sessions (FrameDumpWriter appends) has hours-long gaps at the seams.
+REPLAY_MAX_GAP_FRAMES = 5
+
 class CameraManager:
     """
     Camera Manager for Raspberry Pi 5 Industrial Shield and other platforms.
@@ -15,7 +22,10 @@ class CameraManager:
     def __init__(self, width: int = 1280, height: int = 720, framerate: int = 20, 
                  camera_port: str = 'CSI0', autofocus: bool = False, 
                  awb_mode: str = 'auto', exposure_mode: str = 'auto', 
-                 horizontal_flip: bool = True, vertical_flip: bool = False, debug: bool = False):
+                 horizontal_flip: bool = True, vertical_flip: bool = False, debug: bool = False,
+                 replay_source: Optional[str] = None, replay_fps: float = 0.0, replay_loop: bool = True,
+                 record_path: Optional[str] = None, network_timeout: float = 5.0,
+                 network_reconnect_max: float = 30.0, rtsp_transport: str = 'tcp'):
         """
         Initialize CameraManager with configuration parameters.
         
@@ -23,13 +33,20 @@ class CameraManager:
             width: Frame width (16:9 aspect ratio recommended)
             height: Frame height (16:9 aspect ratio recommended)
             framerate: Target FPS
-            camera_port: CSI port ('CSI0' or 'CSI1')
+            camera_port: CSI port ('CSI0' or 'CSI1'), or an rtsp:// / http(s):// MJPEG camera URL
             autofocus: Enable autofocus (if supported)
             awb_mode: Auto white balance mode
             exposure_mode: Exposure mode
             horizontal_flip: Enable horizontal flip (mirror effect)
             vertical_flip: Enable vertical flip
             debug: Enable debug output for color conversion
+            replay_source: Video file, image directory, image or .fdump to replay instead of a camera
+            replay_fps: Replay rate; 0 = recorded timing (falls back to framerate), <0 = unpaced
+            replay_loop: Restart the replay at the end; otherwise hold the last frame
+            record_path: Append every captured frame to this .fdump for later replay
+            network_timeout: Connect/read timeout (s) for network cameras; also the read_frame wait
+            network_reconnect_max: Longest backoff (s) between network camera reconnects
+            rtsp_transport: FFmpeg RTSP transport ('tcp' avoids UDP packet loss smearing frames)
         """
         self.width = width
         self.height = height
@@ -46,12 +63,37 @@ class CameraManager:
         self.cap = None
         self.picam2 = None
         
+        # Replay backend state
+        self.replay_source = replay_source
+        self.replay_fps = replay_fps
+        self.replay_loop = replay_loop
+        self.replay = None
+        self.replay_finished = False
+        self.replay_frame_index = 0
+        self.replay_frame_timestamp = None
+        self._replay_due = 0.0
+        self._replay_prev_ts = None
+        self._replay_last_frame = None
+        self.record_path = record_path
+        self._recorder = None
+        
+        # Network camera backend state (camera_port is a URL)
+        self.network_timeout = network_timeout
+        self.network_reconnect_max = network_reconnect_max
+        self.rtsp_transport = rtsp_transport
+        self.network = None
+        
         # Status tracking
         self.is_initialized = False
-        self.platform = self._detect_platform()
+        if replay_source:
+            self.platform = 'replay'
+        elif is_network_source(camera_port):
+            self.platform = 'network'
+        else:
+            self.platform = self._detect_platform()
         
         print(f"🔍 Platform detected: {self.platform}")
-        print(f"📷 Camera config: {width}x{height} @ {framerate}fps, Port: {camera_port}")
+        print(f"📷 Camera config: {width}x{height} @ {framerate}fps, Port: {redact_url(camera_port)}")
         print(f"🔄 Transform: H-flip={'ON' if horizontal_flip else 'OFF'}, V-flip={'ON' if vertical_flip else 'OFF'}")
 
     def _detect_platform(self) -> str:
@@ -349,6 +391,72 @@ class CameraManager:
             return False
 
 
+    def _configure_network(self) -> bool:
+        """Start the reader thread for a network camera.
+
+        Succeeds once the reader runs, even if the camera is not reachable yet: the reader
+        keeps reconnecting with backoff and read_frame() returns None until frames arrive."""
+        self.network = NetworkFrameSource(
+            self.camera_port,
+            timeout=self.network_timeout,
+            reconnect_max=self.network_reconnect_max,
+            rtsp_transport=self.rtsp_transport
+        )
+        self.network.start()
+        print(f"✅ Network camera reader started: {self.network.display_url}")
+        return True
+
+    def _configure_replay(self) -> bool:
+        """Open the recorded source used in place of a camera."""
+        source = FileFrameSource(self.replay_source, loop=self.replay_loop)
+        if not source.open():
+            print(f"❌ Could not open replay source: {self.replay_source}")
+            return False
+        self.replay = source
+        self.replay_finished = False
+        self.replay_frame_index = 0
+        self.replay_frame_timestamp = None
+        self._replay_due = time.monotonic()
+        self._replay_prev_ts = None
+        self._replay_last_frame = None
+        print(f"✅ Replay source opened ({source.kind}): {self.replay_source}")
+        return True
+
+    def _read_replay_frame(self) -> Optional[np.ndarray]:
+        """Next replayed frame, paced on a monotonic schedule so timing doesn't drift."""
+        if self.replay_finished:
+            time.sleep(1.0 / max(1, self.framerate))
+            return self._replay_last_frame
+        frame = self.replay.read()
+        if frame is None:
+            # Played once: hold the last frame like a still camera, rather than
+            # returning None (which would make the server reinitialize and replay again).
+            self.replay_finished = True
+            print(f"ℹ️  Replay finished after {self.replay_frame_index} frames")
+            return self._replay_last_frame
+
+        media_ts = self.replay.frame_timestamp
+        if self.replay_fps > 0 or media_ts is None or self._replay_prev_ts is None or media_ts < self._replay_prev_ts:
+            # Fixed rate, untimed source, first frame, or the source looped.
+            rate = self.replay_fps if self.replay_fps > 0 else self.framerate
+            step = 1.0 / max(1e-3, rate) if self._replay_prev_ts is not None else 0.0
+        else:
+            step = min(media_ts - self._replay_prev_ts, REPLAY_MAX_GAP_FRAMES / max(1, self.framerate))
+        self._replay_prev_ts = media_ts if media_ts is not None else (self._replay_prev_ts or 0.0) + step
+
+        if self.replay_fps >= 0:
+            self._replay_due += step
+            now = time.monotonic()
+            if self._replay_due > now:
+                time.sleep(self._replay_due - now)
+            elif now - self._replay_due > 1.0:
+                self._replay_due = now  # fell far behind (e.g. debugger pause): don't burst
+
+        self.replay_frame_index += 1
+        self.replay_frame_timestamp = media_ts
+        self._replay_last_frame = frame
+        return frame
+
     def initialize(self) -> bool:
         """
         Initialize the camera based on platform detection.
@@ -364,7 +472,11 @@ class CameraManager:
         
         success = False
         
-        if self.platform in ['raspberry_pi_5_industrial', 'raspberry_pi']:
+        if self.platform == 'replay':
+            success = self._configure_replay()
+        elif self.platform == 'network':
+            success = self._configure_network()
+        elif self.platform in ['raspberry_pi_5_industrial', 'raspberry_pi']:
             # Try Picamera2 first for Raspberry Pi
             success = self._configure_picamera2()
             if not success:
@@ -376,6 +488,12 @@ class CameraManager:
         
         if success:
             self.is_initialized = True
+            if self.record_path and self._recorder is None:
+                try:
+                    self._recorder = FrameDumpWriter(self.record_path)
+                    print(f"⏺️  Recording frames to {self.record_path}")
+                except OSError as e:
+                    print(f"⚠️  Could not open frame recording {self.record_path}: {e}")
             print(f"✅ Camera initialized successfully on {self.platform}")
         else:
             print(f"❌ Camera initialization failed on {self.platform}")
@@ -458,9 +576,29 @@ class CameraManager:
             if not self.initialize():
                 return None
         
-        if not self.cap:
-            return None
+        if self.replay is not None:
+            # Replayed footage is used as recorded: no color conversion or flips.
+            return self._read_replay_frame()
         
+        if self.network is not None:
+            # Newest frame only; waits up to one frame timeout while the camera reconnects
+            frame = self.network.read(timeout=min(1.0, self.network_timeout))
+            frame = self._apply_transforms(frame) if frame is not None else None
+        elif not self.cap:
+            return None
+        else:
+            frame = self._read_device_frame()
+        if frame is not None and self._recorder is not None:
+            try:
+                self._recorder.write(frame)
+            except Exception as e:
+                print(f"⚠️  Frame recording stopped: {e}")
+                self._recorder.close()
+                self._recorder = None
+        return frame
+
+    def _read_device_frame(self) -> Optional[np.ndarray]:
+        """Read and convert one frame from Picamera2 or OpenCV."""
         try:
             if hasattr(self.cap, 'capture_array'):
                 # Picamera2 frame capture
@@ -536,7 +674,13 @@ class CameraManager:
             dict: Status information
         """
         camera_working = False
-        if self.is_initialized and self.cap:
+        if self.replay is not None:
+            # Don't consume (and pace) a replay frame just to report status.
+            camera_working = self.is_initialized
+        elif self.network is not None:
+            # Nor steal the newest frame from the capture thread
+            camera_working = self.network.connected
+        elif self.is_initialized and self.cap:
             try:
                 frame = self.read_frame()
                 camera_working = frame is not None and frame.shape[0] > 0
@@ -547,11 +691,12 @@ class CameraManager:
             'platform': self.platform,
             'initialized': self.is_initialized,
             'working': camera_working,
-            'camera_type': 'Picamera2' if self.picam2 else 'OpenCV',
+            'camera_type': 'Replay' if self.replay is not None else (
+                'Network' if self.network is not None else ('Picamera2' if self.picam2 else 'OpenCV')),
             'resolution': f"{self.width}x{self.height}",
             'aspect_ratio': f"{self.width/self.height:.2f}:1",
             'framerate': self.framerate,
-            'camera_port': self.camera_port,
+            'camera_port': redact_url(self.camera_port),
             'autofocus': self.autofocus,
             'awb_mode': self.awb_mode,
             'exposure_mode': self.exposure_mode,
@@ -563,12 +708,39 @@ class CameraManager:
         if hasattr(self, 'camera_format'):
             status['camera_format'] = self.camera_format
         
+        if self.replay is not None:
+            status['replay'] = {
+                'source': self.replay_source,
+                'kind': self.replay.kind,
+                'loop': self.replay_loop,
+                'fps': self.replay_fps,
+                'frame_index': self.replay_frame_index,
+                'frame_timestamp': self.replay_frame_timestamp,
+                'finished': self.replay_finished,
+            }
+        if self.network is not None:
+            status['network'] = self.network.snapshot()
+        if self._recorder is not None:
+            status['recording'] = self.record_path
+        
         return status
 
     def close(self):
         """Clean up camera resources."""
         print("🧹 Cleaning up camera resources...")
         
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+            print("✅ Replay source closed")
+        if self.network is not None:
+            self.network.stop()
+            self.network = None
+            print("✅ Network camera reader stopped")
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+        
         if self.picam2:
             try:
                 self.picam2.close()
@@ -0,0 +1,304 @@
+# face_detection/detector_backends.py
+# Interchangeable face detectors for the recognition path. Every backend returns boxes in
+# face_recognition order (top, right, bottom, left) on the image it was given, so the
+# encoder and the landmark filter in FaceDetector work the same whichever one runs.
+
+import os
+import cv2
+import numpy as np
+import face_recognition
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+MODELS_PATH = os.path.join(BASE_PATH, 'models')
+
+
+def non_max_suppression(boxes, scores=None, iou_threshold=0.3):
+    """Greedy NMS over (x, y, w, h) boxes; returns the kept indices, best score first"""
+    if len(boxes) == 0:
+        return []
+    boxes = np.asarray(boxes, dtype=np.float32)
+    scores = np.ones(len(boxes), dtype=np.float32) if scores is None else np.asarray(scores, dtype=np.float32)
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = x1 + boxes[:, 2]
+    y2 = y1 + boxes[:, 3]
+    areas = np.maximum(boxes[:, 2], 0) * np.maximum(boxes[:, 3], 0)
+    # Ties (e.g. unscored Haar boxes) prefer the larger box.
+    order = np.lexsort((-areas, -scores))
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(int(i))
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.maximum(0.0, xx2 - xx1) * np.maximum(0.0, yy2 - yy1)
+        iou = inter / np.maximum(areas[i] + areas[order[1:]] - inter, 1e-6)
+        order = order[1:][iou <= iou_threshold]
+    return keep
+
+
+def _xywh_to_trbl(box, width, height):
+    x, y, w, h = [int(round(v)) for v in box[:4]]
+    top = max(0, y)
+    left = max(0, x)
+    bottom = min(height, y + h)
+    right = min(width, x + w)
+    return (top, right, bottom, left)
+
+
+class DetectorBackend:
+    """Base class: detect(bgr, rgb) -> [(top, right, bottom, left), ...]"""
+
+    name = 'base'
+
+    def available(self):
+        return True
+
+    def detect(self, bgr, rgb):
+        raise NotImplementedError
+
+    def describe(self):
+        return {'name': self.name}
+
+
+class HogBackend(DetectorBackend):
+    """dlib HOG via face_recognition (the original detector). upsample=1 finds ~40px faces at
+    roughly 4x the cost of upsample=0, which only finds ~80px faces"""
+
+    name = 'hog'
+
+    def __init__(self, upsample=1):
+        self.upsample = int(upsample)
+
+    def detect(self, bgr, rgb):
+        return face_recognition.face_locations(rgb, number_of_times_to_upsample=self.upsample, model='hog')
+
+    def describe(self):
+        return {'name': self.name, 'upsample': self.upsample}
+
+
+class HaarBackend(DetectorBackend):
+    """Single Haar cascade with NMS; cheapest option, weakest on rotated or dim faces"""
+
+    name = 'haar'
+
+    def __init__(self, cascade='haarcascade_frontalface_default.xml', scale_factor=1.1,
+                 min_neighbors=5, min_size=40, nms_iou=0.3):
+        self.cascade_file = cascade
+        self.cascade = cv2.CascadeClassifier(os.path.join(BASE_PATH, cascade))
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.nms_iou = nms_iou
+
+    def available(self):
+        return not self.cascade.empty()
+
+    def detect(self, bgr, rgb):
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        boxes = self.cascade.detectMultiScale(
+            gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+            minSize=(self.min_size, self.min_size)
+        )
+        if len(boxes) == 0:
+            return []
+        h, w = gray.shape[:2]
+        return [_xywh_to_trbl(boxes[i], w, h) for i in non_max_suppression(boxes, iou_threshold=self.nms_iou)]
+
+    def describe(self):
+        return {'name': self.name, 'cascade': self.cascade_file, 'min_neighbors': self.min_neighbors}
+
+
+class MultiCascadeHaarBackend(DetectorBackend):
+    """Haar cascades run fastest-first with early exit, fused with NMS into one ranked box list.
+
+    With early_exit, the slower cascades only run when the ones before them found nothing,
+    so a frontal face costs one cascade pass instead of four and never comes back 3-4 times.
+    """
+
+    name = 'haar_multi'
+    # (cascade file, minNeighbors) in the order they are tried
+    CASCADES = (
+        ('haarcascade_frontalface_default.xml', 5),
+        ('haarcascade_frontalface_alt2.xml', 5),
+        ('haarcascade_frontalface_alt.xml', 4),
+        ('haarcascade_profileface.xml', 5),
+    )
+
+    def __init__(self, scale_factor=1.1, min_size=30, nms_iou=0.3, early_exit=True):
+        self.cascades = [
+            (cascade_file, cv2.CascadeClassifier(os.path.join(BASE_PATH, cascade_file)), min_neighbors)
+            for cascade_file, min_neighbors in self.CASCADES
+        ]
+        self.scale_factor = scale_factor
+        self.min_size = min_size
+        self.nms_iou = nms_iou
+        self.early_exit = early_exit
+        # Cascade names that produced the last result (for debugging/benchmarks)
+        self.last_cascades = []
+
+    def available(self):
+        return any(not cascade.empty() for _, cascade, _ in self.cascades)
+
+    def _run_cascade(self, cascade, gray, min_neighbors):
+        size = (self.min_size, self.min_size)
+        if hasattr(cascade, 'detectMultiScale3'):
+            boxes, _, weights = cascade.detectMultiScale3(
+                gray, scaleFactor=self.scale_factor, minNeighbors=min_neighbors,
+                minSize=size, outputRejectLevels=True
+            )
+            if len(boxes) == 0:
+                return [], []
+            return [list(b) for b in boxes], [float(w) for w in np.ravel(weights)]
+        boxes = cascade.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                         minNeighbors=min_neighbors, minSize=size)
+        return [list(b) for b in boxes], [1.0] * len(boxes)
+
+    def detect_boxes(self, gray):
+        """Return ([[x, y, w, h], ...], [score, ...]), deduplicated and best first"""
+        boxes, scores = [], []
+        self.last_cascades = []
+        for cascade_file, cascade, min_neighbors in self.cascades:
+            if cascade.empty():
+                continue
+            found, found_scores = self._run_cascade(cascade, gray, min_neighbors)
+            if found:
+                boxes.extend(found)
+                scores.extend(found_scores)
+                self.last_cascades.append(cascade_file)
+                if self.early_exit:
+                    break
+        if not boxes:
+            return [], []
+        keep = non_max_suppression(boxes, scores, self.nms_iou)
+        return [[int(v) for v in boxes[i]] for i in keep], [scores[i] for i in keep]
+
+    def detect(self, bgr, rgb):
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape[:2]
+        boxes, _ = self.detect_boxes(gray)
+        return [_xywh_to_trbl(box, w, h) for box in boxes]
+
+    def describe(self):
+        return {'name': self.name, 'early_exit': self.early_exit, 'nms_iou': self.nms_iou}
+
+
+class YuNetBackend(DetectorBackend):
+    """OpenCV DNN YuNet (cv2.FaceDetectorYN, OpenCV >= 4.5.4) ONNX model on CPU"""
+
+    name = 'yunet'
+    DEFAULT_MODEL = os.path.join(MODELS_PATH, 'face_detection_yunet_2023mar.onnx')
+
+    def __init__(self, model_path=None, score_threshold=0.7, nms_iou=0.3):
+        self.model_path = model_path or self.DEFAULT_MODEL
+        self.score_threshold = score_threshold
+        self.nms_iou = nms_iou
+        self._detector = None
+        self._input_size = None
+
+    def available(self):
+        return hasattr(cv2, 'FaceDetectorYN') and os.path.exists(self.model_path)
+
+    def detect(self, bgr, rgb):
+        h, w = bgr.shape[:2]
+        if self._detector is None:
+            self._detector = cv2.FaceDetectorYN.create(
+                self.model_path, '', (w, h), self.score_threshold, self.nms_iou, 50
+            )
+            self._input_size = (w, h)
+        elif self._input_size != (w, h):
+            self._detector.setInputSize((w, h))
+            self._input_size = (w, h)
+        _, faces = self._detector.detect(bgr)
+        if faces is None:
+            return []
+        return [_xywh_to_trbl(face, w, h) for face in faces]
+
+    def describe(self):
+        return {'name': self.name, 'model': os.path.basename(self.model_path),
+                'score_threshold': self.score_threshold}
+
+
+class SsdBackend(DetectorBackend):
+    """OpenCV DNN ResNet-10 SSD (res10_300x300) face detector on CPU"""
+
+    name = 'ssd'
+    DEFAULT_MODEL = os.path.join(MODELS_PATH, 'res10_300x300_ssd_iter_140000.caffemodel')
+    DEFAULT_CONFIG = os.path.join(MODELS_PATH, 'deploy.prototxt')
+
+    def __init__(self, model_path=None, config_path=None, score_threshold=0.6, input_size=300):
+        self.model_path = model_path or self.DEFAULT_MODEL
+        self.config_path = config_path if config_path is not None else self.DEFAULT_CONFIG
+        self.score_threshold = score_threshold
+        self.input_size = input_size
+        self._net = None
+
+    def available(self):
+        if not os.path.exists(self.model_path):
+            return False
+        # ONNX exports carry their own graph; Caffe weights need the prototxt.
+        return self.model_path.endswith('.onnx') or os.path.exists(self.config_path)
+
+    def detect(self, bgr, rgb):
+        if self._net is None:
+            config = '' if self.model_path.endswith('.onnx') else self.config_path
+            self._net = cv2.dnn.readNet(self.model_path, config)
+            self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        h, w = bgr.shape[:2]
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        self._net.setInput(blob)
+        detections = self._net.forward().reshape(-1, 7)
+        locations = []
+        for det in detections:
+            if float(det[2]) < self.score_threshold:
+                continue
+            x1, y1, x2, y2 = det[3] * w, det[4] * h, det[5] * w, det[6] * h
+            locations.append(_xywh_to_trbl((x1, y1, x2 - x1, y2 - y1), w, h))
+        return [loc for loc in locations if loc[2] > loc[0] and loc[1] > loc[3]]
+
+    def describe(self):
+        return {'name': self.name, 'model': os.path.basename(self.model_path),
+                'score_threshold': self.score_threshold}
+
+
+DETECTOR_BACKENDS = {
+    'hog': HogBackend,
+    'haar': HaarBackend,
+    'haar_multi': MultiCascadeHaarBackend,
+    'yunet': YuNetBackend,
+    'ssd': SsdBackend,
+}
+
+# modelOptimization -> backends to try in order (first available wins).
+OPTIMIZATION_BACKENDS = {
+    'speed': ('yunet', 'ssd', 'haar'),
+    'balanced': ('hog',),
+    'accuracy': ('hog',),
+}
+
+
+def create_detector_backend(name, **options):
+    """Build a backend by name; falls back to HOG (always available) when it cannot run here"""
+    factory = DETECTOR_BACKENDS.get(str(name).lower())
+    if factory is None:
+        print(f"⚠️  Unknown detector backend '{name}', using hog")
+        return HogBackend()
+    backend = factory(**options)
+    if not backend.available():
+        print(f"⚠️  Detector backend '{name}' unavailable (model missing?), using hog")
+        return HogBackend()
+    return backend
+
+
+def backend_for_optimization(model_optimization, override='auto'):
+    """Resolve the detector for a modelOptimization setting, honouring an explicit override"""
+    if override and override != 'auto':
+        return create_detector_backend(override)
+    for name in OPTIMIZATION_BACKENDS.get(str(model_optimization), ('hog',)):
+        backend = DETECTOR_BACKENDS[name]()
+        if backend.available():
+            return backend
+    return HogBackend()
@@ -0,0 +1,202 @@
+# face_detection/embedding_backends.py
+# Interchangeable face embedding models. Each backend has a model_id that tags every gallery
+# built with it (encodings from different models are not comparable and must never be mixed),
+# plus its own distance tolerance, margin and distance -> confidence scale.
+
+import hashlib
+import os
+import cv2
+import numpy as np
+import face_recognition
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+MODELS_PATH = os.path.join(BASE_PATH, 'models')
+
+# ArcFace-style 112x112 alignment targets: left eye, right eye, nose tip, mouth left, mouth right
+# (image left/right, i.e. face_recognition's 'left_eye' is the first point).
+ALIGN_REFERENCE_112 = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+], dtype=np.float32)
+
+
+class EmbeddingBackend:
+    """Base class: encode(rgb, locations, landmarks=None) -> [vector, ...] (one per location)"""
+
+    name = 'base'
+    model_id = 'base'
+    # None means "use FaceDetector.recognition_tolerance" (the recognitionDistance setting).
+    tolerance = None
+    margin = 0.06
+    # confidence = 1 - distance * distance_scale, keeping the 0.6 raw == 100% display mapping
+    # roughly comparable across models.
+    distance_scale = 1.0
+
+    def available(self):
+        return True
+
+    def encode(self, rgb, locations, landmarks=None):
+        raise NotImplementedError
+
+    def confidence(self, distance):
+        return 1.0 - float(distance) * self.distance_scale
+
+    def describe(self):
+        return {'name': self.name, 'model_id': self.model_id, 'tolerance': self.tolerance,
+                'margin': self.margin}
+
+
+class DlibEmbeddingBackend(EmbeddingBackend):
+    """face_recognition / dlib ResNet-34, 128-D (the original encoder)"""
+
+    name = 'dlib'
+    model_id = 'dlib_resnet34_128'
+
+    def __init__(self, margin=0.06, num_jitters=1):
+        self.margin = margin
+        self.num_jitters = num_jitters
+
+    def encode(self, rgb, locations, landmarks=None):
+        if not locations:
+            return []
+        return face_recognition.face_encodings(rgb, locations, num_jitters=self.num_jitters)
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """ONNX Runtime CPU embedding model (e.g. MobileFaceNet, 112x112 aligned input).
+
+    Faces are aligned on eye/nose/mouth landmarks, normalized to [-1, 1] and run as one batch
+    (or one by one if the model has a fixed batch of 1). Outputs are L2-normalized, so
+    distances fall in [0, 2].
+    """
+
+    name = 'onnx'
+    DEFAULT_MODEL = os.path.join(MODELS_PATH, 'mobilefacenet.onnx')
+
+    def __init__(self, model_path=None, threads=4, tolerance=1.0, margin=0.08, distance_scale=0.5):
+        self.model_path = model_path or self.DEFAULT_MODEL
+        self.threads = max(1, int(threads))
+        self.tolerance = tolerance
+        self.margin = margin
+        self.distance_scale = distance_scale
+        self._session = None
+        self._input_name = None
+        self._input_size = (112, 112)
+        self._nchw = True
+        self._fixed_batch = False
+        self.model_id = f"onnx_{os.path.splitext(os.path.basename(self.model_path))[0]}"
+        if os.path.exists(self.model_path):
+            # Retrained/replaced weights under the same name must not match an old gallery.
+            self.model_id += '_' + _file_digest(self.model_path)
+
+    def available(self):
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            return False
+        return os.path.exists(self.model_path)
+
+    def _ensure_session(self):
+        if self._session is not None:
+            return
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(self.model_path, sess_options=options,
+                                             providers=['CPUExecutionProvider'])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        shape = list(model_input.shape)
+        if len(shape) == 4:
+            self._nchw = shape[1] == 3
+            h, w = (shape[2], shape[3]) if self._nchw else (shape[1], shape[2])
+            if isinstance(h, int) and isinstance(w, int):
+                self._input_size = (w, h)
+            self._fixed_batch = isinstance(shape[0], int) and shape[0] == 1
+
+    def _align(self, rgb, location, landmarks):
+        """Warp one face to the model input size; falls back to a padded box crop"""
+        w, h = self._input_size
+        reference = ALIGN_REFERENCE_112 * np.array([w / 112.0, h / 112.0], dtype=np.float32)
+        if landmarks:
+            src, dst = [], []
+            points = (
+                ('left_eye', None, 0), ('right_eye', None, 1), ('nose_tip', None, 2),
+                ('top_lip', 0, 3), ('top_lip', 6, 4),
+            )
+            for key, index, ref_index in points:
+                pts = landmarks.get(key)
+                if not pts or (index is not None and len(pts) <= index):
+                    continue
+                src.append(pts[index] if index is not None else np.mean(np.array(pts), axis=0))
+                dst.append(reference[ref_index])
+            if len(src) >= 3:
+                matrix, _ = cv2.estimateAffinePartial2D(np.array(src, dtype=np.float32),
+                                                        np.array(dst, dtype=np.float32), method=cv2.LMEDS)
+                if matrix is not None:
+                    return cv2.warpAffine(rgb, matrix, (w, h), borderValue=0)
+        top, right, bottom, left = location
+        pad = int(0.1 * max(1, bottom - top))
+        crop = rgb[max(0, top - pad):bottom + pad, max(0, left - pad):right + pad]
+        if crop.size == 0:
+            return np.zeros((h, w, 3), dtype=np.uint8)
+        return cv2.resize(crop, (w, h), interpolation=cv2.INTER_AREA)
+
+    def encode(self, rgb, locations, landmarks=None):
+        if not locations:
+            return []
+        self._ensure_session()
+        if landmarks is None:
+            try:
+                landmarks = face_recognition.face_landmarks(rgb, locations, model='large')
+            except Exception:
+                landmarks = []
+        faces = [
+            self._align(rgb, loc, landmarks[i] if i < len(landmarks) else None)
+            for i, loc in enumerate(locations)
+        ]
+        batch = (np.stack(faces).astype(np.float32) - 127.5) / 128.0
+        if self._nchw:
+            batch = batch.transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch)
+        if self._fixed_batch:
+            outputs = np.concatenate([
+                self._session.run(None, {self._input_name: batch[i:i + 1]})[0] for i in range(len(batch))
+            ])
+        else:
+            outputs = self._session.run(None, {self._input_name: batch})[0]
+        outputs = outputs.reshape(len(faces), -1).astype(np.float32)
+        norms = np.linalg.norm(outputs, axis=1, keepdims=True)
+        return list(outputs / np.maximum(norms, 1e-10))
+
+    def describe(self):
+        info = super().describe()
+        info.update({'model': os.path.basename(self.model_path), 'threads': self.threads})
+        return info
+
+
+def _file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:8]
+
+
+def create_embedding_backend(name='dlib', **options):
+    """Build an embedding backend by name; falls back to dlib when it cannot run here"""
+    name = str(name or 'dlib').lower()
+    if name == 'onnx':
+        backend = OnnxEmbeddingBackend(**options)
+        if backend.available():
+            return backend
+        print(f"⚠️  ONNX embedding backend unavailable (onnxruntime or {backend.model_path} missing), using dlib")
+        return DlibEmbeddingBackend()
+    if name != 'dlib':
+        print(f"⚠️  Unknown embedding backend '{name}', using dlib")
+    return DlibEmbeddingBackend(**{k: v for k, v in options.items() if k in ('margin', 'num_jitters')})
@@ -3,37 +3,151 @@
 # will see if FR lib give better performance or not
 
 import cv2
-import os
 import numpy as np
 import face_recognition
 from datetime import datetime
+import threading
 import time
+from face_detection.detector_backends import HogBackend, MultiCascadeHaarBackend
+from face_detection.embedding_backends import DlibEmbeddingBackend
+from face_detection.gallery_index import GalleryIndex
 
 class FaceDetector:
 
-    def __init__(self, known_face_encodings=None, known_face_names=None, recognition_tolerance=0.6):
-        base_path = "./face_detection/"
+    def __init__(self, known_face_encodings=None, known_face_names=None, recognition_tolerance=0.6,
+                 embedding_backend=None, gallery_model_id=None, gallery_dtype='float32'):
+        # Haar cascades (frontal, alt2, alt, profile) fused with early exit + NMS
+        self.haar_detector = MultiCascadeHaarBackend()
+        # Scores for the boxes returned by the last detect_faces call (best first)
+        self.last_detection_scores = []
         
-        # Initialize Haar cascades
-        self.frontal_cascade = cv2.CascadeClassifier(os.path.join(base_path, "haarcascade_frontalface_default.xml"))
-        self.profile_cascade = cv2.CascadeClassifier(os.path.join(base_path, "haarcascade_profileface.xml"))
-        self.alt_cascade = cv2.CascadeClassifier(os.path.join(base_path, "haarcascade_frontalface_alt.xml"))
-        self.alt2_cascade = cv2.CascadeClassifier(os.path.join(base_path, "haarcascade_frontalface_alt2.xml"))
+        # Embedding model; the gallery must have been built with the same model_id
+        self.embedding_backend = embedding_backend or DlibEmbeddingBackend()
         
-        # Face recognition data
-        self.known_face_encodings = known_face_encodings or []
-        self.known_face_names = known_face_names or []
+        # Face recognition data: one GalleryIndex snapshot (float64/float32/float16/int8 storage)
+        self.gallery_dtype = gallery_dtype
+        self.gallery = GalleryIndex(dtype=gallery_dtype, model_id=self.embedding_backend.model_id)
+        self.gallery_model_id = self.embedding_backend.model_id
         self.recognition_tolerance = recognition_tolerance
+        # Encodings of the faces matched in the last detect_and_recognize_faces call
+        self.last_encodings = []
+        # Landmarks (original frame coordinates, None if unavailable) per result of that call
+        self.last_landmarks = []
+        if known_face_encodings is not None and len(known_face_encodings):
+            self.update_known_faces(known_face_encodings, known_face_names or [], gallery_model_id)
         # Use distance-based threshold (face_recognition default is 0.6)
         self.min_confidence_threshold = 0.4  # 1 - 0.6
         self.target_width = 960
+        # Detector used by detect_and_recognize_faces (see detector_backends.py)
+        self.detector_backend = HogBackend()
         self.last_recognized = {'name': None, 'ts': 0.0}
+        # Per-thread: camera workers, the hub and benchmarks call detect_and_recognize_faces
+        # concurrently and each reads back the timings of its own call.
+        self._thread_state = threading.local()
+        # Edge mode: a HubClient matching against the hub's master gallery; None, or a hub
+        # that does not answer, means the local gallery is used.
+        self.remote_matcher = None
 
-    def update_known_faces(self, known_face_encodings, known_face_names):
-        """Update the known faces for recognition"""
-        self.known_face_encodings = known_face_encodings
-        self.known_face_names = known_face_names
-        print(f"📊 Updated face detector with {len(known_face_names)} known faces")
+    @property
+    def last_stage_timings(self):
+        """Seconds spent per stage in this thread's last detect_and_recognize_faces call (for metrics)"""
+        return getattr(self._thread_state, 'stage_timings', {})
+
+    def update_known_faces(self, known_face_encodings, known_face_names, model_id=None):
+        """Update the known faces for recognition (model_id: embedding model the gallery was built with)"""
+        model_id = model_id or self.embedding_backend.model_id
+        if model_id != self.embedding_backend.model_id:
+            raise ValueError(
+                f"Gallery built with {model_id} cannot be used with {self.embedding_backend.model_id}"
+            )
+        self.set_gallery(GalleryIndex(known_face_encodings, known_face_names, self.gallery_dtype, model_id))
+
+    def set_gallery(self, gallery):
+        """Swap in a prebuilt GalleryIndex (e.g. one mapped from a GalleryStore); readers see the old or new one whole"""
+        if gallery.model_id != self.embedding_backend.model_id:
+            raise ValueError(
+                f"Gallery built with {gallery.model_id} cannot be used with {self.embedding_backend.model_id}"
+            )
+        self.gallery = gallery
+        self.gallery_model_id = gallery.model_id
+        source = f"generation {gallery.generation}" if gallery.generation is not None else "in memory"
+        print(f"📊 Updated face detector with {len(gallery)} known faces ({gallery.dtype}, {gallery.nbytes // 1024} KiB, {source})")
+
+    @property
+    def known_face_names(self):
+        return self.gallery.names
+
+    @property
+    def known_face_encodings(self):
+        return self.gallery.matrix
+
+    def set_embedding_backend(self, backend):
+        """Swap the embedding model. Returns True if the gallery was dropped and must be reloaded."""
+        self.embedding_backend = backend
+        if backend.model_id == self.gallery_model_id:
+            return False
+        print(f"🧬 Embedding backend: {backend.describe()} - gallery must be rebuilt")
+        self.gallery = GalleryIndex(dtype=self.gallery_dtype, model_id=backend.model_id)
+        self.gallery_model_id = backend.model_id
+        return True
+
+    @property
+    def effective_tolerance(self):
+        """Distance tolerance for the active embedding model"""
+        if self.embedding_backend.tolerance is not None:
+            return self.embedding_backend.tolerance
+        return self.recognition_tolerance
+
+    def match_encoding(self, face_encoding, gallery=None):
+        """Match one encoding against the gallery (or another GalleryIndex, e.g. a float64 baseline).
+
+        Returns (name, confidence, distance, margin, reason); name is "Unknown" when the best
+        distance is over tolerance or the next-best different person is within the margin.
+        """
+        gallery = gallery if gallery is not None else self.gallery
+        if len(gallery) == 0:
+            return "Unknown", 0.0, None, None, 'empty'
+        return self._decide(gallery, gallery.distances(face_encoding))
+
+    def match_encodings(self, face_encodings, gallery=None):
+        """match_encoding for a batch of probes with one distance matrix (hub mode batches edge requests)"""
+        gallery = gallery if gallery is not None else self.gallery
+        if len(gallery) == 0:
+            return [("Unknown", 0.0, None, None, 'empty') for _ in face_encodings]
+        if len(face_encodings) == 0:
+            return []
+        return [self._decide(gallery, row) for row in gallery.distances_batch(face_encodings)]
+
+    def _decide(self, gallery, face_distances):
+        backend = self.embedding_backend
+        tolerance = self.effective_tolerance
+        
+        # Require clear winner: compare against the next-best DIFFERENT person.
+        # Multi-angle registrations add many encodings for the same person, which
+        # would otherwise collapse the margin and incorrectly label valid matches unknown.
+        min_distance_index, min_distance, second_min_distance = gallery.best_two(face_distances)
+        
+        # Calculate confidence (distance-based)
+        confidence = backend.confidence(min_distance)
+        
+        within_tolerance = min_distance <= tolerance
+        if second_min_distance is None:
+            # Only one employee loaded: no second-best to compare
+            margin = 1.0
+            clear_winner = True
+        else:
+            margin = second_min_distance - min_distance
+            clear_winner = margin >= backend.margin  # avoid confusing similar-looking faces
+        if within_tolerance and clear_winner:
+            return gallery.name_at(min_distance_index), confidence, min_distance, margin, 'match'
+        reason = "margin" if within_tolerance and not clear_winner else "tolerance"
+        return "Unknown", confidence, min_distance, margin, reason
+
+    def set_detector_backend(self, backend):
+        """Swap the detector used by detect_and_recognize_faces"""
+        if backend.describe() != self.detector_backend.describe():
+            print(f"🔍 Face detector backend: {backend.describe()}")
+        self.detector_backend = backend
 
     # Return the ROI of the face
     def detect_faces(self, frame):
@@ -57,28 +171,17 @@ class FaceDetector:
 
         ## now supporting various face angles
         ## distance needs to be tested // TODO //
-        frontal_faces = self.frontal_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-        profile_faces = self.profile_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-        alt_faces = self.alt_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(30, 30))
-        alt2_faces = self.alt2_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-        
-        # Convert numpy arrays to lists and combine all detected faces
-        all_faces = []
-        if len(frontal_faces) > 0:
-            all_faces.extend(frontal_faces.tolist())
-        if len(profile_faces) > 0:
-            all_faces.extend(profile_faces.tolist())
-        if len(alt_faces) > 0:
-            all_faces.extend(alt_faces.tolist())
-        if len(alt2_faces) > 0:
-            all_faces.extend(alt2_faces.tolist())
+        # Slower cascades only run when the frontal one finds nothing; overlapping
+        # boxes are merged so each face comes back once, best score first.
+        all_faces, self.last_detection_scores = self.haar_detector.detect_boxes(gray)
 
-        print(f"Frontal faces: {len(frontal_faces)}")
-        print(f"Total faces detected: {len(all_faces)}")
+        print(f"Total faces detected: {len(all_faces)} ({', '.join(self.haar_detector.last_cascades) or 'none'})")
         return all_faces
 
-    def detect_and_recognize_faces(self, frame):
-        """Detect faces and identify them with names and confidence scores"""
+    def detect_and_recognize_faces(self, frame, camera_id=None):
+        """Detect faces and identify them with names and confidence scores (camera_id tags hub requests)"""
+        timings = {}
+        self._thread_state.stage_timings = timings
         if frame is None or frame.size == 0:
             return []
         
@@ -95,27 +198,37 @@ class FaceDetector:
             target_width = int(self.target_width or 960)
             scale = 1.0
             resized = frame
+            t0 = time.perf_counter()
             if w > target_width:
                 scale = target_width / float(w)
                 new_h = max(1, int(h * scale))
                 resized = cv2.resize(frame, (target_width, new_h), interpolation=cv2.INTER_AREA)
+            t1 = time.perf_counter()
+            timings['resize'] = t1 - t0
             
             # Convert BGR to RGB for face_recognition library
             rgb_image = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+            t2 = time.perf_counter()
+            timings['color_convert'] = t2 - t1
             
-            # Find faces using face_recognition library (more accurate than Haar cascades)
-            face_locations = face_recognition.face_locations(rgb_image)
-            face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+            # Find faces with the configured backend (HOG by default)
+            face_locations = self.detector_backend.detect(resized, rgb_image)
+            t3 = time.perf_counter()
+            timings['detect'] = t3 - t2
             
             # Get landmarks to filter for frontal faces only (reject profile/side view)
             landmarks_list = []
-            try:
-                landmarks_list = face_recognition.face_landmarks(rgb_image, face_locations, model='large')
-            except Exception:
-                pass  # If landmarks fail, process all faces (fail open)
+            if face_locations:
+                try:
+                    landmarks_list = face_recognition.face_landmarks(rgb_image, face_locations, model='large')
+                except Exception:
+                    pass  # If landmarks fail, process all faces (fail open)
+                t4 = time.perf_counter()
+                timings['landmarks'] = t4 - t3
             
-            results = []
-            for i, (face_location, face_encoding) in enumerate(zip(face_locations, face_encodings)):
+            # Drop side/profile faces before encoding so they cost no embedding time
+            frontal = []
+            for i, face_location in enumerate(face_locations):
                 # Filter: only accept faces facing the camera (reject side/profile view)
                 top, right, bottom, left = face_location
                 if i < len(landmarks_list):
@@ -136,51 +249,52 @@ class FaceDetector:
                                 continue  # Skip this face - not facing camera
                     except Exception:
                         pass  # On error, allow face (fail open)
-                # Calculate distances to all known faces
-                if self.known_face_encodings:
-                    face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                    min_distance_index = np.argmin(face_distances)
-                    min_distance = face_distances[min_distance_index]
-                    
-                    # Calculate confidence (distance-based)
-                    confidence = 1.0 - min_distance
-                    
-                    # Require clear winner: compare against the next-best DIFFERENT person.
-                    # Multi-angle registrations add many encodings for the same person, which
-                    # would otherwise collapse the margin and incorrectly label valid matches unknown.
-                    within_tolerance = min_distance <= self.recognition_tolerance
-                    if len(face_distances) > 1:
-                        sorted_indices = np.argsort(face_distances)
-                        best_name = self.known_face_names[min_distance_index]
-                        second_min_distance = None
-                        for idx in sorted_indices:
-                            if idx == min_distance_index:
-                                continue
-                            if self.known_face_names[idx] != best_name:
-                                second_min_distance = float(face_distances[idx])
-                                break
-
-                        if second_min_distance is None:
-                            # Only one employee loaded (or all nearest encodings are same person).
-                            margin = 1.0
-                            clear_winner = True
-                        else:
-                            margin = second_min_distance - min_distance
-                            clear_winner = margin >= 0.06  # require gap to avoid confusing similar-looking faces
-                    else:
-                        margin = 1.0
-                        clear_winner = True  # only one known face: no second-best to compare
-                    if within_tolerance and clear_winner:
-                        name = self.known_face_names[min_distance_index]
-                        print(f"🔍 Face {i+1}: {name} (confidence: {confidence:.3f}, distance: {min_distance:.3f}, margin: {margin:.3f})")
-                    else:
-                        name = "Unknown"
-                        reason = "margin" if within_tolerance and not clear_winner else "tolerance"
-                        print(f"🔍 Face {i+1}: Unknown (best distance: {min_distance:.3f}, tolerance: {self.recognition_tolerance}, {reason})")
+                frontal.append(i)
+            
+            frontal_locations = [face_locations[i] for i in frontal]
+            matcher = self.remote_matcher
+            remote = None
+            face_encodings = []
+            if matcher is not None and frontal and matcher.payload == 'crop':
+                # The hub embeds the crops itself: no encoding here while it answers
+                t_hub = time.perf_counter()
+                remote = matcher.match_crops(rgb_image, frontal_locations, camera_id)
+                timings['hub'] = time.perf_counter() - t_hub
+            if remote is None and frontal:
+                t5 = time.perf_counter()
+                face_encodings = self.embedding_backend.encode(
+                    rgb_image,
+                    frontal_locations,
+                    [landmarks_list[i] for i in frontal] if len(landmarks_list) == len(face_locations) else None
+                )
+                timings['encode'] = time.perf_counter() - t5
+                if matcher is not None and matcher.payload == 'embedding':
+                    t_hub = time.perf_counter()
+                    remote = matcher.match_embeddings(face_encodings, self.embedding_backend.model_id, camera_id)
+                    timings['hub'] = time.perf_counter() - t_hub
+            self.last_encodings = list(face_encodings)
+            
+            match_time = 0.0
+            results = []
+            self.last_landmarks = []
+            for k, i in enumerate(frontal):
+                face_location = face_locations[i]
+                if remote is not None:
+                    # Matched by the hub against the master gallery
+                    name, confidence, min_distance, margin, reason = remote[k]
                 else:
-                    name = "Unknown"
-                    confidence = 0.0
+                    # Offline or standalone: calculate distances to all locally known faces
+                    match_start = time.perf_counter()
+                    name, confidence, min_distance, margin, reason = self.match_encoding(face_encodings[k])
+                    match_time += time.perf_counter() - match_start
+                if reason == 'match':
+                    print(f"🔍 Face {i+1}: {name} (confidence: {confidence:.3f}, distance: {min_distance:.3f}, margin: {margin:.3f})")
+                elif reason == 'empty':
                     print(f"🔍 Face {i+1}: Unknown (no known faces loaded)")
+                elif min_distance is None:
+                    print(f"🔍 Face {i+1}: Unknown ({reason})")
+                else:
+                    print(f"🔍 Face {i+1}: Unknown (best distance: {min_distance:.3f}, tolerance: {self.effective_tolerance}, {reason})")
                 
                 # Get face location for bounding box (scale back to original)
                 top, right, bottom, left = face_location
@@ -194,9 +308,19 @@ class FaceDetector:
                 if name != "Unknown":
                     self.last_recognized = {'name': name, 'ts': time.time()}
                 
+                landmarks = landmarks_list[i] if i < len(landmarks_list) else None
+                if landmarks and scale != 1.0:
+                    landmarks = {
+                        key: [(int(x * inv_scale), int(y * inv_scale)) for x, y in points]
+                        for key, points in landmarks.items()
+                    }
+                self.last_landmarks.append(landmarks)
                 results.append({
                     'name': name,
                     'confidence': round(confidence, 3),
+                    # Best distance and gap to the next-best person (None without a gallery)
+                    'distance': round(float(min_distance), 4) if min_distance is not None else None,
+                    'margin': round(float(margin), 4) if margin is not None else None,
                     'timestamp': datetime.now().isoformat(),
                     'location': {
                         'top': top,
@@ -207,6 +331,8 @@ class FaceDetector:
                     'face_id': i  # Unique identifier for this face in the frame
                 })
             
+            if face_encodings and remote is None:
+                timings['match'] = match_time
             if results:
                 recognized_names = [r['name'] for r in results if r['name'] != 'Unknown']
                 if recognized_names:
@@ -235,50 +361,30 @@ class FaceDetector:
             # Convert BGR to RGB for face_recognition library
             rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             
+            # Convert Haar format (x,y,w,h) to face_recognition format (top,right,bottom,left)
+            locations = [(y, x + w, y + h, x) for (x, y, w, h) in face_locations_haar]
+            # One encoding call for all boxes, at the known locations (no re-detection per crop)
+            encodings = self.embedding_backend.encode(rgb_image, locations)
+            
             results = []
-            for i, (x, y, w, h) in enumerate(face_locations_haar):
-                # Convert Haar format (x,y,w,h) to face_recognition format (top,right,bottom,left)
-                top, right, bottom, left = y, x + w, y + h, x
-                
-                # Extract face region
-                face_image = rgb_image[top:bottom, left:right]
-                
-                # Get face encoding
-                face_encodings = face_recognition.face_encodings(face_image)
-                
-                if face_encodings:
-                    face_encoding = face_encodings[0]
-                    
-                    # Compare with known faces
-                    matches = face_recognition.compare_faces(
-                        self.known_face_encodings, 
-                        face_encoding, 
-                        tolerance=self.recognition_tolerance
-                    )
-                    
-                    name = "Unknown"
+            for i, ((top, right, bottom, left), face_encoding) in enumerate(zip(locations, encodings)):
+                # Compare with known faces
+                name, confidence, _, _, _ = self.match_encoding(face_encoding)
+                if name == "Unknown":
                     confidence = 0.0
-                    
-                    if True in matches:
-                        first_match_index = matches.index(True)
-                        name = self.known_face_names[first_match_index]
-                        
-                        # Calculate confidence
-                        face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                        confidence = 1.0 - face_distances[first_match_index]
-                    
-                    results.append({
-                        'name': name,
-                        'confidence': round(confidence, 3),
-                        'timestamp': datetime.now().isoformat(),
-                        'location': {
-                            'top': top,
-                            'right': right,
-                            'bottom': bottom,
-                            'left': left
-                        },
-                        'face_id': i
-                    })
+                
+                results.append({
+                    'name': name,
+                    'confidence': round(confidence, 3),
+                    'timestamp': datetime.now().isoformat(),
+                    'location': {
+                        'top': top,
+                        'right': right,
+                        'bottom': bottom,
+                        'left': left
+                    },
+                    'face_id': i
+                })
             
             if results:
                 recognized_names = [r['name'] for r in results if r['name'] != 'Unknown']
@@ -0,0 +1,157 @@
+# face_detection/frame_source.py
+# Replay recorded frames (video file, image directory, single image or raw frame dump)
+# in place of a camera. Used by the offline benchmark and by CameraManager's replay backend.
+
+import os
+import struct
+import time
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Raw frame dump: file header, then per frame a record header followed by the BGR pixels.
+FRAME_DUMP_EXTENSION = '.fdump'
+FRAME_DUMP_MAGIC = b'FDMP\x01'
+FRAME_DUMP_RECORD = struct.Struct('<dHHB')  # capture timestamp (s), width, height, channels
+
+
+class FrameDumpWriter:
+    """Appends frames to a raw dump with their capture timestamps, for exact replay later"""
+
+    def __init__(self, path):
+        self.path = path
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab')
+        if new_file:
+            self._file.write(FRAME_DUMP_MAGIC)
+
+    def write(self, frame, timestamp=None):
+        if frame is None or frame.ndim not in (2, 3):
+            return
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self._file.write(FRAME_DUMP_RECORD.pack(timestamp if timestamp is not None else time.time(),
+                                                width, height, channels))
+        self._file.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class FileFrameSource:
+    """Yields BGR frames from a video file, a directory of images, a single image or a raw frame dump"""
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.loop = loop
+        self.kind = None
+        self.frame_name = None  # label key of the last frame: file name, or frame index for video
+        # Media time (s) of the last frame: recorded time for dumps, index / fps for video,
+        # None for images (they carry no timing).
+        self.frame_timestamp = None
+        self._capture = None
+        self._dump = None
+        self._dump_t0 = None
+        self._images = []
+        self._index = 0
+
+    def open(self):
+        if os.path.isdir(self.path):
+            self._images = sorted(
+                f for f in os.listdir(self.path) if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            self.kind = 'images'
+            return bool(self._images)
+        if self.path.lower().endswith(IMAGE_EXTENSIONS):
+            self._images = [os.path.basename(self.path)]
+            self.path = os.path.dirname(self.path) or '.'
+            self.kind = 'images'
+            return os.path.exists(os.path.join(self.path, self._images[0]))
+        if self.path.lower().endswith(FRAME_DUMP_EXTENSION):
+            self.kind = 'dump'
+            try:
+                self._dump = open(self.path, 'rb')
+            except OSError:
+                return False
+            if self._dump.read(len(FRAME_DUMP_MAGIC)) != FRAME_DUMP_MAGIC:
+                self.close()
+                return False
+            return True
+        self._capture = cv2.VideoCapture(self.path)
+        self.kind = 'video'
+        return self._capture.isOpened()
+
+    @property
+    def frame_count(self):
+        if self.kind == 'images':
+            return len(self._images)
+        if self._capture is not None:
+            return int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        return 0
+
+    @property
+    def source_fps(self):
+        if self._capture is not None:
+            return float(self._capture.get(cv2.CAP_PROP_FPS) or 0.0)
+        return 0.0
+
+    def _read_dump_frame(self):
+        header = self._dump.read(FRAME_DUMP_RECORD.size)
+        if len(header) < FRAME_DUMP_RECORD.size and self.loop and self._index:
+            self._dump.seek(len(FRAME_DUMP_MAGIC))
+            self._index = 0
+            header = self._dump.read(FRAME_DUMP_RECORD.size)
+        if len(header) < FRAME_DUMP_RECORD.size:
+            return None
+        timestamp, width, height, channels = FRAME_DUMP_RECORD.unpack(header)
+        data = self._dump.read(width * height * channels)
+        if len(data) < width * height * channels:
+            return None  # truncated final record
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        frame = np.frombuffer(data, dtype=np.uint8).reshape(shape).copy()
+        if self._dump_t0 is None:
+            self._dump_t0 = timestamp
+        self.frame_timestamp = timestamp - self._dump_t0
+        self.frame_name = str(self._index)
+        self._index += 1
+        return frame
+
+    def read(self):
+        """Return the next frame, or None at the end (after rewinding if loop is set)"""
+        if self.kind == 'dump':
+            return self._read_dump_frame() if self._dump else None
+        if self.kind == 'images':
+            if self._index >= len(self._images):
+                if not self.loop or not self._images:
+                    return None
+                self._index = 0
+            name = self._images[self._index]
+            self._index += 1
+            frame = cv2.imread(os.path.join(self.path, name))
+            self.frame_name = name
+            return frame
+        if self._capture is None:
+            return None
+        ok, frame = self._capture.read()
+        if not ok and self.loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            self._index = 0
+            ok, frame = self._capture.read()
+        if not ok:
+            return None
+        self.frame_name = str(self._index)
+        fps = self.source_fps
+        self.frame_timestamp = self._index / fps if fps > 0 else None
+        self._index += 1
+        return frame
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+        if self._dump is not None:
+            self._dump.close()
+            self._dump = None
@@ -0,0 +1,227 @@
+# face_detection/gallery.py
+# Load the face gallery (known encodings + names) from a faces directory.
+# Shared by api_server and the offline benchmark so both see the same gallery.
+#
+# Encodings are cached per embedding model in <faces_dir>/.gallery/<model_id>.npz, keyed by
+# image path and mtime, so restarts only encode new or changed images. A cache is only
+# ever read by the model that wrote it: galleries from different models are never mixed.
+#
+# People replicated from another device (gallery_replication.py) have no images here, only
+# their encodings in <faces_dir>/.gallery/replicas/<person>.npz (one array per model). A
+# replica is the newest registration of that person and replaces any local images of them.
+
+import os
+import numpy as np
+import face_recognition
+
+from face_detection.embedding_backends import DlibEmbeddingBackend
+
+GALLERY_CACHE_DIR = '.gallery'
+REPLICA_DIR = 'replicas'
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def _cache_path(faces_dir, model_id):
+    return os.path.join(faces_dir, GALLERY_CACHE_DIR, f"{model_id}.npz")
+
+
+def _load_cache(faces_dir, model_id):
+    """{relative image path: (mtime, encoding)} from this model's cache, {} if absent or stale"""
+    path = _cache_path(faces_dir, model_id)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['model_id']) != model_id:
+                return {}
+            return {
+                str(p): (float(m), e)
+                for p, m, e in zip(data['paths'], data['mtimes'], data['encodings'])
+            }
+    except Exception as e:
+        print(f"⚠️  Ignoring unreadable gallery cache {path}: {e}")
+        return {}
+
+
+def _save_cache(faces_dir, model_id, entries):
+    path = _cache_path(faces_dir, model_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        paths = sorted(entries)
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            model_id=np.array(model_id),
+            paths=np.array(paths),
+            mtimes=np.array([entries[p][0] for p in paths], dtype=np.float64),
+            encodings=np.array([entries[p][1] for p in paths], dtype=np.float32),
+        )
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️  Could not write gallery cache {path}: {e}")
+
+
+def _replica_path(faces_dir, person):
+    return os.path.join(faces_dir, GALLERY_CACHE_DIR, REPLICA_DIR, f"{person}.npz")
+
+
+def save_replica(faces_dir, person, model_id, encodings):
+    """Store a replicated person's encodings for one model (other models' arrays are kept)"""
+    path = _replica_path(faces_dir, person)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = load_replica(faces_dir, person)
+    arrays[model_id] = np.asarray(encodings, dtype=np.float32)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_replica(faces_dir, person, model_id=None):
+    """{model_id: encodings} of a replicated person ({} if none), or one model's array (None if absent)"""
+    path = _replica_path(faces_dir, person)
+    arrays = {}
+    if os.path.exists(path):
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable replica {path}: {e}")
+    return arrays.get(model_id) if model_id is not None else arrays
+
+
+def delete_replica(faces_dir, person):
+    path = _replica_path(faces_dir, person)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def replica_people(faces_dir):
+    directory = os.path.join(faces_dir, GALLERY_CACHE_DIR, REPLICA_DIR)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-len('.npz')] for f in os.listdir(directory) if f.endswith('.npz') and '.tmp' not in f)
+
+
+def encode_face_image(image_path, embedding_backend):
+    """Encoding of the first face in an image file, None if it has no face"""
+    return _encode_image(image_path, embedding_backend)[0]
+
+
+def _encode_image(image_path, embedding_backend):
+    """Return (encoding or None, number of faces found)"""
+    image = face_recognition.load_image_file(image_path)
+    # Faster training load: use HOG with no upsample.
+    face_locations = face_recognition.face_locations(
+        image,
+        number_of_times_to_upsample=0,
+        model='hog'
+    )
+    if not face_locations:
+        return None, 0
+    encoding = embedding_backend.encode(image, face_locations[:1])
+    return (encoding[0] if len(encoding) else None), len(face_locations)
+
+
+def load_face_gallery(faces_dir, embedding_backend=None):
+    """Return (encodings, names) for every face in faces_dir (supports multi-angle registration),
+    encoded with embedding_backend (dlib by default)"""
+    embedding_backend = embedding_backend or DlibEmbeddingBackend()
+    known_face_encodings = []
+    known_face_names = []
+
+    if not os.path.isdir(faces_dir):
+        return known_face_encodings, known_face_names
+
+    cache = _load_cache(faces_dir, embedding_backend.model_id)
+    fresh = {}
+
+    def encode_cached(image_path):
+        rel_path = os.path.relpath(image_path, faces_dir)
+        mtime = os.path.getmtime(image_path)
+        cached = cache.get(rel_path)
+        if cached is not None and cached[0] == mtime:
+            fresh[rel_path] = cached
+            return cached[1], 1
+        encoding, face_count = _encode_image(image_path, embedding_backend)
+        if encoding is not None:
+            fresh[rel_path] = (mtime, np.asarray(encoding, dtype=np.float32))
+        return encoding, face_count
+
+    # Track loaded employees to avoid duplicates
+    loaded_employees = set()
+
+    # First, load faces from employee subdirectories (multi-angle format)
+    for item in os.listdir(faces_dir):
+        item_path = os.path.join(faces_dir, item)
+
+        # Check if it's a directory (employee folder with multiple angles)
+        if os.path.isdir(item_path) and item != GALLERY_CACHE_DIR:
+            employee_name = item
+            angle_count = 0
+
+            # Load all angles for this employee
+            for angle_file in os.listdir(item_path):
+                if angle_file.endswith(IMAGE_EXTENSIONS):
+                    image_path = os.path.join(item_path, angle_file)
+
+                    try:
+                        encoding, _ = encode_cached(image_path)
+                        if encoding is not None:
+                            # Add encoding for each angle to improve recognition
+                            known_face_encodings.append(encoding)
+                            known_face_names.append(employee_name)
+                            angle_count += 1
+                    except Exception as e:
+                        print(f"❌ Error loading angle {angle_file} for {employee_name}: {e}")
+
+            if angle_count > 0:
+                loaded_employees.add(employee_name)
+                print(f"✅ Loaded {angle_count} angles for {employee_name}")
+
+    # Then, load standalone face files (legacy format or main face files)
+    for filename in os.listdir(faces_dir):
+        file_path = os.path.join(faces_dir, filename)
+
+        # Skip if it's a directory (already processed)
+        if os.path.isdir(file_path):
+            continue
+
+        if filename.endswith(IMAGE_EXTENSIONS):
+            name = os.path.splitext(filename)[0]
+
+            # Skip if already loaded from subdirectory
+            if name in loaded_employees:
+                continue
+
+            try:
+                encoding, face_count = encode_cached(file_path)
+                if encoding is None:
+                    if face_count == 0:
+                        print(f"⚠️  No face detected in {filename} - skipping")
+                    else:
+                        print(f"❌ Failed to encode face in {filename}")
+                    continue
+
+                if face_count > 1:
+                    print(f"⚠️  Multiple faces detected in {filename} - using first face")
+
+                known_face_encodings.append(encoding)
+                known_face_names.append(name)
+                print(f"✅ Loaded face: {name}")
+            except Exception as e:
+                print(f"❌ Error loading face {name}: {e}")
+
+    if fresh.keys() != cache.keys() or any(fresh[k][0] != cache[k][0] for k in fresh):
+        _save_cache(faces_dir, embedding_backend.model_id, fresh)
+
+    # Replicated people: their newest encodings replace whatever images of them are here
+    for person in replica_people(faces_dir):
+        encodings = load_replica(faces_dir, person, embedding_backend.model_id)
+        if encodings is None or not len(encodings):
+            continue
+        keep = [i for i, n in enumerate(known_face_names) if n != person]
+        known_face_encodings = [known_face_encodings[i] for i in keep] + list(encodings)
+        known_face_names = [known_face_names[i] for i in keep] + [person] * len(encodings)
+        print(f"✅ Loaded {len(encodings)} replicated encodings for {person}")
+
+    return known_face_encodings, known_face_names
@@ -0,0 +1,238 @@
+# face_detection/gallery_index.py
+# In-memory gallery matrix for matching: contiguous encodings in float64/float32/float16 or
+# int8 (per-dimension symmetric scales), integer person labels plus a name table, and a
+# blocked distance kernel using |g - q|^2 = |g|^2 + |q|^2 - 2 g.q with precomputed norms.
+# Quantized galleries are calibrated against their float64 originals so distances keep
+# the meaning the tolerance/margin thresholds were tuned for.
+
+import numpy as np
+
+GALLERY_DTYPES = ('float64', 'float32', 'float16', 'int8')
+# Rows converted to float32 at a time for float16/int8 galleries (keeps temporaries in cache).
+DISTANCE_BLOCK_ROWS = 2048
+CALIBRATION_PROBES = 128
+
+
+class GalleryIndex:
+    """Immutable gallery snapshot; swap the whole object to update"""
+
+    def __init__(self, encodings=None, names=None, dtype='float32', model_id=None, calibrate=True):
+        if dtype not in GALLERY_DTYPES:
+            raise ValueError(f"Unsupported gallery dtype {dtype!r} (choose from {', '.join(GALLERY_DTYPES)})")
+        self.dtype = dtype
+        self.model_id = model_id
+        names = list(names or [])
+        self._names = names
+        # Generation number when mapped from a GalleryStore (None for in-memory galleries)
+        self.generation = None
+        # Person labels: index into name_table, one per encoding row
+        self.name_table = list(dict.fromkeys(names))
+        lookup = {name: i for i, name in enumerate(self.name_table)}
+        self.labels = np.array([lookup[n] for n in names], dtype=np.int32)
+        self.scales = None
+        # Distance correction fitted by calibrate(): exact ~= slope * quantized + intercept
+        self.calibration = {'slope': 1.0, 'intercept': 0.0}
+
+        source = np.asarray(encodings, dtype=np.float64) if encodings is not None and len(encodings) else \
+            np.empty((0, 0), dtype=np.float64)
+        self.dim = source.shape[1] if source.ndim == 2 else 0
+        self.matrix = self._encode(source)
+        self.sq_norms = np.einsum('ij,ij->i', self._rows(0, len(self)), self._rows(0, len(self))) \
+            if len(self) else np.empty((0,), dtype=np.float32)
+        if calibrate and dtype in ('float16', 'int8') and len(self) > 1:
+            self.calibrate(source)
+
+    @classmethod
+    def from_arrays(cls, matrix, labels, name_table, sq_norms, dtype, model_id=None, scales=None,
+                    calibration=None, generation=None):
+        """Wrap already-encoded arrays (e.g. read-only memory maps) without copying them"""
+        if dtype not in GALLERY_DTYPES:
+            raise ValueError(f"Unsupported gallery dtype {dtype!r} (choose from {', '.join(GALLERY_DTYPES)})")
+        index = cls.__new__(cls)
+        index.dtype = dtype
+        index.model_id = model_id
+        index._names = None
+        index.generation = generation
+        index.name_table = list(name_table)
+        index.labels = labels
+        index.scales = scales
+        index.calibration = dict(calibration or {'slope': 1.0, 'intercept': 0.0})
+        index.matrix = matrix
+        index.dim = matrix.shape[1] if matrix.ndim == 2 else 0
+        index.sq_norms = sq_norms
+        return index
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def names(self):
+        """Name per encoding row (built on first use for mapped galleries)"""
+        if self._names is None:
+            self._names = [self.name_table[i] for i in self.labels]
+        return self._names
+
+    def name_at(self, row):
+        return self.name_table[int(self.labels[row])]
+
+    @property
+    def nbytes(self):
+        return int(self.matrix.nbytes + self.labels.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def _encode(self, source):
+        if self.dtype == 'float64':
+            return np.ascontiguousarray(source)
+        if self.dtype in ('float32', 'float16'):
+            return np.ascontiguousarray(source, dtype=self.dtype)
+        # int8: symmetric per-dimension scale so every dimension uses the full code range
+        if len(source) == 0:
+            self.scales = np.ones((self.dim,), dtype=np.float32)
+            return np.empty((0, self.dim), dtype=np.int8)
+        max_abs = np.max(np.abs(source), axis=0)
+        self.scales = (np.where(max_abs > 0, max_abs, 1.0) / 127.0).astype(np.float32)
+        return np.clip(np.rint(source / self.scales), -127, 127).astype(np.int8)
+
+    def _rows(self, start, stop):
+        """Rows [start, stop) as float vectors (dequantized for int8)"""
+        block = self.matrix[start:stop]
+        if self.dtype == 'float64':
+            return block
+        block = block.astype(np.float32)
+        if self.dtype == 'int8':
+            block *= self.scales
+        return block
+
+    def raw_distances(self, encoding):
+        """Euclidean distance to every row, before calibration"""
+        if len(self) == 0:
+            return np.empty((0,), dtype=np.float32)
+        work_dtype = np.float64 if self.dtype == 'float64' else np.float32
+        query = np.asarray(encoding, dtype=work_dtype).ravel()
+        q_norm = float(query @ query)
+        if self.dtype in ('float64', 'float32'):
+            dots = self.matrix @ query
+        else:
+            dots = np.empty((len(self),), dtype=np.float32)
+            for start in range(0, len(self), DISTANCE_BLOCK_ROWS):
+                stop = min(start + DISTANCE_BLOCK_ROWS, len(self))
+                dots[start:stop] = self._rows(start, stop) @ query
+        sq = self.sq_norms + q_norm - 2.0 * dots
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def distances(self, encoding):
+        """Euclidean distance to every row, mapped onto the float64 scale"""
+        d = self.raw_distances(encoding)
+        slope = self.calibration['slope']
+        intercept = self.calibration['intercept']
+        if slope != 1.0 or intercept != 0.0:
+            d = np.maximum(d * slope + intercept, 0.0)
+        return d
+
+    def distances_batch(self, encodings):
+        """(queries x rows) calibrated distances for a batch of probes: one matrix product, not one per probe"""
+        work_dtype = np.float64 if self.dtype == 'float64' else np.float32
+        queries = np.asarray(encodings, dtype=work_dtype).reshape(len(encodings), -1)
+        if len(self) == 0 or len(queries) == 0:
+            return np.empty((len(queries), len(self)), dtype=work_dtype)
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        if self.dtype in ('float64', 'float32'):
+            dots = queries @ self.matrix.T
+        else:
+            dots = np.empty((len(queries), len(self)), dtype=np.float32)
+            for start in range(0, len(self), DISTANCE_BLOCK_ROWS):
+                stop = min(start + DISTANCE_BLOCK_ROWS, len(self))
+                dots[:, start:stop] = queries @ self._rows(start, stop).T
+        d = np.sqrt(np.maximum(self.sq_norms[None, :] + q_norms[:, None] - 2.0 * dots, 0.0))
+        slope = self.calibration['slope']
+        intercept = self.calibration['intercept']
+        if slope != 1.0 or intercept != 0.0:
+            d = np.maximum(d * slope + intercept, 0.0)
+        return d
+
+    def person_encodings(self, name):
+        """One person's rows as float32 vectors (dequantized for int8), empty if unknown"""
+        if name not in self.name_table:
+            return np.empty((0, self.dim), dtype=np.float32)
+        rows = np.flatnonzero(self.labels == self.name_table.index(name))
+        return np.asarray(self._rows(0, len(self))[rows] if self.dtype == 'int8' else self.matrix[rows], dtype=np.float32)
+
+    def replace_person(self, name, encodings=None):
+        """New index with one person's rows replaced by encodings (removed when empty).
+
+        Everyone else's rows are copied as stored, not rebuilt: float galleries stay exact and
+        an int8 gallery keeps its codes while the new rows fit its scales (otherwise it is
+        requantized and recalibrated once)."""
+        label = self.name_table.index(name) if name in self.name_table else -1
+        keep = self.labels != label
+        new = np.asarray(encodings if encodings is not None else [], dtype=np.float64)
+        new = new.reshape(len(new), -1) if new.size else np.empty((0, self.dim), dtype=np.float64)
+        if len(self) and len(new) and new.shape[1] != self.dim:
+            raise ValueError(f"Encoding size {new.shape[1]} does not match the gallery ({self.dim})")
+        names = [self.name_table[i] for i in self.labels[keep]] + [name] * len(new)
+        if self.dtype == 'int8' and len(self) and np.all(np.abs(new) <= self.scales * 127.0):
+            name_table = list(dict.fromkeys(names))
+            lookup = {n: i for i, n in enumerate(name_table)}
+            codes = np.clip(np.rint(new / self.scales), -127, 127).astype(np.int8)
+            index = GalleryIndex.from_arrays(
+                np.ascontiguousarray(np.concatenate([self.matrix[keep], codes])),
+                np.array([lookup[n] for n in names], dtype=np.int32), name_table, None,
+                self.dtype, self.model_id, self.scales, self.calibration)
+            rows = index._rows(0, len(index))
+            index.sq_norms = np.einsum('ij,ij->i', rows, rows)
+            index._names = names
+            return index
+        kept = self._rows(0, len(self))[keep].astype(np.float64) if len(self) else np.empty((0, new.shape[1]))
+        recalibrate = self.dtype == 'int8' or len(self) == 0
+        index = GalleryIndex(np.concatenate([kept, new]), names, self.dtype, self.model_id, calibrate=recalibrate)
+        if not recalibrate:
+            index.calibration = dict(self.calibration)
+        return index
+
+    def best_two(self, distances):
+        """(best row, best distance, distance to the nearest row of a different person or None)"""
+        best = int(np.argmin(distances))
+        others = distances[self.labels != self.labels[best]]
+        second = float(others.min()) if others.size else None
+        return best, float(distances[best]), second
+
+    def calibrate(self, source, probes=CALIBRATION_PROBES, seed=0):
+        """Fit quantized -> float64 distance mapping on gallery rows used as probes.
+
+        Returns error stats after the fit (also kept in self.calibration)."""
+        rng = np.random.default_rng(seed)
+        probe_rows = rng.choice(len(source), size=min(probes, len(source)), replace=False)
+        exact, approx = [], []
+        for row in probe_rows:
+            # Perturb the probe so pairs are not all self-matches at distance 0
+            probe = source[row] + rng.normal(0.0, 0.02, size=source.shape[1])
+            exact.append(np.linalg.norm(source - probe, axis=1))
+            approx.append(self.raw_distances(probe))
+        exact = np.concatenate(exact)
+        approx = np.concatenate(approx).astype(np.float64)
+        if np.ptp(approx) > 0:
+            slope, intercept = np.polyfit(approx, exact, 1)
+        else:
+            slope, intercept = 1.0, 0.0
+        fitted = np.maximum(approx * slope + intercept, 0.0)
+        errors = np.abs(fitted - exact)
+        self.calibration = {
+            'slope': float(slope),
+            'intercept': float(intercept),
+            'pairs': int(exact.size),
+            'mean_abs_error': float(errors.mean()),
+            'p99_abs_error': float(np.percentile(errors, 99)),
+            'max_abs_error': float(errors.max()),
+        }
+        return self.calibration
+
+    def describe(self):
+        return {
+            'dtype': self.dtype,
+            'encodings': len(self),
+            'identities': len(self.name_table),
+            'dim': self.dim,
+            'bytes': self.nbytes,
+            'model_id': self.model_id,
+            'generation': self.generation,
+            'calibration': dict(self.calibration),
+        }
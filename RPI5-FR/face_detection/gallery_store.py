@@ -0,0 +1,193 @@
+# face_detection/gallery_store.py
+# Versioned on-disk gallery that every recognition process maps read-only.
+#
+# Layout under <root>/<model_id>/:
+#   gen-000042/matrix.npy, labels.npy, sq_norms.npy[, scales.npy], meta.json
+#   CURRENT  -> text file holding the active generation number
+# A publish writes a complete generation directory under a temporary name, renames it into
+# place, then replaces CURRENT (os.replace is atomic), so a reader sees either the old or the
+# new gallery, never a mix. Claiming the generation number and replacing CURRENT happen under
+# an exclusive lock on <root>/<model_id>/.publish.lock, so concurrent publishers (threads or
+# processes) cannot move CURRENT back to an older generation. Readers np.load(mmap_mode='r') the arrays: the page cache holds
+# one copy however many processes or pipelines map it, and a reload is a pointer swap.
+
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: publishers are only serialized within this process
+    fcntl = None
+
+from face_detection.gallery_index import GalleryIndex
+
+GENERATION_PREFIX = 'gen-'
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = '.publish.lock'
+# Generations kept on disk after a publish; older ones are removed (processes that still map
+# them keep their pages until they swap, POSIX unlink semantics).
+KEEP_GENERATIONS = 2
+
+
+_publish_lock = threading.Lock()
+
+
+class GalleryStore:
+    """Publisher/opener for the shared gallery of one embedding model"""
+
+    def __init__(self, root, model_id):
+        self.root = root
+        self.model_id = model_id
+        self.path = os.path.join(root, model_id)
+
+    def _generation_dir(self, generation):
+        return os.path.join(self.path, f"{GENERATION_PREFIX}{generation:06d}")
+
+    def generations(self):
+        """Generation numbers present on disk, oldest first"""
+        if not os.path.isdir(self.path):
+            return []
+        found = []
+        for entry in os.listdir(self.path):
+            if entry.startswith(GENERATION_PREFIX) and entry[len(GENERATION_PREFIX):].isdigit():
+                found.append(int(entry[len(GENERATION_PREFIX):]))
+        return sorted(found)
+
+    def current_generation(self):
+        """Active generation number, or None if nothing was published yet"""
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE)) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def current_stamp(self):
+        """Cheap change marker for CURRENT (inode + mtime); None if absent"""
+        try:
+            st = os.stat(os.path.join(self.path, CURRENT_FILE))
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive publish lock: in-process, then across processes via flock"""
+        with _publish_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path, LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def publish(self, index):
+        """Write index as the next generation and make it current. Returns the generation number."""
+        if index.model_id != self.model_id:
+            raise ValueError(f"Gallery built with {index.model_id} cannot be published to {self.model_id}")
+        os.makedirs(self.path, exist_ok=True)
+        tmp_dir = os.path.join(self.path, f".tmp-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            np.save(os.path.join(tmp_dir, 'matrix.npy'), np.ascontiguousarray(index.matrix))
+            np.save(os.path.join(tmp_dir, 'labels.npy'), np.ascontiguousarray(index.labels, dtype=np.int32))
+            np.save(os.path.join(tmp_dir, 'sq_norms.npy'), np.ascontiguousarray(index.sq_norms))
+            if index.scales is not None:
+                np.save(os.path.join(tmp_dir, 'scales.npy'), index.scales)
+            meta = {
+                'model_id': index.model_id,
+                'dtype': index.dtype,
+                'dim': index.dim,
+                'encodings': len(index),
+                'name_table': index.name_table,
+                'calibration': index.calibration,
+            }
+            with self._locked():
+                # Next generation after everything on disk and the current one, so CURRENT only
+                # ever moves forward
+                generation = max(self.generations() + [self.current_generation() or 0]) + 1
+                meta['generation'] = generation
+                with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                    json.dump(meta, f)
+                os.rename(tmp_dir, self._generation_dir(generation))
+
+                current_tmp = os.path.join(self.path, f".{CURRENT_FILE}.{os.getpid()}-{threading.get_ident()}")
+                with open(current_tmp, 'w') as f:
+                    f.write(f"{generation}\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(current_tmp, os.path.join(self.path, CURRENT_FILE))
+                self.prune()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return generation
+
+    def open(self, generation=None):
+        """Map a generation (the current one by default) read-only as a GalleryIndex, or None"""
+        generation = self.current_generation() if generation is None else generation
+        if generation is None:
+            return None
+        gen_dir = self._generation_dir(generation)
+        with open(os.path.join(gen_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('model_id') != self.model_id:
+            raise ValueError(f"Gallery generation {generation} was built with {meta.get('model_id')}, not {self.model_id}")
+
+        def load(name):
+            # np.asarray drops the np.memmap subclass but keeps the read-only mapping
+            return np.asarray(np.load(os.path.join(gen_dir, name), mmap_mode='r'))
+
+        scales_path = os.path.join(gen_dir, 'scales.npy')
+        return GalleryIndex.from_arrays(
+            load('matrix.npy'),
+            load('labels.npy'),
+            meta['name_table'],
+            load('sq_norms.npy'),
+            meta['dtype'],
+            model_id=meta['model_id'],
+            scales=np.load(scales_path) if os.path.exists(scales_path) else None,
+            calibration=meta.get('calibration'),
+            generation=int(meta.get('generation', generation)),
+        )
+
+    def prune(self, keep=KEEP_GENERATIONS):
+        """Remove all but the newest `keep` generations (never the current one)"""
+        current = self.current_generation()
+        for generation in self.generations()[:-keep]:
+            if generation != current:
+                shutil.rmtree(self._generation_dir(generation), ignore_errors=True)
+
+
+class SharedGallery:
+    """A process's view of a GalleryStore: refresh() swaps to a newer generation when one appears"""
+
+    def __init__(self, store):
+        self.store = store
+        self.index = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Map the current generation if it changed. Returns the new GalleryIndex, or None if unchanged."""
+        stamp = self.store.current_stamp()
+        if stamp is None or (stamp == self._stamp and not force):
+            return None
+        with self._lock:
+            if stamp == self._stamp and not force:
+                return None
+            index = self.store.open()
+            if index is None:
+                return None
+            if self.index is not None and index.generation == self.index.generation and not force:
+                self._stamp = stamp
+                return None
+            self.index = index
+            self._stamp = stamp
+            return index
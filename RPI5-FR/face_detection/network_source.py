@@ -0,0 +1,394 @@
+# face_detection/network_source.py
+# IP camera ingestion: RTSP (and other FFmpeg URLs) or HTTP multipart MJPEG, read by a
+# dedicated thread that keeps only the newest frame, so consumers never work through a
+# backlog of buffered frames. Drops and stalls reconnect with exponential backoff, and
+# every source reports health stats. Used by CameraManager when camera_port is a URL.
+#
+# Local stand-ins for testing:
+#   python -m face_detection.network_source serve <video|dir|image|.fdump> --port 8090
+#   python -m face_detection.network_source probe http://127.0.0.1:8090/stream
+#   ffmpeg -re -stream_loop -1 -i clip.mp4 -f rtsp rtsp://127.0.0.1:8554/cam  (with an RTSP server)
+
+import os
+import random
+import re
+import threading
+import time
+import urllib.request
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+import cv2
+import numpy as np
+
+NETWORK_SCHEMES = ('rtsp', 'rtsps', 'rtmp', 'http', 'https')
+
+_CONTENT_LENGTH = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+_BOUNDARY = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+_JPEG_SOI = b'\xff\xd8'
+_JPEG_EOI = b'\xff\xd9'
+# A multipart stream that yields no complete JPEG within this many bytes is not MJPEG
+MAX_MJPEG_BUFFER = 8 * 1024 * 1024
+
+
+def is_network_source(source):
+    """True for URLs handled by NetworkFrameSource (rtsp://, http://...)"""
+    if not isinstance(source, str) or '://' not in source:
+        return False
+    return source.split('://', 1)[0].lower() in NETWORK_SCHEMES
+
+
+def multipart_boundary(content_type):
+    """b'--<boundary>' delimiter from a multipart Content-Type, or None"""
+    match = _BOUNDARY.search(content_type or '')
+    if not match:
+        return None
+    boundary = match.group(1).strip().encode('latin-1', 'replace')
+    return boundary if boundary.startswith(b'--') else b'--' + boundary
+
+
+def redact_url(url):
+    """URL with any password replaced, safe for logs and status payloads"""
+    try:
+        parts = urlsplit(url)
+        if parts.password is None:
+            return url
+        netloc = f"{parts.username}:***@{parts.hostname}"
+        if parts.port:
+            netloc += f":{parts.port}"
+        return urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+    except ValueError:
+        return url
+
+
+class NetworkFrameSource:
+    """Latest-frame reader for one network camera. Thread-safe; read() never returns a frame twice"""
+
+    def __init__(self, url, timeout=5.0, reconnect_min=0.5, reconnect_max=30.0, stall_timeout=None,
+                 rtsp_transport='tcp'):
+        self.url = url
+        self.display_url = redact_url(url)
+        self.timeout = timeout
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        # No frame for this long on an open connection counts as a drop
+        self.stall_timeout = stall_timeout if stall_timeout is not None else max(2.0, 2 * timeout)
+        self.rtsp_transport = rtsp_transport
+        self.kind = None  # 'mjpeg' or 'ffmpeg' once connected
+
+        self._cond = threading.Condition()
+        # Newest frame: (seq, payload, is_jpeg, received_at); MJPEG stays compressed until read
+        self._latest = None
+        self._seq = 0
+        self._read_seq = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._connection = None
+        self._failures = 0
+        self._fps_ewma = None
+        self._last_frame_at = None
+
+        self.state = 'stopped'
+        self.stats = {
+            'connects': 0,
+            'disconnects': 0,
+            'frames': 0,
+            'frames_skipped': 0,  # replaced before anyone read them
+            'decode_errors': 0,
+            'last_error': None,
+            'next_retry_sec': None,
+        }
+
+    # --- lifecycle -------------------------------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.state = 'connecting'
+        self._thread = threading.Thread(target=self._run, name='netcam-reader', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if not hasattr(self._connection, 'release'):
+            # Unblocks an HTTP read; an FFmpeg capture is released by its own thread (read timeout)
+            self._close_connection()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1.0)
+            self._thread = None
+        self.state = 'stopped'
+
+    @property
+    def connected(self):
+        return self.state == 'streaming'
+
+    # --- consumer side ---------------------------------------------------------------
+    def read(self, timeout=None):
+        """Newest frame not yet returned (BGR), waiting up to timeout for one; None if nothing new"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._latest is None or self._latest[0] <= self._read_seq) and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._latest is None or self._latest[0] <= self._read_seq:
+                return None
+            seq, payload, is_jpeg, _ = self._latest
+            self._read_seq = seq
+        if not is_jpeg:
+            return payload
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            self.stats['decode_errors'] += 1
+        return frame
+
+    def snapshot(self):
+        """Health stats for status endpoints"""
+        with self._cond:
+            last_frame_at = self._last_frame_at
+            fps = self._fps_ewma
+        return dict(
+            self.stats,
+            url=self.display_url,
+            kind=self.kind,
+            state=self.state,
+            connected=self.connected,
+            fps=round(fps, 2) if fps else None,
+            last_frame_age_sec=round(time.monotonic() - last_frame_at, 2) if last_frame_at else None,
+        )
+
+    # --- reader thread ---------------------------------------------------------------
+    def _publish(self, payload, is_jpeg):
+        now = time.monotonic()
+        with self._cond:
+            if self._latest is not None and self._latest[0] > self._read_seq:
+                self.stats['frames_skipped'] += 1
+            self._seq += 1
+            self._latest = (self._seq, payload, is_jpeg, now)
+            if self._last_frame_at is not None:
+                dt = now - self._last_frame_at
+                if dt > 0:
+                    self._fps_ewma = 1.0 / dt if self._fps_ewma is None else 0.9 * self._fps_ewma + 0.1 / dt
+            self._last_frame_at = now
+            self._cond.notify_all()
+        self.stats['frames'] += 1
+        if self._failures:
+            # Delivering again: the next drop starts the backoff from the bottom
+            self._failures = 0
+        self.state = 'streaming'
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.state = 'connecting'
+            try:
+                if self.url.split('://', 1)[0].lower() in ('http', 'https'):
+                    self._stream_http()
+                else:
+                    self._stream_ffmpeg()
+                if not self._stop.is_set():
+                    self.stats['last_error'] = 'stream ended'
+            except Exception as e:
+                if not self._stop.is_set():
+                    self.stats['last_error'] = str(e) or type(e).__name__
+            finally:
+                self._close_connection()
+            if self._stop.is_set():
+                break
+            self.stats['disconnects'] += 1
+            self._failures += 1
+            delay = min(self.reconnect_max, self.reconnect_min * 2 ** (self._failures - 1))
+            delay *= random.uniform(0.8, 1.2)  # cameras behind one switch don't retry in lockstep
+            self.state = 'backoff'
+            self.stats['next_retry_sec'] = round(delay, 2)
+            print(f"⚠️  Network camera {self.display_url}: {self.stats['last_error']} - retrying in {delay:.1f}s")
+            self._stop.wait(delay)
+            self.stats['next_retry_sec'] = None
+        self.state = 'stopped'
+
+    def _close_connection(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            if hasattr(connection, 'release'):
+                connection.release()
+            else:
+                connection.close()
+        except Exception:
+            pass
+
+    def _open_http(self):
+        """urlopen with credentials from the URL answered as Basic or Digest auth (urllib rejects user:pass@host)"""
+        parts = urlsplit(self.url)
+        url = self.url
+        handlers = []
+        if parts.username is not None:
+            netloc = parts.hostname + (f":{parts.port}" if parts.port else '')
+            url = urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+            passwords = urllib.request.HTTPPasswordMgrWithPriorAuth()
+            passwords.add_password(None, url, unquote(parts.username), unquote(parts.password or ''))
+            handlers = [urllib.request.HTTPBasicAuthHandler(passwords), urllib.request.HTTPDigestAuthHandler(passwords)]
+        opener = urllib.request.build_opener(*handlers)
+        request = urllib.request.Request(url, headers={'User-Agent': 'FaceIt-netcam'})
+        return opener.open(request, timeout=self.timeout)
+
+    def _stream_http(self):
+        response = self._open_http()
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.lower().startswith('multipart/'):
+            # Not MJPEG (e.g. an HLS or MP4 URL): let FFmpeg handle it
+            response.close()
+            self._stream_ffmpeg()
+            return
+        self._connection = response
+        self.kind = 'mjpeg'
+        self.stats['connects'] += 1
+        print(f"✅ Network camera connected (MJPEG): {self.display_url}")
+        boundary = multipart_boundary(content_type)
+        buffer = b''
+        while not self._stop.is_set():
+            chunk = response.read1(65536)  # socket timeout = self.timeout ends a stalled stream
+            if not chunk:
+                return
+            buffer += chunk
+            buffer = self._extract_jpegs(buffer, boundary)
+            if len(buffer) > MAX_MJPEG_BUFFER:
+                raise IOError('no JPEG frame found in multipart stream')
+
+    def _extract_jpegs(self, buffer, boundary=None):
+        """Publish every complete JPEG in buffer; returns the unconsumed tail.
+
+        boundary (b'--<boundary>') locates the current part's headers; without it the whole
+        tail is kept until its image arrives (bounded by MAX_MJPEG_BUFFER)."""
+        while True:
+            start = buffer.find(_JPEG_SOI)
+            part = buffer.rfind(boundary, 0, start if start >= 0 else len(buffer)) if boundary else -1
+            if start < 0:
+                # Keep the part headers received so far (their Content-Length is needed once the
+                # image arrives) and a trailing 0xff that may start the SOI; drop only what
+                # precedes the last boundary
+                return buffer[part:] if part > 0 else buffer
+            # Part headers (boundary, Content-Type, Content-Length) sit before the image
+            length = _CONTENT_LENGTH.search(buffer, max(part, 0), start)
+            if length:
+                end = start + int(length.group(1))
+                if len(buffer) < end:
+                    return buffer
+            else:
+                eoi = buffer.find(_JPEG_EOI, start + 2)
+                if eoi < 0:
+                    return buffer[start:]
+                end = eoi + 2
+            self._publish(buffer[start:end], is_jpeg=True)
+            buffer = buffer[end:]
+
+    def _stream_ffmpeg(self):
+        if self.rtsp_transport:
+            os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', f'rtsp_transport;{self.rtsp_transport}')
+        timeout_ms = int(self.timeout * 1000)
+        try:
+            capture = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms,
+            ])
+        except (cv2.error, TypeError, AttributeError):
+            capture = cv2.VideoCapture(self.url)  # OpenCV without open/read timeout properties
+        self._connection = capture
+        if not capture.isOpened():
+            raise IOError('could not open stream')
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.kind = 'ffmpeg'
+        self.stats['connects'] += 1
+        print(f"✅ Network camera connected (FFmpeg): {self.display_url}")
+        last_frame = time.monotonic()
+        while not self._stop.is_set():
+            # Decode every frame as it arrives (H.264 needs them all); only the newest is kept
+            ok, frame = capture.read()
+            if ok and frame is not None:
+                self._publish(frame, is_jpeg=False)
+                last_frame = time.monotonic()
+            elif time.monotonic() - last_frame > self.stall_timeout:
+                raise IOError(f'no frames for {self.stall_timeout:.0f}s')
+            else:
+                time.sleep(0.01)
+
+
+def _serve_mjpeg(source_path, port, fps, loop=True):
+    """Serve a replay source as HTTP MJPEG on /stream (a stand-in for an IP camera)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from face_detection.frame_source import FileFrameSource
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            source = FileFrameSource(source_path, loop=loop)
+            if not source.open():
+                self.send_error(500, f'cannot open {source_path}')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.end_headers()
+            try:
+                while True:
+                    frame = source.read()
+                    if frame is None:
+                        break
+                    ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+                    if not ok:
+                        continue
+                    data = jpeg.tobytes()
+                    self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                                     + str(len(data)).encode() + b'\r\n\r\n' + data + b'\r\n')
+                    time.sleep(1.0 / max(1.0, fps))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                source.close()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    print(f"📡 Serving {source_path} as MJPEG on http://0.0.0.0:{port}/stream")
+    server.serve_forever()
+
+
+def _probe(url, seconds, timeout):
+    """Connect to a source, read for a while and print its health stats"""
+    source = NetworkFrameSource(url, timeout=timeout)
+    source.start()
+    deadline = time.monotonic() + seconds
+    frames = 0
+    shape = None
+    while time.monotonic() < deadline:
+        frame = source.read(timeout=min(1.0, max(0.0, deadline - time.monotonic())))
+        if frame is not None:
+            frames += 1
+            shape = frame.shape
+    source.stop()
+    print(f"Read {frames} frame(s) in {seconds:.0f}s, shape={shape}")
+    for key, value in source.snapshot().items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Network camera stand-in server and probe')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='serve a video/image dir/.fdump as HTTP MJPEG')
+    serve.add_argument('source')
+    serve.add_argument('--port', type=int, default=8090)
+    serve.add_argument('--fps', type=float, default=15.0)
+    serve.add_argument('--no-loop', action='store_true')
+    probe = sub.add_parser('probe', help='read from a camera URL and print health stats')
+    probe.add_argument('url')
+    probe.add_argument('--seconds', type=float, default=5.0)
+    probe.add_argument('--timeout', type=float, default=5.0)
+    args = parser.parse_args()
+    if args.command == 'serve':
+        _serve_mjpeg(args.source, args.port, args.fps, loop=not args.no_loop)
+    else:
+        _probe(args.url, args.seconds, args.timeout)
@@ -0,0 +1,141 @@
+"""
+Face Tracks - links face boxes across recognition cycles by overlap so per-face state
+(asynchronous attributes, later liveness/identity evidence) follows the same person
+between frames instead of being keyed on a name that may still be changing.
+"""
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left), face_recognition order
+
+
+def box_iou(a: Box, b: Box) -> float:
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = max(0, a[1] - a[3]) * max(0, a[2] - a[0])
+    area_b = max(0, b[1] - b[3]) * max(0, b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """One face followed across cycles; enrichment results (attributes, spoof...) arrive asynchronously"""
+
+    def __init__(self, track_id: int, box: Box, now: float, camera_id: str = 'main'):
+        self.track_id = track_id
+        self.camera_id = camera_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        # kind -> latest result and when it arrived; kinds with a request in flight
+        self.results: Dict[str, Dict] = {}
+        self.result_ts: Dict[str, float] = {}
+        self.pending: Set[str] = set()
+
+    def result(self, kind: str, max_age: Optional[float] = None, now: Optional[float] = None) -> Optional[Dict]:
+        """Latest result of a kind, None if absent or older than max_age seconds"""
+        if kind not in self.results:
+            return None
+        if max_age is not None:
+            now = time.time() if now is None else now
+            if now - self.result_ts.get(kind, 0.0) > max_age:
+                return None
+        return self.results[kind]
+
+    def age_of(self, kind: str, now: Optional[float] = None) -> float:
+        """Seconds since the last result of a kind (inf if none yet)"""
+        if kind not in self.result_ts:
+            return float('inf')
+        return (time.time() if now is None else now) - self.result_ts[kind]
+
+
+class FaceTracker:
+    """Greedy IoU association; tracks unseen for max_age seconds are dropped. Thread-safe."""
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: float = 2.0):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self._tracks: Dict[int, FaceTrack] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def update(self, boxes: Sequence[Box], now: Optional[float] = None, camera_id: str = 'main') -> List[FaceTrack]:
+        """Associate this cycle's boxes with the camera's tracks; returns one track per box, in order.
+
+        Track ids are unique across cameras, so per-track state elsewhere needs no camera key."""
+        now = time.time() if now is None else now
+        with self._lock:
+            # Each camera only ages out its own tracks: another camera's cycle says nothing about
+            # them. A stopped camera has no more cycles; drop_camera forgets its tracks then.
+            for track_id in [t for t, track in self._tracks.items()
+                             if track.camera_id == camera_id and now - track.last_seen > self.max_age]:
+                del self._tracks[track_id]
+            pairs = sorted(
+                ((box_iou(box, track.box), i, track.track_id)
+                 for i, box in enumerate(boxes) for track in self._tracks.values()
+                 if track.camera_id == camera_id),
+                reverse=True,
+            )
+            assigned: Dict[int, FaceTrack] = {}
+            used = set()
+            for iou, i, track_id in pairs:
+                if iou < self.iou_threshold:
+                    break
+                if i in assigned or track_id in used:
+                    continue
+                track = self._tracks[track_id]
+                track.box = tuple(boxes[i])
+                track.last_seen = now
+                track.hits += 1
+                assigned[i] = track
+                used.add(track_id)
+            result = []
+            for i, box in enumerate(boxes):
+                track = assigned.get(i)
+                if track is None:
+                    track = FaceTrack(next(self._ids), tuple(box), now, camera_id)
+                    self._tracks[track.track_id] = track
+                result.append(track)
+            return result
+
+    def drop_camera(self, camera_id: str) -> int:
+        """Forget a stopped camera's tracks; returns how many were dropped"""
+        with self._lock:
+            stale = [t for t, track in self._tracks.items() if track.camera_id == camera_id]
+            for track_id in stale:
+                del self._tracks[track_id]
+            return len(stale)
+
+    def get(self, track_id: int) -> Optional[FaceTrack]:
+        with self._lock:
+            return self._tracks.get(track_id)
+
+    def mark_pending(self, track_id: int, kind: str) -> bool:
+        """Claim a request slot for (track, kind); False if one is already in flight or the track is gone"""
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None or kind in track.pending:
+                return False
+            track.pending.add(kind)
+            return True
+
+    def set_result(self, track_id: int, kind: str, result: Optional[Dict], now: Optional[float] = None) -> None:
+        """Deliver an asynchronous result (None = failed) to a track if it still exists"""
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None:
+                return
+            track.pending.discard(kind)
+            if result:
+                track.results[kind] = dict(result)
+                track.result_ts[kind] = time.time() if now is None else now
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tracks)
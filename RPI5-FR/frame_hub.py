@@ -0,0 +1,92 @@
+"""
+Frame Hub - latest-frame handoff from the single capture thread to stream consumers.
+Consumers block (threads) or await (asyncio) on the next frame instead of polling.
+"""
+import asyncio
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from event_bus import AsyncWakeup
+
+
+class FrameHub:
+    """Holds the most recent camera frame and a sequence number that increments per frame"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._async_waiters = AsyncWakeup()
+        self._frame: Optional[np.ndarray] = None
+        self._seq = 0
+        self._timestamp = 0.0
+
+    def publish(self, frame: np.ndarray) -> int:
+        with self._cond:
+            self._seq += 1
+            self._frame = frame
+            self._timestamp = time.time()
+            self._cond.notify_all()
+            self._async_waiters.wake_all()
+            return self._seq
+
+    def latest(self, max_age_sec: Optional[float] = None) -> Tuple[int, Optional[np.ndarray]]:
+        """Return (seq, frame); frame is None if nothing was captured or it is older than max_age_sec"""
+        with self._cond:
+            if self._frame is None:
+                return self._seq, None
+            if max_age_sec is not None and time.time() - self._timestamp > max_age_sec:
+                return self._seq, None
+            return self._seq, self._frame
+
+    def wait_next(self, last_seq: int, timeout: float) -> Tuple[int, Optional[np.ndarray]]:
+        """Block until a frame newer than last_seq is published; frame is None on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > last_seq, timeout):
+                return last_seq, None
+            return self._seq, self._frame
+
+    async def wait_next_async(self, last_seq: int, timeout: float) -> Tuple[int, Optional[np.ndarray]]:
+        """Coroutine form of wait_next(): costs no thread while waiting"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._seq > last_seq:
+                return self._seq, self._frame
+            self._async_waiters.add(loop, future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(loop, future)
+        with self._cond:
+            if self._seq > last_seq:
+                return self._seq, self._frame
+            return last_seq, None
+
+
+class FramePacer:
+    """Frame-rate cap for a stream consumer. Frames are admitted on a fixed schedule
+    (due += interval) with a quarter interval of slack, so capture jitter around the target
+    rate doesn't drop every other frame the way a plain "now - last_sent < interval" check
+    does; after a stall the schedule restarts from now instead of bursting to catch up."""
+
+    SLACK = 0.25
+
+    def __init__(self, fps: float):
+        self.interval = 1.0 / max(1, min(60, fps)) if fps else 0.0
+        self._due = None
+
+    def admit(self, now: Optional[float] = None) -> bool:
+        if self.interval <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        if self._due is not None and now < self._due - self.interval * self.SLACK:
+            return False
+        if self._due is None or now - self._due > self.interval:
+            self._due = now
+        self._due += self.interval
+        return True
@@ -0,0 +1,314 @@
+"""
+Gallery Replication - registrations made at one punch clock reach every other device. Each
+person has a version: a Lamport counter plus the device it was made on, compared as
+(counter, origin) so every device picks the same winner for concurrent edits. Every local
+change or applied remote version takes the next local change sequence number; a peer keeps
+a cursor into that sequence and only fetches the people changed since its last visit.
+
+A change carries the employee row, the person's encodings (the gallery rows for the model
+that made them) and the profile photo, or is a tombstone for a deleted person; either kind
+says whether the person's faces were deleted, so peers drop their copies too. Each sync
+with a peer pushes our changes since its push cursor and pulls theirs since our pull
+cursor. Peer-to-peer means every device lists the others in REPLICATION_PEERS; a hub is a
+device that lists nobody and that the edges all push to and pull from, which forwards
+everyone's changes to everyone. Changes are never sent back to the device they came from.
+"""
+import base64
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import requests
+
+from face_detection.gallery import delete_replica, save_replica
+
+logger = logging.getLogger(__name__)
+
+EMPLOYEE_FIELDS = ('id', 'name', 'department', 'join_date', 'active', 'face_registered')
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+class GalleryReplicator:
+    """Thread-safe. Callbacks into the server:
+      get_encodings(person) -> (model_id, encodings array or None) from the live gallery
+      local_model_id() -> the embedding model this device matches with
+      encode_photo(path) -> encoding or None, used when a change has no encodings for our model
+      on_applied(person, encodings or None, removed) after a remote change is stored"""
+
+    def __init__(self, database, device_id: str, faces_dir: str, peers: Sequence[str] = (), token: str = '',
+                 interval: float = 30.0, timeout: float = 10.0, batch: int = 20,
+                 get_encodings: Optional[Callable] = None, local_model_id: Optional[Callable[[], str]] = None,
+                 encode_photo: Optional[Callable] = None, on_applied: Optional[Callable] = None):
+        self.db = database
+        self.device_id = device_id
+        self.faces_dir = faces_dir
+        self.profile_dir = os.path.join(os.path.dirname(os.path.abspath(faces_dir)) or os.getcwd(), 'profiles')
+        self.peers = [p.rstrip('/') for p in peers if p.strip()]
+        self.interval = interval
+        self.timeout = timeout
+        self.batch = max(1, int(batch))
+        self.get_encodings = get_encodings
+        self.local_model_id = local_model_id
+        self.encode_photo = encode_photo
+        self.on_applied = on_applied
+        self.session = requests.Session()
+        self.session.headers['X-Replication-Device'] = device_id
+        if token:
+            self.session.headers['X-Replication-Token'] = token
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.peer_state: Dict[str, Dict] = {url: {'peer_id': None, 'last_sync': None, 'last_error': None,
+                                                  'pushed': 0, 'pulled': 0} for url in self.peers}
+        self.stats = {'applied': 0, 'stale': 0, 'errors': 0, 'local_changes': 0}
+
+    # Local changes
+    def note_local_change(self, person_id: str, faces_changed: bool = False, deleted: bool = False,
+                          faces_deleted: bool = False) -> None:
+        """Stamp a new version after an edit made on this device (faces_changed: re-registered
+        here, so the local images now win over any replica of the person; faces_deleted: the
+        person has no faces any more)"""
+        with self._lock:
+            if faces_changed or faces_deleted:
+                delete_replica(self.faces_dir, person_id)
+            self.db.stamp_gallery_version(person_id, origin=self.device_id, deleted=deleted)
+            self.db.set_replication_state(f'faces_deleted:{person_id}', int(faces_deleted))
+            self.stats['local_changes'] += 1
+        self._wake.set()
+
+    def seed(self, people: Sequence[str]) -> int:
+        """Give people that predate replication (no version yet) a first local version"""
+        count = 0
+        for person_id in people:
+            if self.db.get_gallery_version(person_id) is None:
+                self.db.stamp_gallery_version(person_id, origin=self.device_id)
+                count += 1
+        if count:
+            print(f"🔁 Replication: {count} existing people queued for peers")
+        return count
+
+    # Feed served to peers
+    def changes_since(self, since: int, peer: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """Changes after sequence `since`, without those that came from `peer`.
+
+        'seq' is the cursor for the next call; 'more' says whether the peer should call again."""
+        limit = max(1, min(int(limit or self.batch), 200))
+        rows = self.db.get_gallery_changes(since, limit)
+        changes = [self._export(row) for row in rows if not peer or row['source'] != peer]
+        return {
+            'device_id': self.device_id,
+            'seq': rows[-1]['seq'] if rows else int(since),
+            'more': len(rows) == limit,
+            'changes': changes,
+        }
+
+    def _profile_path(self, person_id: str) -> str:
+        return os.path.join(self.profile_dir, f"{person_id}.jpg")
+
+    def _export(self, row: Dict) -> Dict:
+        person_id = row['person_id']
+        change = {'id': person_id, 'counter': row['counter'], 'origin': row['origin'], 'deleted': bool(row['deleted'])}
+        change['faces_deleted'] = self.db.get_replication_state(f'faces_deleted:{person_id}', '0') == '1'
+        if row['deleted']:
+            return change
+        employee = self.db.get_employee(person_id)
+        change['employee'] = {k: employee.get(k) for k in EMPLOYEE_FIELDS} if employee else None
+        if self.get_encodings is not None:
+            model_id, encodings = self.get_encodings(person_id)
+            if encodings is not None and len(encodings):
+                encodings = np.asarray(encodings, dtype='<f4')
+                change['model_id'] = model_id
+                change['dim'] = int(encodings.shape[1])
+                change['encodings'] = _b64(encodings.tobytes())
+        photo = self._profile_path(person_id)
+        if os.path.exists(photo):
+            with open(photo, 'rb') as f:
+                change['photo'] = _b64(f.read())
+        return change
+
+    # Applying peers' changes
+    def apply_changes(self, changes: List[Dict], source: Optional[str]) -> Dict:
+        """Store the changes that are newer than ours; returns counts"""
+        result = {'applied': 0, 'stale': 0, 'errors': 0}
+        for change in changes:
+            try:
+                applied = self._apply(change, source)
+                result['applied' if applied else 'stale'] += 1
+            except Exception as e:
+                logger.warning(f"Replication: could not apply {change.get('id')!r} from {source}: {e}")
+                result['errors'] += 1
+        for key, value in result.items():
+            self.stats[key] += value
+        return result
+
+    def _apply(self, change: Dict, source: Optional[str]) -> bool:
+        person_id = str(change['id'])
+        if not person_id or os.sep in person_id or person_id.startswith('.'):
+            raise ValueError('invalid person id')
+        version = (int(change['counter']), str(change['origin']))
+        with self._lock:
+            local = self.db.get_gallery_version(person_id)
+            if local is not None and (local['counter'], local['origin']) >= version:
+                return False
+            deleted = bool(change.get('deleted'))
+            removed = bool(change.get('faces_deleted'))
+            if deleted:
+                self._remove(person_id, removed)
+                encodings = None
+            else:
+                if removed:
+                    delete_replica(self.faces_dir, person_id)
+                encodings = self._store(person_id, change)
+            self.db.stamp_gallery_version(person_id, version[0], version[1], source=source, deleted=deleted)
+            self.db.set_replication_state(f'faces_deleted:{person_id}', int(removed))
+        print(f"🔁 Replicated {'deletion of ' if deleted else ''}{person_id} "
+              f"(v{version[0]}@{version[1]}, via {source})")
+        if self.on_applied is not None:
+            self.on_applied(person_id, encodings, removed)
+        return True
+
+    def _store(self, person_id: str, change: Dict) -> Optional[np.ndarray]:
+        """Write the employee row, photo and encodings; returns encodings for our model (None if none)"""
+        photo_url = None
+        if change.get('photo'):
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = self._profile_path(person_id)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(base64.b64decode(change['photo']))
+            os.replace(path + '.tmp', path)
+            photo_url = f"/api/profiles/{person_id}.jpg"
+
+        encodings = None
+        local_model = self.local_model_id() if self.local_model_id is not None else None
+        if change.get('encodings'):
+            received = np.frombuffer(base64.b64decode(change['encodings']), dtype='<f4')
+            received = received.reshape(-1, int(change['dim'])).astype(np.float32)
+            save_replica(self.faces_dir, person_id, change['model_id'], received)
+            if change['model_id'] == local_model:
+                encodings = received
+        if encodings is None and photo_url and self.encode_photo is not None and not change.get('faces_deleted'):
+            # Made with another embedding model: the profile photo is the one image we have
+            encoding = self.encode_photo(self._profile_path(person_id))
+            if encoding is not None:
+                encodings = np.asarray([encoding], dtype=np.float32)
+                save_replica(self.faces_dir, person_id, local_model, encodings)
+
+        employee = dict(change.get('employee') or {'id': person_id, 'name': person_id})
+        employee['id'] = person_id
+        employee['face_registered'] = bool(employee.get('face_registered')) or encodings is not None
+        existing = self.db.get_employee(person_id)
+        employee['photo'] = photo_url or (existing or {}).get('photo') or ''
+        self.db.upsert_employee(employee)
+        return encodings
+
+    def _remove(self, person_id: str, faces_deleted: bool) -> None:
+        self.db.delete_employee(person_id)
+        if not faces_deleted:
+            return
+        delete_replica(self.faces_dir, person_id)
+        for path in (os.path.join(self.faces_dir, f"{person_id}.jpg"), self._profile_path(person_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        person_dir = os.path.join(self.faces_dir, person_id)
+        if os.path.isdir(person_dir):
+            shutil.rmtree(person_dir, ignore_errors=True)
+
+    # Syncing with peers
+    def sync_peer(self, url: str) -> Dict:
+        """Pull one peer's changes, then push ours; returns counts"""
+        state = self.peer_state.setdefault(url, {'peer_id': None, 'last_sync': None, 'last_error': None,
+                                                 'pushed': 0, 'pulled': 0})
+        result = {'pushed': 0, 'applied': 0, 'stale': 0, 'errors': 0}
+        try:
+            # Pull first: it tells us the peer's device id, which push uses to skip its own changes
+            pull_key = f'pull:{url}'
+            cursor = int(self.db.get_replication_state(pull_key, '0'))
+            while True:
+                response = self.session.get(f"{url}/api/replication/changes", timeout=self.timeout,
+                                            params={'since': cursor, 'peer': self.device_id, 'limit': self.batch})
+                response.raise_for_status()
+                page = response.json()
+                state['peer_id'] = page.get('device_id')
+                counts = self.apply_changes(page.get('changes', []), state['peer_id'])
+                if counts['errors']:
+                    result['errors'] += counts['errors']
+                    break
+                result['applied'] += counts['applied']
+                result['stale'] += counts['stale']
+                cursor = int(page.get('seq', cursor))
+                self.db.set_replication_state(pull_key, cursor)
+                if not page.get('more'):
+                    break
+
+            push_key = f'push:{url}'
+            cursor = int(self.db.get_replication_state(push_key, '0'))
+            while True:
+                rows = self.db.get_gallery_changes(cursor, self.batch)
+                if not rows:
+                    break
+                changes = [self._export(row) for row in rows if row['source'] != state['peer_id']]
+                if changes:
+                    response = self.session.post(f"{url}/api/replication/changes", timeout=self.timeout,
+                                                 json={'device_id': self.device_id, 'changes': changes})
+                    response.raise_for_status()
+                    if response.json().get('errors'):
+                        raise RuntimeError(f"peer could not apply {response.json()['errors']} changes")
+                    result['pushed'] += len(changes)
+                cursor = rows[-1]['seq']
+                self.db.set_replication_state(push_key, cursor)
+            state['last_error'] = None
+        except Exception as e:
+            state['last_error'] = str(e)
+            logger.warning(f"Replication with {url} failed: {e}")
+        state['last_sync'] = time.time()
+        state['pushed'] += result['pushed']
+        state['pulled'] += result['applied']
+        return result
+
+    def sync_all(self) -> Dict[str, Dict]:
+        with self._sync_lock:
+            return {url: self.sync_peer(url) for url in self.peers}
+
+    def start(self, seed_people: Callable[[], Sequence[str]] = None) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(seed_people,), name='gallery-replication',
+                                        daemon=True)
+        self._thread.start()
+        print(f"🔁 Gallery replication as {self.device_id}: peers {', '.join(self.peers) or 'none (serving only)'}")
+
+    def stop(self) -> None:
+        self._running = False
+        self._wake.set()
+
+    def _run(self, seed_people) -> None:
+        if seed_people is not None:
+            try:
+                self.seed(seed_people())
+            except Exception as e:
+                logger.warning(f"Replication seed failed: {e}")
+        while self._running:
+            if self.peers:
+                self.sync_all()
+            # A local change wakes us early so a registration spreads within seconds
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def snapshot(self) -> Dict:
+        return {
+            'device_id': self.device_id,
+            'clock': int(self.db.get_replication_state('clock', '0')),
+            'seq': self.db.get_gallery_seq(),
+            'peers': {url: dict(state) for url, state in self.peer_state.items()},
+            **self.stats,
+        }
@@ -0,0 +1,121 @@
+"""
+Hub Client - the edge side of HUB_MODE=edge. FaceDetector hands each cycle's embeddings (or
+face crops) to match_embeddings / match_crops, which post them to the hub's /api/hub/match
+in one binary request and return the hub's identities. None means "match locally": the hub
+did not answer within the timeout, refused the request, or is in its offline back-off, so a
+hub outage costs one short timeout and then the local gallery takes over until it is back.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import requests
+
+import hub_protocol
+
+logger = logging.getLogger(__name__)
+
+
+class HubClient:
+    """Thread-safe; one keep-alive HTTP session to the hub"""
+
+    def __init__(self, url: str, device_id: str, payload: str = 'embedding', token: str = '',
+                 timeout: float = 0.5, retry_min: float = 1.0, retry_max: float = 30.0):
+        if payload not in hub_protocol.KINDS:
+            logger.warning(f"Unknown hub payload {payload!r}, using embedding")
+            payload = 'embedding'
+        self.url = url.rstrip('/') + '/api/hub/match'
+        self.device_id = device_id
+        self.payload = payload
+        self.timeout = timeout
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': hub_protocol.CONTENT_TYPE})
+        if token:
+            self.session.headers['X-Hub-Token'] = token
+        self.model_id = ''
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._retry_at = 0.0
+        self.online = None
+        self.last_error = ''
+        self.stats = {'requests': 0, 'faces': 0, 'failures': 0, 'offline_skips': 0, 'bytes_sent': 0}
+        self._latency_ms = 0.0
+
+    def match_embeddings(self, embeddings: Sequence, model_id: str, camera_id: Optional[str] = None):
+        """Hub matches for local embeddings, or None to match locally"""
+        if not len(embeddings):
+            return []
+        self.model_id = model_id
+        return self._request(lambda: hub_protocol.encode_embeddings(
+            self.device_id, model_id, embeddings, camera_id or '', time.time()), len(embeddings))
+
+    def match_crops(self, rgb, locations: Sequence, camera_id: Optional[str] = None):
+        """Hub matches for face crops (the hub runs the embedding model), or None to match locally"""
+        if not locations:
+            return []
+        return self._request(lambda: hub_protocol.encode_crops(
+            self.device_id, '', rgb, locations, camera_id or '', time.time()), len(locations))
+
+    def _request(self, build, count: int) -> Optional[List]:
+        now = time.time()
+        with self._lock:
+            if now < self._retry_at:
+                self.stats['offline_skips'] += 1
+                return None
+        try:
+            body = build()
+            started = time.perf_counter()
+            response = self.session.post(self.url, data=body, timeout=self.timeout)
+            if response.status_code != 200:
+                raise RuntimeError(f'HTTP {response.status_code}')
+            status, matches = hub_protocol.decode_response(response.content)
+            if status == hub_protocol.STATUS_MODEL_MISMATCH:
+                raise RuntimeError(f'hub uses a different embedding model than {self.model_id}')
+            if status != hub_protocol.STATUS_OK or len(matches) != count:
+                raise RuntimeError(f'hub status {status}, {len(matches)}/{count} results')
+        except Exception as e:
+            self._failed(e)
+            return None
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            if self.online is False:
+                print(f"✅ Recognition hub back online ({self.url})")
+            self.online = True
+            self._failures = 0
+            self._retry_at = 0.0
+            self.stats['requests'] += 1
+            self.stats['faces'] += count
+            self.stats['bytes_sent'] += len(body)
+            self._latency_ms += 0.2 * (latency_ms - self._latency_ms) if self._latency_ms else latency_ms
+        return matches
+
+    def _failed(self, error: Exception) -> None:
+        with self._lock:
+            self._failures += 1
+            self.stats['failures'] += 1
+            delay = min(self.retry_max, self.retry_min * (2 ** (self._failures - 1)))
+            self._retry_at = time.time() + delay * random.uniform(0.8, 1.2)
+            self.last_error = str(error)
+            if self.online is not False:
+                print(f"⚠️ Recognition hub unreachable ({error}); matching against the local gallery")
+            self.online = False
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'url': self.url,
+                'device_id': self.device_id,
+                'payload': self.payload,
+                'online': self.online,
+                'last_error': self.last_error or None,
+                'retry_in_sec': round(max(0.0, self._retry_at - time.time()), 1),
+                'latency_ms': round(self._latency_ms, 1),
+                **self.stats,
+            }
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,148 @@
+"""
+Hub Matcher - the hub side of HUB_MODE=hub. Requests from many edge devices arrive on
+concurrent HTTP threads; each one queues its faces here and waits. A single matching thread
+takes everything queued within a short window (or up to max_batch faces), embeds any crops,
+and matches all probes against the master gallery with one distance matrix, then hands each
+request its own slice of the answers.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import hub_protocol
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    def __init__(self, request: hub_protocol.HubRequest):
+        self.request = request
+        self.done = threading.Event()
+        self.status = hub_protocol.STATUS_OK
+        self.matches: List = []
+
+
+class HubMatcher:
+    """get_detector() returns the FaceDetector holding the master gallery (None while loading)"""
+
+    def __init__(self, get_detector: Callable, max_batch: int = 64, max_wait: float = 0.005):
+        self.get_detector = get_detector
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self._queue: List[_Pending] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.devices: Dict[str, Dict] = {}
+        self.stats = {'requests': 0, 'faces': 0, 'batches': 0, 'rejected': 0}
+        self._batch_faces = 0.0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='hub-matcher', daemon=True)
+            self._thread.start()
+
+    def match(self, request: hub_protocol.HubRequest, timeout: float = 5.0):
+        """(status, matches) for one decoded request; blocks until its batch is matched"""
+        detector = self.get_detector()
+        if detector is None:
+            return hub_protocol.STATUS_UNAVAILABLE, []
+        if request.kind == hub_protocol.KIND_EMBEDDING:
+            if request.model_id != detector.embedding_backend.model_id:
+                self.stats['rejected'] += 1
+                return hub_protocol.STATUS_MODEL_MISMATCH, []
+            dim = detector.gallery.dim
+            if dim and any(len(item['embedding']) != dim for item in request.items):
+                self.stats['rejected'] += 1
+                return hub_protocol.STATUS_BAD_REQUEST, []
+        self.devices[request.device_id] = {
+            'last_seen': time.time(),
+            'cameras': sorted({item['camera_id'] for item in request.items if item['camera_id']}),
+        }
+        if not request.items:
+            return hub_protocol.STATUS_OK, []
+        self.start()
+        pending = _Pending(request)
+        with self._cond:
+            self._queue.append(pending)
+            self._cond.notify()
+        if not pending.done.wait(timeout):
+            return hub_protocol.STATUS_UNAVAILABLE, []
+        return pending.status, pending.matches
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                # Let concurrent edges join this batch for a moment, unless it is already full
+                deadline = time.monotonic() + self.max_wait
+                while sum(len(p.request.items) for p in self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, faces = [], 0
+                while self._queue and (not batch or faces + len(self._queue[0].request.items) <= self.max_batch):
+                    pending = self._queue.pop(0)
+                    batch.append(pending)
+                    faces += len(pending.request.items)
+            try:
+                self._match_batch(batch)
+            except Exception as e:
+                logger.warning(f"Hub batch of {len(batch)} requests failed: {e}")
+                for pending in batch:
+                    pending.status, pending.matches = hub_protocol.STATUS_UNAVAILABLE, []
+            for pending in batch:
+                pending.done.set()
+
+    def _embed_crops(self, detector, request: hub_protocol.HubRequest) -> List[Optional[np.ndarray]]:
+        embeddings = []
+        for item in request.items:
+            rgb = hub_protocol.decode_crop(item['jpeg'])
+            if rgb is None:
+                embeddings.append(None)
+                continue
+            encoded = detector.embedding_backend.encode(rgb, [item['box']])
+            embeddings.append(encoded[0] if len(encoded) else None)
+        return embeddings
+
+    def _match_batch(self, batch: List[_Pending]) -> None:
+        detector = self.get_detector()
+        probes, owners = [], []
+        for pending in batch:
+            if pending.request.kind == hub_protocol.KIND_CROP:
+                embeddings = self._embed_crops(detector, pending.request)
+            else:
+                embeddings = [item['embedding'] for item in pending.request.items]
+            pending.matches = [("Unknown", 0.0, None, None, 'no_face') for _ in embeddings]
+            for index, embedding in enumerate(embeddings):
+                if embedding is not None:
+                    probes.append(embedding)
+                    owners.append((pending, index))
+        if probes:
+            dims = {len(p) for p in probes}
+            if len(dims) > 1:
+                raise ValueError(f'mixed embedding sizes {sorted(dims)}')
+            for (pending, index), match in zip(owners, detector.match_encodings(np.stack(probes))):
+                pending.matches[index] = match
+        self.stats['batches'] += 1
+        self.stats['requests'] += len(batch)
+        self.stats['faces'] += len(probes)
+        self._batch_faces += 0.1 * (len(probes) - self._batch_faces)
+
+    def snapshot(self) -> Dict:
+        now = time.time()
+        with self._cond:
+            queued = len(self._queue)
+        return dict(
+            self.stats,
+            queued=queued,
+            avg_batch_faces=round(self._batch_faces, 2),
+            devices={device: {'last_seen_sec': round(now - info['last_seen'], 1), 'cameras': info['cameras']}
+                     for device, info in list(self.devices.items())},
+        )
@@ -0,0 +1,207 @@
+"""
+Hub Protocol - compact binary messages between edge devices and the central recognition
+hub (HUB_MODE=edge / hub). An edge runs capture, detection and tracking and sends only its
+face embeddings (or JPEG face crops) per cycle; the hub matches them against the master
+gallery and answers with one identity per face. All integers are big-endian.
+
+Request:   magic 'FIH1', version u8, kind u8 (1 embeddings, 2 crops), count u16,
+           device_id str, model_id str, then per face:
+             id u16, timestamp f64, camera_id str,
+             kind 1: dim u16 + dim x f32
+             kind 2: box in crop (top, right, bottom, left) 4 x u16 + JPEG length u32 + JPEG
+Response:  magic, version u8, status u8, count u16, then per face:
+             id u16, confidence f32, distance f32, margin f32 (NaN = none), reason u8, name str
+str = length u16 + UTF-8 bytes.
+"""
+import math
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+MAGIC = b'FIH1'
+VERSION = 1
+CONTENT_TYPE = 'application/x-faceit-hub'
+MAX_ITEMS = 256
+
+KIND_EMBEDDING = 1
+KIND_CROP = 2
+KINDS = {'embedding': KIND_EMBEDDING, 'crop': KIND_CROP}
+
+STATUS_OK = 0
+STATUS_MODEL_MISMATCH = 1
+STATUS_BAD_REQUEST = 2
+STATUS_UNAVAILABLE = 3
+
+# Reason codes carry FaceDetector.match_encoding's reason; no_face = the hub found no face in a crop
+REASONS = ('match', 'tolerance', 'margin', 'empty', 'no_face')
+
+# Crops are padded around the box so the hub can re-derive landmarks, then capped in size
+CROP_PAD = 0.25
+CROP_MAX_SIDE = 160
+CROP_JPEG_QUALITY = 85
+
+_HEADER = struct.Struct('>4sBBH')
+_STR_LEN = struct.Struct('>H')
+_REQUEST_ITEM = struct.Struct('>Hd')
+_DIM = struct.Struct('>H')
+_CROP = struct.Struct('>4HI')
+_RESULT_ITEM = struct.Struct('>HfffB')
+
+# (name, confidence, distance, margin, reason), as returned by FaceDetector.match_encoding
+Match = Tuple[str, float, Optional[float], Optional[float], str]
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class HubRequest:
+    """One decoded edge request; items are dicts with id, timestamp, camera_id and
+    'embedding' (np.float32 vector) or 'jpeg' + 'box' (location inside the crop)"""
+
+    def __init__(self, kind: int, device_id: str, model_id: str, items: List[dict]):
+        self.kind = kind
+        self.device_id = device_id
+        self.model_id = model_id
+        self.items = items
+
+
+def _pack_str(value: str) -> bytes:
+    data = (value or '').encode('utf-8')[:0xFFFF]
+    return _STR_LEN.pack(len(data)) + data
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def take(self, size: int) -> memoryview:
+        if self.offset + size > len(self.data):
+            raise ProtocolError('truncated message')
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def unpack(self, fmt: struct.Struct):
+        return fmt.unpack(self.take(fmt.size))
+
+    def string(self) -> str:
+        (length,) = self.unpack(_STR_LEN)
+        return bytes(self.take(length)).decode('utf-8', errors='replace')
+
+
+def _read_header(reader: _Reader) -> Tuple[int, int]:
+    magic, version, code, count = reader.unpack(_HEADER)
+    if magic != MAGIC:
+        raise ProtocolError('not a hub message')
+    if version != VERSION:
+        raise ProtocolError(f'unsupported hub protocol version {version}')
+    if count > MAX_ITEMS:
+        raise ProtocolError(f'too many faces ({count})')
+    return code, count
+
+
+def encode_embeddings(device_id: str, model_id: str, embeddings: Sequence, camera_id: str = '',
+                      timestamp: float = 0.0) -> bytes:
+    parts = [_HEADER.pack(MAGIC, VERSION, KIND_EMBEDDING, len(embeddings)),
+             _pack_str(device_id), _pack_str(model_id)]
+    for i, embedding in enumerate(embeddings):
+        vector = np.asarray(embedding, dtype='>f4').ravel()
+        parts += [_REQUEST_ITEM.pack(i, timestamp), _pack_str(camera_id),
+                  _DIM.pack(len(vector)), vector.tobytes()]
+    return b''.join(parts)
+
+
+def crop_face(rgb: np.ndarray, location: Sequence[int]) -> Tuple[bytes, Tuple[int, int, int, int]]:
+    """JPEG of a padded face crop (at most CROP_MAX_SIDE px) and the face box inside it"""
+    top, right, bottom, left = [int(v) for v in location]
+    h, w = rgb.shape[:2]
+    pad = int(CROP_PAD * max(1, bottom - top, right - left))
+    y0, x0 = max(0, top - pad), max(0, left - pad)
+    y1, x1 = min(h, bottom + pad), min(w, right + pad)
+    crop = rgb[y0:y1, x0:x1]
+    scale = min(1.0, CROP_MAX_SIDE / float(max(1, crop.shape[0], crop.shape[1])))
+    if scale < 1.0:
+        crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))),
+                          interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode('.jpg', cv2.cvtColor(crop, cv2.COLOR_RGB2BGR),
+                            [int(cv2.IMWRITE_JPEG_QUALITY), CROP_JPEG_QUALITY])
+    if not ok:
+        raise ProtocolError('JPEG encoding failed')
+    box = tuple(int(round(v * scale)) for v in (top - y0, right - x0, bottom - y0, left - x0))
+    return jpeg.tobytes(), box
+
+
+def encode_crops(device_id: str, model_id: str, rgb: np.ndarray, locations: Sequence, camera_id: str = '',
+                 timestamp: float = 0.0) -> bytes:
+    parts = [_HEADER.pack(MAGIC, VERSION, KIND_CROP, len(locations)),
+             _pack_str(device_id), _pack_str(model_id)]
+    for i, location in enumerate(locations):
+        jpeg, box = crop_face(rgb, location)
+        parts += [_REQUEST_ITEM.pack(i, timestamp), _pack_str(camera_id),
+                  _CROP.pack(*box, len(jpeg)), jpeg]
+    return b''.join(parts)
+
+
+def decode_request(data: bytes) -> HubRequest:
+    reader = _Reader(data)
+    kind, count = _read_header(reader)
+    if kind not in (KIND_EMBEDDING, KIND_CROP):
+        raise ProtocolError(f'unknown request kind {kind}')
+    device_id = reader.string()
+    model_id = reader.string()
+    items = []
+    for _ in range(count):
+        item_id, timestamp = reader.unpack(_REQUEST_ITEM)
+        item = {'id': item_id, 'timestamp': timestamp, 'camera_id': reader.string()}
+        if kind == KIND_EMBEDDING:
+            (dim,) = reader.unpack(_DIM)
+            item['embedding'] = np.frombuffer(reader.take(dim * 4), dtype='>f4').astype(np.float32)
+        else:
+            top, right, bottom, left, length = reader.unpack(_CROP)
+            item['box'] = (top, right, bottom, left)
+            item['jpeg'] = bytes(reader.take(length))
+        items.append(item)
+    return HubRequest(kind, device_id, model_id, items)
+
+
+def decode_crop(jpeg: bytes) -> Optional[np.ndarray]:
+    """RGB image of a request crop (None if it does not decode)"""
+    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image is not None else None
+
+
+def _f32(value: Optional[float]) -> float:
+    return float('nan') if value is None else float(value)
+
+
+def encode_response(status: int, matches: Sequence[Match] = (), ids: Optional[Sequence[int]] = None) -> bytes:
+    parts = [_HEADER.pack(MAGIC, VERSION, status, len(matches))]
+    for i, (name, confidence, distance, margin, reason) in enumerate(matches):
+        code = REASONS.index(reason) if reason in REASONS else REASONS.index('tolerance')
+        parts += [_RESULT_ITEM.pack(ids[i] if ids is not None else i, _f32(confidence), _f32(distance),
+                                    _f32(margin), code), _pack_str(name)]
+    return b''.join(parts)
+
+
+def decode_response(data: bytes) -> Tuple[int, List[Match]]:
+    """(status, matches ordered by item id)"""
+    reader = _Reader(data)
+    status, count = _read_header(reader)
+    results = []
+    for _ in range(count):
+        item_id, confidence, distance, margin, code = reader.unpack(_RESULT_ITEM)
+        name = reader.string()
+        reason = REASONS[code] if code < len(REASONS) else 'tolerance'
+        results.append((item_id, (
+            name,
+            0.0 if math.isnan(confidence) else confidence,
+            None if math.isnan(distance) else distance,
+            None if math.isnan(margin) else margin,
+            reason,
+        )))
+    results.sort(key=lambda item: item[0])
+    return status, [match for _, match in results]
@@ -0,0 +1,105 @@
+"""
+Identity Voting - per-track decision buffer for attendance. Every recognition cycle adds the
+track's match (name, distance, margin to the next-best person) to a window of the last N
+observations; a person is committed only after winning k of them with a consistent margin,
+or earlier when the last few frames agree with overwhelming distance and margin. One lucky
+or unlucky frame can no longer decide a punch on its own.
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# (timestamp, name or None for Unknown, distance, margin, confidence)
+Observation = Tuple[float, Optional[str], Optional[float], Optional[float], float]
+
+
+class IdentityVoter:
+    """Thread-safe; observe() once per track per cycle"""
+
+    def __init__(self, window: int = 5, votes_required: int = 3, early_frames: int = 2,
+                 early_distance_factor: float = 0.7, early_margin_factor: float = 2.0,
+                 state_ttl: float = 10.0):
+        self.window = max(1, int(window))
+        self.votes_required = max(1, min(int(votes_required), self.window))
+        self.early_frames = max(1, int(early_frames))
+        # Early commit: distance <= tolerance * factor and margin >= required margin * factor
+        self.early_distance_factor = early_distance_factor
+        self.early_margin_factor = early_margin_factor
+        self.state_ttl = state_ttl
+        self._tracks: Dict[int, Deque[Observation]] = {}
+        self._last_seen: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, track_id: int, name: Optional[str], distance: Optional[float], margin: Optional[float],
+                confidence: float, tolerance: float, required_margin: float,
+                now: Optional[float] = None) -> Dict:
+        """Add this cycle's match for a track and return the current decision.
+
+        Decision keys: name (winner or None), committed, reason ('votes', 'early', 'pending',
+        'contested', 'margin'), votes, observations, margin (median over the winner's votes),
+        confidence (mean over the winner's votes)."""
+        now = time.time() if now is None else now
+        name = None if not name or name == 'Unknown' else name
+        with self._lock:
+            for stale in [t for t, ts in self._last_seen.items() if now - ts > self.state_ttl]:
+                self._tracks.pop(stale, None)
+                self._last_seen.pop(stale, None)
+            history = self._tracks.get(track_id)
+            if history is None:
+                history = self._tracks[track_id] = deque(maxlen=self.window)
+            history.append((now, name, distance, margin, float(confidence or 0.0)))
+            self._last_seen[track_id] = now
+            observations = list(history)
+
+        counts: Dict[str, int] = {}
+        for _, voted, _, _, _ in observations:
+            if voted is not None:
+                counts[voted] = counts.get(voted, 0) + 1
+        decision = {'name': None, 'committed': False, 'reason': 'pending', 'votes': 0,
+                    'observations': len(observations), 'margin': None, 'confidence': 0.0}
+        if not counts:
+            return decision
+
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        winner, votes = ranked[0]
+        winner_obs = [o for o in observations if o[1] == winner]
+        margins = sorted(o[3] for o in winner_obs if o[3] is not None)
+        median_margin = margins[len(margins) // 2] if margins else None
+        decision.update({
+            'name': winner,
+            'votes': votes,
+            'margin': round(median_margin, 4) if median_margin is not None else None,
+            'confidence': sum(o[4] for o in winner_obs) / len(winner_obs),
+        })
+
+        # Early commit: the most recent frames all agree, each far inside tolerance and margin
+        recent = observations[-self.early_frames:]
+        if len(recent) == self.early_frames and all(
+            o[1] == winner and o[2] is not None and o[2] <= tolerance * self.early_distance_factor
+            and (o[3] is None or o[3] >= required_margin * self.early_margin_factor)
+            for o in recent
+        ):
+            decision.update({'committed': True, 'reason': 'early'})
+            return decision
+
+        if votes < self.votes_required:
+            return decision
+        if len(ranked) > 1 and ranked[1][1] >= votes:
+            decision['reason'] = 'contested'
+            return decision
+        # Consistent margin: the winner's typical frame must clear the margin, not just its best
+        if median_margin is not None and median_margin < required_margin:
+            decision['reason'] = 'margin'
+            return decision
+        decision.update({'committed': True, 'reason': 'votes'})
+        return decision
+
+    def forget(self, track_id: int) -> None:
+        with self._lock:
+            self._tracks.pop(track_id, None)
+            self._last_seen.pop(track_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tracks)
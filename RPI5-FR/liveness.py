@@ -0,0 +1,205 @@
+"""
+Liveness - multi-frame anti-spoofing per face track. Each frame adds evidence to running
+per-track statistics (constant work per frame, nothing re-scanned):
+  - blink: eye aspect ratio from the eye landmarks dropping well below the track's own
+    open-eye baseline, then recovering
+  - micro-motion: non-rigid movement of the landmarks inside the face box (a photo or
+    screen moves rigidly) plus the residual pixel change of the normalized crop
+  - moire: periodic high-frequency peaks in the crop spectrum from screen pixel grids
+  - texture: Laplacian variance (the old single-frame check), as one weak cue
+and the weighted combination is a rolling liveness score in [0, 1].
+"""
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import cv2
+import numpy as np
+
+CROP_SIZE = 64
+# Spectral radius (cycles/pixel) where screen pixel grids and their moire show up
+MOIRE_BAND = (0.25, 0.5)
+
+
+def eye_aspect_ratio(eye: Sequence) -> Optional[float]:
+    """EAR = (|p2-p6| + |p3-p5|) / (2 |p1-p4|) for the 6 dlib eye points; None if malformed"""
+    if not eye or len(eye) != 6:
+        return None
+    p = np.asarray(eye, dtype=np.float32)
+    horizontal = np.linalg.norm(p[0] - p[3])
+    if horizontal <= 1e-6:
+        return None
+    return float((np.linalg.norm(p[1] - p[5]) + np.linalg.norm(p[2] - p[4])) / (2.0 * horizontal))
+
+
+def _moire_patch(gray_full: np.ndarray) -> np.ndarray:
+    """Central CROP_SIZE patch at native resolution (resizing would average a screen grid away)"""
+    h, w = gray_full.shape[:2]
+    if h < CROP_SIZE or w < CROP_SIZE:
+        return cv2.resize(gray_full, (CROP_SIZE, CROP_SIZE), interpolation=cv2.INTER_NEAREST).astype(np.float32)
+    y, x = (h - CROP_SIZE) // 2, (w - CROP_SIZE) // 2
+    return gray_full[y:y + CROP_SIZE, x:x + CROP_SIZE].astype(np.float32)
+
+
+def _moire_peak_ratio(gray: np.ndarray) -> float:
+    """Strongest high-frequency spectral peak over the band's median energy (high = periodic pattern)"""
+    window = np.outer(np.hanning(CROP_SIZE), np.hanning(CROP_SIZE)).astype(np.float32)
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft2((gray - gray.mean()) * window)))
+    band = spectrum[_MOIRE_MASK]
+    median = float(np.median(band))
+    return float(band.max() / median) if median > 1e-6 else 0.0
+
+
+_freq = np.fft.fftshift(np.fft.fftfreq(CROP_SIZE))
+_radius = np.sqrt(_freq[:, None] ** 2 + _freq[None, :] ** 2)
+_MOIRE_MASK = (_radius >= MOIRE_BAND[0]) & (_radius <= MOIRE_BAND[1])
+
+
+class LivenessState:
+    """Running evidence for one track"""
+
+    def __init__(self, now: float):
+        self.frames = 0
+        self.last_update = now
+        self.ear_baseline: Optional[float] = None
+        self.eyes_closed = False
+        self.blinks = 0
+        self.blink_evidence = 0.0
+        self.motion = 0.0
+        self.moire = 0.0
+        self.texture = 0.0
+        self.score = 0.0
+        self.prev_gray: Optional[np.ndarray] = None
+        self.prev_shape: Optional[np.ndarray] = None
+
+
+class LivenessEngine:
+    """Thread-safe; update() is called for each new frame of a track (one at a time per track)"""
+
+    # Component weights in the score (sum to 1)
+    WEIGHTS = {'blink': 0.35, 'motion': 0.3, 'moire': 0.2, 'texture': 0.15}
+
+    def __init__(self, threshold: float = 0.6, min_frames: int = 3, alpha: float = 0.3,
+                 blink_ratio: float = 0.75, blink_decay_sec: float = 20.0,
+                 motion_range: Sequence[float] = (0.006, 0.02), moire_range: Sequence[float] = (12.0, 40.0),
+                 texture_range: Sequence[float] = (18.0, 80.0), state_ttl: float = 10.0):
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.alpha = alpha
+        self.blink_ratio = blink_ratio
+        self.blink_decay_sec = blink_decay_sec
+        self.motion_range = motion_range
+        self.moire_range = moire_range
+        self.texture_range = texture_range
+        self.state_ttl = state_ttl
+        self._states: Dict[int, LivenessState] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _ramp(value: float, low: float, high: float) -> float:
+        return float(min(1.0, max(0.0, (value - low) / (high - low))))
+
+    def _state(self, track_id: int, now: float) -> LivenessState:
+        with self._lock:
+            for stale in [t for t, s in self._states.items() if now - s.last_update > self.state_ttl]:
+                del self._states[stale]
+            state = self._states.get(track_id)
+            if state is None:
+                state = self._states[track_id] = LivenessState(now)
+            return state
+
+    def update(self, track_id: int, frame: np.ndarray, box: Sequence[int], landmarks: Optional[Dict] = None,
+               now: Optional[float] = None) -> Optional[Dict]:
+        """Add one frame of evidence for a track; returns the rolling verdict (None if the crop is empty)"""
+        now = time.time() if now is None else now
+        top, right, bottom, left = [int(v) for v in box]
+        h, w = frame.shape[:2]
+        top, left = max(0, top), max(0, left)
+        bottom, right = min(h, bottom), min(w, right)
+        if bottom <= top or right <= left:
+            return None
+        face = frame[top:bottom, left:right]
+        gray_full = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        gray = cv2.resize(gray_full, (CROP_SIZE, CROP_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+        # Normalize brightness so auto-exposure changes do not read as motion
+        gray = (gray - gray.mean()) / (gray.std() + 1e-6)
+
+        state = self._state(track_id, now)
+        elapsed = max(0.0, now - state.last_update)
+        state.last_update = now
+        state.frames += 1
+        a = self.alpha
+
+        # Blink: EAR below a fraction of the track's own open-eye baseline, then back above it
+        ears = [eye_aspect_ratio((landmarks or {}).get(k)) for k in ('left_eye', 'right_eye')]
+        ears = [e for e in ears if e is not None]
+        state.blink_evidence *= 0.5 ** (elapsed / self.blink_decay_sec) if self.blink_decay_sec > 0 else 0.0
+        if ears:
+            ear = float(np.mean(ears))
+            if state.ear_baseline is None:
+                state.ear_baseline = ear
+            closed = ear < state.ear_baseline * self.blink_ratio
+            if closed:
+                state.eyes_closed = True
+            else:
+                if state.eyes_closed:
+                    state.blinks += 1
+                    state.blink_evidence = 1.0
+                state.eyes_closed = False
+                # Baseline follows open eyes only
+                state.ear_baseline += 0.1 * (ear - state.ear_baseline)
+
+        # Micro-motion: landmark shape change relative to the box, plus normalized pixel residual
+        shape = None
+        if landmarks:
+            points = [p for key in ('left_eye', 'right_eye', 'nose_tip', 'top_lip', 'bottom_lip')
+                      for p in (landmarks.get(key) or [])]
+            if points:
+                size = float(max(1, right - left, bottom - top))
+                shape = (np.asarray(points, dtype=np.float32) - np.array([left, top], dtype=np.float32)) / size
+        motion = 0.0
+        if shape is not None and state.prev_shape is not None and state.prev_shape.shape == shape.shape:
+            deformation = shape - state.prev_shape
+            # Remove the rigid part (shared translation) so a moved photo scores ~0
+            deformation -= deformation.mean(axis=0)
+            motion = float(np.sqrt((deformation ** 2).sum(axis=1)).mean())
+        elif state.prev_gray is not None:
+            # No landmarks: fall back to the crop residual, scaled to the landmark units
+            motion = float(np.abs(gray - state.prev_gray).mean()) * 0.05
+        if state.frames > 1:
+            state.motion += a * (motion - state.motion)
+        state.prev_gray = gray
+        state.prev_shape = shape
+
+        moire = _moire_peak_ratio(_moire_patch(gray_full))
+        state.moire = moire if state.frames == 1 else state.moire + a * (moire - state.moire)
+        texture = float(cv2.Laplacian(gray_full, cv2.CV_64F).var())
+        state.texture = texture if state.frames == 1 else state.texture + a * (texture - state.texture)
+
+        components = {
+            'blink': state.blink_evidence,
+            'motion': self._ramp(state.motion, *self.motion_range),
+            'moire': 1.0 - self._ramp(state.moire, *self.moire_range),
+            'texture': self._ramp(state.texture, *self.texture_range),
+        }
+        state.score = sum(self.WEIGHTS[k] * v for k, v in components.items())
+        decided = state.frames >= self.min_frames
+        live = decided and state.score >= self.threshold
+        return {
+            'liveness': round(state.score, 3),
+            'live': live,
+            # Only call it a spoof once enough frames were seen
+            'spoof': bool(decided and not live),
+            'spoof_score': round(state.texture, 2),
+            'liveness_frames': state.frames,
+            'blinks': state.blinks,
+            'liveness_evidence': {k: round(v, 3) for k, v in components.items()},
+        }
+
+    def forget(self, track_id: int) -> None:
+        with self._lock:
+            self._states.pop(track_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._states)
@@ -0,0 +1,337 @@
+"""
+HTTP load test: concurrent MJPEG/SSE viewers plus a weighted mix of API calls against a
+running server (ideally PLATFORM=replay so the camera side is deterministic). Reports
+per-endpoint latency percentiles and errors, stream frame gaps, and the server's own
+stage timings over the test window from /api/metrics.
+
+    python loadtest.py --base-url http://127.0.0.1:5002 --duration 60 --workers 16 \
+        --mix attendance=5,employees=3,detect_face_quality=2 \
+        --camera-streams 4 --recognition-streams 4 --image sample_face.jpg --output load.json
+
+register_face is opt-in (weight 0 by default): it creates throwaway "<prefix><n>" employees,
+registers a face for each, and deletes both (DELETE /api/employees/<id>?delete_face_data=true)
+at the end of the run; any that could not be removed are listed in the report.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+DEFAULT_MIX = 'attendance=5,employees=3,detect_face_quality=2,register_face=0'
+REQUEST_TIMEOUT_SEC = 30.0
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def summarize(latencies):
+    return {
+        'count': len(latencies),
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(max(latencies) if latencies else None),
+    }
+
+
+def _ms(value):
+    return round(value * 1000.0, 1) if value is not None else None
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        if '=' not in item:
+            continue
+        name, weight = item.split('=', 1)
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = max(0.0, float(weight))
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+class Results:
+    """Thread-safe latency/error store keyed by endpoint name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.status = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, latency, status=None, error=None):
+        with self._lock:
+            if error is not None:
+                self.errors[name][error] += 1
+                return
+            self.latencies[name].append(latency)
+            self.status[name][str(status)] += 1
+            if status >= 400:
+                self.errors[name][f"HTTP {status}"] += 1
+
+
+class Client:
+    """One simulated browser: keeps its own session and ETags like the UI does"""
+
+    def __init__(self, args, results, register_names):
+        self.args = args
+        self.results = results
+        self.session = requests.Session()
+        self.etags = {}
+        self.register_names = register_names
+
+    def _get(self, name, path, params=None):
+        headers = {}
+        key = (path, tuple(sorted((params or {}).items())))
+        if self.args.etag and key in self.etags:
+            headers['If-None-Match'] = self.etags[key]
+        start = time.perf_counter()
+        resp = self.session.get(self.args.base_url + path, params=params, headers=headers,
+                                timeout=REQUEST_TIMEOUT_SEC)
+        _ = resp.content
+        self.results.record(name, time.perf_counter() - start, resp.status_code)
+        if resp.headers.get('ETag'):
+            self.etags[key] = resp.headers['ETag']
+
+    def _post_image(self, name, path, files, data=None):
+        start = time.perf_counter()
+        resp = self.session.post(self.args.base_url + path, files=files, data=data,
+                                 timeout=REQUEST_TIMEOUT_SEC)
+        _ = resp.content
+        self.results.record(name, time.perf_counter() - start, resp.status_code)
+        return resp
+
+    def attendance(self):
+        self._get('attendance', '/api/attendance', {'limit': self.args.attendance_limit})
+
+    def employees(self):
+        self._get('employees', '/api/employees')
+
+    def detect_face_quality(self):
+        self._post_image('detect_face_quality', '/api/detect-face-quality',
+                         {'image': ('frame.jpg', self.args.image_bytes, 'image/jpeg')},
+                         {'angle': 'front'})
+
+    def register_face(self):
+        reg_name = f"{self.args.register_prefix}{random.randint(0, 10 ** 6)}"
+        # Same order as enrolment in the UI: the employee row first, so cleanup can go through
+        # the employee delete (which removes the faces/<id>/<stamp>/ registrations too)
+        resp = self.session.post(self.args.base_url + '/api/employees', timeout=REQUEST_TIMEOUT_SEC,
+                                 json={'id': reg_name, 'name': reg_name, 'department': 'Load test'})
+        if resp.status_code >= 400:
+            self.results.record('register_face', 0.0, error=f"create employee HTTP {resp.status_code}")
+            return
+        self.register_names.add(reg_name)
+        self._post_image('register_face', '/api/register-face',
+                         [('images', ('front.jpg', self.args.image_bytes, 'image/jpeg'))],
+                         {'name': reg_name, 'angles': json.dumps(['front'])})
+
+
+ENDPOINTS = {
+    'attendance': Client.attendance,
+    'employees': Client.employees,
+    'detect_face_quality': Client.detect_face_quality,
+    'register_face': Client.register_face,
+}
+
+
+def request_worker(args, mix, results, register_names, deadline):
+    client = Client(args, results, register_names)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    while time.time() < deadline:
+        name = random.choices(names, weights)[0]
+        try:
+            ENDPOINTS[name](client)
+        except requests.RequestException as e:
+            results.record(name, None, error=type(e).__name__)
+        if args.think_time > 0:
+            time.sleep(random.uniform(0, 2 * args.think_time))
+
+
+def stream_worker(kind, path, marker, args, stream_stats, lock, deadline):
+    """Hold one stream open until the deadline; record time-to-first-message and gaps"""
+    stats = {'connected': False, 'first_ms': None, 'messages': 0, 'gaps': [], 'error': None}
+    start = time.perf_counter()
+    last = None
+    try:
+        with requests.get(args.base_url + path, stream=True, timeout=(5, 35)) as resp:
+            resp.raise_for_status()
+            stats['connected'] = True
+            for chunk in resp.iter_content(chunk_size=None):
+                now = time.perf_counter()
+                hits = chunk.count(marker)
+                if hits:
+                    if last is None:
+                        stats['first_ms'] = _ms(now - start)
+                    else:
+                        stats['gaps'].append(now - last)
+                    last = now
+                    stats['messages'] += hits
+                if time.time() >= deadline:
+                    break
+    except requests.RequestException as e:
+        stats['error'] = type(e).__name__
+    stats['elapsed'] = time.perf_counter() - start
+    with lock:
+        stream_stats[kind].append(stats)
+
+
+def fetch_server_metrics(base_url):
+    """Parse stage _sum/_count and counters from /api/metrics; None if unavailable"""
+    try:
+        text = requests.get(base_url + '/api/metrics', timeout=5).text
+    except requests.RequestException:
+        return None
+    values = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = re.match(r'^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$', line)
+        if match:
+            try:
+                values[match.group(1) + (match.group(2) or '')] = float(match.group(3))
+            except ValueError:
+                pass
+    return values
+
+
+def server_delta(before, after):
+    if before is None or after is None:
+        return None
+    stages = {}
+    for key, total in after.items():
+        match = re.match(r'^faceit_stage_duration_seconds_sum\{stage="([^"]+)"\}$', key)
+        if not match:
+            continue
+        stage = match.group(1)
+        count_key = f'faceit_stage_duration_seconds_count{{stage="{stage}"}}'
+        count = after.get(count_key, 0) - before.get(count_key, 0)
+        if count > 0:
+            stages[stage] = {'count': int(count),
+                             'mean_ms': _ms((total - before.get(key, 0)) / count)}
+    counters = {k: after[k] - before.get(k, 0) for k in after
+                if '_total' in k and after[k] - before.get(k, 0)}
+    return {'stages': stages, 'counters': counters}
+
+
+def delete_load_test_employees(base_url, names):
+    """Delete the throwaway employees and their face data; returns {name: reason} for failures"""
+    failures = {}
+    for name in sorted(names):
+        try:
+            resp = requests.delete(f"{base_url}/api/employees/{name}",
+                                   params={'delete_face_data': 'true'}, timeout=REQUEST_TIMEOUT_SEC)
+        except requests.RequestException as e:
+            failures[name] = str(e)
+            continue
+        if resp.status_code >= 400:
+            failures[name] = f"HTTP {resp.status_code}"
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent stream + API load test')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5002')
+    parser.add_argument('--duration', type=float, default=60.0, help='seconds')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent API clients')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='endpoint=weight,...')
+    parser.add_argument('--think-time', type=float, default=0.5, help='mean pause between a client\'s calls (s)')
+    parser.add_argument('--camera-streams', type=int, default=2, help='concurrent MJPEG viewers')
+    parser.add_argument('--recognition-streams', type=int, default=2, help='concurrent recognition SSE viewers')
+    parser.add_argument('--image', help='JPEG used for detect-face-quality/register-face')
+    parser.add_argument('--attendance-limit', type=int, default=50)
+    parser.add_argument('--register-prefix', default='loadtest_')
+    parser.add_argument('--no-etag', dest='etag', action='store_false', help='don\'t revalidate with If-None-Match')
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+    args.base_url = args.base_url.rstrip('/')
+
+    mix = parse_mix(args.mix)
+    if any(n in mix for n in ('detect_face_quality', 'register_face')):
+        if not args.image:
+            raise SystemExit('--image is required for detect_face_quality/register_face')
+        with open(args.image, 'rb') as f:
+            args.image_bytes = f.read()
+
+    results = Results()
+    register_names = set()
+    stream_stats = defaultdict(list)
+    stream_lock = threading.Lock()
+    metrics_before = fetch_server_metrics(args.base_url)
+    deadline = time.time() + args.duration
+
+    threads = []
+    for _ in range(args.camera_streams):
+        threads.append(threading.Thread(target=stream_worker, daemon=True, args=(
+            'camera_stream', '/api/camera/stream', b'--frame', args, stream_stats, stream_lock, deadline)))
+    for _ in range(args.recognition_streams):
+        threads.append(threading.Thread(target=stream_worker, daemon=True, args=(
+            'recognition_stream', '/api/recognition/stream', b'data:', args, stream_stats, stream_lock, deadline)))
+    if mix:
+        for _ in range(args.workers):
+            threads.append(threading.Thread(target=request_worker, daemon=True, args=(
+                args, mix, results, register_names, deadline)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=args.duration + REQUEST_TIMEOUT_SEC + 10)
+
+    metrics_after = fetch_server_metrics(args.base_url)
+
+    cleanup_failures = delete_load_test_employees(args.base_url, register_names)
+
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'image_bytes'},
+        'endpoints': {},
+        'streams': {},
+        'server': server_delta(metrics_before, metrics_after),
+        'cleanup_failures': cleanup_failures,
+    }
+    for name in sorted(set(results.latencies) | set(results.errors)):
+        summary = summarize(results.latencies[name])
+        summary['throughput_rps'] = round(len(results.latencies[name]) / args.duration, 2)
+        summary['status'] = dict(results.status[name])
+        summary['errors'] = dict(results.errors[name])
+        report['endpoints'][name] = summary
+    for kind, clients in stream_stats.items():
+        gaps = [g for c in clients for g in c['gaps']]
+        elapsed = sum(c['elapsed'] for c in clients) or 1.0
+        report['streams'][kind] = {
+            'clients': len(clients),
+            'connected': sum(1 for c in clients if c['connected']),
+            'errors': [c['error'] for c in clients if c['error']],
+            'first_message_ms_p95': percentile([c['first_ms'] for c in clients if c['first_ms'] is not None], 95),
+            'messages_per_sec_per_client': round(sum(c['messages'] for c in clients) / elapsed, 2),
+            'gap': summarize(gaps),
+        }
+
+    print(f"{'endpoint':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, s in report['endpoints'].items():
+        print(f"{name:<22}{s['count']:>8}{str(s['p50_ms']):>10}{str(s['p95_ms']):>10}"
+              f"{str(s['p99_ms']):>10}{sum(s['errors'].values()):>8}")
+    for kind, s in report['streams'].items():
+        print(f"{kind:<22}{s['connected']}/{s['clients']} connected, "
+              f"{s['messages_per_sec_per_client']} msg/s/client, gap p99 {s['gap']['p99_ms']} ms")
+    for name, reason in cleanup_failures.items():
+        print(f"Could not delete load-test employee {name}: {reason}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+"""
+Metrics - per-stage latency histograms, counters and gauges for the recognition pipeline,
+rendered in Prometheus text exposition format for /api/metrics
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Stage latencies on a Pi range from sub-millisecond (match) to seconds (attribute analysis).
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Recent raw samples kept per histogram for percentile reporting (p50/p95/p99).
+RECENT_SAMPLES = 2048
+
+PREFIX = 'faceit_'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram plus a bounded window of recent samples"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS, recent: int = RECENT_SAMPLES):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent: deque = deque(maxlen=recent)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q in [0, 100] over the recent window; None when empty"""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        idx = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[idx]
+
+
+class MetricsRegistry:
+    """Thread-safe store for stage histograms, labelled counters and gauge callbacks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauges: Dict[str, Tuple[Callable[[], float], str]] = {}
+        self._help: Dict[str, str] = {}
+        self.started_at = time.time()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def observe_stage(self, stage: str, seconds: float):
+        self.observe('stage_duration_seconds', seconds, stage=stage)
+
+    def observe_stages(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.observe_stage(stage, seconds)
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def gauge(self, name: str, fn: Callable[[], float], help_text: Optional[str] = None,
+              metric_type: str = 'gauge'):
+        """Register a value read from fn() at scrape time (metric_type 'counter' for running totals)"""
+        self._gauges[name] = (fn, metric_type)
+        if help_text:
+            self._help[name] = help_text
+
+    def stage_summary(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """{stage: {count, mean, p50, p95, p99}} in seconds, for JSON reports"""
+        with self._lock:
+            series = dict(self._histograms.get('stage_duration_seconds', {}))
+            summary = {}
+            for key, hist in series.items():
+                stage = dict(key).get('stage', '')
+                summary[stage] = {
+                    'count': hist.count,
+                    'mean': (hist.total / hist.count) if hist.count else None,
+                    'p50': hist.percentile(50),
+                    'p95': hist.percentile(95),
+                    'p99': hist.percentile(99),
+                }
+        return summary
+
+    def counter_values(self, name: str) -> Dict[Tuple, float]:
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                full = PREFIX + name
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key in sorted(self._histograms[name]):
+                    hist = self._histograms[name][key]
+                    cumulative = 0
+                    for bound, count in zip(_bucket_labels(hist), hist.counts):
+                        cumulative += count
+                        lines.append(f"{full}_bucket{_label_str(key, ('le', bound))} {cumulative}")
+                    lines.append(f"{full}_sum{_label_str(key)} {hist.total:.6f}")
+                    lines.append(f"{full}_count{_label_str(key)} {hist.count}")
+            for name in sorted(self._counters):
+                full = PREFIX + name + '_total'
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key in sorted(self._counters[name]):
+                    lines.append(f"{full}{_label_str(key)} {self._counters[name][key]:g}")
+        for name in sorted(self._gauges):
+            fn, metric_type = self._gauges[name]
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            full = PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} {metric_type}")
+            lines.append(f"{full} {value:g}")
+        lines.append(f"# TYPE {PREFIX}uptime_seconds gauge")
+        lines.append(f"{PREFIX}uptime_seconds {time.time() - self.started_at:.0f}")
+        return '\n'.join(lines) + '\n'
+
+
+def _bucket_labels(hist: Histogram):
+    return [f"{b:g}" for b in hist.buckets] + ['+Inf']
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
+metrics.describe('stage_duration_seconds', 'Recognition pipeline stage latency')
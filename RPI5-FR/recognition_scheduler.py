@@ -0,0 +1,215 @@
+"""
+Recognition Scheduler - picks the recognition interval, detection width and optional stages
+for each cycle from measured cycle cost, SoC temperature, CPU load, the number of faces in
+view and presence. Load is mapped to a degradation level with hysteresis so the pipeline
+steps down under heat/load and only steps back up after conditions stay clear.
+"""
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+THERMAL_ZONE_PATH = '/sys/class/thermal/thermal_zone0/temp'
+
+
+def read_soc_temperature() -> Optional[float]:
+    """SoC temperature in °C from the thermal zone, None where unavailable"""
+    try:
+        with open(THERMAL_ZONE_PATH, 'r') as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass
+class ScheduleDecision:
+    level: int
+    reason: str
+    presence: str
+    interval: float
+    target_width: int
+    run_attributes: bool
+
+
+class RecognitionScheduler:
+    """Thread-safe; the recognition worker calls plan() before and record_cycle() after each cycle"""
+
+    LEVEL_NAMES = ('normal', 'reduced', 'degraded', 'critical')
+    # Interval multiplier and detection width factor per level.
+    LEVEL_INTERVAL_SCALE = (1.0, 1.4, 2.0, 3.0)
+    LEVEL_WIDTH_SCALE = (1.0, 1.0, 0.8, 0.66)
+    MIN_TARGET_WIDTH = 480
+
+    # Enter thresholds per level 1..3; a level is left only once readings drop
+    # below enter - hysteresis and stay there for STEP_DOWN_HOLD_SEC.
+    TEMP_LEVELS_C = (70.0, 77.0, 82.0)  # Pi 5 firmware throttles at 85 °C
+    TEMP_HYSTERESIS_C = 4.0
+    CPU_LEVELS = (85.0, 93.0, 98.0)
+    CPU_HYSTERESIS = 10.0
+    # Share of wall time the worker may spend inside recognition cycles.
+    TARGET_DUTY = 0.5
+    DUTY_LEVELS = (1.0, 1.6, 2.5)  # base-width cycle cost / (target duty * base interval)
+    DUTY_HYSTERESIS = 0.25
+    STEP_DOWN_HOLD_SEC = 15.0
+    SAMPLE_INTERVAL_SEC = 2.0
+
+    # Presence: seconds since a face was last seen -> minimum interval.
+    PRESENCE_RECENT_SEC = 4.0
+    PRESENCE_IDLE_SEC = 10.0
+    RECENT_INTERVAL = 0.65
+    IDLE_INTERVAL = 0.9
+    # Attribute analysis (DeepFace) is skipped when this many faces are waiting in one cycle.
+    MAX_ATTRIBUTE_FACES = 3
+    COST_EWMA_ALPHA = 0.2
+
+    def __init__(self, base_interval: float = 0.45, base_target_width: int = 960,
+                 temperature_fn: Callable[[], Optional[float]] = read_soc_temperature,
+                 cpu_fn: Optional[Callable[[], Optional[float]]] = None):
+        self._lock = threading.Lock()
+        self.base_interval = base_interval
+        self.base_target_width = base_target_width
+        self._temperature_fn = temperature_fn
+        self._cpu_fn = cpu_fn if cpu_fn is not None else _psutil_cpu_percent
+        self.level = 0
+        self.reason = 'startup'
+        self.cycle_cost_ewma: Optional[float] = None
+        self.temperature: Optional[float] = None
+        self.cpu_percent: Optional[float] = None
+        self.pending_faces = 0
+        self.level_changes = 0
+        self._last_sample = 0.0
+        self._clear_since: Optional[float] = None
+        self._last_decision: Optional[ScheduleDecision] = None
+
+    def record_cycle(self, seconds: float, faces: int, target_width: Optional[int] = None):
+        with self._lock:
+            if target_width and self.base_target_width:
+                # Normalize to the base width (detection cost ~ pixel count) so stepping the
+                # width down does not by itself read as "load cleared" and bounce back up.
+                seconds *= (self.base_target_width / float(target_width)) ** 2
+            if self.cycle_cost_ewma is None:
+                self.cycle_cost_ewma = seconds
+            else:
+                a = self.COST_EWMA_ALPHA
+                self.cycle_cost_ewma = a * seconds + (1 - a) * self.cycle_cost_ewma
+            self.pending_faces = faces
+
+    def _sample(self, now: float):
+        if now - self._last_sample < self.SAMPLE_INTERVAL_SEC:
+            return
+        self._last_sample = now
+        self.temperature = self._temperature_fn()
+        self.cpu_percent = self._cpu_fn()
+
+    def _pressure_level(self, offset: float = 0.0):
+        """Highest level any signal asks for, with thresholds lowered by offset * hysteresis"""
+        candidates = [(0, 'normal')]
+        duty = self._duty()
+        for level in range(3, 0, -1):
+            if self.temperature is not None and \
+                    self.temperature >= self.TEMP_LEVELS_C[level - 1] - offset * self.TEMP_HYSTERESIS_C:
+                candidates.append((level, f"temp {self.temperature:.1f}C"))
+                break
+        for level in range(3, 0, -1):
+            if self.cpu_percent is not None and \
+                    self.cpu_percent >= self.CPU_LEVELS[level - 1] - offset * self.CPU_HYSTERESIS:
+                candidates.append((level, f"cpu {self.cpu_percent:.0f}%"))
+                break
+        for level in range(3, 0, -1):
+            if duty is not None and duty >= self.DUTY_LEVELS[level - 1] - offset * self.DUTY_HYSTERESIS:
+                candidates.append((level, f"cycle cost {self.cycle_cost_ewma * 1000:.0f}ms"))
+                break
+        return max(candidates, key=lambda c: c[0])
+
+    def _duty(self) -> Optional[float]:
+        if self.cycle_cost_ewma is None:
+            return None
+        budget = self.TARGET_DUTY * self.base_interval
+        return self.cycle_cost_ewma / budget if budget > 0 else None
+
+    def _update_level(self, now: float):
+        wanted, reason = self._pressure_level()
+        if wanted > self.level:
+            self._set_level(wanted, reason)
+            self._clear_since = None
+            return
+        # Step down one level at a time, and only after the exit thresholds have held.
+        held, _ = self._pressure_level(offset=1.0)
+        if held >= self.level:
+            self._clear_since = None
+            return
+        if self._clear_since is None:
+            self._clear_since = now
+        elif now - self._clear_since >= self.STEP_DOWN_HOLD_SEC:
+            self._set_level(self.level - 1, reason)
+            self._clear_since = now
+
+    def _set_level(self, level: int, reason: str):
+        previous = self.level
+        self.level = level
+        self.reason = reason
+        self.level_changes += 1
+        icon = '🌡️' if level > previous else '✅'
+        print(f"{icon} Recognition scheduler: {self.LEVEL_NAMES[previous]} -> {self.LEVEL_NAMES[level]} ({reason})")
+        logging.info("Recognition scheduler level %s -> %s (%s)", previous, level, reason)
+
+    def plan(self, last_face_time: float, now: Optional[float] = None, streams: int = 1) -> ScheduleDecision:
+        """Schedule for one camera; streams = active cameras sharing the worker's duty budget"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._sample(now)
+            self._update_level(now)
+
+            idle_gap = now - last_face_time if last_face_time else float('inf')
+            if idle_gap > self.PRESENCE_IDLE_SEC:
+                presence, floor = 'idle', self.IDLE_INTERVAL
+            elif idle_gap > self.PRESENCE_RECENT_SEC:
+                presence, floor = 'recent', self.RECENT_INTERVAL
+            else:
+                presence, floor = 'present', self.base_interval
+
+            width = int(self.base_target_width * self.LEVEL_WIDTH_SCALE[self.level])
+            width = max(min(self.MIN_TARGET_WIDTH, self.base_target_width), width)
+            interval = max(self.base_interval, floor) * self.LEVEL_INTERVAL_SCALE[self.level]
+            if self.cycle_cost_ewma is not None and self.base_target_width:
+                # Never schedule cycles faster than the duty budget allows at this width;
+                # cameras sharing the worker split the budget between them.
+                expected_cost = self.cycle_cost_ewma * (width / float(self.base_target_width)) ** 2
+                interval = max(interval, expected_cost * max(1, streams) / self.TARGET_DUTY)
+            run_attributes = self.level < 2 and self.pending_faces < self.MAX_ATTRIBUTE_FACES
+
+            decision = ScheduleDecision(
+                level=self.level,
+                reason=self.reason,
+                presence=presence,
+                interval=round(interval, 3),
+                target_width=width,
+                run_attributes=run_attributes,
+            )
+            self._last_decision = decision
+            return decision
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'level': self.level,
+                'level_name': self.LEVEL_NAMES[self.level],
+                'reason': self.reason,
+                'level_changes': self.level_changes,
+                'temperature_c': self.temperature,
+                'cpu_percent': self.cpu_percent,
+                'cycle_cost_ms': round(self.cycle_cost_ewma * 1000, 1) if self.cycle_cost_ewma is not None else None,
+                'pending_faces': self.pending_faces,
+                'base_interval': self.base_interval,
+                'base_target_width': self.base_target_width,
+                'decision': asdict(self._last_decision) if self._last_decision else None,
+            }
+
+
+def _psutil_cpu_percent() -> Optional[float]:
+    try:
+        import psutil
+        return psutil.cpu_percent(interval=0.0)
+    except Exception:
+        return None
@@ -0,0 +1,553 @@
+"""
+Production entry point.
+
+The camera, recognition pipeline and database writer must exist exactly once, so
+api_server.py runs as a single owner process bound to loopback (API_INTERNAL_PORT).
+gevent front-end workers listen on API_PORT and reach the owner over keep-alive HTTP:
+
+- ordinary API calls are proxied as-is;
+- /api/camera/stream and /api/recognition/stream are fanned out, so every viewer of
+  the same stream shares one owner connection (one owner thread) instead of one each;
+- /api/events/stream is served from a local EventBus fed by a single owner subscription.
+
+Usage:
+    python serve.py [--workers N] [--no-owner]
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import logging
+import re
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from queue import Empty
+from urllib.parse import parse_qs, urlencode
+
+import gevent
+import requests
+from gevent.event import Event
+from gevent.pywsgi import WSGIServer
+
+from config import Config
+from event_bus import EventBus, CoalescingQueue, TOPICS
+
+logging.basicConfig(
+    level=getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO),
+    format='%(asctime)s [serve:%(process)d] %(levelname)s %(message)s'
+)
+logger = logging.getLogger('serve')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPSTREAM_URL = f"http://127.0.0.1:{Config.API_INTERNAL_PORT}"
+
+PROXY_CONNECT_TIMEOUT_SEC = 3.0
+PROXY_READ_TIMEOUT_SEC = 120.0  # register-face / DeepFace calls can be slow
+# Owner streams send a frame or heartbeat at least every 30 s.
+STREAM_READ_TIMEOUT_SEC = 60.0
+STREAM_MAX_PENDING = 64
+UPSTREAM_RETRY_MAX_SEC = 10.0
+OWNER_RESTART_DELAY_SEC = 2.0
+
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade', 'host',
+}
+SSE_HEADERS = [
+    ('Content-Type', 'text/event-stream'),
+    ('Cache-Control', 'no-cache'),
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', 'Cache-Control, Last-Event-ID'),
+    ('X-Accel-Buffering', 'no'),
+]
+
+session = requests.Session()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=64))
+
+
+def _json_error(start_response, status: str, message: str):
+    body = json.dumps({'success': False, 'error': message}).encode()
+    start_response(status, [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+        ('Access-Control-Allow-Origin', '*'),
+    ])
+    return [body]
+
+
+def _upstream_url(environ) -> str:
+    url = UPSTREAM_URL + environ.get('PATH_INFO', '')
+    if environ.get('QUERY_STRING'):
+        url += '?' + environ['QUERY_STRING']
+    return url
+
+
+def _request_headers(environ) -> dict:
+    headers = {}
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            name = key[5:].replace('_', '-').title()
+            if name.lower() not in HOP_BY_HOP_HEADERS:
+                headers[name] = value
+    if environ.get('CONTENT_TYPE'):
+        headers['Content-Type'] = environ['CONTENT_TYPE']
+    if environ.get('CONTENT_LENGTH'):
+        headers['Content-Length'] = environ['CONTENT_LENGTH']
+    remote = environ.get('REMOTE_ADDR')
+    if remote:
+        prior = headers.get('X-Forwarded-For')
+        headers['X-Forwarded-For'] = f"{prior}, {remote}" if prior else remote
+    return headers
+
+
+def _relay_body(resp):
+    try:
+        for chunk in resp.raw.stream(None, decode_content=False):
+            if chunk:
+                yield chunk
+    finally:
+        resp.close()
+
+
+def proxy_request(environ, start_response):
+    """Forward one request to the owner process and stream the response back"""
+    body = None
+    length = environ.get('CONTENT_LENGTH')
+    if length:
+        try:
+            body = environ['wsgi.input'].read(int(length))
+        except ValueError:
+            return _json_error(start_response, '400 Bad Request', 'Invalid Content-Length')
+    try:
+        resp = session.request(
+            environ['REQUEST_METHOD'],
+            _upstream_url(environ),
+            headers=_request_headers(environ),
+            data=body,
+            stream=True,
+            allow_redirects=False,
+            timeout=(PROXY_CONNECT_TIMEOUT_SEC, PROXY_READ_TIMEOUT_SEC)
+        )
+    except requests.RequestException as e:
+        logger.warning(f"Owner unavailable for {environ.get('PATH_INFO')}: {e}")
+        return _json_error(start_response, '503 Service Unavailable', 'Backend unavailable, retry shortly')
+    headers = [(k, v) for k, v in resp.raw.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS]
+    start_response(f"{resp.status_code} {resp.reason or ''}".strip(), headers)
+    return _relay_body(resp)
+
+
+def _split_mjpeg(chunks):
+    """Yield complete '--frame' parts from an upstream multipart/x-mixed-replace body"""
+    buf = b''
+    for chunk in chunks:
+        buf += chunk
+        while True:
+            start = buf.find(b'--frame\r\n')
+            if start < 0:
+                break
+            head_end = buf.find(b'\r\n\r\n', start)
+            if head_end < 0:
+                break
+            length = None
+            for line in buf[start:head_end].split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    try:
+                        length = int(line.split(b':', 1)[1])
+                    except ValueError:
+                        pass
+            if length is not None:
+                end = head_end + 4 + length + 2
+                if len(buf) < end:
+                    break
+            else:
+                end = buf.find(b'--frame\r\n', head_end)
+                if end < 0:
+                    break
+            yield buf[start:end]
+            buf = buf[end:]
+
+
+def _split_sse(chunks):
+    """Yield complete SSE messages (terminated by a blank line)"""
+    buf = ''
+    for chunk in chunks:
+        buf += chunk.decode('utf-8', errors='replace')
+        while '\n\n' in buf:
+            message, buf = buf.split('\n\n', 1)
+            yield message + '\n\n'
+
+
+# Live fanouts by stream key; a fanout is removed once its last subscriber leaves.
+# Lock order: fanouts_lock, then a fanout's own lock.
+fanouts = {}
+fanouts_lock = threading.Lock()
+
+
+class StreamFanout:
+    """One owner connection per stream key, shared by every client with that key"""
+
+    def __init__(self, key: str, url: str, splitter, coalesce_fn, keep_fn=None):
+        self.key = key
+        self.url = url
+        self._splitter = splitter
+        self._coalesce_fn = coalesce_fn
+        self._keep_fn = keep_fn  # messages replayed to clients that join mid-stream
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._kept = {}
+        self._reader = None
+
+    def subscribe(self) -> CoalescingQueue:
+        client = CoalescingQueue(max_pending=STREAM_MAX_PENDING)
+        with self._lock:
+            for message in self._kept.values():
+                client.put(message)
+            self._clients.add(client)
+            if self._reader is None:
+                self._reader = gevent.spawn(self._run)
+        return client
+
+    def unsubscribe(self, client: CoalescingQueue):
+        client.close()
+        with fanouts_lock:
+            with self._lock:
+                self._clients.discard(client)
+                idle = not self._clients
+            if idle:
+                self._release()
+
+    def _release(self):
+        """Drop this fanout from the registry (caller holds fanouts_lock)"""
+        if fanouts.get(self.key) is self:
+            del fanouts[self.key]
+
+    def _broadcast(self, message) -> bool:
+        """Returns False once nobody is listening so the owner connection can be released"""
+        coalesce = self._coalesce_fn(message)
+        with self._lock:
+            if self._keep_fn:
+                kind = self._keep_fn(message)
+                if kind:
+                    self._kept[kind] = message
+            clients = list(self._clients)
+        for client in clients:
+            if not client.put(message, coalesce=coalesce):
+                logger.warning(f"Dropping stalled client of {self.url}")
+                self.unsubscribe(client)
+        return bool(clients)
+
+    def _run(self):
+        delay = 1.0
+        while True:
+            with self._lock:
+                if not self._clients:
+                    self._reader = None
+                    self._kept.clear()
+                    return
+            try:
+                with session.get(self.url, stream=True,
+                                 timeout=(PROXY_CONNECT_TIMEOUT_SEC, STREAM_READ_TIMEOUT_SEC)) as resp:
+                    if 400 <= resp.status_code < 500:
+                        # Refused (e.g. unknown camera): retrying will not help, so end the clients
+                        logger.warning(f"Upstream refused {self.url}: HTTP {resp.status_code}")
+                        with fanouts_lock:
+                            with self._lock:
+                                clients, self._clients, self._reader = list(self._clients), set(), None
+                                self._kept.clear()
+                            self._release()
+                        for client in clients:
+                            client.close()
+                        return
+                    resp.raise_for_status()
+                    delay = 1.0
+                    for message in self._splitter(resp.iter_content(chunk_size=None)):
+                        if not self._broadcast(message):
+                            break
+            except requests.RequestException as e:
+                logger.info(f"Upstream stream {self.url} interrupted: {e}")
+                gevent.sleep(delay)
+                delay = min(delay * 2, UPSTREAM_RETRY_MAX_SEC)
+            except Exception as e:
+                logger.error(f"Upstream stream {self.url} failed: {e}")
+                gevent.sleep(delay)
+                delay = min(delay * 2, UPSTREAM_RETRY_MAX_SEC)
+            else:
+                # Owner ended the stream (e.g. camera stopped); don't hammer it.
+                gevent.sleep(delay)
+                delay = min(delay * 2, UPSTREAM_RETRY_MAX_SEC)
+            with self._lock:
+                self._kept.clear()
+
+
+def _subscribe(key: str, factory):
+    """(fanout, client) for key; subscribing under fanouts_lock so a concurrent last
+    unsubscribe cannot drop the fanout from the registry in between"""
+    with fanouts_lock:
+        fanout = fanouts.get(key)
+        if fanout is None:
+            fanout = factory()
+            fanouts[key] = fanout
+        return fanout, fanout.subscribe()
+
+
+def _drain(fanout: StreamFanout, client: CoalescingQueue, heartbeat, heartbeat_sec: float):
+    try:
+        while not client.closed:
+            try:
+                message = client.get(timeout=heartbeat_sec)
+            except Empty:
+                if client.closed:
+                    break
+                if heartbeat is not None:
+                    yield heartbeat
+                continue
+            yield message.encode() if isinstance(message, str) else message
+    finally:
+        fanout.unsubscribe(client)
+
+
+def _int_arg(params, name):
+    try:
+        return int(params[name][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def _camera_stream_params(qs: str) -> dict:
+    """The query parameters the owner's _resolve_stream_params actually reads, normalised:
+    w/h only as a pair, unparsable values dropped (the owner falls back to its defaults for
+    those) and everything else (the UI's ?ts= cache-buster) ignored. fps is not a query
+    parameter; the owner takes it from camera settings for every viewer alike."""
+    params = parse_qs(qs)
+    resolved = {}
+    width, height = _int_arg(params, 'w'), _int_arg(params, 'h')
+    if width is not None and height is not None:
+        resolved['w'], resolved['h'] = width, height
+    quality = _int_arg(params, 'q')
+    if quality is not None:
+        resolved['q'] = quality
+    return resolved
+
+
+def camera_stream(environ, start_response):
+    """MJPEG fan-out: viewers with the same stream parameters share one owner stream"""
+    qs = urlencode(_camera_stream_params(environ.get('QUERY_STRING', '')))
+    key = 'camera:' + qs
+    url = f"{UPSTREAM_URL}/api/camera/stream" + (f"?{qs}" if qs else '')
+    fanout, client = _subscribe(
+        key,
+        lambda: StreamFanout(key, url, _split_mjpeg, coalesce_fn=lambda _m: True)
+    )
+    start_response('200 OK', [
+        ('Content-Type', 'multipart/x-mixed-replace; boundary=frame'),
+        ('Cache-Control', 'no-cache'),
+        ('Access-Control-Allow-Origin', '*'),
+    ])
+    return _drain(fanout, client, heartbeat=None, heartbeat_sec=5.0)
+
+
+_CAMERA_ID_RE = re.compile(r'"cameraId": "((?:[^"\\]|\\.)*)"')
+
+
+def _recognition_coalesce_key(message: str):
+    """face_detected frames are latest-wins per camera, like the owner's own queues"""
+    if '"type": "face_detected"' not in message:
+        return False
+    match = _CAMERA_ID_RE.search(message)
+    return match.group(1) if match else True
+
+
+def _recognition_kept_kind(message: str):
+    if '"type": "connection"' in message:
+        return 'connection'
+    if '"type": "status"' in message:
+        return 'status'
+    return None
+
+
+def recognition_stream(environ, start_response):
+    """Recognition SSE fan-out: one owner subscription per ?camera=<id>|all selection, shared
+    by all viewers of it"""
+    camera = (parse_qs(environ.get('QUERY_STRING', '')).get('camera') or [''])[0]
+    url = f"{UPSTREAM_URL}/api/recognition/stream" + (f"?{urlencode({'camera': camera})}" if camera else '')
+    key = 'recognition:' + camera
+    fanout, client = _subscribe(
+        key,
+        lambda: StreamFanout(
+            key,
+            url,
+            _split_sse,
+            coalesce_fn=_recognition_coalesce_key,
+            keep_fn=_recognition_kept_kind
+        )
+    )
+    start_response('200 OK', SSE_HEADERS)
+    return _drain(fanout, client, heartbeat=': heartbeat\n\n', heartbeat_sec=25.0)
+
+
+# Change feed: local bus fed by one owner subscription, so Last-Event-ID resume and
+# per-client topic filtering happen here without costing the owner a thread per tab.
+feed_bus = EventBus()
+feed_relay = None
+
+
+def _relay_event_feed():
+    delay = 1.0
+    while True:
+        try:
+            with session.get(f"{UPSTREAM_URL}/api/events/stream", stream=True,
+                             timeout=(PROXY_CONNECT_TIMEOUT_SEC, STREAM_READ_TIMEOUT_SEC)) as resp:
+                resp.raise_for_status()
+                delay = 1.0
+                for message in _split_sse(resp.iter_content(chunk_size=None)):
+                    data_lines = [line[5:].strip() for line in message.splitlines() if line.startswith('data:')]
+                    if not data_lines:
+                        continue
+                    try:
+                        event = json.loads('\n'.join(data_lines))
+                    except ValueError:
+                        continue
+                    event_type = event.get('type')
+                    if event_type == 'resync':
+                        # Owner restarted or we fell behind: our clients must refetch too.
+                        feed_bus.request_resync()
+                    elif event_type in TOPICS:
+                        feed_bus.publish(event_type, event.get('data'))
+        except requests.RequestException as e:
+            logger.info(f"Event feed relay interrupted: {e}")
+        except Exception as e:
+            logger.error(f"Event feed relay failed: {e}")
+        gevent.sleep(delay)
+        delay = min(delay * 2, UPSTREAM_RETRY_MAX_SEC)
+
+
+def events_stream(environ, start_response):
+    global feed_relay
+    if feed_relay is None:
+        feed_relay = gevent.spawn(_relay_event_feed)
+    params = parse_qs(environ.get('QUERY_STRING', ''))
+    topics = EventBus.parse_topics((params.get('topics') or [None])[0])
+    last_event_id = environ.get('HTTP_LAST_EVENT_ID') or (params.get('lastEventId') or [None])[0]
+    start_response('200 OK', SSE_HEADERS)
+    return (chunk.encode() for chunk in feed_bus.stream(topics, last_event_id=last_event_id))
+
+
+STREAM_ROUTES = {
+    '/api/camera/stream': camera_stream,
+    '/api/recognition/stream': recognition_stream,
+    '/api/events/stream': events_stream,
+}
+
+
+def application(environ, start_response):
+    handler = STREAM_ROUTES.get(environ.get('PATH_INFO', '')) if environ['REQUEST_METHOD'] == 'GET' else None
+    if handler is not None:
+        return handler(environ, start_response)
+    return proxy_request(environ, start_response)
+
+
+def _bind_listener(host: str, port: int) -> socket.socket:
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    return listener
+
+
+def _owner_command():
+    if Config.OWNER_SERVER == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:application',
+                '--host', '127.0.0.1', '--port', str(Config.API_INTERNAL_PORT), '--workers', '1']
+    return [sys.executable, os.path.join(BASE_DIR, 'api_server.py')]
+
+
+def supervise_owner(stop_event):
+    """Run api_server.py as the single camera owner and restart it if it exits"""
+    env = dict(os.environ, API_HOST='127.0.0.1', API_PORT=str(Config.API_INTERNAL_PORT))
+    while not stop_event.is_set():
+        logger.info(f"Starting owner process on 127.0.0.1:{Config.API_INTERNAL_PORT}")
+        proc = subprocess.Popen(_owner_command(), cwd=BASE_DIR, env=env)
+        supervise_owner.proc = proc
+        code = proc.wait()
+        if stop_event.is_set():
+            break
+        logger.warning(f"Owner process exited with code {code}; restarting")
+        gevent.sleep(OWNER_RESTART_DELAY_SEC)
+
+
+supervise_owner.proc = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Production server for the Facial Recognition API')
+    parser.add_argument('--workers', type=int, default=Config.SERVE_WORKERS,
+                        help='front-end worker processes (the camera owner is always one process)')
+    parser.add_argument('--no-owner', action='store_true',
+                        help='do not spawn api_server.py (it is managed separately)')
+    args = parser.parse_args()
+
+    if Config.API_INTERNAL_PORT == Config.API_PORT:
+        parser.error('API_INTERNAL_PORT must differ from API_PORT')
+
+    listener = _bind_listener(Config.API_HOST, Config.API_PORT)
+    workers = max(1, args.workers)
+
+    # Fork before any greenlet exists so children start with a clean hub.
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+            WSGIServer(listener, application, log=None).serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    stop_event = Event()
+    server = WSGIServer(listener, application, log=None)
+
+    def shutdown(*_):
+        if stop_event.is_set():
+            return
+        logger.info("Shutting down")
+        stop_event.set()
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        proc = supervise_owner.proc
+        if proc is not None and proc.poll() is None:
+            # api_server.py and uvicorn both clean up the camera on SIGINT.
+            proc.send_signal(signal.SIGINT)
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        server.stop(timeout=2)
+
+    def watch_child(pid):
+        os.waitpid(pid, 0)
+        if not stop_event.is_set():
+            # A forked worker can't be respawned safely from a running hub; restart everything.
+            logger.error(f"Front-end worker {pid} exited; stopping so the service manager restarts us")
+            shutdown()
+
+    gevent.signal_handler(signal.SIGTERM, shutdown)
+    gevent.signal_handler(signal.SIGINT, shutdown)
+    if not args.no_owner:
+        gevent.spawn(supervise_owner, stop_event)
+    for pid in children:
+        gevent.spawn(watch_child, pid)
+
+    logger.info(f"Serving on {Config.API_HOST}:{Config.API_PORT} with {workers} front-end worker(s); "
+                f"owner at {UPSTREAM_URL}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
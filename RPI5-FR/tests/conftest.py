@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the server modules the way api_server.py does, from the RPI5-FR directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
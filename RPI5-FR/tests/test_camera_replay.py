@@ -0,0 +1,40 @@
+"""
+Replay pacing in CameraManager: a dump holding several recording sessions (FrameDumpWriter
+appends) must not sleep through the gap between them.
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('cv2')
+
+from face_detection import camera_manager
+from face_detection.camera_manager import CameraManager
+
+
+class _TimedReplay:
+    def __init__(self, timestamps):
+        self._timestamps = list(timestamps)
+        self.frame_timestamp = None
+
+    def read(self):
+        if not self._timestamps:
+            return None
+        self.frame_timestamp = self._timestamps.pop(0)
+        return np.zeros((2, 2, 3), dtype=np.uint8)
+
+
+def test_session_gap_is_clamped(monkeypatch):
+    slept = []
+    monkeypatch.setattr(camera_manager.time, 'sleep', slept.append)
+    monkeypatch.setattr(camera_manager.time, 'monotonic', lambda: 0.0)
+    manager = CameraManager(framerate=20, replay_source='session.fdump')
+    # Two sessions two hours apart
+    manager.replay = _TimedReplay([100.0, 100.05, 100.10, 7300.0, 7300.05])
+    manager._replay_due = 0.0
+
+    for _ in range(5):
+        assert manager._read_replay_frame() is not None
+
+    assert manager.replay_frame_index == 5
+    assert manager._replay_due == pytest.approx(0.05 + 0.05 + camera_manager.REPLAY_MAX_GAP_FRAMES / 20 + 0.05)
+    assert max(slept) < 1.0
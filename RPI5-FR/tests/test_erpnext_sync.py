@@ -0,0 +1,168 @@
+"""
+ERPNextSyncWorker and fetch_employees against serve_mock: paged insert_many delivery, the
+duplicate-timestamp refusal counted as delivered, dead letters after max_attempts, an
+unreachable server costing no attempts, and the keyset Employee pull surviving an edit
+made between its pages.
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import pytest
+
+requests = pytest.importorskip('requests')
+pytest.importorskip('dotenv')
+# db.database opens its default database on import and config fixes the faces directory:
+# keep both out of the tree
+_scratch = tempfile.mkdtemp(prefix='erpnext-sync-')
+os.environ.setdefault('DATABASE_FILE', os.path.join(_scratch, 'default.db'))
+os.environ.setdefault('FACES_DIRECTORY', os.path.join(_scratch, 'faces'))
+
+import erpnext_sync
+from db.database import Database
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start_mock(**kwargs) -> str:
+    port = _free_port()
+    threading.Thread(target=erpnext_sync.serve_mock, args=(port,), kwargs=kwargs, daemon=True).start()
+    deadline = time.monotonic() + 5.0
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return f'http://127.0.0.1:{port}'
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _checkins(base: str):
+    return requests.get(f'{base}/api/resource/Employee Checkin').json()['data']
+
+
+@pytest.fixture
+def database(tmp_path):
+    return Database(str(tmp_path / 'attendance.db'))
+
+
+def _punch(database, count: int):
+    return [database.log_attendance(f'HR-EMP-{i:05d}', f'Employee {i}', 0.9) for i in range(1, count + 1)]
+
+
+def _worker(database, base: str, **kwargs):
+    worker = erpnext_sync.ERPNextSyncWorker(
+        database, lambda: {'serverUrl': base, 'apiKey': 'key', 'apiSecret': 'secret'}, 'test-device',
+        backoff_base=0.0, **kwargs)
+    posted = []
+    post = worker.session.post
+
+    def recording_post(url, *args, **kw):
+        posted.append(url)
+        return post(url, *args, **kw)
+
+    worker.session.post = recording_post
+    return worker, posted
+
+
+def _rows(database):
+    with database.get_connection() as conn:
+        return [dict(row) for row in conn.execute('SELECT * FROM attendance_logs ORDER BY id')]
+
+
+def test_pages_are_delivered_with_insert_many(database):
+    base = _start_mock()
+    _punch(database, 25)
+    worker, posted = _worker(database, base, batch_size=10)
+
+    result = worker.run_once()
+
+    assert result['sent'] == 25 and result['error'] is None
+    assert worker.stats['batches'] == 3
+    assert posted == [f'{base}/api/method/frappe.client.insert_many'] * 3
+    assert len(_checkins(base)) == 25
+    rows = _rows(database)
+    assert all(row['synced'] == 1 and row['sync_remote_id'] for row in rows)
+    assert [row['sync_key'] for row in rows] == [f"test-device-{row['id']}" for row in rows]
+
+
+def test_resent_punch_counts_as_delivered(database):
+    base = _start_mock()
+    ids = _punch(database, 3)
+    worker, _ = _worker(database, base)
+    assert worker.run_once()['sent'] == 3
+    # The response was "lost": the same punches (same keys) go out again
+    database.set_attendance_sync_state(ids, 0)
+
+    result = worker.run_once()
+
+    assert result['sent'] == 0 and result['duplicates'] == 3 and result['dead'] == 0
+    assert len(_checkins(base)) == 3
+    assert all(row['synced'] == 1 for row in _rows(database))
+
+
+def test_failing_server_dead_letters_after_max_attempts(database):
+    base = _start_mock(fail_rate=1.0)
+    _punch(database, 2)
+    worker, _ = _worker(database, base, max_attempts=3)
+
+    for attempt in range(1, 3):
+        result = worker.run_once()
+        assert result['retried'] == 2 and result['error']
+        assert all(row['synced'] == 0 and row['sync_attempts'] == attempt for row in _rows(database))
+    result = worker.run_once()
+
+    assert result['dead'] == 2
+    assert database.get_attendance_sync_counts()['dead'] == 2
+    assert all(row['sync_error'] for row in database.get_dead_attendance())
+
+
+def test_unreachable_server_costs_no_attempts(database):
+    base = f'http://127.0.0.1:{_free_port()}'
+    _punch(database, 2)
+    worker, _ = _worker(database, base, max_attempts=1)
+
+    for _ in range(2):
+        result = worker.run_once()
+        assert result['error'].startswith('ERPNext unreachable')
+        worker.backoff_until = 0.0
+
+    assert all(row['synced'] == 0 and not row['sync_attempts'] for row in _rows(database))
+    assert worker.snapshot()['consecutive_failures'] == 2
+
+
+def test_employee_pull_survives_an_edit_between_pages():
+    base = _start_mock(employee_count=250)
+    session = requests.Session()
+    get = session.get
+    touched = threading.Event()
+
+    def editing_get(url, *args, **kwargs):
+        response = get(url, *args, **kwargs)
+        if not touched.is_set():
+            touched.set()
+            # Five employees move to the end of the (modified, name) order and one is hired
+            requests.post(f'{base}/api/test/touch', json={'count': 5, 'status': 'Left'})
+        return response
+
+    session.get = editing_get
+
+    rows = erpnext_sync.fetch_employees(session, base, page_size=20, workers=4)
+
+    assert touched.is_set()
+    expected = requests.get(f'{base}/api/resource/Employee',
+                            params={'limit_page_length': 1000}).json()['data']
+    assert len(expected) == 251
+    assert [row['name'] for row in rows] == [row['name'] for row in expected]
+    assert {row['name']: row['modified'] for row in rows} == {row['name']: row['modified'] for row in expected}
+    assert sum(1 for row in rows if row['status'] == 'Left') == 5
+    assert rows == sorted(rows, key=lambda row: (row['modified'], row['name']))
+    # Incremental pulls only return what changed after the mark
+    assert erpnext_sync.fetch_employees(requests.Session(), base, since=rows[-1]['modified']) == []
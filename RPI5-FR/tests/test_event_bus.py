@@ -0,0 +1,59 @@
+"""
+EventBus Last-Event-ID resume: ids carry the bus's boot epoch, so an id from before a restart
+(or from another serve worker) resyncs instead of resuming from an unrelated event.
+"""
+import json
+
+from event_bus import EventBus
+
+
+def _events(stream, count):
+    """Parsed (sse id, payload) of the next count data messages, skipping the connection hello"""
+    out = []
+    while len(out) < count:
+        message = next(stream)
+        sse_id = next((line[4:] for line in message.splitlines() if line.startswith('id: ')), None)
+        payload = json.loads(message.split('data: ', 1)[1])
+        if payload['type'] != 'connection':
+            out.append((sse_id, payload))
+    return out
+
+
+def _last_event_id(bus):
+    stream = bus.stream({'employee_changed'})
+    _events(stream, 1)  # resync on a fresh connection
+    stream.close()
+    for n in range(3):
+        bus.publish('employee_changed', {'n': n})
+    return f"{bus.epoch}-2"
+
+
+def test_resume_within_the_same_epoch_replays_missed_events():
+    bus = EventBus()
+    last_event_id = _last_event_id(bus)
+    stream = bus.stream({'employee_changed'}, last_event_id=last_event_id)
+    (sse_id, payload), = _events(stream, 1)
+    stream.close()
+    assert payload['type'] == 'employee_changed' and payload['data'] == {'n': 2}
+    assert sse_id == f"{bus.epoch}-3"
+
+
+def test_id_from_a_previous_epoch_resyncs():
+    last_event_id = _last_event_id(EventBus())
+    restarted = EventBus()
+    for n in range(5):
+        restarted.publish('employee_changed', {'n': n})
+    stream = restarted.stream({'employee_changed'}, last_event_id=last_event_id)
+    (sse_id, payload), = _events(stream, 1)
+    stream.close()
+    assert payload['type'] == 'resync'
+    assert sse_id == f"{restarted.epoch}-5"
+
+
+def test_bare_numeric_id_resyncs():
+    bus = EventBus()
+    bus.publish('employee_changed', {})
+    stream = bus.stream({'employee_changed'}, last_event_id='0')
+    (_, payload), = _events(stream, 1)
+    stream.close()
+    assert payload['type'] == 'resync'
@@ -0,0 +1,57 @@
+"""
+FaceTracker keeps tracks per camera: a camera's cycles only age out its own tracks, so a
+camera that stops has its tracks dropped when its pipeline stops.
+"""
+import pytest
+
+from face_tracks import FaceTracker
+
+BOX = (10, 60, 60, 10)
+
+
+def test_cycles_only_age_out_their_own_camera():
+    tracker = FaceTracker(max_age=2.0)
+    tracker.update([BOX], now=0.0, camera_id='entry')
+    exit_track, = tracker.update([BOX], now=0.0, camera_id='exit')
+
+    tracker.update([], now=10.0, camera_id='entry')
+
+    assert len(tracker) == 1
+    assert tracker.get(exit_track.track_id) is exit_track
+
+
+def test_drop_camera_forgets_only_that_camera():
+    tracker = FaceTracker()
+    entry_track, = tracker.update([BOX], now=0.0, camera_id='entry')
+    tracker.update([BOX, (100, 150, 150, 100)], now=0.0, camera_id='exit')
+
+    assert tracker.drop_camera('exit') == 2
+    assert tracker.drop_camera('exit') == 0
+    assert len(tracker) == 1 and tracker.get(entry_track.track_id) is entry_track
+
+
+def test_stopping_a_pipeline_drops_its_tracks():
+    pytest.importorskip('cv2')
+    from camera_pipelines import CameraPipeline
+
+    class _Manager:
+        is_initialized = True
+
+        def initialize(self):
+            return True
+
+        def read_frame(self):
+            return None
+
+        def close(self):
+            pass
+
+    tracker = FaceTracker()
+    pipeline = CameraPipeline('exit', 'rtsp://camera', create_manager=lambda p: _Manager(),
+                              on_stop=tracker.drop_camera)
+    assert pipeline.start()
+    tracker.update([BOX], camera_id='exit')
+
+    pipeline.stop()
+
+    assert len(tracker) == 0
@@ -0,0 +1,35 @@
+"""
+FramePacer: the MJPEG fps cap must hold the target rate under capture jitter, not halve it.
+"""
+import random
+
+from frame_hub import FramePacer
+
+
+def _admitted(source_fps, cap_fps, seconds=10.0, jitter=0.006, seed=1):
+    rng = random.Random(seed)
+    pacer = FramePacer(cap_fps)
+    frames = int(source_fps * seconds)
+    return sum(pacer.admit(i / source_fps + rng.uniform(-jitter, jitter)) for i in range(frames))
+
+
+def test_jittery_source_at_the_cap_keeps_every_frame():
+    assert _admitted(30, 30) >= 0.97 * 300
+
+
+def test_faster_source_is_held_to_the_cap():
+    assert abs(_admitted(30, 15) - 150) <= 3
+    assert abs(_admitted(60, 20) - 200) <= 3
+
+
+def test_stall_does_not_burst():
+    pacer = FramePacer(10)
+    assert pacer.admit(0.0)
+    assert pacer.admit(5.0)  # after a 5 s stall
+    assert not pacer.admit(5.01)
+    assert not pacer.admit(5.02)
+
+
+def test_zero_fps_is_unpaced():
+    pacer = FramePacer(0)
+    assert all(pacer.admit(0.0) for _ in range(5))
@@ -0,0 +1,140 @@
+"""
+Two GalleryReplicators on separate databases and faces directories, wired through
+changes_since/apply_changes the way sync_peer does over HTTP: concurrent edits settle on the
+same (counter, origin) winner on both sides, tombstones and faces_deleted reach the peer, and
+a change is never sent back to the device it came from.
+"""
+import os
+import tempfile
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('requests')
+pytest.importorskip('face_recognition')
+# db.database opens its default database on import: keep it out of the tree
+_scratch = tempfile.mkdtemp(prefix='gallery-replication-')
+os.environ.setdefault('DATABASE_FILE', os.path.join(_scratch, 'default.db'))
+
+from db.database import Database
+from face_detection.gallery import load_replica
+from gallery_replication import GalleryReplicator
+
+MODEL_ID = 'test-model'
+
+
+class _Device:
+    def __init__(self, root, device_id):
+        faces_dir = os.path.join(str(root), device_id, 'faces')
+        os.makedirs(faces_dir)
+        self.db = Database(os.path.join(str(root), device_id, 'db.sqlite'))
+        self.gallery = {}
+        self.applied = []
+        self.cursors = {}
+        self.replicator = GalleryReplicator(
+            self.db, device_id, faces_dir,
+            get_encodings=lambda person: (MODEL_ID, self.gallery.get(person)),
+            local_model_id=lambda: MODEL_ID,
+            on_applied=lambda person, encodings, removed: self.applied.append((person, encodings, removed)))
+
+    @property
+    def device_id(self):
+        return self.replicator.device_id
+
+    def register(self, person, name, value):
+        self.db.upsert_employee({'id': person, 'name': name, 'face_registered': True})
+        self.gallery[person] = np.full((2, 4), value, dtype=np.float32)
+        self.replicator.note_local_change(person, faces_changed=True)
+
+    def version(self, person):
+        row = self.db.get_gallery_version(person)
+        return row['counter'], row['origin']
+
+
+def _sync(source, target):
+    """target pulls everything new from source; returns the changes that were sent"""
+    sent = []
+    while True:
+        page = source.replicator.changes_since(target.cursors.get(source.device_id, 0), peer=target.device_id)
+        target.replicator.apply_changes(page['changes'], source.device_id)
+        sent += page['changes']
+        target.cursors[source.device_id] = page['seq']
+        if not page['more']:
+            return sent
+
+
+@pytest.fixture
+def devices(tmp_path):
+    return _Device(tmp_path, 'A'), _Device(tmp_path, 'B')
+
+
+def test_concurrent_edits_pick_the_same_winner(devices):
+    a, b = devices
+    a.register('bob', 'Bob at A', 1.0)
+    b.register('bob', 'Bob at B', 2.0)
+    assert (a.version('bob'), b.version('bob')) == ((1, 'A'), (1, 'B'))
+
+    _sync(a, b)
+    _sync(b, a)
+
+    # (1, 'B') > (1, 'A'): both keep B's registration
+    assert a.version('bob') == b.version('bob') == (1, 'B')
+    assert a.db.get_employee('bob')['name'] == b.db.get_employee('bob')['name'] == 'Bob at B'
+    assert np.array_equal(load_replica(a.replicator.faces_dir, 'bob', MODEL_ID), b.gallery['bob'])
+    assert b.replicator.stats['stale'] == 1 and not b.applied
+
+    # A's next edit ticks past the counter it has seen, so it wins everywhere
+    a.register('bob', 'Robert', 3.0)
+    _sync(a, b)
+    _sync(b, a)
+    assert a.version('bob') == b.version('bob') == (2, 'A')
+    assert b.db.get_employee('bob')['name'] == 'Robert'
+    assert np.array_equal(b.applied[-1][1], a.gallery['bob'])
+
+
+def test_tombstones_and_deleted_faces_propagate(devices):
+    a, b = devices
+    a.register('bob', 'Bob', 1.0)
+    a.register('eve', 'Eve', 2.0)
+    os.makedirs(a.replicator.profile_dir)
+    with open(a.replicator._profile_path('bob'), 'wb') as f:
+        f.write(b'jpeg bytes')
+    _sync(a, b)
+    assert load_replica(b.replicator.faces_dir, 'bob', MODEL_ID) is not None
+    assert os.path.exists(b.replicator._profile_path('bob'))
+
+    # Eve's faces are deleted but she stays; Bob is deleted with his faces
+    del a.gallery['eve']
+    a.replicator.note_local_change('eve', faces_deleted=True)
+    a.db.delete_employee('bob')
+    del a.gallery['bob']
+    a.replicator.note_local_change('bob', deleted=True, faces_deleted=True)
+    sent = {change['id']: change for change in _sync(a, b)}
+
+    assert sent['bob']['deleted'] and sent['bob']['faces_deleted'] and 'employee' not in sent['bob']
+    assert sent['eve']['faces_deleted'] and 'encodings' not in sent['eve']
+    assert b.db.get_employee('bob') is None
+    assert load_replica(b.replicator.faces_dir, 'bob') == {}
+    assert not os.path.exists(b.replicator._profile_path('bob'))
+    assert b.db.get_employee('eve') is not None
+    assert load_replica(b.replicator.faces_dir, 'eve') == {}
+    assert b.applied[-2:] == [('eve', None, True), ('bob', None, True)]
+
+    # B forwards both flags to devices further along
+    forwarded = {change['id']: change for change in b.replicator.changes_since(0, peer='C')['changes']}
+    assert forwarded['bob']['deleted'] and forwarded['bob']['faces_deleted']
+    assert forwarded['eve']['faces_deleted'] and not forwarded['eve']['deleted']
+
+
+def test_changes_are_not_echoed_to_their_source(devices):
+    a, b = devices
+    a.register('bob', 'Bob', 1.0)
+    b.register('amy', 'Amy', 2.0)
+
+    assert [change['id'] for change in _sync(a, b)] == ['bob']
+    assert [change['id'] for change in _sync(b, a)] == ['amy']
+    # Each side now holds both people, but only its own change goes back out
+    assert _sync(a, b) == [] and _sync(b, a) == []
+    assert [change['id'] for change in a.replicator.changes_since(0, peer='B')['changes']] == ['bob']
+    assert sorted(change['id'] for change in a.replicator.changes_since(0, peer='C')['changes']) == ['amy', 'bob']
+    assert a.replicator.stats['stale'] == b.replicator.stats['stale'] == 0
@@ -0,0 +1,66 @@
+"""
+GalleryStore.publish under concurrent publishers: CURRENT must only move forward and end on
+the newest generation.
+"""
+import multiprocessing
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from face_detection.gallery_index import GalleryIndex
+from face_detection.gallery_store import GalleryStore
+
+MODEL_ID = 'test-model'
+
+
+def _index(seed):
+    rng = np.random.default_rng(seed)
+    return GalleryIndex(list(rng.normal(size=(3, 8))), ['a', 'b', 'c'], 'float32', MODEL_ID, calibrate=False)
+
+
+def _publish_many(root, seed, count):
+    store = GalleryStore(root, MODEL_ID)
+    for i in range(count):
+        store.publish(_index(seed * 1000 + i))
+
+
+def _watch(store, stop, seen):
+    while not stop.is_set():
+        generation = store.current_generation()
+        if generation is not None:
+            seen.append(generation)
+
+
+def _run_publishers(tmp_path, start_publisher):
+    store = GalleryStore(str(tmp_path), MODEL_ID)
+    stop, seen = threading.Event(), []
+    watcher = threading.Thread(target=_watch, args=(store, stop, seen))
+    watcher.start()
+    publishers = [start_publisher(str(tmp_path), seed, 8) for seed in range(4)]
+    for publisher in publishers:
+        publisher.join()
+    stop.set()
+    watcher.join()
+    assert all(a <= b for a, b in zip(seen, seen[1:])), 'CURRENT moved back to an older generation'
+    assert store.current_generation() == max(store.generations()) == 32
+    assert store.open().generation == 32
+
+
+def test_concurrent_thread_publishers(tmp_path):
+    def start(root, seed, count):
+        thread = threading.Thread(target=_publish_many, args=(root, seed, count))
+        thread.start()
+        return thread
+
+    _run_publishers(tmp_path, start)
+
+
+def test_concurrent_process_publishers(tmp_path):
+    def start(root, seed, count):
+        process = multiprocessing.get_context('fork').Process(target=_publish_many, args=(root, seed, count))
+        process.start()
+        return process
+
+    _run_publishers(tmp_path, start)
@@ -0,0 +1,48 @@
+"""MJPEG part parsing in NetworkFrameSource: a part split across reads at any byte must come
+out whole, including JPEGs that contain an EOI marker before their end (EXIF thumbnails)."""
+import pytest
+
+pytest.importorskip('cv2')
+
+from face_detection.network_source import NetworkFrameSource, multipart_boundary
+
+# 26 bytes: SOI, an embedded thumbnail ending in EOI, more data, the real EOI
+JPEG_WITH_THUMBNAIL = b'\xff\xd8\xff\xe1\x00\x08\xff\xd8\x01\x02\xff\xd9ABCDEFGHIJKL\xff\xd9'
+PLAIN_JPEG = b'\xff\xd8\x00\x11\x22\x33\xff\xd9'
+
+
+def _part(jpeg, boundary=b'--myboundary'):
+    return (boundary + b'\r\nContent-Type: image/jpeg\r\nContent-Length: ' + str(len(jpeg)).encode()
+            + b'\r\n\r\n' + jpeg + b'\r\n')
+
+
+STREAM = _part(JPEG_WITH_THUMBNAIL) + _part(PLAIN_JPEG) + _part(JPEG_WITH_THUMBNAIL)
+EXPECTED = [JPEG_WITH_THUMBNAIL, PLAIN_JPEG, JPEG_WITH_THUMBNAIL]
+
+
+def _parse(chunks, boundary):
+    source = NetworkFrameSource('http://127.0.0.1:1/stream')
+    published = []
+    source._publish = lambda payload, is_jpeg: published.append(payload)
+    buffer = b''
+    for chunk in chunks:
+        buffer = source._extract_jpegs(buffer + chunk, boundary)
+    return published
+
+
+def test_boundary_from_content_type():
+    assert multipart_boundary('multipart/x-mixed-replace; boundary=myboundary') == b'--myboundary'
+    assert multipart_boundary('multipart/x-mixed-replace;boundary="--frame"') == b'--frame'
+    assert multipart_boundary('image/jpeg') is None
+
+
+@pytest.mark.parametrize('boundary', [b'--myboundary', None])
+def test_part_split_at_every_offset(boundary):
+    assert len(JPEG_WITH_THUMBNAIL) == 26
+    for offset in range(1, len(STREAM)):
+        assert _parse([STREAM[:offset], STREAM[offset:]], boundary) == EXPECTED, offset
+
+
+@pytest.mark.parametrize('boundary', [b'--myboundary', None])
+def test_byte_at_a_time(boundary):
+    assert _parse([STREAM[i:i + 1] for i in range(len(STREAM))], boundary) == EXPECTED
@@ -0,0 +1,34 @@
+"""
+_resolve_stream_params is shared by the Flask routes and asgi.py, which calls it from the event
+loop with a plain dict and no Flask request context.
+"""
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip('flask_cors')
+pytest.importorskip('face_recognition')
+# Importing the server opens its database and faces directory: keep them out of the tree
+_scratch = tempfile.mkdtemp(prefix='stream-params-')
+os.environ.setdefault('DATABASE_FILE', os.path.join(_scratch, 'test.db'))
+os.environ.setdefault('FACES_DIRECTORY', os.path.join(_scratch, 'faces'))
+api_server = pytest.importorskip('api_server')
+
+
+def test_resolves_a_plain_dict_outside_a_request():
+    width, height, quality, _ = api_server._resolve_stream_params({'w': '800', 'h': '600', 'q': '90'})
+    assert (width, height, quality) == (800, 600, 90)
+
+
+def test_out_of_range_quality_is_clamped():
+    _, _, quality, _ = api_server._resolve_stream_params({'q': '5'})
+    assert quality == api_server.STREAM_MIN_QUALITY
+
+
+def test_defaults_without_params():
+    width, height, quality, fps = api_server._resolve_stream_params({})
+    assert api_server.STREAM_MIN_WIDTH <= width <= api_server.STREAM_MAX_WIDTH
+    assert api_server.STREAM_MIN_HEIGHT <= height <= api_server.STREAM_MAX_HEIGHT
+    assert quality == int(api_server.camera_settings.get('streamQuality', api_server.STREAM_JPEG_QUALITY))
+    assert 1 <= fps <= 60
@@ -0,0 +1,78 @@
+"""The asgi owner serves Flask routes through wsgi_bridge: an open SSE stream must not hold up
+other requests, and a disconnected stream must be closed."""
+import socket
+import threading
+import time
+
+import pytest
+
+flask = pytest.importorskip('flask')
+uvicorn = pytest.importorskip('uvicorn')
+requests = pytest.importorskip('requests')
+
+from wsgi_bridge import ThreadedWsgiToAsgi
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server():
+    app = flask.Flask(__name__)
+    closed = threading.Event()
+
+    @app.route('/api/events/stream')
+    def events_stream():
+        def generate():
+            try:
+                yield 'retry: 1000\n\n'
+                while True:
+                    time.sleep(0.05)
+                    yield ': heartbeat\n\n'
+            finally:
+                closed.set()
+        return flask.Response(generate(), mimetype='text/event-stream')
+
+    @app.route('/api/status')
+    def status():
+        return flask.jsonify({'ok': True})
+
+    port = _free_port()
+    config = uvicorn.Config(ThreadedWsgiToAsgi(app, max_workers=8), host='127.0.0.1', port=port,
+                            log_level='warning', lifespan='off')
+    uv = uvicorn.Server(config)
+    thread = threading.Thread(target=uv.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not uv.started and time.time() < deadline:
+        time.sleep(0.02)
+    yield f'http://127.0.0.1:{port}', closed
+    uv.should_exit = True
+    thread.join(5)
+
+
+def test_status_answers_while_sse_stream_is_open(server):
+    base, closed = server
+    streams = [requests.get(f'{base}/api/events/stream', stream=True, timeout=5) for _ in range(3)]
+    try:
+        for stream in streams:
+            assert stream.raw.read(5) == b'retry'
+        started = time.perf_counter()
+        response = requests.get(f'{base}/api/status', timeout=2)
+        assert response.status_code == 200
+        assert response.json() == {'ok': True}
+        assert time.perf_counter() - started < 1.0
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def test_disconnected_stream_is_closed(server):
+    base, closed = server
+    stream = requests.get(f'{base}/api/events/stream', stream=True, timeout=5)
+    assert stream.raw.read(5) == b'retry'
+    stream.close()
+    assert closed.wait(3)
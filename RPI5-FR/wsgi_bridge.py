@@ -0,0 +1,84 @@
+"""
+WSGI-to-ASGI bridge for the Flask app under uvicorn (asgi.py).
+
+asgiref's WsgiToAsgi runs every request on its single thread-sensitive executor, so one
+long-lived response (an SSE feed, an MJPEG stream, a hub request waiting for its batch)
+stalls every other Flask route behind it. ThreadedWsgiToAsgi keeps asgiref's environ and
+start_response handling but runs each request on its own pool thread, and stops a streaming
+response (closing its iterable, so generator cleanup runs) once the client disconnects.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from asgiref.wsgi import WsgiToAsgiInstance
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+        self.disconnected = threading.Event()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError('WSGI bridge received a non-HTTP scope')
+        self.scope = scope
+        loop = asyncio.get_running_loop()
+        with SpooledTemporaryFile(max_size=65536) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            self.sync_send = lambda message: asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            async def wait_disconnect():
+                while (await receive())['type'] != 'http.disconnect':
+                    pass
+                self.disconnected.set()
+
+            watcher = asyncio.ensure_future(wait_disconnect())
+            try:
+                await loop.run_in_executor(self.executor, self.run_wsgi_app, body)
+            finally:
+                watcher.cancel()
+                await asyncio.gather(watcher, return_exceptions=True)
+
+    def run_wsgi_app(self, body):
+        """Runs on a pool thread; start_response is called on the same thread"""
+        iterable = self.wsgi_application(self.build_environ(self.scope, body), self.start_response)
+        try:
+            for output in iterable:
+                if self.disconnected.is_set():
+                    return
+                if not self.response_started:
+                    self.response_started = True
+                    self.sync_send(self.response_start)
+                if output:
+                    self.sync_send({'type': 'http.response.body', 'body': output, 'more_body': True})
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        if self.disconnected.is_set():
+            return
+        if not self.response_started:
+            self.response_started = True
+            self.sync_send(self.response_start)
+        self.sync_send({'type': 'http.response.body'})
+
+
+class ThreadedWsgiToAsgi:
+    """ASGI app serving a WSGI app from a pool of max_workers threads (one per open request)"""
+
+    def __init__(self, wsgi_application, max_workers: int = 64):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)